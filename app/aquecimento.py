@@ -0,0 +1,338 @@
+# app/aquecimento.py
+"""
+Aquecimento dos caches de respostas e de recuperação (app.cache).
+
+Passa uma lista de perguntas frequentes (uma por linha; linhas vazias e
+iniciadas por `#` são ignoradas) pelo pipeline RAG de app.chat com
+concorrência limitada e grava as respostas em
+`<CHROMA_PERSIST_DIR>/respostas_quentes.json`, que todos os workers
+consultam quando o cache em memória não tem a pergunta. O cache da
+recuperação é preenchido só no processo que aquece.
+
+Respostas ainda válidas (mesma geração do índice e menos de metade do
+TTL) são reaproveitadas; as demais são geradas de novo.
+
+Com EKLESIA_WARMUP_FILE definido, a API vigia o índice e reaquece:
+- depois de cada mudança no índice (ingestão, reindexação, troca da
+  coleção ativa), quando ele fica EKLESIA_WARMUP_DEBOUNCE_S sem mudar;
+- uma vez por dia na janela de baixo movimento EKLESIA_WARMUP_HOURS
+  (ex.: "2-5", hora local; vazio desliga).
+Um lock de arquivo garante que só um worker aquece por vez.
+
+- EKLESIA_WARMUP_CONCURRENCY: perguntas simultâneas (padrão 2)
+- EKLESIA_WARMUP_CHECK_S: intervalo da vigia (padrão 30)
+
+    python -m app.aquecimento perguntas.txt       # aquece agora
+    python -m app.aquecimento --concorrencia 4 perguntas.txt
+
+A cobertura (fração do tráfego real atendida por entradas aquecidas)
+sai em `eklesia_warmup_coverage_ratio{cache}` e em /health/ready.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.cache import (
+    CACHE_RECUPERACAO,
+    CACHE_RESPOSTAS,
+    PERSIST_DIR,
+    RESPOSTAS_QUENTES,
+    aquecendo,
+    geracao_indice,
+    idade_indice,
+)
+from app.logging_utils import get_logger
+from app.metrics import WARMUP_QUESTIONS, WARMUP_RUNS
+
+load_dotenv()
+
+WARMUP_FILE = os.getenv("EKLESIA_WARMUP_FILE", "")
+WARMUP_CONCURRENCY = int(os.getenv("EKLESIA_WARMUP_CONCURRENCY", "2"))
+WARMUP_HOURS = os.getenv("EKLESIA_WARMUP_HOURS", "")
+WARMUP_DEBOUNCE = float(os.getenv("EKLESIA_WARMUP_DEBOUNCE_S", "60"))
+WARMUP_CHECK = float(os.getenv("EKLESIA_WARMUP_CHECK_S", "30"))
+LOCK_PATH = os.path.join(PERSIST_DIR, "aquecimento.lock")
+# Reaquecimento agendado: no máximo um por janela
+_INTERVALO_AGENDA = 12 * 3600
+
+log = get_logger("aquecimento")
+
+
+def ler_perguntas(path: str) -> List[str]:
+    """Perguntas do arquivo, sem repetidas (mesma chave normalizada)."""
+    from app.singleflight import chave_pergunta
+
+    vistas, perguntas = set(), []
+    with open(path, encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha or linha.startswith("#"):
+                continue
+            chave = chave_pergunta(linha)
+            if chave not in vistas:
+                vistas.add(chave)
+                perguntas.append(linha)
+    return perguntas
+
+
+def na_janela(hora: int, janela: str = WARMUP_HOURS) -> bool:
+    """'2-5' cobre 2h às 4h59; '22-3' atravessa a meia-noite."""
+    if not janela:
+        return False
+    inicio, fim = (int(h) for h in janela.split("-", 1))
+    if inicio <= fim:
+        return inicio <= hora < fim
+    return hora >= inicio or hora < fim
+
+
+class _Lock:
+    """flock não bloqueante: um aquecimento por vez entre processos."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or LOCK_PATH
+        self._f = None
+
+    def __enter__(self) -> bool:
+        import fcntl
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._f = open(self.path, "w")
+        try:
+            fcntl.flock(self._f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._f.close()
+            self._f = None
+            return False
+        return True
+
+    def __exit__(self, *exc) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+class Aquecimento:
+    """Estado do job (um por processo) e vigia do índice."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._vigia: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self.estado: Dict[str, Any] = {"estado": "ocioso"}
+
+    def em_andamento(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> Dict[str, Any]:
+        st = dict(self.estado)
+        if st.get("estado") == "executando":
+            st["decorrido_s"] = round(time.monotonic() - st["_inicio"], 1)
+        st.pop("_inicio", None)
+        st["snapshot"] = RESPOSTAS_QUENTES.resumo()
+        st["caches"] = {
+            "respostas": CACHE_RESPOSTAS.estado(),
+            "recuperacao": CACHE_RECUPERACAO.estado(),
+        }
+        return st
+
+    def iniciar(
+        self,
+        perguntas: List[str],
+        concorrencia: int = WARMUP_CONCURRENCY,
+        motivo: str = "manual",
+    ) -> Dict[str, Any]:
+        """Aquece em segundo plano; acompanhe em `status()`."""
+        _exigir_rag()
+        with self._lock:
+            if self.em_andamento():
+                raise RuntimeError("Já existe um aquecimento em andamento.")
+            self.estado = {"estado": "executando", "motivo": motivo}
+            self._thread = threading.Thread(
+                target=self._executar_seguro,
+                args=(perguntas, concorrencia, motivo),
+                name="aquecimento", daemon=True,
+            )
+            self._thread.start()
+        return self.status()
+
+    def _executar_seguro(self, *args) -> None:
+        try:
+            self.executar(*args)
+        except Exception:
+            pass  # já registrado em executar()
+
+    def executar(
+        self,
+        perguntas: List[str],
+        concorrencia: int = WARMUP_CONCURRENCY,
+        motivo: str = "manual",
+    ) -> Dict[str, Any]:
+        """
+        Aquece as perguntas e grava o snapshot. Devolve o resumo; com
+        outro processo aquecendo, não faz nada (estado "ocupado").
+        """
+        _exigir_rag()
+        with _Lock() as obtido:
+            if not obtido:
+                self.estado = {"estado": "ocupado", "motivo": motivo}
+                return self.status()
+            if motivo != "manual" and self.motivo_pendente() is None:
+                self.estado = {"estado": "ocioso"}
+                return self.status()
+            self.estado = {
+                "estado": "executando", "motivo": motivo,
+                "_inicio": time.monotonic(), "perguntas": len(perguntas),
+                "geradas": 0, "reaproveitadas": 0, "erros": 0,
+            }
+            try:
+                self._aquecer(perguntas, max(1, concorrencia))
+            except Exception as e:
+                log.error("aquecimento_erro", motivo=motivo, error=str(e))
+                WARMUP_RUNS.inc(result="error")
+                self.estado.update(estado="erro", erro=str(e))
+                raise
+        WARMUP_RUNS.inc(result="ok")
+        st = self.estado
+        st.update(
+            estado="concluido",
+            duracao_s=round(time.monotonic() - st["_inicio"], 1),
+            concluido_em=datetime.now(timezone.utc).isoformat(),
+        )
+        log.info("aquecimento_concluido", motivo=motivo,
+                 perguntas=len(perguntas), geradas=st["geradas"],
+                 reaproveitadas=st["reaproveitadas"], erros=st["erros"],
+                 duracao_s=st["duracao_s"])
+        return self.status()
+
+    def _aquecer(self, perguntas: List[str], concorrencia: int) -> None:
+        geracao = geracao_indice()
+        inicio = time.time()
+        st = self.estado
+        entradas: Dict[str, Dict[str, Any]] = {}
+        with ThreadPoolExecutor(
+            max_workers=concorrencia, thread_name_prefix="aquecer"
+        ) as pool:
+            for pergunta, chave, entrada in pool.map(
+                _aquecer_pergunta, perguntas
+            ):
+                if entrada is None:
+                    st["erros"] += 1
+                    WARMUP_QUESTIONS.inc(result="erro")
+                    continue
+                entradas[chave] = entrada
+                resultado = (
+                    "gerada" if entrada["criado"] >= inicio
+                    else "reaproveitada"
+                )
+                st["geradas" if resultado == "gerada"
+                   else "reaproveitadas"] += 1
+                WARMUP_QUESTIONS.inc(result=resultado)
+        RESPOSTAS_QUENTES.gravar(geracao, entradas)
+
+    # ----------------------------
+    # Vigia (API)
+    # ----------------------------
+    def motivo_pendente(self, agora: Optional[datetime] = None) -> \
+            Optional[str]:
+        """Por que (e se) reaquecer agora: "indice", "agenda" ou None."""
+        idade = idade_indice()
+        if idade is not None and idade < WARMUP_DEBOUNCE:
+            return None  # índice ainda mudando (ingestão em lote)
+        # Outro worker pode ter acabado de aquecer
+        RESPOSTAS_QUENTES.recarregar_se_mudou(forcar=True)
+        resumo = RESPOSTAS_QUENTES.resumo()
+        if not resumo["atual"]:
+            return "indice"
+        agora = agora or datetime.now()
+        criado = resumo["criado_em"]
+        if na_janela(agora.hour) and (
+            not criado
+            or time.time() - datetime.fromisoformat(criado).timestamp()
+            > _INTERVALO_AGENDA
+        ):
+            return "agenda"
+        return None
+
+    def iniciar_vigia(self, path: str = WARMUP_FILE) -> bool:
+        from app import chat
+
+        if not path or chat.MOCK_RAG or self._vigia is not None:
+            return False
+        self._parar.clear()
+        self._vigia = threading.Thread(
+            target=self._vigiar, args=(path,),
+            name="aquecimento-vigia", daemon=True,
+        )
+        self._vigia.start()
+        return True
+
+    def parar_vigia(self) -> None:
+        self._parar.set()
+        self._vigia = None
+
+    def _vigiar(self, path: str) -> None:
+        while not self._parar.wait(WARMUP_CHECK):
+            try:
+                motivo = self.motivo_pendente()
+                if motivo and not self.em_andamento():
+                    self.executar(ler_perguntas(path), motivo=motivo)
+            except Exception as e:
+                log.error("aquecimento_vigia_erro", error=str(e))
+
+
+def _exigir_rag() -> None:
+    from app import chat
+
+    if chat.MOCK_RAG:
+        raise RuntimeError("RAG em modo mock: nada a aquecer.")
+
+
+def _aquecer_pergunta(
+    pergunta: str,
+) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    from app import chat
+
+    chave = chat.chave_resposta(pergunta, None)
+    try:
+        with aquecendo():
+            chat.recuperar_docs(pergunta)
+            chat.responder_pergunta_com_versiculo(pergunta)
+    except Exception as e:
+        log.warning("aquecimento_pergunta_erro", error=str(e))
+        return pergunta, chave, None
+    return pergunta, chave, CACHE_RESPOSTAS.entrada(chave)
+
+
+AQUECIMENTO = Aquecimento()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    p.add_argument("arquivo", nargs="?", default=WARMUP_FILE,
+                   help="perguntas, uma por linha (EKLESIA_WARMUP_FILE)")
+    p.add_argument("--concorrencia", type=int, default=WARMUP_CONCURRENCY)
+    args = p.parse_args(argv)
+    if not args.arquivo:
+        p.error("informe o arquivo de perguntas")
+    resumo = AQUECIMENTO.executar(
+        ler_perguntas(args.arquivo), args.concorrencia
+    )
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    return 0 if resumo["estado"] == "concluido" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,206 @@
 import os
+import time
 import requests
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
 # Carrega variáveis de ambiente
 from dotenv import load_dotenv
+
+from app.metrics import (
+    BIBLE_API_CALLS,
+    BIBLE_API_LATENCY,
+    registrar_cache,
+)
+from app.tracing import registrar_bible_call
+from app.logging_utils import get_logger
+from app import biblia_local
+
 load_dotenv()
 
 BIBLE_API_URL = os.getenv("BIBLE_API_URL", "https://4.dbt.io/api")
 BIBLE_API_KEY = os.getenv("BIBLE_API_KEY", "")
 
+# Cache de resolução idioma -> (bible_id, fileset_id de texto).
+# Evita duas chamadas extras ao upstream a cada busca de versículo.
+BIBLE_CACHE_TTL = float(os.getenv("BIBLE_CACHE_TTL", "3600"))
+_cache_fileset: Dict[str, Tuple[float, str, str]] = {}
+_cache_stats = {"hits": 0, "misses": 0}
+# Timeout (s) de cada chamada de recursos extras (áudio, vídeo) anexados
+# à busca por palavra; são opcionais e não podem travar a resposta
+BIBLE_EXTRAS_TIMEOUT = float(os.getenv("BIBLE_EXTRAS_TIMEOUT", "5"))
+
+log = get_logger("biblia_api")
+
+
+def _get(operacao: str, url: str, **kwargs) -> requests.Response:
+    """
+    requests.get instrumentado: métricas, trace e log estruturado.
+    URLs/params têm a chave redigida e o corpo só é lido (e truncado)
+    quando o debug está ligado e o evento foi amostrado.
+    """
+    inicio = time.perf_counter()
+    status = "error"
+    try:
+        resp = requests.get(url, **kwargs)
+        status = str(resp.status_code)
+    except Exception as e:
+        log.warning(
+            "bible_api_error", operation=operacao, url=url,
+            params=kwargs.get("params"), error=str(e),
+        )
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        BIBLE_API_LATENCY.observe(duracao, operation=operacao)
+        BIBLE_API_CALLS.inc(operation=operacao, status=status)
+        registrar_bible_call(operacao, status, duracao)
+
+    if resp.status_code >= 500:
+        log.warning(
+            "bible_api_response", operation=operacao, url=url,
+            status=resp.status_code, ms=round(duracao * 1000, 2),
+        )
+    else:
+        log.debug(
+            "bible_api_response", operation=operacao, url=url,
+            params=kwargs.get("params"), status=resp.status_code,
+            ms=round(duracao * 1000, 2), payload=lambda: resp.text,
+        )
+    return resp
+
+
+def _cache_get(language_code: str) -> Optional[Tuple[str, str]]:
+    item = _cache_fileset.get(language_code)
+    if item and item[0] > time.monotonic():
+        _cache_stats["hits"] += 1
+        registrar_cache("biblia_fileset", True)
+        return item[1], item[2]
+    _cache_stats["misses"] += 1
+    registrar_cache("biblia_fileset", False)
+    return None
+
+
+def _cache_set(language_code: str, bible_id: str, fileset_id: str) -> None:
+    _cache_fileset[language_code] = (
+        time.monotonic() + BIBLE_CACHE_TTL, bible_id, fileset_id
+    )
+
+
+def estado_cache() -> Dict[str, Any]:
+    """Resumo do cache de resolução (usado pelo readiness)."""
+    agora = time.monotonic()
+    return {
+        "entries": len(_cache_fileset),
+        "valid": sum(
+            1 for exp, _, _ in _cache_fileset.values() if exp > agora
+        ),
+        "hits": _cache_stats["hits"],
+        "misses": _cache_stats["misses"],
+        "ttl_s": BIBLE_CACHE_TTL,
+    }
+
+
+def resolver_fileset_texto(
+    language_code: str,
+    operacao: str,
+    fileset_id: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Resolve (bible_id, fileset_id de texto) do idioma, com cache.
+    Devolve `(None, None)` sem bíblia e `(bible_id, None)` sem fileset.
+    """
+    cached = None if fileset_id else _cache_get(language_code)
+    if cached:
+        return cached
+    bibles_url = (
+        f"{BIBLE_API_URL}/bibles"
+        f"?language_code={language_code}"
+        f"&v=4&key={BIBLE_API_KEY}"
+    )
+    bibles_resp = _get(operacao, bibles_url)
+    bibles_data = (
+        bibles_resp.json().get("data", [])
+        if bibles_resp.status_code == 200 else []
+    )
+    if not bibles_data:
+        return None, None
+    bible_id = bibles_data[0]["abbr"]
+    if fileset_id:
+        return bible_id, fileset_id
+    filesets_url = (
+        f"{BIBLE_API_URL}/bibles/{bible_id}"
+        f"?v=4&key={BIBLE_API_KEY}"
+    )
+    filesets_resp = _get(operacao, filesets_url)
+    filesets_obj = (
+        filesets_resp.json().get("data", {}).get("filesets", {})
+        if filesets_resp.status_code == 200 else {}
+    )
+    filesets = [
+        fs
+        for fs_list in filesets_obj.values()
+        for fs in fs_list
+        if fs.get("type", "").startswith("text")
+        or fs.get("set_type_code", "").startswith("text")
+    ]
+    if not filesets:
+        return bible_id, None
+    fileset_id = filesets[0]["id"]
+    _cache_set(language_code, bible_id, fileset_id)
+    return bible_id, fileset_id
+
 
 def buscar_versos_por_palavra(
     palavra: str,
     idiomas: Optional[List[str]] = None,
-    limite: int = 50
+    limite: int = 50,
+    recursos: bool = True,
 ) -> List[Dict[str, Any]]:
     """
     Busca todos os versos que contenham a palavra,
     em todos os idiomas especificados.
+    Os recursos extras são buscados uma vez por capítulo, com timeout e
+    sem derrubar a busca (`{}` se falharem); `recursos=False` os omite.
     """
     resultados = []
     idiomas = idiomas or ["por", "spa", "eng", "ell", "heb"]
+    por_capitulo: Dict[Tuple[Any, Any, Any], Dict[str, Any]] = {}
+
+    def extras(bible_id, book_id, chapter) -> Dict[str, Any]:
+        if not recursos:
+            return {}
+        chave = (bible_id, book_id, chapter)
+        if chave not in por_capitulo:
+            try:
+                por_capitulo[chave] = buscar_recursos_extras(
+                    bible_id, book_id, chapter,
+                    timeout=BIBLE_EXTRAS_TIMEOUT,
+                )
+            except Exception as e:
+                log.warning(
+                    "bible_extras_error", bible_id=bible_id,
+                    book_id=book_id, chapter=chapter, error=str(e),
+                )
+                por_capitulo[chave] = {}
+        return por_capitulo[chave]
+
     for idioma in idiomas:
+        local = biblia_local.pesquisar(palavra, idioma, limite=limite)
+        if local is not None:
+            for v in local["data"]:
+                resultados.append({
+                    "idioma": idioma,
+                    "referencia": v["reference"],
+                    "texto": v["verse_text"],
+                    "bible_id": v["bible_id"],
+                    "livro": v["book_id"],
+                    "capitulo": v["chapter"],
+                    "versiculo": v["verse_start"],
+                    "recursos": extras(
+                        v["bible_id"], v["book_id"], v["chapter"]
+                    ),
+                })
+            continue
         params = {
             "key": BIBLE_API_KEY,
             "query": palavra,
@@ -29,7 +208,7 @@ def buscar_versos_por_palavra(
             "limit": limite
         }
         url = f"{BIBLE_API_URL}/search"
-        resp = requests.get(url, params=params)
+        resp = _get("buscar_versos_por_palavra", url, params=params)
         if resp.status_code == 200:
             data = resp.json()
             versos = data.get("verses", [])
@@ -42,7 +221,7 @@ def buscar_versos_por_palavra(
                     "livro": v.get("book_id"),
                     "capitulo": v.get("chapter"),
                     "versiculo": v.get("verse"),
-                    "recursos": buscar_recursos_extras(
+                    "recursos": extras(
                         v.get("bible_id"),
                         v.get("book_id"),
                         v.get("chapter")
@@ -67,7 +246,7 @@ def buscar_verso_por_referencia(
     if verse_number:
         url += f"/{verse_number}"
     params = {"key": BIBLE_API_KEY}
-    resp = requests.get(url, params=params)
+    resp = _get("buscar_verso_por_referencia", url, params=params)
     if resp.status_code == 200:
         data = resp.json()
         return data
@@ -86,7 +265,7 @@ def listar_biblias_idiomas(
         "language_code": ",".join(idiomas)
     }
     url = f"{BIBLE_API_URL}/bibles"
-    resp = requests.get(url, params=params)
+    resp = _get("listar_biblias_idiomas", url, params=params)
     if resp.status_code == 200:
         data = resp.json()
         return data.get("data", [])
@@ -96,7 +275,8 @@ def listar_biblias_idiomas(
 def buscar_recursos_extras(
     bible_id: str,
     book_id: str,
-    chapter_id: str
+    chapter_id: str,
+    timeout: Optional[float] = None,
 ) -> Dict[str, Any]:
     """
     Busca recursos extras (áudio, vídeo, etc) para um capítulo.
@@ -105,7 +285,10 @@ def buscar_recursos_extras(
     # Descobrir filesets disponíveis para a bíblia
     url_filesets = f"{BIBLE_API_URL}/bibles/{bible_id}"
     params = {"key": BIBLE_API_KEY}
-    resp = requests.get(url_filesets, params=params)
+    resp = _get(
+        "buscar_recursos_extras", url_filesets, params=params,
+        timeout=timeout,
+    )
     if resp.status_code == 200:
         data = resp.json()
         filesets = data.get("data", {}).get("filesets", [])
@@ -117,7 +300,10 @@ def buscar_recursos_extras(
                 f"{BIBLE_API_URL}/bibles/filesets/{fs_id}/"
                 f"{book_id}/{chapter_id}"
             )
-            resp2 = requests.get(url_content, params=params)
+            resp2 = _get(
+                "buscar_recursos_extras", url_content, params=params,
+                timeout=timeout,
+            )
             if resp2.status_code == 200:
                 recursos[fs_type] = resp2.json()
     return recursos
@@ -126,9 +312,7 @@ def buscar_recursos_extras(
 def listar_tipos_fileset():
     url = f"{BASE_URL}/bibles/filesets/media/types"
     params = {"v": 4, "key": API_KEY}
-    response = requests.get(url, params=params)
-    print("Status:", response.status_code)
-    print("Response:", response.text)
+    response = _get("listar_tipos_fileset", url, params=params)
     if response.status_code == 200:
         return response.json()
     return None
@@ -150,41 +334,13 @@ def buscar_versiculo(
     # /bibles/filesets/{fileset_id}/{book_id}/{chapter_id}/{verse_number}
     # Mas para uso genérico, vamos buscar o fileset de texto primeiro
     try:
-        # Buscar bible_id
-        bibles_url = (
-            f"{BIBLE_API_URL}/bibles"
-            f"?language_code={language_code}"
-            f"&v=4&key={BIBLE_API_KEY}"
-        )
-        bibles_resp = requests.get(bibles_url)
-        bibles_data = (
-            bibles_resp.json().get("data", [])
-            if bibles_resp.status_code == 200 else []
+        bible_id, fileset_id = resolver_fileset_texto(
+            language_code, "buscar_versiculo", fileset_id
         )
-        if not bibles_data:
+        if not bible_id:
             return {"error": "Nenhuma bíblia encontrada para o idioma."}
-        bible_id = bibles_data[0]["abbr"]
-        # Se não foi passado fileset_id, buscar o primeiro disponível
         if not fileset_id:
-            filesets_url = (
-                f"{BIBLE_API_URL}/bibles/{bible_id}"
-                f"?v=4&key={BIBLE_API_KEY}"
-            )
-            filesets_resp = requests.get(filesets_url)
-            filesets_obj = (
-                filesets_resp.json().get("data", {}).get("filesets", {})
-                if filesets_resp.status_code == 200 else {}
-            )
-            filesets = [
-                fs
-                for fs_list in filesets_obj.values()
-                for fs in fs_list
-                if fs.get("type", "").startswith("text")
-                or fs.get("set_type_code", "").startswith("text")
-            ]
-            if not filesets:
-                return {"error": "Nenhum fileset de texto encontrado."}
-            fileset_id = filesets[0]["id"]
+            return {"error": "Nenhum fileset de texto encontrado."}
         # Montar endpoint correto para buscar o versículo
         if verse_number:
             url = (
@@ -197,10 +353,7 @@ def buscar_versiculo(
                 f"{BIBLE_API_URL}/bibles/filesets/{fileset_id}/"
                 f"{book_id}/{chapter_id}?v=4&key={BIBLE_API_KEY}"
             )
-        print(f"[DEBUG buscar_versiculo] URL: {url}")
-        response = requests.get(url)
-        print(f"[DEBUG buscar_versiculo] Status: {response.status_code}")
-        print(f"[DEBUG buscar_versiculo] Response: {response.text}")
+        response = _get("buscar_versiculo", url)
         if response.status_code == 200:
             data = response.json()
             # Retorna o primeiro versículo encontrado
@@ -209,6 +362,10 @@ def buscar_versiculo(
                 and isinstance(data["data"], list)
                 and data["data"]
             ):
+                if not verse_number:
+                    biblia_local.armazenar_capitulo(
+                        language_code, bible_id, fileset_id, data["data"]
+                    )
                 return data["data"][0]
             return data
         # Fallback: se 404, buscar capítulo inteiro e filtrar o versículo
@@ -217,19 +374,12 @@ def buscar_versiculo(
                 f"{BIBLE_API_URL}/bibles/filesets/{fileset_id}/"
                 f"{book_id}/{chapter_id}?v=4&key={BIBLE_API_KEY}"
             )
-            print(f"[DEBUG buscar_versiculo] Fallback URL: {cap_url}")
-            cap_resp = requests.get(cap_url)
-            print(
-                (
-                    f"[DEBUG buscar_versiculo] Fallback Status: "
-                    f"{cap_resp.status_code}"
-                )
-            )
-            print(
-                f"[DEBUG buscar_versiculo] Fallback Response: {cap_resp.text}"
-            )
+            cap_resp = _get("buscar_versiculo_fallback", cap_url)
             if cap_resp.status_code == 200:
                 cap_data = cap_resp.json().get("data", [])
+                biblia_local.armazenar_capitulo(
+                    language_code, bible_id, fileset_id, cap_data
+                )
                 for verse in cap_data:
                     vnum = (
                         verse.get("verse_start")
@@ -257,45 +407,31 @@ def buscar_versiculo(
         return {"error": str(e)}
 
 
-def pesquisar_termo(termo, page=1, limit=5):
+def pesquisar_termo(termo, page=1, limit=5, cursor=None):
+    """
+    Busca por termo. Usa o índice local (`app.biblia_local`) quando há
+    texto sincronizado para o idioma; senão consulta o `/search` do DBT.
+    """
     try:
-        # Buscar o primeiro bible_id disponível em português
-        bibles_url = (
-            f"{BIBLE_API_URL}/bibles?language_code=por"
-            f"&v=4&key={BIBLE_API_KEY}"
+        local = biblia_local.pesquisar(
+            termo, "por", limite=limit, cursor=cursor, page=page
         )
-        bibles_resp = requests.get(bibles_url)
-        bibles_data = (
-            bibles_resp.json().get("data", [])
-            if bibles_resp.status_code == 200 else []
+        if local is not None:
+            return local
+    except ValueError as e:
+        return {"error": str(e)}
+    try:
+        bible_id, fileset_id = resolver_fileset_texto(
+            "por", "pesquisar_termo"
         )
-        if not bibles_data:
+        if not bible_id:
             return {"error": "Nenhuma bíblia encontrada para busca."}
-        bible_id = bibles_data[0]["abbr"]
-        # Buscar fileset_id de texto para o bible_id selecionado
-        filesets_url = (
-            f"{BIBLE_API_URL}/bibles/{bible_id}"
-            f"?v=4&key={BIBLE_API_KEY}"
-        )
-        filesets_resp = requests.get(filesets_url)
-        filesets_obj = (
-            filesets_resp.json().get("data", {}).get("filesets", {})
-            if filesets_resp.status_code == 200 else {}
-        )
-        filesets = [
-            fs
-            for fs_list in filesets_obj.values()
-            for fs in fs_list
-            if fs.get("type", "").startswith("text")
-            or fs.get("set_type_code", "").startswith("text")
-        ]
-        if not filesets:
+        if not fileset_id:
             return {
                 "error": (
                     "Nenhum fileset de texto encontrado para a bíblia."
                 )
             }
-        fileset_id = filesets[0]["id"]
         url = f"{BIBLE_API_URL}/search"
         params = {
             "key": BIBLE_API_KEY,
@@ -306,11 +442,7 @@ def pesquisar_termo(termo, page=1, limit=5):
             "limit": limit,
             "v": 4
         }
-        response = requests.get(url, params=params)
-        print(f"[DEBUG pesquisar_termo] URL: {url}")
-        print(f"[DEBUG pesquisar_termo] Params: {params}")
-        print(f"[DEBUG pesquisar_termo] Status: {response.status_code}")
-        print(f"[DEBUG pesquisar_termo] Response: {response.text}")
+        response = _get("pesquisar_termo", url, params=params)
         if response.status_code == 200:
             result = response.json()
             # Se vier no formato verses > data, retorna direto os versos
@@ -328,7 +460,7 @@ def pesquisar_termo(termo, page=1, limit=5):
 def listar_biblias():
     url = f"{BIBLE_API_URL}/bibles"
     params = {"v": 4, "key": BIBLE_API_KEY}
-    response = requests.get(url, params=params)
+    response = _get("listar_biblias", url, params=params)
     if response.status_code == 200:
         data = response.json()
         return data.get("data", [])
@@ -338,37 +470,37 @@ def listar_biblias():
 def listar_livros(bible_id):
     url = f"{BASE_URL}/bibles/{bible_id}/book"
     params = {"key": API_KEY}
-    response = requests.get(url, params=params)
+    response = _get("listar_livros", url, params=params)
     return response.json() if response.status_code == 200 else None
 
 
 def buscar_conteudo_multimidia(fileset_id, book, chapter):
     url = f"{BASE_URL}/bibles/filesets/{fileset_id}/{book}/{chapter}"
     params = {"key": API_KEY}
-    response = requests.get(url, params=params)
+    response = _get("buscar_conteudo_multimidia", url, params=params)
     return response.json() if response.status_code == 200 else None
 
 
 def buscar_audio_timestamps(fileset_id, book, chapter):
     url = f"{BASE_URL}/timestamps/{fileset_id}/{book}/{chapter}"
     params = {"key": API_KEY}
-    response = requests.get(url, params=params)
+    response = _get("buscar_audio_timestamps", url, params=params)
     return response.json() if response.status_code == 200 else None
 
 
 def listar_idiomas():
     url = f"{BASE_URL}/languages"
     params = {"key": API_KEY}
-    response = requests.get(url, params=params)
+    response = _get("listar_idiomas", url, params=params)
     return response.json() if response.status_code == 200 else None
 
 
 def listar_paises():
     url = f"{BASE_URL}/countries"
     params = {"key": API_KEY}
-    response = requests.get(url, params=params)
+    response = _get("listar_paises", url, params=params)
     return response.json() if response.status_code == 200 else None
     url = f"{BASE_URL}/countries"
     params = {"key": API_KEY}
-    response = requests.get(url, params=params)
+    response = _get("listar_paises", url, params=params)
     return response.json() if response.status_code == 200 else None
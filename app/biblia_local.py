@@ -0,0 +1,387 @@
+# app/biblia_local.py
+"""
+Texto bíblico local e índice full-text em memória.
+
+O texto fica em um JSONL por idioma (`BIBLIA_LOCAL_DIR/<idioma>.jsonl`,
+padrão `./biblia_local`), alimentado por:
+- sincronização explícita: python -m app.biblia_local --sync por
+  [--livros GEN,EXO]
+- write-through: todo capítulo inteiro obtido por `buscar_versiculo`.
+
+A busca é insensível a acentos (pt/es), normaliza grego (sem tonos/
+espíritos, sigma final) e hebraico (sem niqqud/cantilação, letras finais),
+aceita frases entre aspas e pagina por cursor opaco em ordem canônica.
+Sem texto local para o idioma, `pesquisar` devolve None e o chamador usa
+o `/search` do DBT.
+"""
+from __future__ import annotations
+
+import base64
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.logging_utils import get_logger
+
+load_dotenv()
+
+BIBLIA_LOCAL_DIR = os.getenv("BIBLIA_LOCAL_DIR", "./biblia_local")
+# Intervalo mínimo (s) entre checagens de mtime (write-through de outros
+# workers)
+RELOAD_INTERVAL = float(os.getenv("BIBLIA_LOCAL_RELOAD_INTERVAL", "5"))
+
+log = get_logger("biblia_local")
+
+LIVROS = (
+    "GEN EXO LEV NUM DEU JOS JDG RUT 1SA 2SA 1KI 2KI 1CH 2CH EZR NEH EST "
+    "JOB PSA PRO ECC SNG ISA JER LAM EZK DAN HOS JOL AMO OBA JON MIC NAM "
+    "HAB ZEP HAG ZEC MAL MAT MRK LUK JHN ACT ROM 1CO 2CO GAL EPH PHP COL "
+    "1TH 2TH 1TI 2TI TIT PHM HEB JAS 1PE 2PE 1JN 2JN 3JN JUD REV"
+).split()
+_ORDEM_LIVRO = {livro: i for i, livro in enumerate(LIVROS)}
+
+# Sigma final e letras finais hebraicas; maqaf/paseq separam palavras
+_FINAIS = str.maketrans({
+    "ς": "σ", "ך": "כ", "ם": "מ", "ן": "נ", "ף": "פ", "ץ": "צ",
+    "־": " ", "׀": " ",
+})
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_FRASE_RE = re.compile(r'"([^"]*)"')
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas sem diacríticos (acentos, tonos, niqqud, cantilação)."""
+    nfkd = unicodedata.normalize("NFKD", texto or "")
+    base = "".join(c for c in nfkd if unicodedata.category(c) != "Mn")
+    return base.casefold().translate(_FINAIS)
+
+
+def tokenizar(texto: str) -> List[str]:
+    return _TOKEN_RE.findall(normalizar(texto))
+
+
+def analisar_consulta(consulta: str) -> Tuple[List[str], List[List[str]]]:
+    """Separa termos soltos e frases (entre aspas)."""
+    frases = [tokenizar(f) for f in _FRASE_RE.findall(consulta or "")]
+    resto = _FRASE_RE.sub(" ", consulta or "")
+    return tokenizar(resto), [f for f in frases if f]
+
+
+def _chave_ordem(livro: str, capitulo: int, verso: int) -> Tuple[int, ...]:
+    return (_ORDEM_LIVRO.get(livro, len(LIVROS)), capitulo, verso)
+
+
+def codificar_cursor(registro: Dict[str, Any]) -> str:
+    bruto = f"{registro['book_id']}.{registro['chapter']}.{registro['verse']}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[int, ...]:
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        livro, cap, verso = (
+            base64.urlsafe_b64decode(cursor + pad).decode().split(".")
+        )
+        return _chave_ordem(livro, int(cap), int(verso))
+    except Exception:
+        raise ValueError("Cursor inválido.")
+
+
+def _numero(valor: Any) -> Optional[int]:
+    try:
+        return int(str(valor).split("-")[0])
+    except (TypeError, ValueError):
+        return None
+
+
+class IndiceVersos:
+    """Índice posicional de um idioma (termo -> {verso: [posições]})."""
+
+    def __init__(self, idioma: str, pasta: str = BIBLIA_LOCAL_DIR):
+        self.idioma = idioma
+        self.path = os.path.join(pasta, f"{idioma}.jsonl")
+        self._lock = threading.RLock()
+        self._mtime = 0.0
+        self._checado = 0.0
+        self._por_ref: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+        self._sujo = False
+        self.versos: List[Dict[str, Any]] = []
+        self.ordem: List[Tuple[int, ...]] = []
+        self.postings: Dict[str, Dict[int, List[int]]] = {}
+
+    # ------------------------
+    # Persistência
+    # ------------------------
+    def carregar(self) -> None:
+        with self._lock:
+            self._por_ref = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for linha in f:
+                        if linha.strip():
+                            self._registrar(json.loads(linha))
+                self._mtime = os.path.getmtime(self.path)
+            self._sujo = True
+
+    def recarregar_se_mudou(self) -> None:
+        agora = time.monotonic()
+        if agora - self._checado < RELOAD_INTERVAL:
+            return
+        self._checado = agora
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime > self._mtime:
+            self.carregar()
+
+    def _registrar(self, registro: Dict[str, Any]) -> None:
+        ref = (registro["book_id"], registro["chapter"], registro["verse"])
+        self._por_ref[ref] = registro
+
+    def adicionar(self, registros: List[Dict[str, Any]]) -> int:
+        """
+        Acrescenta ao JSONL os versos novos ou com texto diferente (última
+        versão de cada ref vence); devolve quantos foram gravados.
+        """
+        with self._lock:
+            novos = []
+            for r in registros or []:
+                atual = self._por_ref.get(
+                    (r["book_id"], r["chapter"], r["verse"])
+                )
+                if atual is None or atual.get("text") != r["text"]:
+                    novos.append(r)
+            if not novos:
+                # Capítulo já conhecido: nada a gravar nem reindexar
+                return 0
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                        exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for r in novos:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+                    self._registrar(r)
+            self._mtime = os.path.getmtime(self.path)
+            self._sujo = True
+            return len(novos)
+
+    # ------------------------
+    # Índice
+    # ------------------------
+    def _reconstruir(self) -> None:
+        versos = sorted(
+            self._por_ref.values(),
+            key=lambda r: _chave_ordem(
+                r["book_id"], r["chapter"], r["verse"]
+            ),
+        )
+        postings: Dict[str, Dict[int, List[int]]] = {}
+        # Ids crescentes: cada dict de postings fica em ordem canônica
+        for i, r in enumerate(versos):
+            for pos, termo in enumerate(tokenizar(r["text"])):
+                postings.setdefault(termo, {}).setdefault(i, []).append(pos)
+        self.versos = versos
+        self.ordem = [
+            _chave_ordem(r["book_id"], r["chapter"], r["verse"])
+            for r in versos
+        ]
+        self.postings = postings
+        self._sujo = False
+
+    def __len__(self) -> int:
+        return len(self._por_ref)
+
+    def _tem_frase(self, doc: int, frase: List[str]) -> bool:
+        inicios = self.postings[frase[0]][doc]
+        seguintes = [set(self.postings[t][doc]) for t in frase[1:]]
+        return any(
+            all(p + i + 1 in s for i, s in enumerate(seguintes))
+            for p in inicios
+        )
+
+    def buscar(
+        self,
+        consulta: str,
+        limite: int = 15,
+        apos: Optional[Tuple[int, ...]] = None,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """
+        Versos com todos os termos e frases, em ordem canônica.
+        Retorna (página, total, há_mais).
+        """
+        with self._lock:
+            if self._sujo:
+                self._reconstruir()
+            termos, frases = analisar_consulta(consulta)
+            todos = set(termos) | {t for f in frases for t in f}
+            if not todos:
+                return [], 0, False
+            listas = [self.postings.get(t) for t in todos]
+            if any(not lista for lista in listas):
+                return [], 0, False
+            listas.sort(key=len)
+            achados = [
+                d for d in listas[0]
+                if all(d in outra for outra in listas[1:])
+                and all(self._tem_frase(d, f) for f in frases)
+            ]
+            inicio = offset
+            if apos is not None:
+                chaves = [self.ordem[d] for d in achados]
+                inicio = bisect.bisect_right(chaves, apos)
+            pagina = achados[inicio:inicio + limite]
+            mais = inicio + limite < len(achados)
+            return [self.versos[d] for d in pagina], len(achados), mais
+
+
+_indices: Dict[str, IndiceVersos] = {}
+_indices_lock = threading.Lock()
+
+
+def indice(idioma: str) -> IndiceVersos:
+    """Instância compartilhada por idioma (carregada sob demanda)."""
+    idx = _indices.get(idioma)
+    if idx is None:
+        with _indices_lock:
+            idx = _indices.get(idioma)
+            if idx is None:
+                idx = IndiceVersos(idioma)
+                idx.carregar()
+                _indices[idioma] = idx
+    idx.recarregar_se_mudou()
+    return idx
+
+
+def _formatar(r: Dict[str, Any]) -> Dict[str, Any]:
+    """Formato próximo ao dos versos do DBT (`verses.data`)."""
+    return {
+        "bible_id": r.get("bible_id"),
+        "fileset_id": r.get("fileset_id"),
+        "book_id": r["book_id"],
+        "book_name": r.get("book_name") or r["book_id"],
+        "chapter": r["chapter"],
+        "verse_start": r["verse"],
+        "verse_end": r["verse"],
+        "verse_text": r["text"],
+        "reference": f"{r['book_id']} {r['chapter']}:{r['verse']}",
+    }
+
+
+def pesquisar(
+    termo: str,
+    idioma: str = "por",
+    limite: int = 5,
+    cursor: Optional[str] = None,
+    page: int = 1,
+) -> Optional[Dict[str, Any]]:
+    """
+    Busca no texto local. None quando não há texto local do idioma.
+    `cursor` (de `next_cursor`) tem precedência sobre `page`.
+    """
+    idx = indice(idioma)
+    if not len(idx):
+        return None
+    apos = decodificar_cursor(cursor) if cursor else None
+    offset = max(page - 1, 0) * limite
+    inicio = time.perf_counter()
+    versos, total, mais = idx.buscar(termo, limite, apos=apos, offset=offset)
+    log.debug(
+        "busca_local", idioma=idioma, total=total,
+        ms=round((time.perf_counter() - inicio) * 1000, 3),
+    )
+    return {
+        "data": [_formatar(r) for r in versos],
+        "meta": {
+            "total": total,
+            "next_cursor": codificar_cursor(versos[-1]) if mais else None,
+            "source": "local",
+        },
+    }
+
+
+def armazenar_capitulo(
+    idioma: str,
+    bible_id: Optional[str],
+    fileset_id: Optional[str],
+    versos: List[Dict[str, Any]],
+) -> int:
+    """Write-through de um capítulo do DBT; nunca propaga erro."""
+    try:
+        registros = []
+        for v in versos or []:
+            capitulo = _numero(v.get("chapter"))
+            numero = _numero(
+                v.get("verse_start") or v.get("verse_sequence")
+                or v.get("verse")
+            )
+            texto = v.get("verse_text") or v.get("text")
+            if not (v.get("book_id") and capitulo and numero and texto):
+                continue
+            registros.append({
+                "bible_id": bible_id,
+                "fileset_id": fileset_id,
+                "book_id": v["book_id"],
+                "book_name": v.get("book_name"),
+                "chapter": capitulo,
+                "verse": numero,
+                "text": texto,
+            })
+        indice(idioma).adicionar(registros)
+        return len(registros)
+    except Exception as e:
+        log.warning("biblia_local_write_error", idioma=idioma, error=str(e))
+        return 0
+
+
+def sincronizar(idioma: str, livros: Optional[List[str]] = None) -> int:
+    """Baixa capítulos do DBT para o texto local do idioma."""
+    from app.biblia_api import (
+        BIBLE_API_KEY,
+        BIBLE_API_URL,
+        _get,
+        resolver_fileset_texto,
+    )
+
+    bible_id, fileset_id = resolver_fileset_texto(idioma, "sincronizar")
+    if not fileset_id:
+        raise RuntimeError(f"Sem fileset de texto para '{idioma}'.")
+    params = {"v": 4, "key": BIBLE_API_KEY}
+    resp = _get(
+        "sincronizar", f"{BIBLE_API_URL}/bibles/{bible_id}/book",
+        params=params,
+    )
+    total = 0
+    for livro in resp.json().get("data", []) if resp.ok else []:
+        if livros and livro.get("book_id") not in livros:
+            continue
+        for cap in livro.get("chapters") or []:
+            url = (
+                f"{BIBLE_API_URL}/bibles/filesets/{fileset_id}/"
+                f"{livro['book_id']}/{cap}"
+            )
+            r = _get("sincronizar", url, params=params)
+            if r.status_code == 200:
+                total += armazenar_capitulo(
+                    idioma, bible_id, fileset_id, r.json().get("data", [])
+                )
+    return total
+
+
+if __name__ == "__main__":
+    if "--sync" in sys.argv:
+        idioma = sys.argv[sys.argv.index("--sync") + 1]
+        livros = None
+        if "--livros" in sys.argv:
+            livros = sys.argv[sys.argv.index("--livros") + 1].split(",")
+        print(f"Versos sincronizados: {sincronizar(idioma, livros)}")
+    else:
+        print(__doc__)
@@ -0,0 +1,328 @@
+# app/cache.py
+"""
+Caches de respostas e de recuperação do RAG.
+
+As entradas valem para uma geração do índice: cada mudança no acervo
+indexado (ingestão, remoção de duplicatas, reindexação) grava um
+marcador novo em `<CHROMA_PERSIST_DIR>/indice.geracao`, e a troca da
+coleção ativa (re-embedding) também muda a geração. Os workers percebem
+a mudança pelo mtime do marcador (checado a cada
+EKLESIA_INDEX_CHECK_INTERVAL s) e passam a ignorar as entradas antigas.
+
+- `CacheLRU`: em memória, por processo, com TTL e limite de itens.
+- `RespostasQuentes`: respostas gravadas pelo aquecimento
+  (app.aquecimento) em `<CHROMA_PERSIST_DIR>/respostas_quentes.json`,
+  compartilhadas por todos os workers; consultadas quando o cache em
+  memória não tem a pergunta.
+
+Consultas feitas dentro de `aquecendo()` não contam como tráfego real:
+marcam as entradas como aquecidas, e os hits reais nelas alimentam
+`eklesia_warmup_coverage_ratio`.
+
+- EKLESIA_ANSWER_CACHE: "1" (padrão) liga os caches; "0" desliga
+- EKLESIA_ANSWER_CACHE_TTL / EKLESIA_ANSWER_CACHE_MAX: validade (s) e
+  itens do cache de respostas (86400 / 2048)
+- EKLESIA_RETRIEVAL_CACHE_TTL / EKLESIA_RETRIEVAL_CACHE_MAX: idem para
+  a recuperação (86400 / 1024)
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from app.metrics import CACHE_WARM_HITS, registrar_cache
+
+load_dotenv()
+
+PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+CACHE_ATIVO = os.getenv("EKLESIA_ANSWER_CACHE", "1").lower() in {
+    "1", "true", "yes"
+}
+ANSWER_CACHE_TTL = float(os.getenv("EKLESIA_ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_MAX = int(os.getenv("EKLESIA_ANSWER_CACHE_MAX", "2048"))
+RETRIEVAL_CACHE_TTL = float(
+    os.getenv("EKLESIA_RETRIEVAL_CACHE_TTL", "86400")
+)
+RETRIEVAL_CACHE_MAX = int(os.getenv("EKLESIA_RETRIEVAL_CACHE_MAX", "1024"))
+INDEX_CHECK_INTERVAL = float(
+    os.getenv("EKLESIA_INDEX_CHECK_INTERVAL", "5")
+)
+MARCADOR_PATH = os.path.join(PERSIST_DIR, "indice.geracao")
+QUENTES_PATH = os.getenv(
+    "EKLESIA_WARM_ANSWERS_PATH",
+    os.path.join(PERSIST_DIR, "respostas_quentes.json"),
+)
+
+_aquecendo: ContextVar[bool] = ContextVar("eklesia_aquecendo", default=False)
+
+
+@contextmanager
+def aquecendo() -> Iterator[None]:
+    """Consultas e gravações do bloco são do aquecimento, não tráfego."""
+    token = _aquecendo.set(True)
+    try:
+        yield
+    finally:
+        _aquecendo.reset(token)
+
+
+def _gravar_atomico(path: str, conteudo: str) -> None:
+    pasta = os.path.dirname(path) or "."
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+    os.replace(tmp, path)
+
+
+# ----------------------------
+# Geração do índice
+# ----------------------------
+class _Geracao:
+    def __init__(self, path: str = MARCADOR_PATH):
+        self.path = path
+        self._valor = ""
+        self._mtime = -1.0
+        self._checado = 0.0
+        self._lock = threading.Lock()
+
+    def marcador(self) -> str:
+        agora = time.monotonic()
+        if agora - self._checado < INDEX_CHECK_INTERVAL:
+            return self._valor
+        with self._lock:
+            self._checado = agora
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return self._valor
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._valor = f.read().strip()
+                    self._mtime = mtime
+                except OSError:
+                    pass
+        return self._valor
+
+    def alterar(self) -> str:
+        with self._lock:
+            self._valor = uuid.uuid4().hex
+            _gravar_atomico(self.path, self._valor)
+            self._mtime = os.path.getmtime(self.path)
+            self._checado = time.monotonic()
+        return self._valor
+
+    def idade(self) -> Optional[float]:
+        """Segundos desde a última mudança do índice (None: nunca)."""
+        try:
+            return time.time() - os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+
+_geracao = _Geracao()
+
+
+def geracao_indice() -> str:
+    """Coleção ativa + marcador da última mudança do acervo indexado."""
+    from app.colecoes import registro
+
+    ativa = registro().ativa() or {}
+    return f"{ativa.get('nome', '-')}:{_geracao.marcador() or '-'}"
+
+
+def marcar_indice_alterado() -> None:
+    """Chamado a cada mudança no índice; invalida os caches (todos os
+    workers) e dispara o reaquecimento (app.aquecimento)."""
+    _geracao.alterar()
+
+
+def idade_indice() -> Optional[float]:
+    return _geracao.idade()
+
+
+# ----------------------------
+# Respostas aquecidas (arquivo)
+# ----------------------------
+class RespostasQuentes:
+    """Snapshot do último aquecimento, recarregado pelo mtime."""
+
+    def __init__(self, path: str = QUENTES_PATH):
+        self.path = path
+        self.dados: Dict[str, Any] = {"geracao": None, "entradas": {}}
+        self._mtime = 0.0
+        self._checado = 0.0
+        self._lock = threading.Lock()
+
+    def recarregar_se_mudou(self, forcar: bool = False) -> None:
+        agora = time.monotonic()
+        if not forcar and agora - self._checado < INDEX_CHECK_INTERVAL:
+            return
+        self._checado = agora
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime > self._mtime:
+            with self._lock:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        self.dados = json.load(f)
+                    self._mtime = mtime
+                except (OSError, ValueError):
+                    pass
+
+    def entrada(self, chave: str, geracao: str) -> Optional[Dict[str, Any]]:
+        """{"valor", "criado"} da pergunta, se for da geração corrente."""
+        self.recarregar_se_mudou()
+        if self.dados.get("geracao") != geracao:
+            return None
+        return self.dados["entradas"].get(chave)
+
+    def gravar(
+        self, geracao: str, entradas: Dict[str, Dict[str, Any]]
+    ) -> None:
+        dados = {
+            "geracao": geracao,
+            "criado_em": datetime.now(timezone.utc).isoformat(),
+            "entradas": entradas,
+        }
+        with self._lock:
+            _gravar_atomico(
+                self.path, json.dumps(dados, ensure_ascii=False, default=float)
+            )
+            self.dados = dados
+            self._mtime = os.path.getmtime(self.path)
+
+    def resumo(self) -> Dict[str, Any]:
+        self.recarregar_se_mudou()
+        return {
+            "entradas": len(self.dados.get("entradas") or {}),
+            "criado_em": self.dados.get("criado_em"),
+            "atual": self.dados.get("geracao") == geracao_indice(),
+        }
+
+
+# ----------------------------
+# Cache em memória
+# ----------------------------
+class CacheLRU:
+    """
+    LRU com TTL por geração do índice. Guarda o objeto como veio: quem
+    chama copia o que for alterar.
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        max_itens: int,
+        ttl: float,
+        reserva: Optional[RespostasQuentes] = None,
+    ):
+        self.nome = nome
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.reserva = reserva
+        self._itens: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        CACHE_WARM_HITS.inc(0, cache=nome)
+
+    def _valida(self, entrada: list, geracao: str, agora: float) -> bool:
+        _, ger, criado, _ = entrada
+        limite = self.ttl / 2 if _aquecendo.get() else self.ttl
+        return ger == geracao and agora - criado < limite
+
+    def obter(self, chave: str) -> Optional[Any]:
+        if not CACHE_ATIVO:
+            return None
+        aquecendo_ = _aquecendo.get()
+        geracao = geracao_indice()
+        agora = time.time()
+        with self._lock:
+            entrada = self._itens.get(chave)
+            if entrada is not None and not self._valida(
+                entrada, geracao, agora
+            ):
+                del self._itens[chave]
+                entrada = None
+        if entrada is None and self.reserva is not None:
+            quente = self.reserva.entrada(chave, geracao)
+            if quente is not None:
+                entrada = [quente["valor"], geracao, quente["criado"], True]
+                if not self._valida(entrada, geracao, agora):
+                    entrada = None
+                else:
+                    self._inserir(chave, entrada)
+        if entrada is None:
+            if not aquecendo_:
+                registrar_cache(self.nome, False)
+            return None
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+        if aquecendo_:
+            entrada[3] = True
+        else:
+            registrar_cache(self.nome, True)
+            if entrada[3]:
+                CACHE_WARM_HITS.inc(cache=self.nome)
+        return entrada[0]
+
+    def entrada(self, chave: str) -> Optional[Dict[str, Any]]:
+        """{"valor", "criado"} sem contar como consulta (aquecimento)."""
+        with self._lock:
+            entrada = self._itens.get(chave)
+        if entrada is None or not self._valida(
+            entrada, geracao_indice(), time.time()
+        ):
+            return None
+        return {"valor": entrada[0], "criado": entrada[2]}
+
+    def guardar(self, chave: str, valor: Any) -> None:
+        if not CACHE_ATIVO:
+            return
+        self._inserir(
+            chave, [valor, geracao_indice(), time.time(), _aquecendo.get()]
+        )
+
+    def _inserir(self, chave: str, entrada: list) -> None:
+        with self._lock:
+            self._itens[chave] = entrada
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+
+    def estado(self) -> Dict[str, Any]:
+        with self._lock:
+            entradas = list(self._itens.values())
+        return {
+            "entradas": len(entradas),
+            "aquecidas": sum(1 for e in entradas if e[3]),
+            "max": self.max_itens,
+            "ttl_s": self.ttl,
+        }
+
+
+RESPOSTAS_QUENTES = RespostasQuentes()
+CACHE_RESPOSTAS = CacheLRU(
+    "respostas", ANSWER_CACHE_MAX, ANSWER_CACHE_TTL, RESPOSTAS_QUENTES
+)
+CACHE_RECUPERACAO = CacheLRU(
+    "recuperacao", RETRIEVAL_CACHE_MAX, RETRIEVAL_CACHE_TTL
+)
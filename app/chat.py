@@ -2,24 +2,39 @@
 # app/chat.py
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import contextvars
+import copy
+import functools
+import json
 import os
 import importlib
 import re
-from typing import Any, Dict, List, AsyncIterator
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Dict, List, AsyncIterator, Optional
 from typing import Any as _Any
 from types import SimpleNamespace
 
 from dotenv import load_dotenv
 
+from app import prompts, rerank
+from app.cache import CACHE_RECUPERACAO, CACHE_RESPOSTAS
+from app.contexto import contar_tokens, formatar_contexto
+from app.metrics import medir, registrar_geracao
+from app.singleflight import SingleFlight, chave_pergunta
+from app.tracing import anotar
+
 # Imports de LangChain/Ollama/Chroma serão resolvidos sob demanda
 OllamaLLM = None
 OllamaEmbeddings = None
 Chroma = None
-RetrievalQA = None
 ChatPromptTemplate = None
 RunnablePassthrough = None
 RunnableLambda = None
-StrOutputParser = None
 
 # Tenta usar a API real; se não existir, usa fallback local
 try:
@@ -47,57 +62,129 @@ EMBED_MODEL = os.getenv(
     "OLLAMA_EMBED_MODEL", "bge-m3"
 )  # ex.: "bge-m3", "nomic-embed-text"
 
+# Recuperação: "hybrid" (BM25 local + vetorial, padrão), "vector" ou
+# "lexical". No modo híbrido, se o BM25 estiver confiante (todos os termos
+# da pergunta no melhor doc e folga sobre o 2º), o embedding é pulado.
+RETRIEVAL_MODE = os.getenv("EKLESIA_RETRIEVAL_MODE", "hybrid").lower()
+HYBRID_ALPHA = float(os.getenv("EKLESIA_HYBRID_ALPHA", "0.5"))
+LEXICAL_MIN_COVERAGE = float(os.getenv("EKLESIA_LEXICAL_MIN_COVERAGE", "1.0"))
+LEXICAL_MIN_MARGIN = float(os.getenv("EKLESIA_LEXICAL_MIN_MARGIN", "1.5"))
+# Score BM25 relativo ao melhor resultado para aceitar um doc só léxico
+LEXICAL_MIN_REL = 0.5
+
+# Recuperação (embedding, Chroma, BM25) e API da Bíblia são chamadas
+# síncronas e curtas; no caminho assíncrono rodam neste pool de threads
+RETRIEVAL_THREADS = int(os.getenv("EKLESIA_RETRIEVAL_THREADS", "8"))
+_pool_recuperacao = ThreadPoolExecutor(
+    max_workers=RETRIEVAL_THREADS, thread_name_prefix="recuperar"
+)
+
+_voos_respostas = SingleFlight("answer")
+
 # Flag para simular RAG (útil em smoke tests/ambientes sem modelos baixados)
 MOCK_RAG = os.getenv("EKLESIA_MOCK_RAG", "0").lower() in {"1", "true", "yes"}
 
 # ----------------------------
 # Modelos / Vectorstore
 # ----------------------------
+_colecao_ativa: Optional[str] = None
+_colecao_lock = threading.Lock()
+
+
+def _abrir_colecao():
+    """
+    Abre a coleção ativa do registro com o modelo com que ela foi
+    gerada (não necessariamente EMBED_MODEL; ver app.colecoes).
+    """
+    from app.colecoes import registro
+    from app.embedding import ExecutorEmbeddings
+    from app.logging_utils import get_logger
+
+    info = registro().garantir_ativa(EMBED_MODEL)
+    if info["modelo"] != EMBED_MODEL:
+        get_logger("chat").warning(
+            "embed_model_pendente",
+            colecao=info["nome"], modelo=info["modelo"],
+            desejado=EMBED_MODEL,
+        )
+    emb = ExecutorEmbeddings(OllamaEmbeddings(model=info["modelo"]))
+    colecao = abrir_vectorstore(
+        info["nome"], emb, info.get("backend", "chroma")
+    )
+    return emb, colecao, info["nome"]
+
+
+def abrir_vectorstore(nome: str, emb, backend: str):
+    """Chroma ou o índice NumPy em memmap (app.vetores), por coleção."""
+    if backend == "numpy":
+        from app.vetores import IndiceNumpy
+
+        return IndiceNumpy(nome, PERSIST_DIR, emb)
+    return Chroma(
+        collection_name=nome,
+        persist_directory=PERSIST_DIR,
+        embedding_function=emb,
+    )
+
+
+def sincronizar_colecao(forcar: bool = False) -> None:
+    """Reabre embeddings/db se a coleção ativa mudou no registro."""
+    global embeddings, db, retriever, _colecao_ativa
+    if MOCK_RAG:
+        return
+    from app.colecoes import registro
+
+    ativa = registro().ativa()
+    # _colecao_ativa None: vectorstore não foi aberto por este módulo
+    if not forcar and (
+        _colecao_ativa is None or (ativa and ativa["nome"] == _colecao_ativa)
+    ):
+        return
+    with _colecao_lock:
+        emb, colecao, nome = _abrir_colecao()
+        # Troca o par de uma vez: quem leu _par_vetorial() antes segue
+        # com a coleção antiga até o fim da consulta
+        embeddings, db, _colecao_ativa = emb, colecao, nome
+        retriever = db.as_retriever(
+            search_type="similarity_score_threshold",
+            search_kwargs={"k": 8, "score_threshold": 0.25},
+        )
+
+
+def _par_vetorial():
+    sincronizar_colecao()
+    return embeddings, db, _colecao_ativa
+
+
 if not MOCK_RAG:
     try:
         _ollama = importlib.import_module("langchain_ollama")
         _chroma = importlib.import_module("langchain_chroma")
-        _chains = importlib.import_module("langchain.chains")
-        _prompts = importlib.import_module("langchain.prompts")
+        _prompts = importlib.import_module("langchain_core.prompts")
         _runnables = importlib.import_module("langchain_core.runnables")
-        _parsers = importlib.import_module("langchain_core.output_parsers")
 
         _OllamaLLM = getattr(_ollama, "OllamaLLM")
         _OllamaEmbeddings = getattr(_ollama, "OllamaEmbeddings")
         _Chroma = getattr(_chroma, "Chroma")
-        _RetrievalQA = getattr(_chains, "RetrievalQA")
         _ChatPromptTemplate = getattr(_prompts, "ChatPromptTemplate")
         _RunnablePassthrough = getattr(_runnables, "RunnablePassthrough")
         _RunnableLambda = getattr(_runnables, "RunnableLambda")
-        _StrOutputParser = getattr(_parsers, "StrOutputParser")
 
         # Bind símbolos globais
         OllamaLLM = _OllamaLLM
         OllamaEmbeddings = _OllamaEmbeddings
         Chroma = _Chroma
-        RetrievalQA = _RetrievalQA
         ChatPromptTemplate = _ChatPromptTemplate
         RunnablePassthrough = _RunnablePassthrough
         RunnableLambda = _RunnableLambda
-        StrOutputParser = _StrOutputParser
-
-        llm = OllamaLLM(model=LLM_MODEL)
-        embeddings = OllamaEmbeddings(model=EMBED_MODEL)
-        db = Chroma(
-            collection_name=COLLECTION_NAME,
-            persist_directory=PERSIST_DIR,
-            embedding_function=embeddings,
-        )
+
+        # keep_alive/num_ctx fixos preservam o cache do prefixo do prompt
+        llm = OllamaLLM(model=LLM_MODEL, **prompts.opcoes_ollama(LLM_MODEL))
+        embeddings, db, _colecao_ativa = _abrir_colecao()
         retriever = db.as_retriever(
             search_type="similarity_score_threshold",
             search_kwargs={"k": 8, "score_threshold": 0.25},
         )
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            retriever=retriever,
-            return_source_documents=True,
-            chain_type="stuff",
-        )
     except Exception:
         # Falha em importar/instanciar: entra em modo MOCK
         MOCK_RAG = True
@@ -105,13 +192,11 @@ if not MOCK_RAG:
         embeddings = None
         db = None
         retriever = None
-        qa_chain = None
 else:
     llm = None
     embeddings = None
     db = None
     retriever = None
-    qa_chain = None
 
 # ----------------------------
 # Auxiliares
@@ -170,10 +255,40 @@ def buscar_versiculo(referencia: str) -> str:
 # ----------------------------
 # Função principal
 # ----------------------------
-def responder_pergunta_com_versiculo(pergunta: str) -> Dict[str, Any]:
+def responder_pergunta_com_versiculo(
+    pergunta: str,
+    filtros: Optional[Dict[str, Any]] = None,
+    tarefa: str = "resposta",
+) -> Dict[str, Any]:
     """
     Responde com base no acervo (RAG) + injeta João 3:16 quando a pergunta
     trata de 'salvação'. Retorna também as fontes (quando houver).
+    `filtros` (autor/tema/tipo) restringem a recuperação; vide
+    `recuperar_docs`. `tarefa` escolhe as instruções do prompt
+    (app.prompts); para as de geração, `pergunta` é o pedido montado por
+    `prompts.pedido`.
+
+    Versão síncrona (CLI, scripts, aquecimento): espera
+    `aresponder_pergunta_com_versiculo` pelo `em_loop`, com o mesmo
+    cache e single-flight da API.
+    """
+    return em_loop(aresponder_pergunta_com_versiculo(
+        pergunta, filtros, tarefa
+    ))
+
+
+async def aresponder_pergunta_com_versiculo(
+    pergunta: str,
+    filtros: Optional[Dict[str, Any]] = None,
+    tarefa: str = "resposta",
+    recuperados: Optional[tuple] = None,
+) -> Dict[str, Any]:
+    """
+    Implementação de `responder_pergunta_com_versiculo`, usada pela API:
+    a geração vai por `astream` e não prende o event loop; a recuperação
+    e a API da Bíblia (chamadas curtas e síncronas) rodam no pool de
+    threads da recuperação. `recuperados` ((docs, fontes) de
+    `recuperar_lote`) dispensa a recuperação.
     """
     pergunta = (pergunta or "").strip()
     if not pergunta:
@@ -181,16 +296,101 @@ def responder_pergunta_com_versiculo(pergunta: str) -> Dict[str, Any]:
             "resposta": "Por favor, forneça uma pergunta.",
             "fontes": [],
         }
+    guardada = resposta_em_cache(pergunta, filtros, tarefa)
+    if guardada is not None:
+        return finalizar(**guardada)
+    # Perguntas idênticas em voo compartilham a mesma execução
+    return await _voos_respostas.executar(
+        chave_resposta(pergunta, filtros, tarefa),
+        lambda: _aresponder(pergunta, filtros, tarefa, recuperados),
+    )
 
+
+async def _aresponder(
+    pergunta: str,
+    filtros: Optional[Dict[str, Any]],
+    tarefa: str,
+    recuperados: Optional[tuple] = None,
+) -> Dict[str, Any]:
     if MOCK_RAG:
         resposta = f"[MOCK] Resposta simulada para: {pergunta}"
         fontes = [{"source": "mock.txt", "page": 1, "score": 0.99}]
     else:
-        # Use invoke com dict para pegar result + source_documents
-        result = qa_chain.invoke({"query": pergunta})
-        resposta = (result.get("result") or "").strip()
-        fontes = _format_sources(result.get("source_documents"))
+        if recuperados is None:
+            recuperados = await arecuperar_docs(pergunta, filtros=filtros)
+        docs, fontes = recuperados
+        resposta = await _agerar_resposta(pergunta, docs, tarefa)
+
+    versiculo = None
+    if _SALVACAO_REGEX.search(pergunta):
+        versiculo = await em_thread(_versiculo_salvacao)
+    guardar_resposta(pergunta, filtros, resposta, fontes, versiculo, tarefa)
+    return finalizar(resposta, fontes, versiculo)
+
+
+def chave_resposta(
+    pergunta: str,
+    filtros: Optional[Dict[str, Any]],
+    tarefa: str = "resposta",
+) -> str:
+    # A resposta depende também do modelo e da versão do prompt
+    return (
+        f"{LLM_MODEL}|{prompts.PROMPT_VERSION}|{tarefa}|"
+        f"{chave_pergunta(pergunta, filtros)}"
+    )
+
+
+def resposta_em_cache(
+    pergunta: str,
+    filtros: Optional[Dict[str, Any]] = None,
+    tarefa: str = "resposta",
+) -> Optional[Dict[str, Any]]:
+    """
+    {"resposta", "fontes", "versiculo"} já gerados para a pergunta na
+    geração corrente do índice (app.cache), ou None. A resposta vem sem
+    o aviso de falta de fontes nem o versículo (vide `finalizar`).
+    """
+    if MOCK_RAG:
+        return None
+    guardada = CACHE_RESPOSTAS.obter(
+        chave_resposta(pergunta, filtros, tarefa)
+    )
+    anotar(answer_cache="hit" if guardada is not None else "miss")
+    return copy.deepcopy(guardada)
+
+
+def guardar_resposta(
+    pergunta: str,
+    filtros: Optional[Dict[str, Any]],
+    resposta: str,
+    fontes: list,
+    versiculo: Optional[str],
+    tarefa: str = "resposta",
+) -> None:
+    if MOCK_RAG:
+        return
+    CACHE_RESPOSTAS.guardar(chave_resposta(pergunta, filtros, tarefa), {
+        "resposta": resposta,
+        "fontes": copy.deepcopy(fontes),
+        "versiculo": versiculo,
+    })
 
+
+def _versiculo_salvacao() -> Optional[str]:
+    # Nunca deixa a falha da API derrubar a resposta principal
+    try:
+        return buscar_versiculo("João 3:16") or None
+    except Exception:
+        return None
+
+
+def finalizar(
+    resposta: str, fontes: list, versiculo: Optional[str]
+) -> Dict[str, Any]:
+    """
+    {"resposta", "fontes"} como a API devolve, a partir do que foi
+    gerado ou guardado (`finalizar(**resposta_em_cache(...))`).
+    """
     # Se não houve fontes relevantes, avisa na resposta
     if not fontes:
         resposta = (
@@ -198,92 +398,471 @@ def responder_pergunta_com_versiculo(pergunta: str) -> Dict[str, Any]:
             "responder com confiança. Aqui vai uma resposta geral com base no "
             "modelo:\n\n"
         ) + (resposta or "—")
+    if versiculo:
+        resposta += f"\n\n📖 **João 3:16** — {versiculo}"
+    return {"resposta": resposta, "fontes": fontes}
 
-    # Injeta versículo quando apropriado (sem quebrar se API falhar)
-    try:
-        if _SALVACAO_REGEX.search(pergunta):
-            v = buscar_versiculo("João 3:16")
-            if v:
-                resposta += f"\n\n📖 **João 3:16** — {v}"
-    except Exception:
-        # Nunca deixa a falha da API derrubar a resposta principal
-        pass
 
-# (imports moved to top of file)
-# Duplicate imports removed; already imported at the top.
+def _entrada_llm(
+    pergunta: str, docs: list, tarefa: str = "resposta"
+) -> _Any:
+    """
+    Prompt já formatado (layout versionado em app.prompts). A geração
+    chama `llm.astream` direto: a cadeia prompt | llm |
+    StrOutputParser dava o mesmo texto (o OllamaLLM já devolve str) com
+    ~3x a CPU por token.
+    """
+    with medir("prompt", LLM_MODEL):
+        context = _format_docs_text(docs, pergunta)
+        entrada = prompts.template(tarefa).invoke(
+            {"question": pergunta, "context": context}
+        )
+    _anotar_prompt(pergunta, context)
+    anotar(prompt_version=prompts.PROMPT_VERSION, prompt_task=tarefa)
+    return entrada
 
 
-def _format_docs_text(docs: list) -> str:
-    """Concatena conteúdos de documentos para o contexto do prompt."""
-    parts = []
-    for d in docs or []:
-        txt = getattr(d, "page_content", "") or ""
-        parts.append(txt.strip())
-    return "\n\n---\n\n".join(p for p in parts if p)
-
-
-def _build_prompt() -> _Any:
-    """Prompt para respostas teológicas com fontes."""
-    system = (
-        "Você é um assistente teológico que responde com base nos trechos "
-        "fornecidos no CONTEXTO.\n"
-        "Regras:\n"
-        "- Seja fiel ao CONTEXTO; se a resposta não estiver no contexto, "
-        "diga que não encontrou evidências suficientes.\n"
-        "- Cite fontes quando possível (arquivo/página), em Markdown.\n"
-        "- Seja claro e biblicamente acurado.\n"
+# Chamado com o nº de chunks já gerados (progresso dos jobs, app.jobs)
+_ao_gerar: ContextVar[Optional[_Any]] = ContextVar("_ao_gerar", default=None)
+
+
+@contextlib.contextmanager
+def acompanhar_geracao(fn):
+    """`fn(chunks)` a cada chunk das gerações feitas dentro do bloco."""
+    token = _ao_gerar.set(fn)
+    try:
+        yield
+    finally:
+        _ao_gerar.reset(token)
+
+
+async def _agerar_resposta(
+    pergunta: str, docs: list, tarefa: str = "resposta"
+) -> str:
+    """Gera a resposta por `astream`, medindo TTFT e vazão."""
+    entrada = _entrada_llm(pergunta, docs, tarefa)
+
+    partes: List[str] = []
+    ttft = None
+    inicio = time.perf_counter()
+    ao_gerar = _ao_gerar.get()
+    async for chunk in llm.astream(entrada):
+        if ttft is None:
+            ttft = time.perf_counter() - inicio
+        partes.append(chunk)
+        if ao_gerar is not None:
+            ao_gerar(len(partes))
+    registrar_geracao(
+        LLM_MODEL, len(partes), ttft, time.perf_counter() - inicio
     )
-    # Import seguro caso esteja em modo não-MOCK
-    _prompts = importlib.import_module("langchain.prompts")
-    _ChatPromptTemplate = getattr(_prompts, "ChatPromptTemplate")
-    template = _ChatPromptTemplate.from_messages(
-        [
-            ("system", system),
-            ("human", "Pergunta: {question}\n\nCONTEXTO:\n{context}"),
-        ]
+    return "".join(partes).strip()
+
+
+def _anotar_prompt(pergunta: str, context: str) -> None:
+    """Registra no trace o tamanho do prompt (tokens estimados)."""
+    anotar(
+        prompt_chars=len(pergunta) + len(context),
+        prompt_tokens_est=contar_tokens(pergunta) + contar_tokens(context),
     )
-    return template
 
 
-def recuperar_docs(pergunta: str, k: int = 8, score_threshold: float = 0.25):
+def _format_docs_text(docs: list, pergunta: str = "") -> str:
+    """
+    Contexto do prompt dentro do orçamento de tokens do modelo: frases mais
+    relevantes de cada doc, sem trechos repetidos (app.contexto).
+    """
+    return formatar_contexto(docs, pergunta, LLM_MODEL)
+
+
+def recuperar_docs(
+    pergunta: str,
+    k: int = 8,
+    score_threshold: float = 0.25,
+    filtros: Optional[Dict[str, Any]] = None,
+):
     """
     Recupera documentos relevantes e formata fontes.
-    Usa o retriever já configurado em módulo (db.as_retriever(...)).
+    Conforme EKLESIA_RETRIEVAL_MODE combina o índice BM25 local
+    (app.lexical) com a busca vetorial no Chroma; o filtro por
+    `score_threshold` vale para o score vetorial. Com EKLESIA_RERANK,
+    busca mais candidatos e mantém só o top reordenado (app.rerank).
+
+    `filtros` ({"autor", "tema", "tipo"}, sem diferenciar acentos e
+    maiúsculas) restringem as duas buscas aos metadados; se nada atender,
+    a busca é refeita sem filtro.
+
+    O resultado fica no cache da recuperação (app.cache) até a próxima
+    mudança do índice.
     """
-    # O retriever já foi criado com threshold no módulo.
-    # Se quiser, here override:
-    # local_retriever = db.as_retriever(
-    #     search_type="similarity_score_threshold",
-    #     search_kwargs={"k": k, "score_threshold": score_threshold}
-    # )
-    # docs = local_retriever.get_relevant_documents(pergunta)
     if MOCK_RAG:
-        docs = [SimpleNamespace(page_content=f"[MOCK CONTEXTO] {pergunta}")]
+        return _recuperar_docs(pergunta, k, score_threshold, filtros)
+    chave = _chave_recuperacao(pergunta, k, score_threshold, filtros)
+    guardado = CACHE_RECUPERACAO.obter(chave)
+    anotar(retrieval_cache="hit" if guardado is not None else "miss")
+    if guardado is None:
+        guardado = _recuperar_docs(pergunta, k, score_threshold, filtros)
+        CACHE_RECUPERACAO.guardar(chave, guardado)
+    docs, fontes = guardado
+    return list(docs), copy.deepcopy(fontes)
+
+
+def _chave_recuperacao(pergunta, k, score_threshold, filtros) -> str:
+    return f"{chave_pergunta(pergunta, filtros)}|{k}|{score_threshold}"
+
+
+def _recuperar_docs(pergunta, k, score_threshold, filtros):
+    if MOCK_RAG:
+        docs = [
+            SimpleNamespace(
+                page_content=f"[MOCK CONTEXTO] {pergunta}",
+                metadata={"source": "mock.txt", "page": 1},
+            )
+        ]
+        scores = [None]
+    elif rerank.ativo():
+        pares = _recuperar_filtrado(
+            pergunta, max(k, rerank.RERANK_CANDIDATES), score_threshold,
+            filtros,
+        )
+        pares = rerank.reordenar(pergunta, pares, top_k=min(
+            k, rerank.RERANK_TOP_K
+        ))
+        docs = [d for d, _ in pares]
+        scores = [s for _, s in pares]
     else:
-        docs = retriever.get_relevant_documents(pergunta)
+        pares = _recuperar_filtrado(pergunta, k, score_threshold, filtros)
+        docs = [d for d, _ in pares]
+        scores = [s for _, s in pares]
+    anotar(docs=len(docs))
 
     fontes = []
-    for d in docs or []:
+    for d, score in zip(docs, scores):
         m = d.metadata or {}
         fontes.append(
             {
                 "source": (
                     m.get("source")
                     or m.get("file_path")
+                    or m.get("titulo")
                     or "desconhecido"
                 ),
                 "page": m.get("page"),
+                "score": score,
             }
         )
     return docs, fontes
 
 
+async def arecuperar_docs(
+    pergunta: str,
+    k: int = 8,
+    score_threshold: float = 0.25,
+    filtros: Optional[Dict[str, Any]] = None,
+):
+    """`recuperar_docs` no pool de threads da recuperação."""
+    return await em_thread(
+        recuperar_docs, pergunta, k, score_threshold, filtros
+    )
+
+
+# ----------------------------
+# Recuperação em lote
+# ----------------------------
+class _LoteVetorial:
+    """Embeddings e buscas vetoriais já feitos por `recuperar_lote`."""
+
+    def __init__(self):
+        self.vetores: Dict[str, List[float]] = {}
+        # (pergunta, k, where) -> [(doc, relevância)]
+        self.buscas: Dict[tuple, List[tuple]] = {}
+
+
+_lote_vetorial: ContextVar[Optional[_LoteVetorial]] = ContextVar(
+    "eklesia_lote_vetorial", default=None
+)
+
+
+def _chave_where(where: Optional[Dict[str, Any]]) -> str:
+    return json.dumps(where or {}, sort_keys=True)
+
+
+def recuperar_lote(
+    perguntas: List[str],
+    k: int = 8,
+    score_threshold: float = 0.25,
+    filtros: Optional[Dict[str, Any]] = None,
+) -> List[tuple]:
+    """
+    `recuperar_docs` de várias perguntas (mesmos `filtros`), na ordem.
+    As que não estão no cache da recuperação nem são resolvidas pelo
+    caminho léxico têm os embeddings calculados numa chamada só e a busca
+    vetorial feita de uma vez (uma passada pela matriz no índice NumPy;
+    uma consulta por vetor no Chroma). Fusão, rerank e fontes seguem o
+    caminho normal, pergunta a pergunta.
+    """
+    if MOCK_RAG:
+        return [
+            recuperar_docs(p, k, score_threshold, filtros) for p in perguntas
+        ]
+    from app.lexical import filtro_chroma, limpar_filtros
+
+    limpos = limpar_filtros(filtros)
+    busca = _folga_colapso(
+        max(k, rerank.RERANK_CANDIDATES) if rerank.ativo() else k
+    )
+    vetoriais = []
+    for p in dict.fromkeys(perguntas):
+        if CACHE_RECUPERACAO.entrada(
+            _chave_recuperacao(p, k, score_threshold, filtros)
+        ) is not None:
+            continue
+        if RETRIEVAL_MODE == "lexical":
+            continue
+        if RETRIEVAL_MODE == "hybrid":
+            idx, lex = _busca_lexica(p, busca, limpos)
+            if _lexico_confiante(idx, p, lex):
+                continue
+        vetoriais.append(p)
+
+    lote = _LoteVetorial()
+    if vetoriais:
+        emb, colecao, nome = _par_vetorial()
+        modelo = getattr(emb, "model", EMBED_MODEL)
+        with medir("embed", modelo):
+            vetores = emb.embed_documents(vetoriais)
+        if nome:
+            from app.colecoes import registro
+
+            registro().conferir_dimensao(nome, len(vetores[0]))
+        where = filtro_chroma(limpos)
+        with medir("retrieve", modelo):
+            resultados = _buscar_vetores(colecao, vetores, busca, where)
+        relevancia = colecao._select_relevance_score_fn()
+        for p, v, pares in zip(vetoriais, vetores, resultados):
+            lote.vetores[p] = v
+            lote.buscas[(p, busca, _chave_where(where))] = [
+                (d, relevancia(dist)) for d, dist in pares
+            ]
+    anotar(lote=len(perguntas), lote_vetorial=len(vetoriais))
+
+    token = _lote_vetorial.set(lote)
+    try:
+        return [
+            recuperar_docs(p, k, score_threshold, filtros) for p in perguntas
+        ]
+    finally:
+        _lote_vetorial.reset(token)
+
+
+def _buscar_vetores(colecao, vetores, k: int, where) -> List[list]:
+    kwargs = {"filter": where} if where else {}
+    em_lote = getattr(
+        colecao, "similarity_search_by_vectors_with_relevance_scores", None
+    )
+    if em_lote is not None:
+        return em_lote(vetores, k=k, **kwargs)
+    return [
+        colecao.similarity_search_by_vector_with_relevance_scores(
+            v, k=k, **kwargs
+        )
+        for v in vetores
+    ]
+
+
+async def em_thread(fn, *args):
+    """
+    Roda `fn` no pool da recuperação, com o contexto corrente (trace e
+    rota de /metrics seguem valendo dentro da thread).
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _pool_recuperacao, functools.partial(ctx.run, fn, *args)
+    )
+
+
+# Loop em que o código síncrono espera as corrotinas (`em_loop`): o da
+# API quando registrado no lifespan, para compartilhar o single-flight e
+# os clientes do LLM; fora dela, um loop próprio numa thread do processo
+_loop_api: Optional[asyncio.AbstractEventLoop] = None
+_loop_proprio: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def registrar_loop(loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Loop da API (lifespan); None ao desligar."""
+    global _loop_api
+    _loop_api = loop
+
+
+def _loop_sincrono() -> asyncio.AbstractEventLoop:
+    global _loop_proprio
+    loop = _loop_api
+    if loop is not None and loop.is_running():
+        return loop
+    with _loop_lock:
+        if _loop_proprio is None:
+            _loop_proprio = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop_proprio.run_forever, name="loop-sincrono",
+                daemon=True,
+            ).start()
+        return _loop_proprio
+
+
+def em_loop(coro):
+    """
+    Espera `coro` a partir de código síncrono, com o contexto corrente.
+    Dentro de um event loop bloquearia o próprio loop: use await.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run_coroutine_threadsafe(
+            coro, _loop_sincrono()
+        ).result()
+    coro.close()
+    raise RuntimeError("em_loop chamado dentro de um event loop.")
+
+
+def _recuperar_filtrado(pergunta, k, score_threshold, filtros):
+    from app.duplicatas import colapsar
+    from app.lexical import limpar_filtros
+
+    busca = _folga_colapso(k)
+    filtros = limpar_filtros(filtros)
+    if filtros:
+        anotar(filtros=filtros)
+        pares = _recuperar(pergunta, busca, score_threshold, filtros)
+        if pares:
+            return colapsar(pares)[:k]
+        anotar(filtros_relaxados=True)
+    return colapsar(_recuperar(pergunta, busca, score_threshold))[:k]
+
+
+def _folga_colapso(k: int) -> int:
+    from app.duplicatas import COLLAPSE_BITS
+
+    # Folga para repor os fragmentos quase duplicados que forem colapsados
+    return k + k // 2 if COLLAPSE_BITS > 0 else k
+
+
+def _busca_vetorial(
+    pergunta: str, k: int, filtros: Optional[Dict[str, str]] = None
+) -> List[tuple]:
+    """Embedding + busca no Chroma; devolve (doc, relevância 0..1)."""
+    from app.lexical import filtro_chroma
+
+    from app.colecoes import registro
+
+    where = filtro_chroma(filtros or {})
+    lote = _lote_vetorial.get()
+    if lote is not None:
+        pares = lote.buscas.get((pergunta, k, _chave_where(where)))
+        if pares is not None:
+            return pares
+    emb, colecao, nome = _par_vetorial()
+    modelo = getattr(emb, "model", EMBED_MODEL)
+    vetor = lote.vetores.get(pergunta) if lote is not None else None
+    if vetor is None:
+        with medir("embed", modelo):
+            vetor = emb.embed_query(pergunta)
+    # Vetor de outra dimensão que a da coleção: erro claro em vez de
+    # falha opaca no Chroma
+    if nome:
+        registro().conferir_dimensao(nome, len(vetor))
+    kwargs = {}
+    if where:
+        kwargs["filter"] = where
+    with medir("retrieve", modelo):
+        pares = colecao.similarity_search_by_vector_with_relevance_scores(
+            vetor, k=k, **kwargs
+        )
+    relevancia = colecao._select_relevance_score_fn()
+    return [(d, relevancia(dist)) for d, dist in pares]
+
+
+def _busca_lexica(
+    pergunta: str, k: int, filtros: Optional[Dict[str, str]] = None
+):
+    from app.lexical import indice_lexico
+
+    idx = indice_lexico()
+    if not len(idx):
+        return idx, []
+    with medir("lexical", "bm25"):
+        return idx, idx.buscar(pergunta, k=k, filtros=filtros)
+
+
+def _lexico_confiante(idx, pergunta: str, lex: List[tuple]) -> bool:
+    if not lex:
+        return False
+    segundo = lex[1][1] if len(lex) > 1 else 0.0
+    return (
+        idx.cobertura(pergunta, lex[0][0]) >= LEXICAL_MIN_COVERAGE
+        and lex[0][1] >= LEXICAL_MIN_MARGIN * segundo
+    )
+
+
+def _fundir(vetoriais, lex, idx, k: int, score_threshold: float):
+    """Combinação convexa: alpha * vetorial + (1 - alpha) * BM25/max."""
+    from app.lexical import chave_doc
+
+    candidatos: Dict[str, list] = {}
+    for d, s in vetoriais:
+        chave = chave_doc(d.page_content, d.metadata)
+        candidatos[chave] = [d, s, 0.0]
+    topo = lex[0][1] if lex else 1.0
+    for chave, s in lex:
+        rel = s / topo if topo else 0.0
+        if chave in candidatos:
+            candidatos[chave][2] = rel
+        else:
+            candidatos[chave] = [idx.documento(chave), 0.0, rel]
+
+    fundidos = [
+        (d, HYBRID_ALPHA * v + (1 - HYBRID_ALPHA) * lx)
+        for d, v, lx in candidatos.values()
+        if v >= score_threshold or lx >= LEXICAL_MIN_REL
+    ]
+    fundidos.sort(key=lambda x: x[1], reverse=True)
+    return fundidos[:k]
+
+
+def _recuperar(
+    pergunta: str,
+    k: int,
+    score_threshold: float,
+    filtros: Optional[Dict[str, str]] = None,
+):
+    if RETRIEVAL_MODE == "vector":
+        anotar(retrieval="vector")
+        return [
+            (d, s) for d, s in _busca_vetorial(pergunta, k, filtros)
+            if s >= score_threshold
+        ]
+
+    idx, lex = _busca_lexica(pergunta, k, filtros)
+    if lex and (
+        RETRIEVAL_MODE == "lexical" or _lexico_confiante(idx, pergunta, lex)
+    ):
+        # Caminho rápido: sem chamada de embedding
+        anotar(retrieval="lexical")
+        topo = lex[0][1]
+        return [(idx.documento(c), s / topo) for c, s in lex]
+
+    anotar(retrieval="hybrid" if lex else "vector")
+    return _fundir(
+        _busca_vetorial(pergunta, k, filtros), lex, idx, k, score_threshold
+    )
+
+
 async def stream_resposta(
     pergunta: str,
     docs: list | None = None
 ) -> AsyncIterator[str]:
     """
-    Faz streaming da resposta do LLM usando LCEL (prompt | llm | parser).
+    Faz streaming da resposta do LLM (prompt formatado -> llm.astream).
     Se 'docs' não for passado, recupera antes (bloqueio rápido) e
     streama apenas a geração.
     Retorna chunks de texto (tokens) como strings.
@@ -296,7 +875,7 @@ async def stream_resposta(
 
     # Recupera docs uma vez (fora do stream de tokens)
     if docs is None:
-        docs, _ = recuperar_docs(pergunta)
+        docs, _ = await arecuperar_docs(pergunta)
 
     if MOCK_RAG:
         text = f"[MOCK STREAM] Resposta para: {pergunta}"
@@ -304,13 +883,18 @@ async def stream_resposta(
             yield part + " "
         return
 
-    context = _format_docs_text(docs)
-    prompt = _build_prompt()
-    parser = StrOutputParser()
+    entrada = _entrada_llm(pergunta, docs)
 
-    chain = prompt | llm | parser
-    async for chunk in chain.astream({
-        "question": pergunta,
-        "context": context
-    }):
-        yield chunk
+    tokens = 0
+    ttft = None
+    inicio = time.perf_counter()
+    try:
+        async for chunk in llm.astream(entrada):
+            if ttft is None:
+                ttft = time.perf_counter() - inicio
+            tokens += 1
+            yield chunk
+    finally:
+        registrar_geracao(
+            LLM_MODEL, tokens, ttft, time.perf_counter() - inicio
+        )
@@ -0,0 +1,368 @@
+# app/colecoes.py
+"""
+Registro de coleções vetoriais e re-embedding em segundo plano.
+
+`<CHROMA_PERSIST_DIR>/colecoes.json` guarda, para cada coleção física, o
+modelo de embeddings, a dimensão dos vetores e o backend (Chroma ou
+NumPy, ver app.vetores), e qual delas atende o alias
+`CHROMA_COLLECTION_NAME`. As consultas usam sempre o modelo da coleção
+ativa: trocar `OLLAMA_EMBED_MODEL` não quebra a recuperação, só marca o
+re-embedding como pendente. `EKLESIA_VECTOR_BACKEND` também vale só para
+coleções novas; migrar de backend é um re-embedding.
+
+O re-embedding monta uma coleção nova em lotes a partir de
+conteudo_teologico enquanto a antiga continua servindo e, ao terminar,
+troca a ativa com uma escrita atômica do registro. Os demais workers
+percebem a troca pelo mtime do arquivo.
+
+    python -m app.colecoes                   # estado do registro
+    python -m app.colecoes --reembed bge-m3  # re-embedding (bloqueante)
+    python -m app.colecoes --remover <nome>  # apaga coleção inativa
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.logging_utils import get_logger
+from app.metrics import REEMBED_PROGRESS
+from app.vetores import VECTOR_BACKEND
+
+load_dotenv()
+
+PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION_NAME", "eklesia")
+REGISTRY_PATH = os.getenv(
+    "EKLESIA_COLLECTION_REGISTRY", os.path.join(PERSIST_DIR, "colecoes.json")
+)
+RELOAD_INTERVAL = float(os.getenv("EKLESIA_REGISTRY_RELOAD_INTERVAL", "5"))
+# Fragmentos por gravação no Chroma (o executor divide em lotes de
+# embedding conforme a latência; ver app.embedding)
+REEMBED_BATCH = int(os.getenv("EKLESIA_REEMBED_BATCH", "256"))
+# Conteúdos lidos do banco por página
+_PAGINA = 50
+
+log = get_logger("colecoes")
+
+
+def _agora() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Registro:
+    def __init__(
+        self, path: str = REGISTRY_PATH, alias: str = COLLECTION_NAME
+    ):
+        self.path = path
+        self.alias = alias
+        self._lock = threading.RLock()
+        self._mtime = 0.0
+        self._checado = 0.0
+        self.dados: Dict[str, Any] = {"ativa": None, "colecoes": {}}
+
+    # ------------------------
+    # Persistência
+    # ------------------------
+    def carregar(self) -> None:
+        with self._lock:
+            if not os.path.exists(self.path):
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.dados = json.load(f)
+            self._mtime = os.path.getmtime(self.path)
+
+    def salvar(self) -> None:
+        """Escrita atômica (tmp + rename): a troca da ativa é atômica."""
+        with self._lock:
+            pasta = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(pasta, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.dados, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+            self._mtime = os.path.getmtime(self.path)
+
+    def recarregar_se_mudou(self) -> None:
+        agora = time.monotonic()
+        if agora - self._checado < RELOAD_INTERVAL:
+            return
+        self._checado = agora
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime > self._mtime:
+            self.carregar()
+
+    # ------------------------
+    # Coleções
+    # ------------------------
+    def ativa(self) -> Optional[Dict[str, Any]]:
+        nome = self.dados.get("ativa")
+        if not nome:
+            return None
+        return {"nome": nome, **self.dados["colecoes"].get(nome, {})}
+
+    def registrar(
+        self, nome: str, modelo: str, dimensao: Optional[int] = None,
+        **extra: Any,
+    ) -> None:
+        with self._lock:
+            self.dados["colecoes"][nome] = {
+                "modelo": modelo,
+                "dimensao": dimensao,
+                "criada_em": _agora(),
+                **extra,
+            }
+            self.salvar()
+
+    def garantir_ativa(self, modelo: str) -> Dict[str, Any]:
+        """
+        Sem registro, assume que a coleção do alias foi gerada com
+        `modelo` (instalações anteriores ao registro).
+        """
+        with self._lock:
+            if self.ativa() is None:
+                self.registrar(
+                    self.alias, modelo, estado="ativa",
+                    backend=VECTOR_BACKEND,
+                )
+                self.dados["ativa"] = self.alias
+                self.salvar()
+            return self.ativa()
+
+    def atualizar(self, nome: str, **campos: Any) -> None:
+        with self._lock:
+            self.dados["colecoes"].setdefault(nome, {}).update(campos)
+            self.salvar()
+
+    def conferir_dimensao(self, nome: str, dimensao: int) -> None:
+        """Grava a dimensão na primeira vez; depois, exige a mesma."""
+        registrada = self.dados["colecoes"].get(nome, {}).get("dimensao")
+        if registrada is None:
+            self.atualizar(nome, dimensao=dimensao)
+        elif registrada != dimensao:
+            raise RuntimeError(
+                f"Coleção '{nome}' tem vetores de dimensão {registrada}, "
+                f"mas o embedding gerou {dimensao}. Rode o re-embedding."
+            )
+
+    def ativar(self, nome: str) -> None:
+        with self._lock:
+            anterior = self.dados.get("ativa")
+            if anterior and anterior in self.dados["colecoes"]:
+                self.dados["colecoes"][anterior]["estado"] = "inativa"
+            self.dados["colecoes"][nome]["estado"] = "ativa"
+            self.dados["colecoes"][nome]["ativada_em"] = _agora()
+            self.dados["ativa"] = nome
+            self.salvar()
+
+    def remover(self, nome: str) -> None:
+        with self._lock:
+            if nome == self.dados.get("ativa"):
+                raise ValueError("Não é possível remover a coleção ativa.")
+            self.dados["colecoes"].pop(nome, None)
+            self.salvar()
+
+    def resumo(self) -> Dict[str, Any]:
+        return {
+            "alias": self.alias,
+            "ativa": self.dados.get("ativa"),
+            "colecoes": self.dados.get("colecoes", {}),
+        }
+
+
+_registro: Optional[Registro] = None
+_registro_lock = threading.Lock()
+
+
+def registro() -> Registro:
+    """Instância compartilhada do processo."""
+    global _registro
+    if _registro is None:
+        with _registro_lock:
+            if _registro is None:
+                r = Registro()
+                r.carregar()
+                _registro = r
+    _registro.recarregar_se_mudou()
+    return _registro
+
+
+# ----------------------------
+# Re-embedding
+# ----------------------------
+def nome_colecao(modelo: str) -> str:
+    slug = re.sub(r"[^a-zA-Z0-9]+", "-", modelo).strip("-").lower()
+    return f"{COLLECTION_NAME}__{slug}__{int(time.time())}"
+
+
+class ReEmbedding:
+    """Estado do job (um por processo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.estado: Dict[str, Any] = {"estado": "ocioso"}
+
+    def em_andamento(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> Dict[str, Any]:
+        st = dict(self.estado)
+        if st.get("estado") == "executando":
+            st["decorrido_s"] = round(time.monotonic() - st["_inicio"], 1)
+        st.pop("_inicio", None)
+        return st
+
+    def iniciar(self, modelo: str, lote: int = REEMBED_BATCH) -> Dict:
+        from app import chat
+
+        if chat.MOCK_RAG:
+            raise RuntimeError("RAG em modo mock: sem Ollama/Chroma.")
+        with self._lock:
+            if self.em_andamento():
+                raise RuntimeError("Já existe um re-embedding em andamento.")
+            self.estado = {"estado": "executando", "modelo": modelo}
+            self._thread = threading.Thread(
+                target=self.executar, args=(modelo, lote),
+                name="reembed", daemon=True,
+            )
+            self._thread.start()
+        return self.status()
+
+    def executar(self, modelo: str, lote: int = REEMBED_BATCH) -> str:
+        """Monta a coleção nova, troca a ativa e devolve o nome dela."""
+        self.estado = {
+            "estado": "executando", "modelo": modelo,
+            "_inicio": time.monotonic(), "conteudos": 0, "fragmentos": 0,
+        }
+        try:
+            nome = self._executar(modelo, lote)
+        except Exception as e:
+            log.error("reembed_erro", modelo=modelo, error=str(e))
+            self.estado.update(estado="erro", erro=str(e))
+            raise
+        return nome
+
+    def _executar(self, modelo: str, lote: int) -> str:
+        from sqlalchemy.orm import Session
+
+        from app import chat
+        from app.embedding import ExecutorEmbeddings
+        from app.ingestor import (
+            ConteudoTeologico, canonicos, engine, itens_indexaveis,
+        )
+
+        if chat.MOCK_RAG:
+            raise RuntimeError("RAG em modo mock: sem Ollama/Chroma.")
+        emb = ExecutorEmbeddings(
+            chat.OllamaEmbeddings(model=modelo), job="reembed"
+        )
+        dimensao = len(emb.embed_query("dimensão"))
+        nome = nome_colecao(modelo)
+        nova = chat.abrir_vectorstore(nome, emb, VECTOR_BACKEND)
+        reg = registro()
+        reg.registrar(
+            nome, modelo, dimensao, estado="construindo",
+            backend=VECTOR_BACKEND,
+        )
+        st = self.estado
+        st.update(colecao=nome, dimensao=dimensao)
+
+        def indexar_a_partir_de(ultimo: int) -> int:
+            """Indexa conteúdos com id > ultimo; devolve o último id."""
+            with Session(engine) as s:
+                st["conteudos_total"] = st["conteudos"] + canonicos(
+                    s
+                ).filter(ConteudoTeologico.id > ultimo).count()
+                while True:
+                    linhas = (
+                        canonicos(s)
+                        .filter(ConteudoTeologico.id > ultimo)
+                        .order_by(ConteudoTeologico.id)
+                        .limit(_PAGINA)
+                        .all()
+                    )
+                    if not linhas:
+                        return ultimo
+                    itens = [i for c in linhas for i in itens_indexaveis(c)]
+                    for p in range(0, len(itens), lote):
+                        parte = itens[p:p + lote]
+                        nova.add_texts(
+                            [t for _, t, _ in parte],
+                            metadatas=[m for _, _, m in parte],
+                            ids=[k for k, _, _ in parte],
+                        )
+                        st["fragmentos"] += len(parte)
+                    ultimo = linhas[-1].id
+                    st["conteudos"] += len(linhas)
+                    st["embedding"] = emb.estado()
+                    self._progresso(nome)
+
+        # Repete até não sobrar conteúdo novo (ingestões durante o job)
+        ultimo = indexar_a_partir_de(0)
+        while True:
+            seguinte = indexar_a_partir_de(ultimo)
+            if seguinte == ultimo:
+                break
+            ultimo = seguinte
+
+        reg.atualizar(nome, docs=st["fragmentos"])
+        reg.ativar(nome)
+        chat.sincronizar_colecao(forcar=True)
+        # O que entrou entre a última passada e a troca
+        indexar_a_partir_de(ultimo)
+        REEMBED_PROGRESS.set(1.0, collection=nome)
+        st.update(estado="concluido", concluido_em=_agora())
+        self._progresso(nome)
+        log.info("reembed_concluido", colecao=nome, modelo=modelo,
+                 fragmentos=st["fragmentos"],
+                 vetores_por_s=st.get("vetores_por_s"))
+        return nome
+
+    def _progresso(self, nome: str) -> None:
+        st = self.estado
+        decorrido = time.monotonic() - st["_inicio"]
+        st["vetores_por_s"] = round(st["fragmentos"] / decorrido, 2) \
+            if decorrido else None
+        total = st.get("conteudos_total") or 0
+        st["progresso"] = round(st["conteudos"] / total, 4) if total else 1.0
+        REEMBED_PROGRESS.set(st["progresso"], collection=nome)
+
+
+REEMBED = ReEmbedding()
+
+
+def remover_colecao(nome: str) -> None:
+    """Apaga do Chroma e do registro uma coleção que não está ativa."""
+    from app import chat
+    from app.vetores import apagar_colecao
+
+    reg = registro()
+    backend = reg.dados["colecoes"].get(nome, {}).get("backend", "chroma")
+    reg.remover(nome)
+    if backend == "numpy":
+        apagar_colecao(chat.PERSIST_DIR, nome)
+    elif chat.db is not None and hasattr(chat.db, "_client"):
+        chat.db._client.delete_collection(nome)
+
+
+if __name__ == "__main__":
+    if "--reembed" in sys.argv:
+        modelo = sys.argv[sys.argv.index("--reembed") + 1]
+        print(f"Coleção ativa: {REEMBED.executar(modelo)}")
+        print(json.dumps(REEMBED.status(), ensure_ascii=False, indent=2))
+    elif "--remover" in sys.argv:
+        remover_colecao(sys.argv[sys.argv.index("--remover") + 1])
+    else:
+        print(json.dumps(registro().resumo(), ensure_ascii=False, indent=2))
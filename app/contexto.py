@@ -0,0 +1,176 @@
+# app/contexto.py
+"""
+Montagem do CONTEXTO do prompt com orçamento de tokens por modelo.
+
+Cada documento é quebrado em frases (ou janelas de palavras, para textos
+sem pontuação); frases repetidas entre chunks sobrepostos são descartadas
+e as mais relevantes para a pergunta entram até o orçamento, exibidas na
+ordem original de cada documento.
+
+- EKLESIA_CONTEXT_BUDGET: orçamento padrão em tokens (2000)
+- EKLESIA_CONTEXT_BUDGETS: por modelo, ex.: "mistral=3000,llama3.1:8b=6000"
+
+Os tokens são estimados (~4 caracteres por token): o tokenizer real fica
+dentro do Ollama.
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from app.metrics import CONTEXT_TOKENS
+from app.tracing import anotar
+
+load_dotenv()
+
+CONTEXT_BUDGET = int(os.getenv("EKLESIA_CONTEXT_BUDGET", "2000"))
+CONTEXT_BUDGETS: Dict[str, int] = {
+    nome.strip(): int(valor)
+    for nome, _, valor in (
+        item.partition("=")
+        for item in os.getenv("EKLESIA_CONTEXT_BUDGETS", "").split(",")
+        if "=" in item
+    )
+}
+
+SEPARADOR = "\n\n---\n\n"
+ELIPSE = " […] "
+# Trechos sem pontuação maiores que isso viram janelas de palavras
+_MAX_TOKENS_FRASE = 120
+_PALAVRAS_JANELA = 80
+# Peso da posição do documento no ranking da recuperação
+_PESO_RANK = 0.3
+
+_FRASE_RE = re.compile(r"(?<=[.!?;])\s+|\n\s*\n?")
+
+
+def contar_tokens(texto: str) -> int:
+    if not texto:
+        return 0
+    return max(1, (len(texto) + 3) // 4)
+
+
+def orcamento(modelo: Optional[str]) -> int:
+    if modelo and modelo in CONTEXT_BUDGETS:
+        return CONTEXT_BUDGETS[modelo]
+    base = (modelo or "").split(":")[0]
+    return CONTEXT_BUDGETS.get(base, CONTEXT_BUDGET)
+
+
+def _frases(texto: str) -> List[str]:
+    frases = []
+    for f in _FRASE_RE.split(texto or ""):
+        f = f.strip()
+        if not f:
+            continue
+        if contar_tokens(f) <= _MAX_TOKENS_FRASE:
+            frases.append(f)
+            continue
+        palavras = f.split()
+        for i in range(0, len(palavras), _PALAVRAS_JANELA):
+            frases.append(" ".join(palavras[i:i + _PALAVRAS_JANELA]))
+    return frases
+
+
+class _Trecho:
+    __slots__ = ("doc", "pos", "texto", "tokens", "score")
+
+    def __init__(self, doc: int, pos: int, texto: str, score: float):
+        self.doc = doc
+        self.pos = pos
+        self.texto = texto
+        self.tokens = contar_tokens(texto)
+        self.score = score
+
+
+def montar_contexto(
+    docs: Sequence[Any],
+    pergunta: str = "",
+    modelo: Optional[str] = None,
+    limite: Optional[int] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Devolve (contexto, relatório). O relatório traz tokens originais,
+    usados, descartados e quantos trechos duplicados foram removidos.
+    """
+    from app.lexical import tokenizar
+
+    limite = orcamento(modelo) if limite is None else limite
+    termos = set(tokenizar(pergunta))
+
+    por_doc: List[List[_Trecho]] = []
+    originais: List[Tuple[str, int]] = []
+    vistos = set()
+    total = duplicados = 0
+    for i, d in enumerate(docs or []):
+        texto = (getattr(d, "page_content", "") or "").strip()
+        frases = _frases(texto)
+        originais.append((texto, len(frases)))
+        trechos = []
+        for pos, frase in enumerate(frases):
+            total += contar_tokens(frase)
+            tokens = tokenizar(frase)
+            chave = " ".join(tokens) or frase
+            if chave in vistos:
+                duplicados += 1
+                continue
+            vistos.add(chave)
+            cobertura = (
+                len(termos & set(tokens)) / len(termos) if termos else 0.0
+            )
+            trechos.append(
+                _Trecho(i, pos, frase, cobertura + _PESO_RANK / (1 + i))
+            )
+        por_doc.append(trechos)
+
+    # Mais relevantes primeiro; quem não cabe é pulado, não interrompe
+    escolhidos = set()
+    usados = 0
+    todos = [t for trechos in por_doc for t in trechos]
+    for t in sorted(todos, key=lambda t: t.score, reverse=True):
+        if usados + t.tokens <= limite:
+            escolhidos.add((t.doc, t.pos))
+            usados += t.tokens
+
+    partes = []
+    for i, trechos in enumerate(por_doc):
+        mantidos = [t for t in trechos if (t.doc, t.pos) in escolhidos]
+        if not mantidos:
+            continue
+        texto, n_frases = originais[i]
+        if len(mantidos) == n_frases:
+            partes.append(texto)
+            continue
+        texto = mantidos[0].texto
+        for anterior, t in zip(mantidos, mantidos[1:]):
+            texto += (" " if t.pos == anterior.pos + 1 else ELIPSE) + t.texto
+        partes.append(texto)
+
+    relatorio = {
+        "tokens": total,
+        "usados": usados,
+        "descartados": total - usados,
+        "duplicados": duplicados,
+        "limite": limite,
+    }
+    return SEPARADOR.join(partes), relatorio
+
+
+def formatar_contexto(
+    docs: Sequence[Any], pergunta: str = "", modelo: Optional[str] = None
+) -> str:
+    """`montar_contexto` registrando o relatório no trace e em /metrics."""
+    contexto, rel = montar_contexto(docs, pergunta, modelo)
+    anotar(
+        context_tokens=rel["usados"],
+        context_dropped_tokens=rel["descartados"],
+        context_duplicates=rel["duplicados"],
+    )
+    CONTEXT_TOKENS.inc(rel["usados"], model=modelo or "-", kind="used")
+    CONTEXT_TOKENS.inc(
+        rel["descartados"], model=modelo or "-", kind="dropped"
+    )
+    return contexto
@@ -0,0 +1,281 @@
+# app/duplicatas.py
+"""
+Detecção de quase-duplicatas.
+
+Na ingestão, cada conteúdo recebe uma assinatura MinHash das sequências
+de palavras (sem acentos e sem stopwords, como no BM25). Um índice LSH
+acha candidatos e a similaridade de Jaccard estimada decide: o mesmo
+sermão em PDF e DOCX, ou com outro rodapé, cai acima do limiar.
+
+- EKLESIA_DEDUP: "link" (padrão) grava o conteúdo com `duplicata_de`
+  apontando o original e não o indexa; "skip" não grava e devolve o id
+  do original; "off" desliga
+- EKLESIA_DEDUP_THRESHOLD: Jaccard estimado mínimo (0.85)
+
+Na recuperação, fragmentos quase iguais (SimHash de 64 bits a no máximo
+EKLESIA_DEDUP_COLLAPSE_BITS bits de distância, padrão 3; 0 desliga) são
+colapsados no de maior score, para o top-k não se encher de cópias.
+
+    python -m app.duplicatas             # relata duplicatas no acervo
+    python -m app.duplicatas --aplicar   # marca e desindexa as cópias
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import sys
+import threading
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.lexical import tokenizar
+from app.tracing import anotar
+
+load_dotenv()
+
+DEDUP = os.getenv("EKLESIA_DEDUP", "link").lower()
+DEDUP_THRESHOLD = float(os.getenv("EKLESIA_DEDUP_THRESHOLD", "0.85"))
+COLLAPSE_BITS = int(os.getenv("EKLESIA_DEDUP_COLLAPSE_BITS", "3"))
+
+# Palavras por shingle; permutações = BANDAS x LINHAS. Com 32 bandas de
+# 4 linhas, pares com Jaccard 0.6 já viram candidatos com ~98% de chance;
+# o limiar de verdade é aplicado depois, sobre a assinatura inteira.
+_SHINGLE = 5
+_BANDAS = 32
+_LINHAS = 4
+NUM_PERM = _BANDAS * _LINHAS
+# Shingles por vez no cálculo vetorizado (limita memória em livros)
+_BLOCO = 2048
+
+_PRIMO = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+
+# ----------------------------
+# MinHash
+# ----------------------------
+def _shingles(texto: str) -> np.ndarray:
+    tokens = tokenizar(texto)
+    if len(tokens) <= _SHINGLE:
+        grupos = [" ".join(tokens)] if tokens else []
+    else:
+        grupos = {
+            " ".join(tokens[i:i + _SHINGLE])
+            for i in range(len(tokens) - _SHINGLE + 1)
+        }
+    return np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) for g in grupos), dtype=np.uint64
+    )
+
+
+def assinar(texto: str) -> Optional[np.ndarray]:
+    """Assinatura MinHash (NUM_PERM inteiros) ou None sem palavras."""
+    hashes = _shingles(texto)
+    if not len(hashes):
+        return None
+    assinatura = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for a in range(0, len(hashes), _BLOCO):
+            h = hashes[a:a + _BLOCO, None]
+            valores = (h * _A + _B) % _PRIMO
+            np.minimum(assinatura, valores.min(axis=0), out=assinatura)
+    return assinatura
+
+
+def similaridade(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard estimado entre dois conjuntos de shingles."""
+    return float(np.mean(a == b))
+
+
+def codificar(assinatura: Optional[np.ndarray]) -> Optional[str]:
+    if assinatura is None:
+        return None
+    return base64.b64encode(assinatura.astype("<u8").tobytes()).decode()
+
+
+def decodificar(valor: Optional[str]) -> Optional[np.ndarray]:
+    if not valor:
+        return None
+    return np.frombuffer(base64.b64decode(valor), dtype="<u8").astype(
+        np.uint64
+    )
+
+
+# ----------------------------
+# Índice LSH (conteúdos canônicos)
+# ----------------------------
+class IndiceLSH:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baldes: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        self._assinaturas: Dict[int, np.ndarray] = {}
+        self._ultimo = 0
+
+    def _chaves(self, assinatura: np.ndarray):
+        for b in range(_BANDAS):
+            banda = assinatura[b * _LINHAS:(b + 1) * _LINHAS]
+            yield b, banda.tobytes()
+
+    def adicionar(self, conteudo_id: int, assinatura: np.ndarray) -> None:
+        with self._lock:
+            if conteudo_id in self._assinaturas:
+                return
+            self._assinaturas[conteudo_id] = assinatura
+            for chave in self._chaves(assinatura):
+                self._baldes[chave].append(conteudo_id)
+            self._ultimo = max(self._ultimo, conteudo_id)
+
+    def _atualizar(self) -> None:
+        """Carrega o que outros workers gravaram desde a última vez."""
+        from app.ingestor import ConteudoTeologico, Session
+
+        with Session() as s:
+            linhas = (
+                s.query(ConteudoTeologico.id, ConteudoTeologico.minhash)
+                .filter(
+                    ConteudoTeologico.id > self._ultimo,
+                    ConteudoTeologico.duplicata_de.is_(None),
+                    ConteudoTeologico.minhash.isnot(None),
+                )
+                .all()
+            )
+        for cid, valor in linhas:
+            self.adicionar(cid, decodificar(valor))
+
+    def procurar(
+        self, assinatura: np.ndarray, limiar: float = DEDUP_THRESHOLD
+    ) -> Tuple[Optional[int], float]:
+        """Conteúdo canônico mais parecido acima do limiar (id, Jaccard)."""
+        self._atualizar()
+        return self.melhor(assinatura, limiar)
+
+    def melhor(
+        self, assinatura: np.ndarray, limiar: float = DEDUP_THRESHOLD
+    ) -> Tuple[Optional[int], float]:
+        with self._lock:
+            candidatos = {
+                cid
+                for chave in self._chaves(assinatura)
+                for cid in self._baldes.get(chave, ())
+            }
+            melhor, sim = None, 0.0
+            for cid in candidatos:
+                s = similaridade(assinatura, self._assinaturas[cid])
+                if s > sim:
+                    melhor, sim = cid, s
+        if sim >= limiar:
+            return melhor, sim
+        return None, sim
+
+
+_indice: Optional[IndiceLSH] = None
+_indice_lock = threading.Lock()
+
+
+def indice_lsh() -> IndiceLSH:
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                _indice = IndiceLSH()
+    return _indice
+
+
+# ----------------------------
+# Colapso na recuperação (SimHash)
+# ----------------------------
+_POS = np.arange(64, dtype=np.uint64)
+
+
+def simhash(texto: str) -> int:
+    tokens = tokenizar(texto)
+    # Bigramas: a ordem das palavras também conta
+    termos = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not termos:
+        return 0
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(
+                t.encode("utf-8"), digest_size=8
+            ).digest(), "little")
+            for t in termos
+        ),
+        dtype=np.uint64, count=len(termos),
+    )
+    bits = ((hashes[:, None] >> _POS) & np.uint64(1)).astype(np.int32)
+    # Bit ligado onde a maioria dos termos tem 1
+    ligados = bits.sum(axis=0) * 2 > len(termos)
+    return sum(1 << int(i) for i in np.flatnonzero(ligados))
+
+
+def colapsar(
+    pares: Sequence[Tuple[Any, Any]], bits: int = COLLAPSE_BITS
+) -> List[Tuple[Any, Any]]:
+    """
+    Mantém, na ordem recebida (melhor score primeiro), só o primeiro de
+    cada grupo de fragmentos quase iguais.
+    """
+    if bits <= 0 or len(pares) < 2:
+        return list(pares)
+    mantidos: List[Tuple[Any, Any]] = []
+    vistos: List[int] = []
+    for doc, score in pares:
+        h = simhash(getattr(doc, "page_content", "") or "")
+        if any(bin(h ^ v).count("1") <= bits for v in vistos):
+            continue
+        vistos.append(h)
+        mantidos.append((doc, score))
+    if len(mantidos) < len(pares):
+        anotar(colapsados=len(pares) - len(mantidos))
+    return mantidos
+
+
+# ----------------------------
+# Varredura do acervo
+# ----------------------------
+def varrer(aplicar: bool = False) -> List[Tuple[int, int, float]]:
+    """
+    Assina o que ainda não tem assinatura e relata (cópia, original,
+    Jaccard). Com `aplicar`, marca `duplicata_de` e tira as cópias dos
+    índices.
+    """
+    from app.ingestor import ConteudoTeologico, desindexar_conteudo, session
+
+    global _indice
+    _indice = IndiceLSH()
+    idx = _indice
+    achados = []
+    for c in session.query(ConteudoTeologico).order_by(ConteudoTeologico.id):
+        if c.duplicata_de is not None:
+            continue
+        assinatura = decodificar(c.minhash)
+        if assinatura is None:
+            assinatura = assinar(c.texto or "")
+            c.minhash = codificar(assinatura)
+        if assinatura is None:
+            continue
+        original, sim = idx.melhor(assinatura)
+        if original is not None:
+            achados.append((c.id, original, sim))
+            if aplicar:
+                c.duplicata_de = original
+                desindexar_conteudo(c)
+            continue
+        idx.adicionar(c.id, assinatura)
+    session.commit()
+    return achados
+
+
+if __name__ == "__main__":
+    aplicar = "--aplicar" in sys.argv
+    for copia, original, sim in varrer(aplicar):
+        print(f"{copia} ~ {original} (Jaccard {sim:.2f})")
+    if aplicar:
+        print("Cópias marcadas e removidas dos índices.")
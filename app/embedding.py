@@ -0,0 +1,228 @@
+# app/embedding.py
+"""
+Executor de embeddings: lotes por tamanho, chamadas concorrentes,
+retentativa com backoff e lote adaptativo pela latência observada.
+
+`ExecutorEmbeddings` embrulha um Embeddings do LangChain (o
+OllamaEmbeddings, que manda cada lote numa única chamada a /api/embed) e
+é o que o Chroma recebe como `embedding_function`; indexação, consulta
+e re-embedding passam por ele.
+
+- EKLESIA_EMBED_BATCH: textos por lote no início (32)
+- EKLESIA_EMBED_BATCH_MIN / EKLESIA_EMBED_BATCH_MAX: limites do lote
+  adaptativo (4 / 256)
+- EKLESIA_EMBED_BATCH_CHARS: caracteres somados por lote (32000); evita
+  lotes de poucos textos enormes estourarem a latência alvo
+- EKLESIA_EMBED_CONCURRENCY: lotes em voo ao mesmo tempo (2); acima de
+  OLLAMA_NUM_PARALLEL não ajuda
+- EKLESIA_EMBED_TARGET_MS: latência alvo por lote (2000); abaixo da
+  metade o lote cresce 25%, acima dela cai pela metade
+- EKLESIA_EMBED_RETRIES: retentativas por lote (3), com backoff
+  exponencial; esgotadas, o lote é dividido ao meio antes de desistir
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence
+
+from dotenv import load_dotenv
+
+from app.logging_utils import get_logger
+from app.metrics import EMBED_BATCH, EMBED_ERRORS, EMBED_RATE, EMBED_VECTORS
+
+try:
+    from langchain_core.embeddings import Embeddings as _Base
+except Exception:  # pragma: no cover - modo mock sem LangChain
+    _Base = object
+
+load_dotenv()
+
+EMBED_BATCH_SIZE = int(os.getenv("EKLESIA_EMBED_BATCH", "32"))
+EMBED_BATCH_MIN = int(os.getenv("EKLESIA_EMBED_BATCH_MIN", "4"))
+EMBED_BATCH_MAX = int(os.getenv("EKLESIA_EMBED_BATCH_MAX", "256"))
+EMBED_BATCH_CHARS = int(os.getenv("EKLESIA_EMBED_BATCH_CHARS", "32000"))
+EMBED_CONCURRENCY = int(os.getenv("EKLESIA_EMBED_CONCURRENCY", "2"))
+EMBED_TARGET_MS = float(os.getenv("EKLESIA_EMBED_TARGET_MS", "2000"))
+EMBED_RETRIES = int(os.getenv("EKLESIA_EMBED_RETRIES", "3"))
+# Backoff: base * 2^tentativa (+ jitter), com teto
+_BACKOFF_BASE = 0.5
+_BACKOFF_MAX = 10.0
+# Peso da última medição na média móvel de vetores/s
+_EWMA = 0.3
+
+log = get_logger("embedding")
+
+
+def planejar_lotes(
+    textos: Sequence[str], lote: int, max_chars: int = EMBED_BATCH_CHARS
+) -> List[List[int]]:
+    """
+    Índices de `textos` agrupados em ordem: no máximo `lote` textos e
+    `max_chars` caracteres por lote (um texto maior que isso vai sozinho).
+    """
+    lotes: List[List[int]] = []
+    atual: List[int] = []
+    chars = 0
+    for i, t in enumerate(textos):
+        n = len(t)
+        if atual and (len(atual) >= lote or chars + n > max_chars):
+            lotes.append(atual)
+            atual, chars = [], 0
+        atual.append(i)
+        chars += n
+    if atual:
+        lotes.append(atual)
+    return lotes
+
+
+class ExecutorEmbeddings(_Base):
+    def __init__(
+        self,
+        base: Any,
+        job: str = "index",
+        lote: int = EMBED_BATCH_SIZE,
+        concorrencia: int = EMBED_CONCURRENCY,
+        alvo_ms: float = EMBED_TARGET_MS,
+        retentativas: int = EMBED_RETRIES,
+    ):
+        self.base = base
+        self.model = getattr(base, "model", "-")
+        self.job = job
+        self.lote = max(EMBED_BATCH_MIN, min(EMBED_BATCH_MAX, lote))
+        self.teto = EMBED_BATCH_MAX
+        self.concorrencia = max(1, concorrencia)
+        self.alvo = alvo_ms / 1000
+        self.retentativas = retentativas
+        self.vetores = 0
+        self.vetores_por_s: float = 0.0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.concorrencia,
+            thread_name_prefix=f"embed-{job}",
+        )
+        EMBED_BATCH.set(self.lote, job=job, model=self.model)
+
+    # ------------------------
+    # Chamadas com retentativa
+    # ------------------------
+    def _com_retentativa(self, fn, arg, retentativas=None):
+        limite = self.retentativas if retentativas is None else retentativas
+        tentativa = 0
+        while True:
+            try:
+                return fn(arg)
+            except Exception as e:
+                EMBED_ERRORS.inc(job=self.job, model=self.model)
+                if tentativa >= limite:
+                    raise
+                espera = min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** tentativa)
+                espera *= 1 + random.random() * 0.25
+                log.warning(
+                    "embed_retentativa", job=self.job, model=self.model,
+                    tentativa=tentativa + 1, espera_s=round(espera, 2),
+                    error=str(e),
+                )
+                time.sleep(espera)
+                tentativa += 1
+
+    def _embed_lote(self, textos: List[str]):
+        """Devolve (vetores, duração); esgotadas as retentativas, divide."""
+        inicio = time.perf_counter()
+        try:
+            vetores = self._com_retentativa(
+                self.base.embed_documents, textos
+            )
+        except Exception:
+            if len(textos) == 1:
+                raise
+            self._ajustar(len(textos), None)
+            meio = len(textos) // 2
+            a, _ = self._embed_lote(textos[:meio])
+            b, _ = self._embed_lote(textos[meio:])
+            vetores = a + b
+        return vetores, time.perf_counter() - inicio
+
+    # ------------------------
+    # Lote adaptativo
+    # ------------------------
+    def _ajustar(self, n: int, duracao) -> None:
+        """
+        Duração None = lote de `n` falhou: o lote cai à metade e não volta
+        a passar dela. Com latência, AIMD sobre o alvo.
+        """
+        with self._lock:
+            if duracao is None:
+                self.teto = max(EMBED_BATCH_MIN, n // 2)
+                self.lote = min(self.lote, self.teto)
+            elif duracao > self.alvo:
+                self.lote = max(EMBED_BATCH_MIN, self.lote // 2)
+            elif duracao < self.alvo / 2 and n >= self.lote:
+                # Só cresce quando o lote cheio coube folgado no alvo
+                self.lote = min(self.teto, int(self.lote * 1.25) + 1)
+            EMBED_BATCH.set(self.lote, job=self.job, model=self.model)
+
+    def _registrar_vazao(self, n: int, duracao: float) -> None:
+        if duracao <= 0:
+            return
+        taxa = n / duracao
+        with self._lock:
+            self.vetores += n
+            self.vetores_por_s = (
+                taxa if not self.vetores_por_s
+                else _EWMA * taxa + (1 - _EWMA) * self.vetores_por_s
+            )
+        EMBED_VECTORS.inc(n, job=self.job, model=self.model)
+        EMBED_RATE.set(
+            round(self.vetores_por_s, 2), job=self.job, model=self.model
+        )
+
+    # ------------------------
+    # Interface Embeddings
+    # ------------------------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        textos = list(texts)
+        resultado: List[Any] = [None] * len(textos)
+        pendentes = list(range(len(textos)))
+        # Em ondas de `concorrencia` lotes, replanejando com o lote
+        # ajustado pela onda anterior
+        while pendentes:
+            sub = [textos[i] for i in pendentes]
+            planos = planejar_lotes(sub, self.lote)[: self.concorrencia]
+            inicio = time.perf_counter()
+            futuros = [
+                (p, self._pool.submit(
+                    self._embed_lote, [sub[i] for i in p]
+                ))
+                for p in planos
+            ]
+            feitos = 0
+            for p, fut in futuros:
+                vetores, duracao = fut.result()
+                for i, v in zip(p, vetores):
+                    resultado[pendentes[i]] = v
+                self._ajustar(len(p), duracao)
+                feitos += len(p)
+            self._registrar_vazao(feitos, time.perf_counter() - inicio)
+            pendentes = pendentes[feitos:]
+        return resultado
+
+    def embed_query(self, text: str) -> List[float]:
+        # Consulta: uma retentativa só (latência do usuário), sem lote nem
+        # métrica de vazão (já medida em medir("embed"))
+        return self._com_retentativa(
+            self.base.embed_query, text, min(1, self.retentativas)
+        )
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "job": self.job,
+            "model": self.model,
+            "lote": self.lote,
+            "concorrencia": self.concorrencia,
+            "vetores": self.vetores,
+            "vetores_por_s": round(self.vetores_por_s, 2),
+        }
@@ -1,10 +1,441 @@
-from docx import Document
+# app/exportador.py
+"""
+Exportação de sermões, estudos, devocionais e ebooks gerados (o JSON de
+/gerar-* ou o resultado de um job, app.jobs) para DOCX, PDF e Markdown.
 
+O documento sai de `secoes()` uma seção por vez (abertura, esboço, cada
+capítulo do ebook, citações, fontes), e cada formato escreve a seção no
+destino e a descarta: Markdown e PDF (PyMuPDF, uma Story por seção) vão
+direto para o arquivo, página a página. O DOCX é a exceção: o
+python-docx guarda a árvore XML até salvar, mas ela é salva direto no
+arquivo, sem uma cópia em bytes.
+
+`exportar()` grava em EKLESIA_EXPORT_DIR com o hash do conteúdo no nome:
+a mesma exportação pedida de novo (por qualquer usuário ou worker) sai
+do disco. A escrita vai para um temporário renomeado no fim, então
+pedidos simultâneos não se atropelam. Acima de EKLESIA_EXPORT_CACHE_MB,
+os arquivos usados há mais tempo são apagados.
+"""
+from __future__ import annotations
+
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import tempfile
+import unicodedata
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.logging_utils import get_logger
+from app.metrics import EXPORTS
+
+load_dotenv()
+
+EXPORT_DIR = os.getenv("EKLESIA_EXPORT_DIR", "./exportacoes")
+EXPORT_CACHE_MB = float(os.getenv("EKLESIA_EXPORT_CACHE_MB", "200"))
+
+# Muda quando o layout muda (invalida os arquivos já gerados)
+LAYOUT = "1"
+
+FORMATOS = {
+    "docx": (
+        "docx",
+        "application/vnd.openxmlformats-officedocument"
+        ".wordprocessingml.document",
+    ),
+    "pdf": ("pdf", "application/pdf"),
+    "md": ("md", "text/markdown; charset=utf-8"),
+}
+
+_ROTULOS = {
+    "sermao": "Sermão",
+    "estudo": "Estudo bíblico",
+    "devocional": "Devocional",
+    "ebook": "Ebook",
+}
+
+_CAPITULO = re.compile(r"^(#{1,3}\s*)?(cap[ií]tulo\s+\S+.*)$", re.I)
+_TITULO_MD = re.compile(r"^(#{1,6})\s+(.*)$")
+_ITEM = re.compile(r"^[-*•]\s+(.*)$")
+_NUMERADO = re.compile(r"^(\d+)[.)]\s+(.*)$")
+
+log = get_logger("exportador")
+
+# Bloco: (tipo, texto), tipo em titulo|p|item|num|citacao
+Bloco = Tuple[str, str]
+
+
+class Secao:
+    """Título (nível 1 ou 2) e blocos; `nova_pagina` nos capítulos."""
+
+    __slots__ = ("titulo", "nivel", "blocos", "nova_pagina")
+
+    def __init__(
+        self,
+        titulo: Optional[str],
+        nivel: int = 2,
+        blocos: Optional[List[Bloco]] = None,
+        nova_pagina: bool = False,
+    ):
+        self.titulo = titulo
+        self.nivel = nivel
+        self.blocos = blocos or []
+        self.nova_pagina = nova_pagina
+
+
+def tipo_conteudo(conteudo: Dict[str, Any]) -> str:
+    """sermao|estudo|devocional|ebook, pelos campos do resultado."""
+    if "capitulos" in conteudo:
+        return "ebook"
+    if "versiculo" in conteudo:
+        return "devocional"
+    if "tipo" in conteudo:
+        return "sermao"
+    return "estudo"
+
+
+# ----------------------------
+# Estrutura do documento
+# ----------------------------
+def _blocos(linhas: List[str]) -> List[Bloco]:
+    blocos: List[Bloco] = []
+    for linha in linhas:
+        linha = linha.strip()
+        if not linha:
+            continue
+        for regex, tipo in (
+            (_TITULO_MD, "titulo"), (_ITEM, "item"), (_NUMERADO, "num"),
+        ):
+            m = regex.match(linha)
+            if m:
+                blocos.append((tipo, m.groups()[-1].strip()))
+                break
+        else:
+            blocos.append(("p", linha))
+    return blocos
+
+
+def _capitulos(texto: str) -> Iterator[Tuple[Optional[str], List[str]]]:
+    """(título, linhas) de cada capítulo; o que vem antes do primeiro
+    sai com título None."""
+    titulo: Optional[str] = None
+    linhas: List[str] = []
+    for linha in texto.splitlines():
+        m = _CAPITULO.match(linha.strip())
+        if m:
+            if titulo is not None or any(x.strip() for x in linhas):
+                yield titulo, linhas
+            titulo, linhas = m.group(2).strip(" *"), []
+        else:
+            linhas.append(linha)
+    if titulo is not None or any(x.strip() for x in linhas):
+        yield titulo, linhas
+
+
+def secoes(
+    conteudo: Dict[str, Any], tipo: Optional[str] = None
+) -> Iterator[Secao]:
+    """Seções do documento, na ordem (geradas uma a uma)."""
+    tipo = tipo or tipo_conteudo(conteudo)
+    texto = conteudo.get("texto_gerado") or ""
+
+    abertura: List[Bloco] = []
+    rotulo = _ROTULOS.get(tipo, tipo.capitalize())
+    if tipo == "sermao" and conteudo.get("tipo"):
+        rotulo += f" {conteudo['tipo']}"
+    abertura.append(("p", rotulo))
+    versiculos = conteudo.get("versiculos") or (
+        [conteudo["versiculo"]] if conteudo.get("versiculo") else []
+    )
+    if versiculos:
+        abertura.append(("p", "Texto bíblico: " + ", ".join(versiculos)))
+    if conteudo.get("autor"):
+        abertura.append(("p", f"Com citações de {conteudo['autor']}"))
+    yield Secao(conteudo.get("tema") or rotulo, 1, abertura)
+
+    if tipo == "sermao" and conteudo.get("esboco"):
+        yield Secao("Esboço", 2, [
+            ("num", str(t).strip()) for t in conteudo["esboco"]
+        ])
+
+    if tipo == "ebook":
+        for titulo, linhas in _capitulos(texto):
+            yield Secao(
+                titulo, 2, _blocos(linhas), nova_pagina=titulo is not None
+            )
+    elif texto:
+        titulo = "Desenvolvimento" if tipo == "sermao" else None
+        yield Secao(titulo, 2, _blocos(texto.splitlines()))
+
+    if conteudo.get("citacoes"):
+        yield Secao("Citações", 2, [
+            ("citacao", str(c)) for c in conteudo["citacoes"]
+        ])
+    fontes = []
+    for f in conteudo.get("fontes") or []:
+        if isinstance(f, dict):
+            origem = os.path.basename(str(f.get("source") or "desconhecido"))
+            if f.get("page") is not None:
+                origem += f", p. {f['page']}"
+            fontes.append(("item", origem))
+        else:
+            fontes.append(("item", str(f)))
+    if fontes:
+        # Mesma fonte citada por vários trechos aparece uma vez
+        yield Secao("Fontes", 2, list(dict.fromkeys(fontes)))
+
+
+# ----------------------------
+# Formatos
+# ----------------------------
+def _escrever_md(partes: Iterator[Secao], destino: BinaryIO) -> None:
+    for secao in partes:
+        linhas = []
+        if secao.titulo:
+            linhas.append(f"{'#' * secao.nivel} {secao.titulo}\n")
+        n = 0
+        for tipo, texto in secao.blocos:
+            n = n + 1 if tipo == "num" else 0
+            if tipo == "titulo":
+                linhas.append(f"{'#' * (secao.nivel + 1)} {texto}\n")
+            elif tipo == "item":
+                linhas.append(f"- {texto}")
+            elif tipo == "num":
+                linhas.append(f"{n}. {texto}")
+            elif tipo == "citacao":
+                linhas.append(f"> {texto}\n")
+            else:
+                linhas.append(f"{texto}\n")
+        destino.write(("\n".join(linhas).rstrip() + "\n\n").encode("utf-8"))
+
+
+def _escrever_docx(partes: Iterator[Secao], destino: BinaryIO) -> None:
+    from docx import Document
+    from docx.enum.text import WD_BREAK
 
-def gerar_docx(sermao):
     doc = Document()
-    doc.add_heading(sermao["tema"], level=1)
-    for i, topico in enumerate(sermao["esboco"], 1):
-        doc.add_heading(f"Tópico {i}", level=2)
-        doc.add_paragraph(topico)
-    doc.save("sermao.docx")
+    estilos = {
+        "item": "List Bullet", "num": "List Number", "citacao": "Quote",
+    }
+    primeira = True
+    for secao in partes:
+        if secao.nova_pagina and not primeira:
+            doc.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+        primeira = False
+        if secao.titulo:
+            doc.add_heading(secao.titulo, level=secao.nivel)
+        for tipo, texto in secao.blocos:
+            if tipo == "titulo":
+                doc.add_heading(texto, level=min(secao.nivel + 1, 9))
+            else:
+                doc.add_paragraph(texto, style=estilos.get(tipo))
+    doc.save(destino)
+
+
+_CSS_PDF = """
+* { font-family: sans-serif; }
+h1 { font-size: 20pt; margin-bottom: 8pt; }
+h2 { font-size: 15pt; margin-top: 14pt; margin-bottom: 6pt; }
+h3 { font-size: 12pt; margin-top: 10pt; }
+p, li { font-size: 11pt; line-height: 1.35; text-align: justify; }
+blockquote { font-style: italic; margin-left: 18pt; }
+"""
+
+
+def _html(secao: Secao) -> str:
+    e = html.escape
+    partes = []
+    if secao.titulo:
+        partes.append(f"<h{secao.nivel}>{e(secao.titulo)}</h{secao.nivel}>")
+    lista = None
+    for tipo, texto in secao.blocos:
+        tag = {"item": "ul", "num": "ol"}.get(tipo)
+        if tag != lista:
+            if lista:
+                partes.append(f"</{lista}>")
+            if tag:
+                partes.append(f"<{tag}>")
+            lista = tag
+        if tag:
+            partes.append(f"<li>{e(texto)}</li>")
+        elif tipo == "titulo":
+            n = min(secao.nivel + 1, 6)
+            partes.append(f"<h{n}>{e(texto)}</h{n}>")
+        elif tipo == "citacao":
+            partes.append(f"<blockquote>{e(texto)}</blockquote>")
+        else:
+            partes.append(f"<p>{e(texto)}</p>")
+    if lista:
+        partes.append(f"</{lista}>")
+    return "".join(partes)
+
+
+class _Saida:
+    """`destino` sem o atributo `name`: com ele, o DocumentWriter do
+    PyMuPDF reabre o arquivo pelo caminho em vez de usar o objeto."""
+
+    def __init__(self, destino: BinaryIO):
+        self.write = destino.write
+        self.seek = destino.seek
+        self.tell = destino.tell
+        self.truncate = destino.truncate
+
+
+def _escrever_pdf(partes: Iterator[Secao], destino: BinaryIO) -> None:
+    import pymupdf
+
+    pagina = pymupdf.paper_rect("a4")
+    area = pagina + (56, 56, -56, -56)
+    escritor = pymupdf.DocumentWriter(_Saida(destino))
+    # Onde a última seção parou: (dispositivo da página aberta, y livre)
+    aberta = None
+    try:
+        for secao in partes:
+            story = pymupdf.Story(_html(secao), user_css=_CSS_PDF)
+            # Capítulo novo, ou pouco espaço para começar uma seção
+            if aberta and (secao.nova_pagina or aberta[1] > area.y1 - 72):
+                escritor.end_page()
+                aberta = None
+            falta = True
+            while falta:
+                if aberta is None:
+                    aberta = (escritor.begin_page(pagina), area.y0)
+                dispositivo, y = aberta
+                livre = pymupdf.Rect(area.x0, y, area.x1, area.y1)
+                falta, usado = story.place(livre)
+                story.draw(dispositivo)
+                if falta:
+                    escritor.end_page()
+                    aberta = None
+                else:
+                    aberta = (dispositivo, usado[3] + 6)
+    finally:
+        if aberta:
+            escritor.end_page()
+        escritor.close()
+
+
+_ESCRITORES = {
+    "md": _escrever_md,
+    "docx": _escrever_docx,
+    "pdf": _escrever_pdf,
+}
+
+
+def escrever(
+    conteudo: Dict[str, Any],
+    formato: str,
+    destino: BinaryIO,
+    tipo: Optional[str] = None,
+) -> None:
+    """Escreve o documento em `destino` (arquivo ou BytesIO)."""
+    if formato not in _ESCRITORES:
+        raise ValueError(
+            f"Formato desconhecido: {formato} "
+            f"(disponíveis: {', '.join(FORMATOS)})"
+        )
+    _ESCRITORES[formato](secoes(conteudo, tipo), destino)
+
+
+def gerar_docx(sermao: Dict[str, Any]) -> bytes:
+    """DOCX do conteúdo, em memória."""
+    saida = io.BytesIO()
+    escrever(sermao, "docx", saida)
+    return saida.getvalue()
+
+
+# ----------------------------
+# Cache em disco
+# ----------------------------
+def chave(
+    conteudo: Dict[str, Any], formato: str, tipo: Optional[str] = None
+) -> str:
+    base = json.dumps(
+        [LAYOUT, formato, tipo or tipo_conteudo(conteudo), conteudo],
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()[:32]
+
+
+def nome_arquivo(
+    conteudo: Dict[str, Any], formato: str, tipo: Optional[str] = None
+) -> str:
+    """Nome sugerido para download: `<tipo>-<tema>.<ext>`."""
+    tema = unicodedata.normalize("NFKD", str(conteudo.get("tema") or ""))
+    tema = tema.encode("ascii", "ignore").decode().lower()
+    tema = re.sub(r"[^a-z0-9]+", "-", tema).strip("-")[:60]
+    tipo = tipo or tipo_conteudo(conteudo)
+    return f"{tipo}-{tema or 'documento'}.{FORMATOS[formato][0]}"
+
+
+def exportar(
+    conteudo: Dict[str, Any],
+    formato: str,
+    tipo: Optional[str] = None,
+    pasta: Optional[str] = None,
+) -> Tuple[str, bool]:
+    """(caminho do arquivo, veio do cache)."""
+    if formato not in FORMATOS:
+        raise ValueError(
+            f"Formato desconhecido: {formato} "
+            f"(disponíveis: {', '.join(FORMATOS)})"
+        )
+    pasta = pasta or EXPORT_DIR
+    caminho = os.path.join(
+        pasta, f"{chave(conteudo, formato, tipo)}.{FORMATOS[formato][0]}"
+    )
+    try:
+        # Marca o uso (a limpeza apaga os usados há mais tempo)
+        os.utime(caminho)
+        EXPORTS.inc(formato=formato, result="hit")
+        return caminho, True
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            escrever(conteudo, formato, f, tipo)
+        os.replace(tmp, caminho)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    EXPORTS.inc(formato=formato, result="miss")
+    limpar(pasta, manter=caminho)
+    return caminho, False
+
+
+def limpar(pasta: Optional[str] = None, manter: Optional[str] = None) -> int:
+    """Apaga os menos usados até caber em EKLESIA_EXPORT_CACHE_MB."""
+    pasta = pasta or EXPORT_DIR
+    arquivos = []
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome)
+        try:
+            st = os.stat(caminho)
+        except OSError:
+            continue
+        if not nome.startswith(".tmp-"):
+            arquivos.append((st.st_mtime, st.st_size, caminho))
+    total = sum(a[1] for a in arquivos)
+    limite = EXPORT_CACHE_MB * 1024 * 1024
+    apagados = 0
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite:
+            break
+        if caminho == manter:
+            continue
+        try:
+            os.remove(caminho)
+        except OSError:
+            continue
+        total -= tamanho
+        apagados += 1
+    if apagados:
+        log.info("exportacoes_limpas", apagados=apagados)
+    return apagados
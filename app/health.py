@@ -0,0 +1,191 @@
+# app/health.py
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict
+
+import requests
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+# ----------------------------
+# Configurações por ambiente
+# ----------------------------
+OLLAMA_BASE_URL = (
+    os.getenv("OLLAMA_BASE_URL")
+    or os.getenv("OLLAMA_HOST")
+    or "http://localhost:11434"
+)
+if not OLLAMA_BASE_URL.startswith("http"):
+    OLLAMA_BASE_URL = f"http://{OLLAMA_BASE_URL}"
+
+# Timeout de cada probe (segundos) e validade do resultado em cache
+PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2.0"))
+CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "5.0"))
+
+router = APIRouter(tags=["Health"])
+
+
+# ----------------------------
+# Probes
+# ----------------------------
+def _probe_db() -> Dict[str, Any]:
+    """Executa SELECT 1 usando o pool do engine da aplicação."""
+    from sqlalchemy import text
+    from app.ingestor import engine
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return {"pool": engine.pool.status()}
+
+
+def _probe_chroma() -> Dict[str, Any]:
+    """Conta documentos da coleção consultada pelo RAG."""
+    from app import chat
+
+    if chat.MOCK_RAG:
+        return {"mock": True}
+    from app.colecoes import REEMBED, registro
+
+    chat.sincronizar_colecao()
+    if chat.db is None:
+        raise RuntimeError("vectorstore não inicializado")
+    ativa = registro().ativa() or {}
+    return {
+        "collection": chat.COLLECTION_NAME,
+        "active": ativa.get("nome"),
+        "embed_model": ativa.get("modelo"),
+        "desired_embed_model": chat.EMBED_MODEL,
+        "reembed": REEMBED.status().get("estado"),
+        "backend": ativa.get("backend", "chroma"),
+        "docs": (
+            chat.db.count() if hasattr(chat.db, "count")
+            else chat.db._collection.count()
+        ),
+    }
+
+
+def _probe_ollama() -> Dict[str, Any]:
+    """Verifica se os modelos de geração e embeddings estão disponíveis."""
+    from app import chat
+
+    if chat.MOCK_RAG:
+        return {"mock": True}
+    resp = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=PROBE_TIMEOUT)
+    resp.raise_for_status()
+    disponiveis = {m.get("name", "") for m in resp.json().get("models", [])}
+    # Embeddings: o modelo da coleção ativa é o que atende consultas
+    modelos = [chat.LLM_MODEL, getattr(chat.embeddings, "model",
+                                       chat.EMBED_MODEL)]
+    faltando = [
+        m for m in modelos
+        if m not in disponiveis and f"{m}:latest" not in disponiveis
+    ]
+    if faltando:
+        raise RuntimeError(f"modelos ausentes: {', '.join(faltando)}")
+    return {"models": modelos}
+
+
+def _probe_biblia() -> Dict[str, Any]:
+    """Estado do cache local da API da Bíblia (não chama o upstream)."""
+    from app.biblia_api import estado_cache
+
+    return estado_cache()
+
+
+def _probe_cache_rag() -> Dict[str, Any]:
+    """Caches de respostas/recuperação, aquecimento e cobertura."""
+    from app.aquecimento import AQUECIMENTO
+    from app.metrics import coberturas_aquecimento
+
+    st = AQUECIMENTO.status()
+    st["cobertura"] = {
+        c: round(v, 4) for (c,), v in coberturas_aquecimento().items()
+    }
+    return st
+
+
+# nome -> (função, crítico para servir RAG?)
+PROBES: Dict[str, tuple[Callable[[], Dict[str, Any]], bool]] = {
+    "database": (_probe_db, True),
+    "chroma": (_probe_chroma, True),
+    "ollama": (_probe_ollama, True),
+    "biblia_api": (_probe_biblia, False),
+    "cache_rag": (_probe_cache_rag, False),
+}
+
+
+async def _executar_probe(
+    nome: str, fn: Callable[[], Dict[str, Any]]
+) -> Dict[str, Any]:
+    inicio = time.perf_counter()
+    try:
+        detalhe = await asyncio.wait_for(
+            asyncio.to_thread(fn), timeout=PROBE_TIMEOUT
+        )
+        status = "ok"
+    except asyncio.TimeoutError:
+        detalhe = {"error": f"timeout após {PROBE_TIMEOUT}s"}
+        status = "fail"
+    except Exception as e:
+        detalhe = {"error": str(e)}
+        status = "fail"
+    return {
+        "status": status,
+        "latency_ms": round((time.perf_counter() - inicio) * 1000, 2),
+        **detalhe,
+    }
+
+
+_cache: Dict[str, Any] = {"expira": 0.0, "resultado": None}
+_lock = asyncio.Lock()
+
+
+async def verificar_dependencias(forcar: bool = False) -> Dict[str, Any]:
+    """
+    Roda todas as probes em paralelo e guarda o resultado por CACHE_TTL
+    segundos; chamadas concorrentes compartilham a mesma execução.
+    """
+    async with _lock:
+        agora = time.monotonic()
+        if not forcar and _cache["resultado"] and agora < _cache["expira"]:
+            return _cache["resultado"]
+
+        nomes = list(PROBES)
+        resultados = await asyncio.gather(
+            *(_executar_probe(n, PROBES[n][0]) for n in nomes)
+        )
+        checks = dict(zip(nomes, resultados))
+        pronto = all(
+            checks[n]["status"] == "ok" for n in nomes if PROBES[n][1]
+        )
+        resultado = {
+            "status": "ok" if pronto else "fail",
+            "checked_at": time.time(),
+            "checks": checks,
+        }
+        _cache["resultado"] = resultado
+        _cache["expira"] = time.monotonic() + CACHE_TTL
+        return resultado
+
+
+# ----------------------------
+# Endpoints
+# ----------------------------
+@router.get("/health/live")
+def health_live():
+    """Liveness: o processo está de pé e respondendo."""
+    return {"status": "ok"}
+
+
+@router.get("/health/ready")
+async def health_ready():
+    """
+    Readiness: só retorna 200 quando DB, Chroma e Ollama respondem.
+    A API da Bíblia é informativa e não derruba o readiness.
+    """
+    resultado = await verificar_dependencias()
+    code = 200 if resultado["status"] == "ok" else 503
+    return JSONResponse(resultado, status_code=code)
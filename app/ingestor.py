@@ -1,15 +1,31 @@
+import hashlib
+import mimetypes
 import os
+import time
+from typing import Any, Dict, List, Tuple
+
 import fitz  # PyMuPDF
 import docx
 from bs4 import BeautifulSoup
 from pptx import Presentation
-from sqlalchemy import create_engine, Column, Integer, String, Text
+from sqlalchemy import (
+    create_engine, Column, DateTime, Integer, String, Text, func, inspect,
+    text,
+)
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.exc import OperationalError
 
+from app.lexical import metadados_filtro
+from app.logging_utils import get_logger
+from app.metrics import (
+    INGEST_BYTES,
+    INGEST_DOCS,
+    INGEST_DUPLICATES,
+    INGEST_LATENCY,
+    INGEST_QUEUE,
+)
+
 
 def get_user_by_username(username):
     return session.query(User).filter(User.username == username).first()
@@ -42,7 +58,9 @@ except Exception:
     fallback_url = "sqlite:////data/app.db"
     engine = create_engine(fallback_url)
 Session = sessionmaker(bind=engine)
-session = Session()
+# Uma sessão por thread: a ingestão roda no pool de threads da API
+session = scoped_session(Session)
+log = get_logger("ingestor")
 
 Base = declarative_base()
 
@@ -68,9 +86,57 @@ class ConteudoTeologico(Base):
     autor = Column(String)
     tema = Column(String)
     fonte = Column(String)
+    # Origem do arquivo e hash do texto (deduplicação na ingestão)
+    source_path = Column(String(1024))
+    mime_type = Column(String(128))
+    content_hash = Column(String(64), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Quase-duplicatas (app.duplicatas): assinatura MinHash e, nas
+    # cópias, o id do conteúdo original (cópias não são indexadas)
+    minhash = Column(Text)
+    duplicata_de = Column(Integer, index=True)
+
+
+# Colunas adicionadas depois da criação original da tabela
+_COLUNAS_NOVAS = {
+    "source_path": "VARCHAR(1024)",
+    "mime_type": "VARCHAR(128)",
+    "content_hash": "VARCHAR(64)",
+    "created_at": "TIMESTAMP",
+    "minhash": "TEXT",
+    "duplicata_de": "INTEGER",
+}
+
+
+def garantir_schema(eng=None) -> List[str]:
+    """
+    Adiciona em bancos antigos as colunas novas de conteudo_teologico
+    (só ALTER TABLE ADD COLUMN). Devolve as colunas criadas.
+    """
+    eng = eng or engine
+    existentes = {
+        c["name"] for c in inspect(eng).get_columns("conteudo_teologico")
+    }
+    faltando = [c for c in _COLUNAS_NOVAS if c not in existentes]
+    with eng.begin() as conn:
+        for coluna in faltando:
+            conn.execute(text(
+                f"ALTER TABLE conteudo_teologico ADD COLUMN {coluna} "
+                f"{_COLUNAS_NOVAS[coluna]}"
+            ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_conteudo_teologico_content_hash "
+            "ON conteudo_teologico (content_hash)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_conteudo_teologico_duplicata_de "
+            "ON conteudo_teologico (duplicata_de)"
+        ))
+    return faltando
 
 
 Base.metadata.create_all(engine)
+garantir_schema()
 
 
 def extrair_pdf(caminho):
@@ -105,20 +171,215 @@ def extrair_ppt(caminho):
     return "\n".join(texto)
 
 
-def salvar_conteudo(titulo, texto, tipo, autor=None, tema=None, fonte=None):
+def hash_conteudo(texto: str) -> str:
+    """SHA-256 do texto (sem espaços nas bordas): mesma entrada, mesmo id."""
+    return hashlib.sha256((texto or "").strip().encode("utf-8")).hexdigest()
+
+
+def salvar_conteudo(
+    titulo,
+    texto,
+    tipo,
+    autor=None,
+    tema=None,
+    fonte=None,
+    source_path=None,
+    mime_type=None,
+    indexar=True,
+):
+    """
+    Persiste em conteudo_teologico e indexa (BM25 + Chroma). Texto já
+    ingerido devolve o id existente sem gerar embeddings de novo; quase
+    duplicatas seguem EKLESIA_DEDUP (app.duplicatas).
+    """
+    from app import duplicatas
+
+    content_hash = hash_conteudo(texto)
+    existente = session.query(ConteudoTeologico.id).filter(
+        ConteudoTeologico.content_hash == content_hash
+    ).first()
+    if existente:
+        return existente[0]
+    assinatura = original = None
+    if duplicatas.DEDUP in {"link", "skip"}:
+        assinatura = duplicatas.assinar(texto or "")
+        if assinatura is not None:
+            original, sim = duplicatas.indice_lsh().procurar(assinatura)
+        if original is not None:
+            INGEST_DUPLICATES.inc(action=duplicatas.DEDUP)
+            log.info(
+                "quase_duplicata", titulo=titulo, original=original,
+                jaccard=round(sim, 3), acao=duplicatas.DEDUP,
+            )
+            if duplicatas.DEDUP == "skip":
+                return original
     conteudo = ConteudoTeologico(
         titulo=titulo,
         texto=texto,
         tipo=tipo,
         autor=autor,
         tema=tema,
-        fonte=fonte
+        fonte=fonte,
+        source_path=source_path[:1024] if source_path else None,
+        mime_type=mime_type[:128] if mime_type else None,
+        content_hash=content_hash,
+        minhash=duplicatas.codificar(assinatura),
+        duplicata_de=original,
     )
     session.add(conteudo)
     session.commit()
+    INGEST_BYTES.inc(len((texto or "").encode("utf-8")))
+    if original is not None:
+        return conteudo.id
+    if assinatura is not None:
+        duplicatas.indice_lsh().adicionar(conteudo.id, assinatura)
+    if indexar:
+        indexar_conteudo(conteudo)
     return conteudo.id
 
 
+def canonicos(s=None):
+    """Consulta dos conteúdos indexáveis (sem as quase-duplicatas)."""
+    return (s or session).query(ConteudoTeologico).filter(
+        ConteudoTeologico.duplicata_de.is_(None)
+    )
+
+
+# ----------------------------
+# Indexação (BM25 local + Chroma da app.chat)
+# ----------------------------
+CHUNK_CHARS = int(os.getenv("EKLESIA_CHUNK_CHARS", "1500"))
+CHUNK_OVERLAP = int(os.getenv("EKLESIA_CHUNK_OVERLAP", "200"))
+
+
+def fragmentar(texto: str) -> List[str]:
+    """
+    Fragmentos de até CHUNK_CHARS com CHUNK_OVERLAP de sobreposição,
+    cortando de preferência em quebra de linha ou fim de frase.
+    """
+    texto = (texto or "").strip()
+    if len(texto) <= CHUNK_CHARS:
+        return [texto] if texto else []
+    partes = []
+    inicio = 0
+    while inicio < len(texto):
+        fim = min(inicio + CHUNK_CHARS, len(texto))
+        if fim < len(texto):
+            meio = inicio + CHUNK_CHARS // 2
+            corte = max(
+                texto.rfind("\n", meio, fim), texto.rfind(". ", meio, fim)
+            )
+            if corte > inicio:
+                fim = corte + 1
+        partes.append(texto[inicio:fim].strip())
+        if fim >= len(texto):
+            break
+        inicio = max(fim - CHUNK_OVERLAP, inicio + 1)
+    return [p for p in partes if p]
+
+
+def itens_indexaveis(c) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(chave, texto, metadata) de cada fragmento de um conteúdo."""
+    base = {
+        "id": c.id,
+        "titulo": c.titulo,
+        "tipo": c.tipo,
+        "autor": c.autor,
+        "tema": c.tema,
+        "fonte": c.fonte,
+        "source": (
+            os.path.basename(c.source_path) if c.source_path else None
+        ),
+    }
+    # Chroma não aceita None em metadados
+    base = {k: v for k, v in base.items() if v is not None}
+    # Campos normalizados usados pelo `filter=` de recuperar_docs
+    base.update(metadados_filtro(base))
+    return [
+        (f"ct:{c.id}:{i}", trecho,
+         {**base, "doc_key": f"ct:{c.id}:{i}", "chunk": i})
+        for i, trecho in enumerate(fragmentar(c.texto))
+    ]
+
+
+def indexar_conteudo(c) -> int:
+    """Indexa um conteúdo; falhas aqui não derrubam a ingestão."""
+    from app.cache import marcar_indice_alterado
+
+    itens = itens_indexaveis(c)
+    _indexar_lexico(c.id, itens)
+    _indexar_vetorial(itens)
+    marcar_indice_alterado()
+    return len(itens)
+
+
+def desindexar_conteudo(c) -> None:
+    """Tira os fragmentos de um conteúdo do BM25 e da coleção ativa."""
+    chaves = [k for k, _, _ in itens_indexaveis(c)]
+    try:
+        from app.lexical import indice_lexico
+
+        idx = indice_lexico()
+        for chave in chaves:
+            idx.remover(chave)
+        idx.salvar()
+    except Exception as e:
+        log.error("lexico_remocao_falhou", conteudo=c.id, error=str(e))
+    from app import chat
+
+    chat.sincronizar_colecao()
+    if chat.db is not None and chaves:
+        chat.db.delete(ids=chaves)
+    from app.cache import marcar_indice_alterado
+
+    marcar_indice_alterado()
+
+
+def _indexar_lexico(conteudo_id, itens):
+    """Atualiza o índice BM25 local."""
+    try:
+        from app.lexical import indexar_textos, indice_lexico
+
+        # Entrada do formato antigo (documento inteiro, sem fragmentos)
+        indice_lexico().remover(f"ct:{conteudo_id}")
+        indexar_textos([(t, m) for _, t, m in itens])
+    except Exception as e:
+        log.error(
+            "lexico_indexacao_falhou", conteudo=conteudo_id, error=str(e)
+        )
+
+
+def _indexar_vetorial(itens) -> bool:
+    """
+    Grava os fragmentos na coleção ativa do chat (com o modelo de
+    embeddings registrado para ela; ver app.colecoes). Ids estáveis: o
+    Chroma faz upsert, sem duplicar vetores.
+    """
+    if not itens:
+        return False
+    from app import chat
+
+    chat.sincronizar_colecao()
+    if chat.db is None:
+        log.warning(
+            "vetorial_adiado", motivo="RAG em modo mock", itens=len(itens)
+        )
+        return False
+    try:
+        chat.db.add_texts(
+            [t for _, t, _ in itens],
+            metadatas=[m for _, _, m in itens],
+            ids=[k for k, _, _ in itens],
+        )
+        return True
+    except Exception as e:
+        log.error(
+            "vetorial_indexacao_falhou", doc_key=itens[0][0],
+            itens=len(itens), error=str(e),
+        )
+        return False
+
+
 def extrair_metadados_pdf(caminho):
     doc = fitz.open(caminho)
     meta = doc.metadata
@@ -190,11 +451,43 @@ def extrair_metadados_ppt(caminho):
     return autor, tema, None
 
 
-def processar_arquivo(caminho, tipo=None, autor=None, tema=None, fonte=None):
+def processar_arquivo(
+    caminho, tipo=None, autor=None, tema=None, fonte=None, origem=None
+):
+    """
+    Extrai e persiste um arquivo; instrumentado em /metrics. `origem` é
+    o nome do arquivo original quando `caminho` é um temporário (vai
+    para source_path e para o título padrão).
+    """
+    INGEST_QUEUE.inc()
+    inicio = time.perf_counter()
+    try:
+        conteudo_id = _processar_arquivo(
+            caminho, tipo, autor, tema, fonte, origem
+        )
+    except Exception:
+        INGEST_DOCS.inc(result="error")
+        raise
+    finally:
+        INGEST_QUEUE.dec()
+        INGEST_LATENCY.observe(time.perf_counter() - inicio)
+        # Devolve a conexão: a thread do pool fica para outras tarefas
+        session.remove()
+    INGEST_DOCS.inc(result="ok")
+    return conteudo_id
+
+
+_TIPOS_EQUIVALENTES = {"md": "txt", "htm": "html", "pptx": "ppt"}
+
+
+def _processar_arquivo(
+    caminho, tipo=None, autor=None, tema=None, fonte=None, origem=None
+):
     # Detecta tipo por extensão, se não informado
     if not tipo:
         _, ext = os.path.splitext(caminho)
         tipo = ext.lower().lstrip(".")
+    tipo = _TIPOS_EQUIVALENTES.get(tipo, tipo)
 
     if tipo == "pdf":
         texto = extrair_pdf(caminho)
@@ -213,52 +506,55 @@ def processar_arquivo(caminho, tipo=None, autor=None, tema=None, fonte=None):
         auto_autor, auto_tema, auto_titulo = extrair_metadados_ppt(caminho)
     else:
         raise ValueError("Tipo de arquivo não suportado")
-    titulo = auto_titulo or os.path.basename(caminho)
+    origem = origem or caminho
+    titulo = auto_titulo or os.path.basename(origem)
     autor = autor or auto_autor
     tema = tema or auto_tema
+    origem = {
+        "source_path": origem,
+        "mime_type": mimetypes.guess_type(origem)[0],
+    }
     try:
-        return salvar_conteudo(titulo, texto, tipo, autor, tema, fonte)
+        return salvar_conteudo(
+            titulo, texto, tipo, autor, tema, fonte, **origem
+        )
     except OperationalError:
         # Se o DB cair no meio, tenta fallback para SQLite
         try:
             global engine, session
             engine = create_engine("sqlite:////data/app.db")
             SessionLocal = sessionmaker(bind=engine)
-            session = SessionLocal()
+            session = scoped_session(SessionLocal)
             Base.metadata.create_all(engine)
-            return salvar_conteudo(titulo, texto, tipo, autor, tema, fonte)
+            return salvar_conteudo(
+                titulo, texto, tipo, autor, tema, fonte, **origem
+            )
         except Exception as e:
             raise e
 
 
-def indexar_conteudo_teologico():
+def indexar_conteudo_teologico(forcar=False):
     """
-    Indexa todos os textos do banco de dados no ChromaDB usando embeddings
-    Ollama.
+    Indexa no Chroma da app (e no BM25) o conteúdo ainda não indexado;
+    com `forcar`, reindexa tudo. Devolve quantos conteúdos foram
+    indexados.
     """
-    embedding_model = OllamaEmbeddings(model="gemma:2b")
-    db = Chroma(
-        persist_directory="./chroma_db",
-        embedding_function=embedding_model
-    )
-    conteudos = session.query(ConteudoTeologico).all()
-    documentos = []
-    metadados = []
-    for c in conteudos:
-        documentos.append(c.texto)
-        metadados.append({
-            "id": c.id,
-            "titulo": c.titulo,
-            "tipo": c.tipo,
-            "autor": c.autor,
-            "tema": c.tema,
-            "fonte": c.fonte
-        })
-    if documentos:
-        db.add_texts(documentos, metadados)
-        print(f"Indexados {len(documentos)} documentos no ChromaDB.")
-    else:
-        print("Nenhum conteúdo encontrado para indexar.")
+    from app import chat
+
+    chat.sincronizar_colecao()
+    if chat.db is None:
+        raise RuntimeError("RAG em modo mock: sem coleção para indexar.")
+    total = 0
+    try:
+        for c in canonicos().all():
+            if not forcar and chat.db.get(ids=[f"ct:{c.id}:0"])["ids"]:
+                continue
+            if indexar_conteudo(c):
+                total += 1
+    finally:
+        session.remove()
+    log.info("conteudos_indexados", total=total)
+    return total
 
 
 if __name__ == "__main__":
@@ -0,0 +1,629 @@
+# app/jobs.py
+"""
+Fila persistente de jobs de geração (sermão, estudo, devocional, ebook e
+lotes de perguntas), na tabela jobs_geracao do banco de DATABASE_URL.
+
+A API só grava o pedido (`FILA.submeter`) e responde 202; quem gera são
+os workers (`python -m app.jobs worker`), quantos processos forem
+precisos, desde que vejam o mesmo banco e o mesmo CHROMA_PERSIST_DIR. A
+geração não depende mais da conexão HTTP que a pediu.
+
+- Cada worker pega um job pendente com um UPDATE condicional (só um
+  vence), renova `atualizado_em` a cada EKLESIA_JOB_HEARTBEAT_S e grava
+  junto o progresso (chunks gerados, perguntas prontas).
+- Um job "executando" sem batimento há EKLESIA_JOB_LEASE_S (worker
+  morreu) volta para a fila.
+- Falhas voltam para a fila com espera exponencial
+  (EKLESIA_JOB_RETRY_BASE_S · 2^(tentativa-1)) até
+  EKLESIA_JOB_MAX_ATTEMPTS tentativas; depois, estado "erro".
+- Cancelar um job pendente o encerra na hora; um em execução recebe a
+  marca `cancelar` e o worker interrompe a geração (e libera o slot do
+  Ollama) no batimento seguinte.
+- O resultado fica no próprio registro, em JSON.
+
+- EKLESIA_JOBS_INLINE: "1" (padrão) roda um worker dentro de cada
+  processo da API (instalação de um processo só); "0" deixa os jobs só
+  para os workers dedicados
+- EKLESIA_JOB_CONCURRENCY: jobs simultâneos por worker (padrão 1)
+- EKLESIA_JOB_TIMEOUT_S: limite de cada tentativa (padrão 1800)
+
+    python -m app.jobs worker --concorrencia 2
+    python -m app.jobs status <id>
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, \
+    Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import Column, DateTime, Integer, String, Text
+
+from app.ingestor import Base, Session, engine
+from app.logging_utils import get_logger
+from app.metrics import JOBS
+
+load_dotenv()
+
+JOBS_INLINE = os.getenv("EKLESIA_JOBS_INLINE", "1").lower() in {
+    "1", "true", "yes"
+}
+JOB_CONCURRENCY = int(os.getenv("EKLESIA_JOB_CONCURRENCY", "1"))
+JOB_POLL = float(os.getenv("EKLESIA_JOB_POLL_S", "1"))
+JOB_HEARTBEAT = float(os.getenv("EKLESIA_JOB_HEARTBEAT_S", "2"))
+JOB_LEASE = float(os.getenv("EKLESIA_JOB_LEASE_S", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("EKLESIA_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE = float(os.getenv("EKLESIA_JOB_RETRY_BASE_S", "10"))
+JOB_TIMEOUT = float(os.getenv("EKLESIA_JOB_TIMEOUT_S", "1800"))
+
+TERMINAIS = {"concluido", "erro", "cancelado"}
+
+log = get_logger("jobs")
+
+
+class JobGeracao(Base):
+    __tablename__ = "jobs_geracao"
+    id = Column(String(32), primary_key=True)
+    tipo = Column(String(32), nullable=False)
+    dono = Column(String(255), index=True)
+    parametros = Column(Text, nullable=False)
+    # pendente | executando | concluido | erro | cancelado
+    estado = Column(String(16), nullable=False, index=True)
+    tentativas = Column(Integer, nullable=False, default=0)
+    max_tentativas = Column(Integer, nullable=False)
+    cancelar = Column(Integer, nullable=False, default=0)
+    progresso = Column(Text)
+    resultado = Column(Text)
+    erro = Column(Text)
+    worker = Column(String(255))
+    # Datas em UTC sem fuso (o SQLite não guarda o fuso)
+    criado_em = Column(DateTime, nullable=False)
+    disponivel_em = Column(DateTime, nullable=False, index=True)
+    iniciado_em = Column(DateTime)
+    atualizado_em = Column(DateTime)
+    concluido_em = Column(DateTime)
+
+
+Base.metadata.create_all(engine, tables=[JobGeracao.__table__])
+
+
+def _agora() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _iso(d: Optional[datetime]) -> Optional[str]:
+    return d.replace(tzinfo=timezone.utc).isoformat() if d else None
+
+
+def _carregar(texto: Optional[str]) -> Any:
+    return json.loads(texto) if texto else None
+
+
+def _publico(job: JobGeracao) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "tipo": job.tipo,
+        "estado": job.estado,
+        "tentativas": job.tentativas,
+        "max_tentativas": job.max_tentativas,
+        "cancelamento_pedido": bool(job.cancelar)
+        and job.estado == "executando",
+        "progresso": _carregar(job.progresso),
+        "resultado": _carregar(job.resultado),
+        "erro": job.erro,
+        "criado_em": _iso(job.criado_em),
+        "iniciado_em": _iso(job.iniciado_em),
+        "concluido_em": _iso(job.concluido_em),
+    }
+
+
+# ----------------------------
+# Fila (banco)
+# ----------------------------
+class FilaJobs:
+    def __init__(self, sessoes=Session):
+        self._sessoes = sessoes
+
+    @contextmanager
+    def _sessao(self):
+        with self._sessoes() as s, s.begin():
+            yield s
+
+    def submeter(
+        self,
+        tipo: str,
+        parametros: Dict[str, Any],
+        dono: Optional[str] = None,
+        max_tentativas: int = JOB_MAX_ATTEMPTS,
+    ) -> Dict[str, Any]:
+        if tipo not in _EXECUTORES:
+            raise ValueError(
+                f"Tipo de job desconhecido: {tipo} "
+                f"(disponíveis: {', '.join(sorted(_EXECUTORES))})"
+            )
+        agora = _agora()
+        job = JobGeracao(
+            id=uuid.uuid4().hex, tipo=tipo, dono=dono,
+            parametros=json.dumps(parametros, ensure_ascii=False),
+            estado="pendente", tentativas=0,
+            max_tentativas=max(1, max_tentativas), cancelar=0,
+            criado_em=agora, disponivel_em=agora,
+        )
+        with self._sessao() as s:
+            s.add(job)
+            s.flush()
+            publico = _publico(job)
+        JOBS.inc(tipo=tipo, result="submetido")
+        return publico
+
+    def obter(
+        self, job_id: str, dono: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """O job, se existe e é de `dono`."""
+        with self._sessao() as s:
+            job = s.get(JobGeracao, job_id)
+            if job is None or job.dono != dono:
+                return None
+            return _publico(job)
+
+    def listar(
+        self, dono: Optional[str] = None, limite: int = 50
+    ) -> List[Dict[str, Any]]:
+        with self._sessao() as s:
+            jobs = (
+                s.query(JobGeracao)
+                .filter(JobGeracao.dono == dono)
+                .order_by(JobGeracao.criado_em.desc())
+                .limit(limite)
+                .all()
+            )
+            return [
+                {**_publico(j), "resultado": None} for j in jobs
+            ]
+
+    def cancelar(
+        self, job_id: str, dono: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Pendente: cancela já. Executando: pede ao worker."""
+        with self._sessao() as s:
+            job = s.get(JobGeracao, job_id)
+            if job is None or job.dono != dono:
+                return None
+            q = s.query(JobGeracao).filter(JobGeracao.id == job_id)
+            if q.filter(JobGeracao.estado == "pendente").update(
+                {"estado": "cancelado", "concluido_em": _agora()},
+                synchronize_session=False,
+            ):
+                JOBS.inc(tipo=job.tipo, result="cancelado")
+            else:
+                q.filter(JobGeracao.estado == "executando").update(
+                    {"cancelar": 1}, synchronize_session=False
+                )
+            s.expire(job)
+            return _publico(job)
+
+    # ------------------------
+    # Lado do worker
+    # ------------------------
+    def reivindicar(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Passa o pendente mais antigo para `worker` (ou None)."""
+        agora = _agora()
+        with self._sessao() as s:
+            candidatos = (
+                s.query(JobGeracao.id)
+                .filter(
+                    JobGeracao.estado == "pendente",
+                    JobGeracao.disponivel_em <= agora,
+                )
+                .order_by(JobGeracao.criado_em)
+                .limit(8)
+                .all()
+            )
+            for (job_id,) in candidatos:
+                # Condicional: com vários workers, só um troca o estado
+                if s.query(JobGeracao).filter(
+                    JobGeracao.id == job_id, JobGeracao.estado == "pendente"
+                ).update({
+                    "estado": "executando",
+                    "worker": worker,
+                    "tentativas": JobGeracao.tentativas + 1,
+                    "iniciado_em": agora,
+                    "atualizado_em": agora,
+                }, synchronize_session=False):
+                    job = s.get(JobGeracao, job_id)
+                    return {
+                        **_publico(job),
+                        "parametros": json.loads(job.parametros),
+                    }
+        return None
+
+    def _do_worker(self, s, job_id: str, worker: str):
+        return s.query(JobGeracao).filter(
+            JobGeracao.id == job_id,
+            JobGeracao.worker == worker,
+            JobGeracao.estado == "executando",
+        )
+
+    def bater(
+        self, job_id: str, worker: str, progresso: Dict[str, Any]
+    ) -> Optional[bool]:
+        """Batimento com o progresso. Devolve se o cancelamento foi
+        pedido, ou None se o job não é mais deste worker."""
+        with self._sessao() as s:
+            q = self._do_worker(s, job_id, worker)
+            if not q.update({
+                "atualizado_em": _agora(),
+                "progresso": json.dumps(progresso, ensure_ascii=False),
+            }, synchronize_session=False):
+                return None
+            return bool(q.with_entities(JobGeracao.cancelar).scalar())
+
+    def encerrar(
+        self,
+        job_id: str,
+        worker: str,
+        estado: str,
+        progresso: Optional[Dict[str, Any]] = None,
+        resultado: Any = None,
+        erro: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Fecha a tentativa: "concluido", "cancelado" ou "erro" (que volta
+        à fila enquanto houver tentativas) ou "devolvido" (worker
+        parando: volta à fila sem gastar tentativa). Devolve o estado
+        gravado, ou None se o job não é mais deste worker.
+        """
+        agora = _agora()
+        with self._sessao() as s:
+            job = self._do_worker(s, job_id, worker).first()
+            if job is None:
+                return None
+            valores: Dict[str, Any] = {"worker": None, "atualizado_em": agora}
+            if progresso is not None:
+                valores["progresso"] = json.dumps(
+                    progresso, ensure_ascii=False
+                )
+            if estado == "devolvido":
+                valores.update(
+                    estado="pendente", disponivel_em=agora,
+                    tentativas=JobGeracao.tentativas - 1,
+                )
+            elif estado == "erro" and job.tentativas < job.max_tentativas:
+                espera = JOB_RETRY_BASE * 2 ** (job.tentativas - 1)
+                valores.update(
+                    estado="pendente", erro=erro,
+                    disponivel_em=agora + timedelta(seconds=espera),
+                )
+                JOBS.inc(tipo=job.tipo, result="retentativa")
+            else:
+                valores.update(estado=estado, erro=erro, concluido_em=agora)
+                if resultado is not None:
+                    valores["resultado"] = json.dumps(
+                        resultado, ensure_ascii=False, default=str
+                    )
+                JOBS.inc(tipo=job.tipo, result=estado)
+            if not self._do_worker(s, job_id, worker).update(
+                valores, synchronize_session=False
+            ):
+                return None
+            return valores["estado"]
+
+    def recuperar_abandonados(self) -> int:
+        """Devolve à fila os jobs cujo worker parou de bater."""
+        limite = _agora() - timedelta(seconds=JOB_LEASE)
+        recuperados = 0
+        with self._sessao() as s:
+            parados = s.query(JobGeracao.id, JobGeracao.worker).filter(
+                JobGeracao.estado == "executando",
+                JobGeracao.atualizado_em < limite,
+            ).all()
+        for job_id, worker in parados:
+            log.warning("job_abandonado", job=job_id, worker=worker)
+            if self.encerrar(
+                job_id, worker, "erro",
+                erro=f"Worker {worker} parou de responder.",
+            ):
+                recuperados += 1
+        return recuperados
+
+
+FILA = FilaJobs()
+
+
+# ----------------------------
+# Execução por tipo
+# ----------------------------
+Executor = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[Any]]
+_EXECUTORES: Dict[str, Executor] = {}
+
+
+def _executor(tipo: str):
+    def registrar(fn: Executor) -> Executor:
+        _EXECUTORES[tipo] = fn
+        return fn
+
+    return registrar
+
+
+async def _com_progresso(progresso: Dict[str, Any], coro) -> Any:
+    """Roda a geração contando os chunks do LLM em `progresso`."""
+    from app.chat import acompanhar_geracao
+
+    def contar(chunks: int) -> None:
+        progresso["chunks"] = chunks
+
+    with acompanhar_geracao(contar):
+        return await coro
+
+
+@_executor("sermao")
+async def _sermao(p: Dict[str, Any], progresso: Dict[str, Any]) -> Any:
+    from app.sermoes.generator import agerar_sermao
+
+    return await _com_progresso(progresso, agerar_sermao(
+        p["tipo"], p["tema"], p["versiculos"], p["num_topicos"],
+        p.get("autor"),
+    ))
+
+
+@_executor("estudo")
+async def _estudo(p: Dict[str, Any], progresso: Dict[str, Any]) -> Any:
+    from app.sermoes.generator import agerar_estudo_biblico
+
+    return await _com_progresso(progresso, agerar_estudo_biblico(
+        p["tema"], p["versiculos"], p.get("autor")
+    ))
+
+
+@_executor("devocional")
+async def _devocional(p: Dict[str, Any], progresso: Dict[str, Any]) -> Any:
+    from app.sermoes.generator import agerar_devocional
+
+    return await _com_progresso(progresso, agerar_devocional(
+        p["tema"], p["versiculo"], p.get("autor")
+    ))
+
+
+@_executor("ebook")
+async def _ebook(p: Dict[str, Any], progresso: Dict[str, Any]) -> Any:
+    from app.sermoes.generator import agerar_ebook
+
+    return await _com_progresso(progresso, agerar_ebook(
+        p["tema"], p["capitulos"], p.get("autor")
+    ))
+
+
+@_executor("lote")
+async def _lote(p: Dict[str, Any], progresso: Dict[str, Any]) -> Any:
+    from app.lote import responder_lote
+
+    eventos = []
+    progresso["prontas"] = 0
+    async for evento in responder_lote(p["perguntas"], p.get("filtros")):
+        eventos.append(evento)
+        if evento["tipo"] == "inicio":
+            progresso["unicas"] = evento["unicas"]
+        elif evento["tipo"] in {"resposta", "erro"}:
+            progresso["prontas"] += 1
+    return {"eventos": eventos}
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+class Worker:
+    """Pega jobs da fila e os executa, até `concorrencia` por vez."""
+
+    def __init__(
+        self,
+        concorrencia: int = JOB_CONCURRENCY,
+        nome: Optional[str] = None,
+        fila: FilaJobs = FILA,
+    ):
+        self.concorrencia = max(1, concorrencia)
+        self.nome = nome or f"{socket.gethostname()}:{os.getpid()}"
+        self.fila = fila
+        self._gerando: Dict[str, asyncio.Task] = {}
+        self._execucoes: set = set()
+        self._parando = False
+        self._acordar: Optional[asyncio.Event] = None
+
+    async def rodar(self) -> None:
+        self._acordar = asyncio.Event()
+        log.info("jobs_worker_iniciado", worker=self.nome,
+                 concorrencia=self.concorrencia)
+        while not self._parando:
+            try:
+                await asyncio.to_thread(self.fila.recuperar_abandonados)
+                while len(self._execucoes) < self.concorrencia:
+                    job = await asyncio.to_thread(
+                        self.fila.reivindicar, self.nome
+                    )
+                    if job is None:
+                        break
+                    execucao = asyncio.create_task(self._executar(job))
+                    self._execucoes.add(execucao)
+                    execucao.add_done_callback(self._execucoes.discard)
+            except Exception as e:
+                log.error("jobs_worker_erro", worker=self.nome, error=str(e))
+            self._acordar.clear()
+            try:
+                await asyncio.wait_for(self._acordar.wait(), JOB_POLL)
+            except asyncio.TimeoutError:
+                pass
+        # Parando: o que estava gerando volta para a fila
+        if self._execucoes:
+            await asyncio.wait(set(self._execucoes))
+
+    def parar(self) -> None:
+        self._parando = True
+        for tarefa in self._gerando.values():
+            tarefa.cancel()
+        if self._acordar is not None:
+            self._acordar.set()
+
+    async def _executar(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        progresso: Dict[str, Any] = dict(job.get("progresso") or {})
+        # Chunks contados em tentativas anteriores não somam de novo
+        progresso.pop("chunks", None)
+        log.info("job_iniciado", job=job_id, tipo=job["tipo"],
+                 tentativa=job["tentativas"])
+        gerar = asyncio.create_task(
+            _EXECUTORES[job["tipo"]](job["parametros"], progresso)
+        )
+        self._gerando[job_id] = gerar
+        inicio = time.monotonic()
+        motivo = None
+        try:
+            while not gerar.done():
+                await asyncio.wait({gerar}, timeout=JOB_HEARTBEAT)
+                if gerar.done():
+                    break
+                cancelar = await asyncio.to_thread(
+                    self.fila.bater, job_id, self.nome, dict(progresso)
+                )
+                if cancelar is None:
+                    motivo = "perdido"
+                elif cancelar:
+                    motivo = "cancelado"
+                elif time.monotonic() - inicio > JOB_TIMEOUT:
+                    motivo = "tempo"
+                if motivo:
+                    gerar.cancel()
+                    await asyncio.wait({gerar})
+        finally:
+            self._gerando.pop(job_id, None)
+
+        if gerar.cancelled():
+            estado, erro = {
+                "cancelado": ("cancelado", None),
+                "tempo": ("erro", f"Tempo esgotado ({JOB_TIMEOUT:.0f} s)."),
+                None: ("devolvido", None),  # worker parando
+            }.get(motivo, (None, None))
+            if estado is None:
+                log.warning("job_perdido", job=job_id, worker=self.nome)
+                return
+            final = await asyncio.to_thread(
+                self.fila.encerrar, job_id, self.nome, estado,
+                dict(progresso), None, erro,
+            )
+        elif gerar.exception() is not None:
+            erro = str(gerar.exception()) or type(gerar.exception()).__name__
+            final = await asyncio.to_thread(
+                self.fila.encerrar, job_id, self.nome, "erro",
+                dict(progresso), None, erro,
+            )
+        else:
+            final = await asyncio.to_thread(
+                self.fila.encerrar, job_id, self.nome, "concluido",
+                dict(progresso), gerar.result(),
+            )
+        log.info("job_encerrado", job=job_id, tipo=job["tipo"],
+                 estado=final, duracao_s=round(time.monotonic() - inicio, 1))
+
+
+# Worker dentro da API (EKLESIA_JOBS_INLINE)
+_inline: Optional[Worker] = None
+_inline_tarefa: Optional[asyncio.Task] = None
+
+
+def iniciar_worker_inline() -> bool:
+    global _inline, _inline_tarefa
+    if not JOBS_INLINE or _inline is not None:
+        return False
+    _inline = Worker()
+    _inline_tarefa = asyncio.get_running_loop().create_task(_inline.rodar())
+    return True
+
+
+async def parar_worker_inline() -> None:
+    global _inline, _inline_tarefa
+    if _inline is None:
+        return
+    _inline.parar()
+    await _inline_tarefa
+    _inline, _inline_tarefa = None, None
+
+
+# ----------------------------
+# Progresso via SSE
+# ----------------------------
+async def eventos_sse(
+    job_id: str, dono: Optional[str], request: Any = None
+) -> AsyncIterator[bytes]:
+    """
+    Estado do job a cada mudança (`event: job`), lido do banco a cada
+    EKLESIA_JOB_POLL_S; o último evento traz o resultado. Sem mudanças,
+    manda `: ping` a cada EKLESIA_SSE_HEARTBEAT_S.
+    """
+    from app.streaming import SSE_HEARTBEAT, SSE_RETRY_MS, formatar_evento
+
+    yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+    anterior = None
+    ocioso = time.monotonic()
+    while True:
+        job = await asyncio.to_thread(FILA.obter, job_id, dono)
+        if job is None:
+            return
+        terminal = job["estado"] in TERMINAIS
+        if not terminal:
+            job.pop("resultado", None)
+        if job != anterior:
+            anterior = job
+            ocioso = time.monotonic()
+            yield formatar_evento(job, nome="job")
+        elif time.monotonic() - ocioso >= SSE_HEARTBEAT:
+            ocioso = time.monotonic()
+            yield b": ping\n\n"
+        if terminal:
+            return
+        if request is not None and await request.is_disconnected():
+            return
+        await asyncio.sleep(JOB_POLL)
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    sub = p.add_subparsers(dest="comando", required=True)
+    w = sub.add_parser("worker", help="executa jobs da fila")
+    w.add_argument("--concorrencia", type=int, default=JOB_CONCURRENCY)
+    st = sub.add_parser("status", help="estado de um job")
+    st.add_argument("id")
+    st.add_argument("--dono")
+    args = p.parse_args(argv)
+
+    if args.comando == "status":
+        job = FILA.obter(args.id, args.dono)
+        print(json.dumps(job, ensure_ascii=False, indent=2))
+        return 0 if job else 1
+
+    import signal
+
+    async def rodar():
+        worker = Worker(args.concorrencia)
+        loop = asyncio.get_running_loop()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sinal, worker.parar)
+        await worker.rodar()
+
+    asyncio.run(rodar())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
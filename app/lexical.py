@@ -0,0 +1,474 @@
+# app/lexical.py
+"""
+Índice invertido BM25 local sobre o acervo (fragmentos de
+conteudo_teologico, as mesmas chaves da coleção do Chroma).
+
+O índice é atualizado incrementalmente na ingestão e persistido em
+`LEXICAL_INDEX_PATH` (padrão `<CHROMA_PERSIST_DIR>/lexical_index.json`):
+um snapshot JSON mais um diário (`<path>.<geração>.log`, uma linha por
+documento adicionado ou removido). `salvar()` só acrescenta ao diário
+as mudanças do processo, sob flock, depois de aplicar as dos outros
+workers; quando o diário passa do tamanho do snapshot, o índice inteiro
+vira um snapshot novo (geração nova). Os workers leem do diário só o
+que ainda não aplicaram e recarregam tudo quando o snapshot muda.
+
+Reconstrução completa a partir do banco:
+    python -m app.lexical --rebuild
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INDEX_PATH = os.getenv(
+    "LEXICAL_INDEX_PATH",
+    os.path.join(
+        os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"), "lexical_index.json"
+    ),
+)
+# Intervalo mínimo (s) entre checagens de mtime para recarregar o índice
+RELOAD_INTERVAL = float(os.getenv("LEXICAL_RELOAD_INTERVAL", "5"))
+# Diário menor que isso nunca dispara um snapshot novo
+COMPACT_MIN_BYTES = 1 << 20
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e ela ele em entre era essa esse
+esta este eu foi for ha isso la lhe mais mas me mesmo na nas nem no nos
+o os ou para pela pelas pelo pelos por qual quando que quem se sem ser
+seu sua suas seus so sobre tambem te tem um uma umas uns voce
+el la los las del y en por con para es
+the of and to in is that for on with as
+""".split())
+
+_TOKEN_RE = re.compile(r"\d+:\d+|\w+", re.UNICODE)
+
+
+def sem_acentos(texto: str) -> str:
+    nfkd = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in nfkd if not unicodedata.combining(c))
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Minúsculas, sem acentos, sem stopwords; mantém refs como `2:8`."""
+    texto = sem_acentos((texto or "").lower())
+    return [
+        t for t in _TOKEN_RE.findall(texto)
+        if t not in _STOPWORDS and (len(t) > 1 or t.isdigit())
+    ]
+
+
+# Metadados filtráveis (app.chat.recuperar_docs)
+CAMPOS_FILTRO = ("autor", "tema", "tipo")
+
+
+def normalizar_valor(valor: Any) -> str:
+    return sem_acentos(str(valor).strip().casefold())
+
+
+def limpar_filtros(filtros: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Só campos conhecidos com valor, já normalizados."""
+    return {
+        campo: normalizar_valor(valor)
+        for campo, valor in (filtros or {}).items()
+        if campo in CAMPOS_FILTRO and valor and str(valor).strip()
+    }
+
+
+def metadados_filtro(metadata: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Campos `<campo>_norm` gravados junto ao vetor para o `filter=`."""
+    m = metadata or {}
+    return {
+        f"{campo}_norm": normalizar_valor(m[campo])
+        for campo in CAMPOS_FILTRO
+        if m.get(campo)
+    }
+
+
+def filtro_chroma(filtros: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Cláusula `where` do Chroma a partir de `limpar_filtros`."""
+    clausulas = [{f"{c}_norm": v} for c, v in filtros.items()]
+    if not clausulas:
+        return None
+    return clausulas[0] if len(clausulas) == 1 else {"$and": clausulas}
+
+
+def chave_doc(texto: str, metadata: Optional[Dict[str, Any]]) -> str:
+    """Identificador comum entre o índice léxico e o vetorial."""
+    m = metadata or {}
+    if m.get("doc_key"):
+        return str(m["doc_key"])
+    if m.get("id") is not None:
+        return f"ct:{m['id']}"
+    return hashlib.sha1((texto or "").encode("utf-8")).hexdigest()
+
+
+class _Trava:
+    """flock no `<path>.lock` (escritores de processos diferentes)."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._f = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        self._f = open(self.caminho, "a")
+        try:
+            import fcntl
+
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        except ImportError:  # pragma: no cover - Windows
+            pass
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()  # fechar libera o flock
+
+
+class IndiceBM25:
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        # Snapshot lido (inode, mtime) e bytes do diário já aplicados
+        self._snapshot: Optional[Tuple[int, int]] = None
+        self._geracao = "0"
+        self._aplicado = 0
+        # Mudanças deste processo ainda não gravadas no diário
+        self._pendentes: List[Dict[str, Any]] = []
+        self._checado = 0.0
+        self._limpar()
+
+    def _limpar(self) -> None:
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.total_len = 0
+        # "campo=valor" normalizado -> chaves (derivado de `docs`)
+        self.meta_postings: Dict[str, set] = {}
+
+    def _indexar_meta(self, chave: str, metadata: Dict[str, Any]) -> None:
+        for campo, valor in limpar_filtros(metadata).items():
+            self.meta_postings.setdefault(f"{campo}={valor}", set()).add(
+                chave
+            )
+
+    def _desindexar_meta(self, chave: str, metadata: Dict[str, Any]) -> None:
+        for campo, valor in limpar_filtros(metadata).items():
+            chaves = self.meta_postings.get(f"{campo}={valor}")
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self.meta_postings[f"{campo}={valor}"]
+
+    # ------------------------
+    # Persistência
+    # ------------------------
+    def _diario(self) -> str:
+        return f"{self.path}.{self._geracao}.log"
+
+    def carregar(self) -> None:
+        """Snapshot + diário; mudanças ainda não salvas são mantidas."""
+        with self._lock:
+            self._limpar()
+            self._snapshot, self._geracao, self._aplicado = None, "0", 0
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    st = os.fstat(f.fileno())
+                    dados = json.load(f)
+            except FileNotFoundError:
+                dados, st = None, None
+            if dados is not None:
+                self._snapshot = (st.st_ino, st.st_mtime_ns)
+                self._geracao = dados.get("geracao", "0")
+                self.postings = dados.get("postings", {})
+                self.doc_len = dados.get("doc_len", {})
+                self.docs = dados.get("docs", {})
+                self.total_len = sum(self.doc_len.values())
+                for chave, d in self.docs.items():
+                    self._indexar_meta(chave, d["metadata"])
+            self._aplicar_diario()
+
+    def _snapshot_atual(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _aplicar_diario(self) -> None:
+        """Aplica o que outros processos gravaram desde a última leitura
+        e reaplica por cima as mudanças pendentes deste."""
+        try:
+            with open(self._diario(), "rb") as f:
+                f.seek(self._aplicado)
+                novo = f.read()
+        except FileNotFoundError:
+            novo = b""
+        # Só linhas completas (um escritor pode estar no meio de uma)
+        novo = novo[:novo.rfind(b"\n") + 1]
+        for linha in novo.splitlines():
+            self._aplicar(json.loads(linha))
+        self._aplicado += len(novo)
+        for op in self._pendentes:
+            self._aplicar(op)
+
+    def _aplicar(self, op: Dict[str, Any]) -> None:
+        if op["op"] == "+":
+            self._adicionar(op["k"], op["t"], op["m"])
+        else:
+            self._remover(op["k"])
+
+    def _sincronizar(self) -> None:
+        if self._snapshot_atual() != self._snapshot:
+            self.carregar()
+        else:
+            self._aplicar_diario()
+
+    def salvar(self, completo: bool = False) -> None:
+        """
+        Grava as mudanças pendentes no diário (sob flock, depois de
+        aplicar as dos outros processos). `completo` grava o índice em
+        memória como snapshot novo, descartando o que está em disco
+        (reconstrução).
+        """
+        with self._lock, _Trava(self.path + ".lock"):
+            if not completo:
+                self._sincronizar()
+                if self._pendentes:
+                    linhas = b"".join(
+                        json.dumps(op, ensure_ascii=False).encode("utf-8")
+                        + b"\n"
+                        for op in self._pendentes
+                    )
+                    with open(self._diario(), "ab") as f:
+                        f.write(linhas)
+                    self._aplicado += len(linhas)
+                    self._pendentes = []
+                try:
+                    tamanho = os.path.getsize(self.path)
+                except OSError:
+                    tamanho = 0
+                if self._aplicado <= max(COMPACT_MIN_BYTES, tamanho):
+                    return
+            self._gravar_snapshot()
+
+    def _gravar_snapshot(self) -> None:
+        """Escrita atômica (tmp + rename) para leitores concorrentes."""
+        antigo = self._diario()
+        pasta = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(pasta, exist_ok=True)
+        geracao = uuid.uuid4().hex[:12]
+        fd, tmp = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({
+                "geracao": geracao,
+                "postings": self.postings,
+                "doc_len": self.doc_len,
+                "docs": self.docs,
+            }, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self._snapshot = self._snapshot_atual()
+        self._geracao, self._aplicado, self._pendentes = geracao, 0, []
+        try:
+            os.remove(antigo)
+        except OSError:
+            pass
+
+    def recarregar_se_mudou(self) -> None:
+        agora = time.monotonic()
+        if agora - self._checado < RELOAD_INTERVAL:
+            return
+        self._checado = agora
+        with self._lock:
+            self._sincronizar()
+
+    # ------------------------
+    # Atualização incremental
+    # ------------------------
+    def remover(self, chave: str) -> None:
+        with self._lock:
+            if chave in self.docs:
+                self._pendentes.append({"op": "-", "k": chave})
+                self._remover(chave)
+
+    def adicionar(
+        self, texto: str, metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        chave = chave_doc(texto, metadata)
+        with self._lock:
+            self._pendentes.append(
+                {"op": "+", "k": chave, "t": texto, "m": metadata or {}}
+            )
+            self._adicionar(chave, texto, metadata or {})
+        return chave
+
+    def _remover(self, chave: str) -> None:
+        if chave not in self.docs:
+            return
+        for termo in set(tokenizar(self.docs[chave]["text"])):
+            lista = self.postings.get(termo)
+            if lista is not None:
+                lista.pop(chave, None)
+                if not lista:
+                    del self.postings[termo]
+        self.total_len -= self.doc_len.pop(chave, 0)
+        self._desindexar_meta(chave, self.docs[chave]["metadata"])
+        del self.docs[chave]
+
+    def _adicionar(
+        self, chave: str, texto: str, metadata: Dict[str, Any]
+    ) -> None:
+        tokens = tokenizar(texto)
+        self._remover(chave)
+        for termo, tf in Counter(tokens).items():
+            self.postings.setdefault(termo, {})[chave] = tf
+        self.doc_len[chave] = len(tokens)
+        self.total_len += len(tokens)
+        self.docs[chave] = {"text": texto, "metadata": metadata}
+        self._indexar_meta(chave, metadata)
+
+    # ------------------------
+    # Consulta
+    # ------------------------
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def filtrar(self, filtros: Dict[str, Any]) -> Optional[set]:
+        """Chaves que atendem a todos os filtros (None = sem filtro)."""
+        filtros = limpar_filtros(filtros)
+        if not filtros:
+            return None
+        with self._lock:
+            conjuntos = sorted(
+                (self.meta_postings.get(f"{c}={v}", set())
+                 for c, v in filtros.items()),
+                key=len,
+            )
+            return set(conjuntos[0]).intersection(*conjuntos[1:])
+
+    def buscar(
+        self,
+        consulta: str,
+        k: int = 8,
+        filtros: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Top-k por BM25 (Okapi), opcionalmente restrito por metadados."""
+        termos = tokenizar(consulta)
+        # Leitura sob o lock: a ingestão muda os dicts de outra thread
+        with self._lock:
+            return self._buscar(termos, k, filtros)
+
+    def _buscar(self, termos, k, filtros) -> List[Tuple[str, float]]:
+        n = len(self.docs)
+        permitidos = self.filtrar(filtros or {})
+        if not termos or not n or permitidos == set():
+            return []
+        avgdl = self.total_len / n if n else 1.0
+        scores: Dict[str, float] = {}
+        for termo in set(termos):
+            lista = self.postings.get(termo)
+            if not lista:
+                continue
+            df = len(lista)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            if permitidos is not None and len(permitidos) < len(lista):
+                itens = [(c, lista[c]) for c in permitidos if c in lista]
+            else:
+                itens = lista.items()
+            for chave, tf in itens:
+                if permitidos is not None and chave not in permitidos:
+                    continue
+                dl = self.doc_len.get(chave, 0)
+                denom = tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl)
+                scores[chave] = scores.get(chave, 0.0) + (
+                    idf * tf * (BM25_K1 + 1) / denom
+                )
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+    def cobertura(self, consulta: str, chave: str) -> float:
+        """Fração dos termos da consulta presentes no documento."""
+        termos = set(tokenizar(consulta))
+        if not termos:
+            return 0.0
+        with self._lock:
+            achados = sum(
+                1 for t in termos if chave in self.postings.get(t, {})
+            )
+        return achados / len(termos)
+
+    def documento(self, chave: str):
+        with self._lock:
+            d = self.docs[chave]
+            meta = {**d["metadata"], "doc_key": chave}
+        return SimpleNamespace(page_content=d["text"], metadata=meta)
+
+
+_indice: Optional[IndiceBM25] = None
+_indice_lock = threading.Lock()
+
+
+def indice_lexico() -> IndiceBM25:
+    """Instância compartilhada do processo (carregada sob demanda)."""
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                idx = IndiceBM25()
+                idx.carregar()
+                _indice = idx
+    _indice.recarregar_se_mudou()
+    return _indice
+
+
+def indexar_textos(
+    itens: Iterable[Tuple[str, Dict[str, Any]]], salvar: bool = True
+) -> int:
+    """Adiciona (texto, metadata) ao índice compartilhado."""
+    idx = indice_lexico()
+    total = 0
+    for texto, meta in itens:
+        if texto:
+            idx.adicionar(texto, meta)
+            total += 1
+    if salvar and total:
+        idx.salvar()
+    return total
+
+
+def reconstruir_do_banco() -> int:
+    """Recria o índice a partir de conteudo_teologico (por fragmento)."""
+    from app.ingestor import canonicos, itens_indexaveis
+
+    idx = indice_lexico()
+    with idx._lock:
+        idx._limpar()
+        for c in canonicos().all():
+            for _, texto, meta in itens_indexaveis(c):
+                idx._adicionar(chave_doc(texto, meta), texto, meta or {})
+        idx.salvar(completo=True)
+    return len(idx)
+
+
+if __name__ == "__main__":
+    if "--rebuild" in sys.argv:
+        print(f"Índice léxico reconstruído: {reconstruir_do_banco()} docs")
+    else:
+        print(__doc__)
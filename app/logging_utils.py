@@ -0,0 +1,109 @@
+# app/logging_utils.py
+"""
+Camada de logging estruturado (JSON por linha) para os módulos da app.
+
+- Nível global via EKLESIA_LOG_LEVEL (padrão INFO).
+- Payloads truncados em EKLESIA_LOG_MAX_PAYLOAD caracteres.
+- Chaves de API redigidas em URLs e dicionários de parâmetros.
+- Eventos de debug de alto volume são amostrados
+  (EKLESIA_LOG_DEBUG_SAMPLE, fração entre 0 e 1).
+
+Com debug desligado, `StructuredLogger.debug` retorna após uma única
+checagem de nível (cacheada pelo `logging`), sem montar mensagem alguma.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import re
+from typing import Any, Dict, Mapping
+
+LOG_LEVEL = os.getenv("EKLESIA_LOG_LEVEL", "INFO").upper()
+MAX_PAYLOAD = int(os.getenv("EKLESIA_LOG_MAX_PAYLOAD", "500"))
+DEBUG_SAMPLE_RATE = float(os.getenv("EKLESIA_LOG_DEBUG_SAMPLE", "0.1"))
+
+_SENSITIVE_KEYS = {"key", "api_key", "apikey", "token", "password"}
+_SENSITIVE_QS = re.compile(
+    r"([?&](?:key|api_key|apikey|token)=)[^&#\s]*", re.IGNORECASE
+)
+
+_root = logging.getLogger("eklesia")
+if not _root.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(
+        logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | "
+                          "%(message)s")
+    )
+    _root.addHandler(_handler)
+    _root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    _root.propagate = False
+
+
+def redigir_url(url: str) -> str:
+    """Substitui valores de chaves sensíveis na query string por ***."""
+    return _SENSITIVE_QS.sub(r"\1***", url or "")
+
+
+def redigir_params(params: Mapping[str, Any] | None) -> Dict[str, Any]:
+    return {
+        k: ("***" if k.lower() in _SENSITIVE_KEYS else v)
+        for k, v in (params or {}).items()
+    }
+
+
+def truncar(texto: Any, limite: int = MAX_PAYLOAD) -> str:
+    texto = str(texto)
+    if len(texto) <= limite:
+        return texto
+    return f"{texto[:limite]}...(+{len(texto) - limite} chars)"
+
+
+class StructuredLogger:
+    """Wrapper fino sobre `logging.Logger` que emite JSON."""
+
+    def __init__(self, nome: str, sample_rate: float = DEBUG_SAMPLE_RATE):
+        self._logger = logging.getLogger(f"eklesia.{nome}")
+        self.sample_rate = sample_rate
+
+    @property
+    def debug_enabled(self) -> bool:
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def _emit(self, level: int, evento: str, campos: Dict[str, Any]):
+        dados = {"event": evento}
+        for k, v in campos.items():
+            if callable(v):
+                v = v()  # valores caros são avaliados só aqui
+            if isinstance(v, str):
+                v = truncar(redigir_url(v))
+            elif isinstance(v, Mapping):
+                v = redigir_params(v)
+            dados[k] = v
+        self._logger.log(
+            level, json.dumps(dados, ensure_ascii=False, default=str)
+        )
+
+    def debug(self, evento: str, **campos: Any) -> None:
+        """Debug amostrado; campos podem ser callables (avaliação lazy)."""
+        if not self._logger.isEnabledFor(logging.DEBUG):
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self._emit(logging.DEBUG, evento, campos)
+
+    def info(self, evento: str, **campos: Any) -> None:
+        if self._logger.isEnabledFor(logging.INFO):
+            self._emit(logging.INFO, evento, campos)
+
+    def warning(self, evento: str, **campos: Any) -> None:
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._emit(logging.WARNING, evento, campos)
+
+    def error(self, evento: str, **campos: Any) -> None:
+        self._emit(logging.ERROR, evento, campos)
+
+
+def get_logger(nome: str, **kwargs: Any) -> StructuredLogger:
+    return StructuredLogger(nome, **kwargs)
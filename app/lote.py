@@ -0,0 +1,184 @@
+# app/lote.py
+"""
+Perguntas em lote (catecismos, roteiros de estudo): `/perguntar/lote`.
+
+As perguntas repetidas (mesma chave normalizada de app.singleflight) são
+respondidas uma vez só; o resultado de cada pergunta única traz os
+índices de todas as posições em que ela aparece no lote. As que já estão
+no cache de respostas (app.cache) saem na hora. As demais passam pela
+recuperação em blocos de EKLESIA_BATCH_RETRIEVAL_SIZE perguntas
+(`chat.recuperar_lote`: embeddings numa chamada só e busca vetorial de
+uma vez) e pela geração com no máximo EKLESIA_BATCH_CONCURRENCY
+perguntas simultâneas; a recuperação do bloco seguinte corre enquanto o
+anterior gera.
+
+Os eventos (um objeto JSON por linha, NDJSON) saem na ordem em que
+ficam prontos:
+  {"tipo": "inicio", "total": n, "unicas": m}
+  {"tipo": "resposta", "indices": [...], "pergunta", "resposta",
+   "fontes", "origem": "cache"|"gerada"}
+  {"tipo": "erro", "indices": [...], "pergunta", "erro"}
+  {"tipo": "fim", "respondidas", "em_cache", "erros", "duracao_s"}
+
+Em modo job o lote roda na fila de jobs (app.jobs, tipo "lote"); os
+mesmos eventos ficam no resultado do job.
+
+- EKLESIA_BATCH_MAX: perguntas por lote (500)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.logging_utils import get_logger
+from app.metrics import BATCH_QUESTIONS
+from app.singleflight import chave_pergunta
+
+load_dotenv()
+
+BATCH_MAX = int(os.getenv("EKLESIA_BATCH_MAX", "500"))
+BATCH_CONCURRENCY = int(os.getenv("EKLESIA_BATCH_CONCURRENCY", "4"))
+BATCH_RETRIEVAL_SIZE = int(os.getenv("EKLESIA_BATCH_RETRIEVAL_SIZE", "64"))
+
+log = get_logger("lote")
+
+
+def agrupar(
+    perguntas: List[str], filtros: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Perguntas únicas, na ordem da primeira ocorrência, com os índices
+    de todas as ocorrências. Perguntas vazias são ignoradas."""
+    grupos: Dict[str, Dict[str, Any]] = {}
+    for i, pergunta in enumerate(perguntas):
+        pergunta = (pergunta or "").strip()
+        if not pergunta:
+            continue
+        chave = chave_pergunta(pergunta, filtros)
+        if chave in grupos:
+            grupos[chave]["indices"].append(i)
+        else:
+            grupos[chave] = {"pergunta": pergunta, "indices": [i]}
+    return list(grupos.values())
+
+
+def _evento_resposta(
+    grupo: Dict[str, Any], resultado: Dict[str, Any], origem: str
+) -> Dict[str, Any]:
+    return {
+        "tipo": "resposta",
+        "indices": grupo["indices"],
+        "pergunta": grupo["pergunta"],
+        "resposta": resultado.get("resposta"),
+        "fontes": resultado.get("fontes") or [],
+        "origem": origem,
+    }
+
+
+async def responder_lote(
+    perguntas: List[str],
+    filtros: Optional[Dict[str, Any]] = None,
+    concorrencia: int = BATCH_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Eventos do lote (vide docstring do módulo), à medida que saem."""
+    from app import chat
+
+    inicio = time.monotonic()
+    grupos = agrupar(perguntas, filtros)
+    repetidas = sum(len(g["indices"]) - 1 for g in grupos)
+    if repetidas:
+        BATCH_QUESTIONS.inc(repetidas, result="duplicada")
+    yield {"tipo": "inicio", "total": len(perguntas), "unicas": len(grupos)}
+
+    contagem = {"respondidas": 0, "em_cache": 0, "erros": 0}
+    pendentes = []
+    for g in grupos:
+        guardada = chat.resposta_em_cache(g["pergunta"], filtros)
+        if guardada is None:
+            pendentes.append(g)
+            continue
+        contagem["respondidas"] += 1
+        contagem["em_cache"] += 1
+        BATCH_QUESTIONS.inc(result="cache")
+        yield _evento_resposta(g, chat.finalizar(**guardada), "cache")
+
+    loop = asyncio.get_running_loop()
+    blocos = [
+        pendentes[i:i + BATCH_RETRIEVAL_SIZE]
+        for i in range(0, len(pendentes), BATCH_RETRIEVAL_SIZE)
+    ]
+    recuperacoes = [loop.create_future() for _ in blocos]
+
+    async def recuperar():
+        for bloco, futuro in zip(blocos, recuperacoes):
+            try:
+                futuro.set_result(await chat.em_thread(
+                    chat.recuperar_lote, [g["pergunta"] for g in bloco],
+                    8, 0.25, filtros,
+                ))
+            except Exception as e:
+                futuro.set_exception(e)
+
+    vagas = asyncio.Semaphore(max(1, concorrencia))
+
+    async def responder(g, futuro, i):
+        try:
+            recuperados = (await futuro)[i]
+            async with vagas:
+                r = await chat.aresponder_pergunta_com_versiculo(
+                    g["pergunta"], filtros, recuperados=recuperados
+                )
+            return g, r, None
+        except Exception as e:
+            return g, None, e
+
+    tarefas = [loop.create_task(recuperar())] if blocos else []
+    respostas = [
+        loop.create_task(responder(g, futuro, i))
+        for bloco, futuro in zip(blocos, recuperacoes)
+        for i, g in enumerate(bloco)
+    ]
+    tarefas.extend(respostas)
+    try:
+        for pronta in asyncio.as_completed(respostas):
+            g, r, erro = await pronta
+            if erro is not None:
+                contagem["erros"] += 1
+                BATCH_QUESTIONS.inc(result="erro")
+                log.warning("lote_pergunta_erro", error=str(erro))
+                yield {
+                    "tipo": "erro",
+                    "indices": g["indices"],
+                    "pergunta": g["pergunta"],
+                    "erro": str(erro),
+                }
+                continue
+            contagem["respondidas"] += 1
+            BATCH_QUESTIONS.inc(result="gerada")
+            yield _evento_resposta(g, r, "gerada")
+    finally:
+        # Cliente desconectou (ou job cancelado): para o que falta
+        for t in tarefas:
+            t.cancel()
+
+    yield {
+        "tipo": "fim",
+        **contagem,
+        "duracao_s": round(time.monotonic() - inicio, 2),
+    }
+
+
+async def ndjson(
+    eventos: AsyncIterator[Dict[str, Any]],
+) -> AsyncIterator[bytes]:
+    async for evento in eventos:
+        yield linha_ndjson(evento)
+
+
+def linha_ndjson(evento: Dict[str, Any]) -> bytes:
+    """Um evento do lote como linha NDJSON (stream e resultado do job)."""
+    return json.dumps(evento, ensure_ascii=False).encode("utf-8") + b"\n"
@@ -0,0 +1,487 @@
+# app/metrics.py
+"""
+Métricas no formato texto do Prometheus, sem dependências externas.
+
+Cada worker do uvicorn mantém seu próprio registro em memória; o scrape
+deve ser feito por worker (ou agregado no Prometheus via `sum by`).
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.tracing import registrar_stage
+
+# Rota (template) da requisição corrente; preenchida pelo middleware
+_rota: ContextVar[str] = ContextVar("eklesia_rota", default="-")
+
+# Buckets padrão (segundos): de embeddings rápidos a gerações longas
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    60.0, 120.0,
+)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200)
+
+LabelKey = Tuple[str, ...]
+
+
+def rota_atual() -> str:
+    return _rota.get()
+
+
+def _fmt_labels(nomes: Sequence[str], valores: LabelKey) -> str:
+    if not nomes:
+        return ""
+    pares = []
+    for n, v in zip(nomes, valores):
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"')
+        pares.append(f'{n}="{v}"')
+    return "{" + ",".join(pares) + "}"
+
+
+class _Metric:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, labels: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.nome} {self.ajuda}",
+            f"# TYPE {self.nome} {self.tipo}",
+        ]
+
+
+class Counter(_Metric):
+    tipo = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[LabelKey, float] = {}
+
+    def inc(self, valor: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._valores[key] = self._valores.get(key, 0.0) + valor
+
+    def valor(self, **labels: str) -> float:
+        return self._valores.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        linhas = super().render()
+        with self._lock:
+            itens = list(self._valores.items())
+        for key, v in itens:
+            linhas.append(f"{self.nome}{_fmt_labels(self.labels, key)} {v}")
+        return linhas
+
+
+class Gauge(_Metric):
+    tipo = "gauge"
+
+    def __init__(self, *args, funcao: Optional[Callable] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valores: Dict[LabelKey, float] = {}
+        # funcao() -> {label_key: valor}, avaliada no momento do scrape
+        self._funcao = funcao
+
+    def set(self, valor: float, **labels: str) -> None:
+        with self._lock:
+            self._valores[self._key(labels)] = valor
+
+    def inc(self, valor: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._valores[key] = self._valores.get(key, 0.0) + valor
+
+    def dec(self, valor: float = 1.0, **labels: str) -> None:
+        self.inc(-valor, **labels)
+
+    def render(self) -> List[str]:
+        linhas = super().render()
+        with self._lock:
+            itens = dict(self._valores)
+        if self._funcao:
+            itens.update(self._funcao())
+        for key, v in itens.items():
+            linhas.append(f"{self.nome}{_fmt_labels(self.labels, key)} {v}")
+        return linhas
+
+
+class Histogram(_Metric):
+    tipo = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [contagens por bucket..., soma, total]
+        self._valores: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, valor: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            v = self._valores.get(key)
+            if v is None:
+                v = self._valores[key] = [0.0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                v[idx] += 1
+            v[-2] += valor
+            v[-1] += 1
+
+    def render(self) -> List[str]:
+        linhas = super().render()
+        with self._lock:
+            itens = [(k, list(v)) for k, v in self._valores.items()]
+        nomes_le = self.labels + ("le",)
+        for key, v in itens:
+            acumulado = 0.0
+            for b, c in zip(self.buckets, v):
+                acumulado += c
+                lbl = _fmt_labels(nomes_le, key + (repr(float(b)),))
+                linhas.append(f"{self.nome}_bucket{lbl} {acumulado}")
+            lbl = _fmt_labels(nomes_le, key + ("+Inf",))
+            linhas.append(f"{self.nome}_bucket{lbl} {v[-1]}")
+            base = _fmt_labels(self.labels, key)
+            linhas.append(f"{self.nome}_sum{base} {v[-2]}")
+            linhas.append(f"{self.nome}_count{base} {v[-1]}")
+        return linhas
+
+
+class Registry:
+    def __init__(self):
+        self._metricas: Dict[str, _Metric] = {}
+
+    def registrar(self, metrica: _Metric) -> _Metric:
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def render(self) -> str:
+        linhas: List[str] = []
+        for m in self._metricas.values():
+            linhas.extend(m.render())
+        return "\n".join(linhas) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(nome: str, ajuda: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.registrar(Counter(nome, ajuda, labels))
+
+
+def gauge(nome: str, ajuda: str, labels: Sequence[str] = (),
+          funcao: Optional[Callable] = None) -> Gauge:
+    return REGISTRY.registrar(Gauge(nome, ajuda, labels, funcao=funcao))
+
+
+def histogram(nome: str, ajuda: str, labels: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.registrar(Histogram(nome, ajuda, labels, buckets=buckets))
+
+
+# ----------------------------
+# Métricas da aplicação
+# ----------------------------
+HTTP_REQUESTS = counter(
+    "eklesia_http_requests_total",
+    "Requisições HTTP por rota, método e status.",
+    ("route", "method", "status"),
+)
+HTTP_LATENCY = histogram(
+    "eklesia_http_request_duration_seconds",
+    "Duração das requisições HTTP (até o fim do corpo).",
+    ("route", "method"),
+)
+RAG_STAGE = histogram(
+    "eklesia_rag_stage_seconds",
+    "Duração de cada estágio do pipeline RAG "
+    "(embed, retrieve, prompt, ttft, generate).",
+    ("stage", "route", "model"),
+)
+LLM_TOKENS = counter(
+    "eklesia_llm_tokens_total",
+    "Chunks de tokens gerados pelo LLM.",
+    ("route", "model"),
+)
+LLM_TOKENS_PER_SECOND = histogram(
+    "eklesia_llm_tokens_per_second",
+    "Vazão de geração (tokens/s) por requisição.",
+    ("route", "model"),
+    buckets=RATE_BUCKETS,
+)
+LLM_STREAMS_CANCELLED = counter(
+    "eklesia_llm_streams_cancelled_total",
+    "Streams de geração interrompidos "
+    "(reason=desconexao|tempo|tokens).",
+    ("model", "reason"),
+)
+LLM_TOKENS_SAVED = counter(
+    "eklesia_llm_tokens_saved_total",
+    "Chunks de tokens não gerados por interrupção do stream (estimados "
+    "pela média das respostas completas do modelo).",
+    ("model", "reason"),
+)
+SINGLEFLIGHT_REQUESTS = counter(
+    "eklesia_singleflight_requests_total",
+    "Perguntas por papel na coalescência de perguntas idênticas em voo "
+    "(kind=answer|stream, role=leader|follower).",
+    ("kind", "role"),
+)
+STREAM_FANOUT = histogram(
+    "eklesia_stream_fanout",
+    "Assinantes por stream de geração (1 = sem carona).",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100),
+)
+CONTEXT_TOKENS = counter(
+    "eklesia_context_tokens_total",
+    "Tokens (estimados) do CONTEXTO usados e descartados pelo orçamento.",
+    ("model", "kind"),
+)
+RERANK_RUNS = counter(
+    "eklesia_rerank_total",
+    "Execuções do rerank por scorer e resultado (ok|timeout).",
+    ("scorer", "result"),
+)
+BIBLE_API_CALLS = counter(
+    "eklesia_bible_api_requests_total",
+    "Chamadas à API da Bíblia por operação e status HTTP.",
+    ("operation", "status"),
+)
+BIBLE_API_LATENCY = histogram(
+    "eklesia_bible_api_request_duration_seconds",
+    "Latência das chamadas à API da Bíblia.",
+    ("operation",),
+)
+CACHE_REQUESTS = counter(
+    "eklesia_cache_requests_total",
+    "Consultas a caches internos (result=hit|miss).",
+    ("cache", "result"),
+)
+
+
+def _cache_ratios() -> Dict[LabelKey, float]:
+    caches = {k[0] for k in CACHE_REQUESTS._valores}
+    ratios = {}
+    for c in caches:
+        hits = CACHE_REQUESTS.valor(cache=c, result="hit")
+        total = hits + CACHE_REQUESTS.valor(cache=c, result="miss")
+        ratios[(c,)] = hits / total if total else 0.0
+    return ratios
+
+
+CACHE_HIT_RATIO = gauge(
+    "eklesia_cache_hit_ratio",
+    "Razão hits/(hits+misses) por cache desde o início do processo.",
+    ("cache",),
+    funcao=_cache_ratios,
+)
+CACHE_WARM_HITS = counter(
+    "eklesia_cache_warm_hits_total",
+    "Hits do tráfego real em entradas preenchidas pelo aquecimento.",
+    ("cache",),
+)
+
+
+def coberturas_aquecimento() -> Dict[LabelKey, float]:
+    coberturas = {}
+    for (c,) in list(CACHE_WARM_HITS._valores):
+        total = CACHE_REQUESTS.valor(cache=c, result="hit") + \
+            CACHE_REQUESTS.valor(cache=c, result="miss")
+        quentes = CACHE_WARM_HITS.valor(cache=c)
+        coberturas[(c,)] = quentes / total if total else 0.0
+    return coberturas
+
+
+WARMUP_COVERAGE = gauge(
+    "eklesia_warmup_coverage_ratio",
+    "Fração das consultas reais a um cache atendidas por entrada aquecida.",
+    ("cache",),
+    funcao=coberturas_aquecimento,
+)
+WARMUP_RUNS = counter(
+    "eklesia_warmup_runs_total",
+    "Rodadas do aquecimento de caches (result=ok|error).",
+    ("result",),
+)
+WARMUP_QUESTIONS = counter(
+    "eklesia_warmup_questions_total",
+    "Perguntas do aquecimento (result=gerada|reaproveitada|erro).",
+    ("result",),
+)
+BATCH_QUESTIONS = counter(
+    "eklesia_batch_questions_total",
+    "Perguntas de /perguntar/lote "
+    "(result=cache|gerada|duplicada|erro).",
+    ("result",),
+)
+JOBS = counter(
+    "eklesia_jobs_total",
+    "Jobs da fila de geração (result=submetido|concluido|erro|"
+    "retentativa|cancelado).",
+    ("tipo", "result"),
+)
+EXPORTS = counter(
+    "eklesia_exports_total",
+    "Exportações de documentos (formato=docx|pdf|md, result=hit|miss).",
+    ("formato", "result"),
+)
+INGEST_DOCS = counter(
+    "eklesia_ingest_documents_total",
+    "Arquivos processados na ingestão (result=ok|error).",
+    ("result",),
+)
+INGEST_BYTES = counter(
+    "eklesia_ingest_bytes_total",
+    "Bytes de texto extraído e persistido na ingestão.",
+)
+INGEST_LATENCY = histogram(
+    "eklesia_ingest_duration_seconds",
+    "Duração da ingestão por arquivo (extração + persistência).",
+)
+INGEST_DUPLICATES = counter(
+    "eklesia_ingest_near_duplicates_total",
+    "Quase-duplicatas detectadas na ingestão (action=link|skip).",
+    ("action",),
+)
+INGEST_QUEUE = gauge(
+    "eklesia_ingest_queue_depth",
+    "Arquivos aguardando ou em processamento de ingestão.",
+)
+EMBED_VECTORS = counter(
+    "eklesia_embedding_vectors_total",
+    "Vetores gerados fora do caminho de consulta (job=index|reembed).",
+    ("job", "model"),
+)
+EMBED_RATE = gauge(
+    "eklesia_embedding_vectors_per_second",
+    "Vazão do último lote de embeddings (média móvel), por job e modelo.",
+    ("job", "model"),
+)
+EMBED_BATCH = gauge(
+    "eklesia_embedding_batch_size",
+    "Tamanho de lote corrente do executor de embeddings (adaptativo).",
+    ("job", "model"),
+)
+EMBED_ERRORS = counter(
+    "eklesia_embedding_errors_total",
+    "Falhas de chamadas de embedding (com retentativa), por job e modelo.",
+    ("job", "model"),
+)
+REEMBED_PROGRESS = gauge(
+    "eklesia_reembed_progress_ratio",
+    "Progresso (0..1) do re-embedding em andamento, por coleção nova.",
+    ("collection",),
+)
+
+
+# ----------------------------
+# Helpers de instrumentação
+# ----------------------------
+@contextmanager
+def medir(stage: str, model: str = "-") -> Iterator[None]:
+    """Mede um estágio do pipeline RAG (histograma + trace corrente)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        RAG_STAGE.observe(
+            duracao, stage=stage, route=rota_atual(), model=model,
+        )
+        registrar_stage(stage, duracao)
+
+
+def registrar_geracao(
+    model: str, tokens: int, ttft: Optional[float], duracao: float
+) -> None:
+    """Registra TTFT, tempo total e vazão de uma geração do LLM."""
+    rota = rota_atual()
+    if ttft is not None:
+        RAG_STAGE.observe(ttft, stage="ttft", route=rota, model=model)
+        registrar_stage("ttft", ttft)
+    RAG_STAGE.observe(duracao, stage="generate", route=rota, model=model)
+    registrar_stage("generate", duracao)
+    LLM_TOKENS.inc(tokens, route=rota, model=model)
+    if tokens and duracao > 0:
+        LLM_TOKENS_PER_SECOND.observe(
+            tokens / duracao, route=rota, model=model
+        )
+
+
+def registrar_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ----------------------------
+# Middleware ASGI + endpoint
+# ----------------------------
+def _resolver_rota(scope) -> str:
+    """Devolve o template da rota (ex.: /jobs/{job_id}) para evitar
+    explosão de cardinalidade nos labels."""
+    from starlette.routing import Match
+
+    app = scope.get("app")
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "desconhecida"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rota = _resolver_rota(scope)
+        token = _rota.set(rota)
+        status = {"code": 500}
+        inicio = time.perf_counter()
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_LATENCY.observe(
+                time.perf_counter() - inicio,
+                route=rota, method=scope["method"],
+            )
+            HTTP_REQUESTS.inc(
+                route=rota, method=scope["method"], status=str(status["code"])
+            )
+            _rota.reset(token)
+
+
+router = APIRouter(tags=["Health"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Exposição no formato texto do Prometheus (version=0.0.4)."""
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,228 @@
+# app/prompts.py
+"""
+Prompts versionados do RAG (resposta e geração de conteúdo).
+
+O Ollama reaproveita o KV cache do prompt anterior de cada slot até o
+primeiro token diferente. Na versão 2 tudo que é fixo vem primeiro e é
+igual entre requisições: regras gerais e, em seguida, as instruções da
+tarefa (resposta, sermão, estudo, devocional, ebook). Depois vêm o
+CONTEXTO recuperado e, por último, o pedido com as partes variáveis
+(tema, versículos, autor). Só o que muda é avaliado a cada geração. A
+versão 1 é o layout anterior (pedido e instruções misturados no começo
+da mensagem), mantida para comparação (`python -m bench.prompt`).
+
+- EKLESIA_PROMPT_VERSION: "2" (padrão) ou "1"
+- OLLAMA_KEEP_ALIVE: quanto tempo o Ollama mantém o modelo (e o cache
+  do prefixo) carregado após a última geração (padrão "30m")
+- OLLAMA_NUM_CTX: janela de contexto pedida ao Ollama; fixa, para não
+  recarregar o modelo entre requisições, e grande o bastante para o
+  prompt não ser truncado pelo começo (padrão: orçamento do CONTEXTO +
+  folga, arredondado para 2048; "0" usa o padrão do servidor)
+"""
+from __future__ import annotations
+
+import functools
+import importlib
+import os
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROMPT_VERSION = os.getenv("EKLESIA_PROMPT_VERSION", "2")
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "-1"))
+# Tokens além do CONTEXTO: instruções, pedido e a geração em si
+_FOLGA_CTX = 2048
+
+TAREFAS = ("resposta", "sermao", "estudo", "devocional", "ebook")
+
+_SISTEMA = (
+    "Você é um assistente teológico que responde com base nos trechos "
+    "fornecidos no CONTEXTO.\n"
+    "Regras:\n"
+    "- Seja fiel ao CONTEXTO; se a resposta não estiver no contexto, "
+    "diga que não encontrou evidências suficientes.\n"
+    "- Cite fontes quando possível (arquivo/página), em Markdown.\n"
+    "- Seja claro e biblicamente acurado.\n"
+)
+
+
+def _autor(campos: Dict[str, Any]) -> str:
+    return campos.get("autor") or "teólogos relevantes"
+
+
+# ----------------------------
+# Versão 1: pedido + contexto numa mensagem só
+# ----------------------------
+_PEDIDOS_V1: Dict[str, Callable[..., str]] = {
+    "resposta": lambda c: c["pergunta"],
+    "sermao": lambda c: (
+        f"Crie um sermão {c['tipo']} sobre '{c['tema']}' com "
+        f"{c['num_topicos']} tópicos. "
+        f"Use os versículos: {c['base_biblica']}. "
+        f"Inclua citações de {_autor(c)}."
+    ),
+    "estudo": lambda c: (
+        f"Crie um estudo bíblico sobre '{c['tema']}'. "
+        f"Use os versículos: {', '.join(c['versiculos'])}. "
+        f"Inclua citações de {_autor(c)}. "
+        "Estruture em introdução, desenvolvimento e conclusão."
+    ),
+    "devocional": lambda c: (
+        f"Crie um devocional sobre '{c['tema']}' baseado no versículo "
+        f"{c['versiculo']}. "
+        "Inclua uma reflexão pessoal e uma oração final."
+    ),
+    "ebook": lambda c: (
+        f"Crie um ebook sobre '{c['tema']}' dividido em {c['capitulos']} "
+        "capítulos. Cada capítulo deve abordar um aspecto do tema "
+        "e incluir referências bíblicas "
+        f"e citações de {_autor(c)}."
+    ),
+}
+
+# ----------------------------
+# Versão 2: prefixo fixo por tarefa, variáveis no fim
+# ----------------------------
+_INSTRUCOES_V2 = {
+    "resposta": (
+        "Tarefa: responder à PERGUNTA no fim da mensagem, de forma direta "
+        "e em poucos parágrafos, indicando para cada afirmação a fonte do "
+        "CONTEXTO que a sustenta.\n"
+    ),
+    "sermao": (
+        "Tarefa: escrever o sermão descrito no PEDIDO no fim da mensagem "
+        "(tipo, tema, número de tópicos, versículos e autor a citar).\n"
+        "Estrutura:\n"
+        "- Uma linha por tópico no início, numerada, com o título de cada "
+        "tópico na quantidade pedida.\n"
+        "- Introdução ao tema a partir dos versículos do pedido.\n"
+        "- Desenvolvimento de cada tópico com explicação, referência "
+        "bíblica e aplicação.\n"
+        "- Citações do autor pedido, atribuídas e com a fonte do "
+        "CONTEXTO quando houver.\n"
+        "- Conclusão com um apelo.\n"
+    ),
+    "estudo": (
+        "Tarefa: escrever o estudo bíblico descrito no PEDIDO no fim da "
+        "mensagem (tema, versículos e autor a citar).\n"
+        "Estrutura: introdução, desenvolvimento e conclusão. Explique os "
+        "versículos do pedido no seu contexto e inclua citações do autor "
+        "pedido, atribuídas e com a fonte do CONTEXTO quando houver.\n"
+    ),
+    "devocional": (
+        "Tarefa: escrever o devocional descrito no PEDIDO no fim da "
+        "mensagem (tema e versículo).\n"
+        "Estrutura: leitura do versículo, uma reflexão pessoal ligada ao "
+        "tema e uma oração final.\n"
+    ),
+    "ebook": (
+        "Tarefa: escrever o ebook descrito no PEDIDO no fim da mensagem "
+        "(tema, número de capítulos e autor a citar).\n"
+        "Estrutura: cada capítulo com título e um aspecto do tema, "
+        "referências bíblicas e citações do autor pedido, atribuídas e "
+        "com a fonte do CONTEXTO quando houver.\n"
+    ),
+}
+
+
+def _versiculos_v2(c: Dict[str, Any]) -> str:
+    return ", ".join(c.get("versiculos") or []) or "à sua escolha"
+
+
+_PEDIDOS_V2: Dict[str, Callable[..., str]] = {
+    "resposta": lambda c: c["pergunta"],
+    "sermao": lambda c: (
+        f"Sermão {c['tipo']} sobre '{c['tema']}', com {c['num_topicos']} "
+        f"tópicos.\nVersículos:\n{c['base_biblica']}\n"
+        f"Citar: {_autor(c)}"
+    ),
+    "estudo": lambda c: (
+        f"Estudo bíblico sobre '{c['tema']}'.\n"
+        f"Versículos: {_versiculos_v2(c)}\nCitar: {_autor(c)}"
+    ),
+    "devocional": lambda c: (
+        f"Devocional sobre '{c['tema']}'"
+        + (f", baseado em {c['versiculo']}." if c.get("versiculo") else ".")
+    ),
+    "ebook": lambda c: (
+        f"Ebook sobre '{c['tema']}', com {c['capitulos']} capítulos.\n"
+        f"Citar: {_autor(c)}"
+    ),
+}
+
+_VERSOES = {
+    "1": {
+        "pedidos": _PEDIDOS_V1,
+        "sistema": lambda tarefa: _SISTEMA,
+        "humano": lambda tarefa: (
+            "Pergunta: {question}\n\nCONTEXTO:\n{context}"
+        ),
+    },
+    "2": {
+        "pedidos": _PEDIDOS_V2,
+        "sistema": lambda tarefa: _SISTEMA + "\n" + _INSTRUCOES_V2[tarefa],
+        "humano": lambda tarefa: (
+            "CONTEXTO:\n{context}\n\n"
+            + ("PERGUNTA" if tarefa == "resposta" else "PEDIDO")
+            + ":\n{question}"
+        ),
+    },
+}
+
+
+def _versao(versao: Optional[str]) -> Dict[str, Any]:
+    versao = versao or PROMPT_VERSION
+    if versao not in _VERSOES:
+        raise ValueError(
+            f"Versão de prompt desconhecida: {versao} "
+            f"(disponíveis: {', '.join(sorted(_VERSOES))})"
+        )
+    return _VERSOES[versao]
+
+
+def pedido(tarefa: str, versao: Optional[str] = None, **campos: Any) -> str:
+    """Texto variável da tarefa (vai em `question` do template)."""
+    return _versao(versao)["pedidos"][tarefa](campos)
+
+
+def template(tarefa: str = "resposta", versao: Optional[str] = None) -> Any:
+    """ChatPromptTemplate da tarefa (montado uma vez por versão)."""
+    return _template(tarefa, versao or PROMPT_VERSION)
+
+
+@functools.lru_cache(maxsize=None)
+def _template(tarefa: str, versao: str) -> Any:
+    v = _versao(versao)
+    prompts = importlib.import_module("langchain_core.prompts")
+    return prompts.ChatPromptTemplate.from_messages([
+        ("system", v["sistema"](tarefa)),
+        ("human", v["humano"](tarefa)),
+    ])
+
+
+def renderizar(
+    tarefa: str, question: str, context: str, versao: Optional[str] = None
+) -> str:
+    """O texto que o OllamaLLM envia em /api/generate."""
+    return template(tarefa, versao).invoke(
+        {"question": question, "context": context}
+    ).to_string()
+
+
+def opcoes_ollama(modelo: Optional[str] = None) -> Dict[str, Any]:
+    """keep_alive e num_ctx para o OllamaLLM (vide docstring do módulo)."""
+    from app.contexto import orcamento
+
+    opcoes: Dict[str, Any] = {}
+    if KEEP_ALIVE:
+        opcoes["keep_alive"] = KEEP_ALIVE
+    num_ctx = NUM_CTX
+    if num_ctx < 0:
+        necessario = orcamento(modelo) + _FOLGA_CTX
+        num_ctx = -(-necessario // 2048) * 2048
+    if num_ctx:
+        opcoes["num_ctx"] = num_ctx
+    return opcoes
@@ -0,0 +1,225 @@
+# app/rerank.py
+"""
+Rerank opcional dos candidatos recuperados.
+
+A recuperação busca mais candidatos (`EKLESIA_RERANK_CANDIDATES`), o
+scorer os reordena e ficam só os melhores que cabem no orçamento de
+tokens — menos trechos, prompt menor e geração mais rápida.
+
+- EKLESIA_RERANK: "off" (padrão), "lexical" ou "cross-encoder"
+- EKLESIA_RERANK_MODEL: modelo do cross-encoder (sentence-transformers),
+  carregado numa thread na primeira consulta; até ficar pronto (ou se
+  falhar), vale o scorer léxico
+- EKLESIA_RERANK_CANDIDATES: candidatos buscados antes do rerank (24)
+- EKLESIA_RERANK_TOP_K: máximo de trechos mantidos (4)
+- EKLESIA_RERANK_TOKEN_BUDGET: tokens somados dos trechos mantidos (1500)
+- EKLESIA_RERANK_TIMEOUT_MS: teto de latência do rerank (300); estourado,
+  vale a ordem da recuperação
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from app.contexto import contar_tokens
+from app.logging_utils import get_logger
+from app.metrics import RERANK_RUNS, medir
+from app.tracing import anotar
+
+load_dotenv()
+
+RERANK = os.getenv("EKLESIA_RERANK", "off").lower()
+RERANK_MODEL = os.getenv(
+    "EKLESIA_RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+)
+RERANK_CANDIDATES = int(os.getenv("EKLESIA_RERANK_CANDIDATES", "24"))
+RERANK_TOP_K = int(os.getenv("EKLESIA_RERANK_TOP_K", "4"))
+RERANK_TOKEN_BUDGET = int(os.getenv("EKLESIA_RERANK_TOKEN_BUDGET", "1500"))
+RERANK_TIMEOUT_MS = float(os.getenv("EKLESIA_RERANK_TIMEOUT_MS", "300"))
+
+# Pares (pergunta, trecho) por lote do cross-encoder; o teto de latência
+# é verificado entre lotes
+_LOTE = 8
+# Caracteres do trecho enviados ao cross-encoder
+_MAX_CHARS = 2000
+
+log = get_logger("rerank")
+
+Pares = List[Tuple[Any, Optional[float]]]
+
+
+def ativo() -> bool:
+    return RERANK in {"lexical", "cross-encoder"}
+
+
+# ----------------------------
+# Scorers
+# ----------------------------
+class _Tempo(Exception):
+    pass
+
+
+def _bigramas(tokens: Sequence[str]) -> set:
+    return set(zip(tokens, tokens[1:]))
+
+
+def _scores_lexicos(pergunta: str, pares: Pares, prazo: float) -> List[float]:
+    """
+    Cobertura dos termos da pergunta + bigramas em comum, com a
+    relevância da recuperação como desempate.
+    """
+    from app.lexical import tokenizar
+
+    termos = tokenizar(pergunta)
+    distintos = set(termos)
+    bigramas = _bigramas(termos)
+    scores = []
+    for doc, ret in pares:
+        if time.monotonic() > prazo:
+            raise _Tempo()
+        tokens = tokenizar(getattr(doc, "page_content", "") or "")
+        presentes = set(tokens)
+        cobertura = (
+            len(distintos & presentes) / len(distintos) if distintos else 0.0
+        )
+        proximidade = (
+            len(bigramas & _bigramas(tokens)) / len(bigramas)
+            if bigramas else 0.0
+        )
+        scores.append(cobertura + 0.5 * proximidade + 0.25 * (ret or 0.0))
+    return scores
+
+
+_cross_encoder = None
+_cross_lock = threading.Lock()
+# Falha ao carregar o cross-encoder: usa o léxico sem tentar de novo até
+# este instante (monotonic); sem sentence-transformers, nunca mais
+_indisponivel_ate = 0.0
+# Espera (s) antes de tentar carregar de novo um modelo que falhou
+_RETENTAR_S = 300.0
+_carregador: Optional[threading.Thread] = None
+
+
+def _carregar_cross_encoder():
+    global _cross_encoder
+    if _cross_encoder is None:
+        with _cross_lock:
+            if _cross_encoder is None:
+                from sentence_transformers import CrossEncoder
+
+                _cross_encoder = CrossEncoder(RERANK_MODEL)
+    return _cross_encoder
+
+
+def _scores_cross(pergunta: str, pares: Pares, prazo: float) -> List[float]:
+    modelo = _cross_encoder
+    entradas = [
+        (pergunta, (getattr(d, "page_content", "") or "")[:_MAX_CHARS])
+        for d, _ in pares
+    ]
+    scores: List[float] = []
+    lote_s = 0.0
+    for i in range(0, len(entradas), _LOTE):
+        # `predict` não é interrompível: só começa um lote que, pelo
+        # tempo do anterior, termina dentro do prazo
+        agora = time.monotonic()
+        if agora + lote_s > prazo:
+            raise _Tempo()
+        scores.extend(
+            float(s) for s in modelo.predict(entradas[i:i + _LOTE])
+        )
+        lote_s = time.monotonic() - agora
+    return scores
+
+
+def _carregar_seguro() -> None:
+    global _indisponivel_ate
+    try:
+        _carregar_cross_encoder()
+    except ImportError as e:
+        _indisponivel_ate = float("inf")
+        log.warning("rerank_cross_encoder_indisponivel", error=str(e))
+    except Exception as e:
+        _indisponivel_ate = time.monotonic() + _RETENTAR_S
+        log.warning(
+            "rerank_cross_encoder_indisponivel", error=str(e),
+            retentar_s=_RETENTAR_S,
+        )
+
+
+def _scorer():
+    """Cross-encoder se já carregado; senão dispara a carga e usa léxico."""
+    global _carregador
+    if RERANK == "cross-encoder":
+        if _cross_encoder is not None:
+            return "cross-encoder", _scores_cross
+        if time.monotonic() >= _indisponivel_ate:
+            with _cross_lock:
+                if _carregador is None or not _carregador.is_alive():
+                    _carregador = threading.Thread(
+                        target=_carregar_seguro, name="rerank-carregar",
+                        daemon=True,
+                    )
+                    _carregador.start()
+    return "lexical", _scores_lexicos
+
+
+# ----------------------------
+# Seleção
+# ----------------------------
+def _dentro_do_orcamento(
+    pares: Pares, top_k: int, orcamento: int
+) -> Pares:
+    """Mantém a ordem; para no top_k ou ao estourar o orçamento."""
+    mantidos: Pares = []
+    usados = 0
+    for doc, score in pares:
+        tokens = contar_tokens(getattr(doc, "page_content", ""))
+        if mantidos and usados + tokens > orcamento:
+            break
+        mantidos.append((doc, score))
+        usados += tokens
+        if len(mantidos) >= top_k:
+            break
+    return mantidos
+
+
+def reordenar(
+    pergunta: str,
+    pares: Pares,
+    top_k: int = RERANK_TOP_K,
+    orcamento: int = RERANK_TOKEN_BUDGET,
+    timeout_ms: float = RERANK_TIMEOUT_MS,
+) -> Pares:
+    """
+    Reordena (doc, score) pelo scorer configurado e devolve o top dentro
+    do orçamento de tokens. Se o teto de latência estourar, mantém a
+    ordem da recuperação.
+    """
+    if not pares:
+        return pares
+    prazo = time.monotonic() + timeout_ms / 1000
+    nome, scorer = _scorer()
+    resultado = "ok"
+    with medir("rerank", nome):
+        try:
+            scores = scorer(pergunta, pares, prazo)
+            ordenados = sorted(
+                ((d, s) for (d, _), s in zip(pares, scores)),
+                key=lambda x: x[1],
+                reverse=True,
+            )
+        except _Tempo:
+            resultado = "timeout"
+            ordenados = list(pares)
+    RERANK_RUNS.inc(scorer=nome, result=resultado)
+    mantidos = _dentro_do_orcamento(ordenados, top_k, orcamento)
+    anotar(
+        rerank=nome, rerank_result=resultado,
+        rerank_candidates=len(pares), rerank_kept=len(mantidos),
+    )
+    return mantidos
@@ -17,12 +17,11 @@ from fastapi import (
     UploadFile,
     File,
     HTTPException,
+    Request,
 )
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-import json
-from fastapi.responses import StreamingResponse
 
 # Importa configurações de RAG definidas no chat
 # Configs específicas serão importadas localmente quando necessário
@@ -36,13 +35,25 @@ from app.auth import (
     free_or_authenticated,
     get_current_user,
 )
-from app.chat import responder_pergunta_com_versiculo, recuperar_docs
+from app.chat import (
+    aresponder_pergunta_com_versiculo,
+    arecuperar_docs,
+    em_thread,
+)
+from app.lote import BATCH_MAX
+from app.singleflight import chave_pergunta
+from app.streaming import (
+    TRANSMISSOES,
+    GuardaStream,
+    ler_event_id,
+    resposta_sse,
+)
+from app.tracing import anexar_timings, trace_atual
 from app.sermoes.generator import (
-    gerar_sermao,
-    gerar_estudo_biblico,
-    gerar_devocional,
-    gerar_ebook,  # você importou, mas não havia endpoint;
-    # mantive import, se quiser expor avise
+    agerar_sermao,
+    agerar_estudo_biblico,
+    agerar_devocional,
+    agerar_ebook,
 )
 from app.ingestor import indexar_conteudo_teologico, processar_arquivo
 from app.biblia_api import (
@@ -82,6 +93,17 @@ class PerguntaRequest(BaseModel):
     pergunta: str = Field(..., min_length=3, description="Pergunta do usuário")
 
 
+class LoteRequest(BaseModel):
+    perguntas: list[str] = Field(..., min_length=1, max_length=BATCH_MAX)
+    autor: Optional[str] = None
+    tema: Optional[str] = None
+    tipo: Optional[str] = None
+    modo: str = Field(
+        default="stream",
+        description="stream (NDJSON na resposta) | job (baixar depois)",
+    )
+
+
 class GerarSermaoRequest(BaseModel):
     tipo: str = Field(default="expositivo")
     tema: str = Field(default="graça")
@@ -106,6 +128,10 @@ class GerarEbookRequest(BaseModel):
     tema: str
     capitulos: int = Field(default=5, ge=1, le=50)
     autor: Optional[str] = None
+    modo: str = Field(
+        default="job",
+        description="job (fila; 202) | direto (gera na requisição)",
+    )
 
 
 class PerguntaUnificadaRequest(BaseModel):
@@ -115,9 +141,41 @@ class PerguntaUnificadaRequest(BaseModel):
     )
     tema: Optional[str] = None
     autor: Optional[str] = None
+    tipo: Optional[str] = Field(
+        None, description="Filtra o acervo pelo tipo do conteúdo ingerido"
+    )
     versiculos: list[str] = Field(default_factory=list)
 
 
+class JobRequest(BaseModel):
+    tipo: str = Field(..., description="sermao|estudo|devocional|ebook|lote")
+    parametros: dict = Field(
+        default_factory=dict,
+        description="Campos do endpoint síncrono equivalente",
+    )
+
+
+class ExportarRequest(BaseModel):
+    formato: str = Field(default="docx", description="docx|pdf|md")
+    conteudo: Optional[dict] = Field(
+        None, description="JSON devolvido por /gerar-*"
+    )
+    job_id: Optional[str] = Field(
+        None, description="Ou: job concluído de /jobs (sermao, estudo...)"
+    )
+
+
+class ReembedRequest(BaseModel):
+    modelo: str = Field(..., min_length=1, description="Modelo do Ollama")
+
+
+class AquecerRequest(BaseModel):
+    perguntas: list[str] = Field(
+        default_factory=list,
+        description="Vazio: usa o arquivo de EKLESIA_WARMUP_FILE",
+    )
+
+
 # ----------------------------
 # Registro e Autenticação
 # ----------------------------
@@ -185,6 +243,7 @@ async def perguntar(
     """
     Responde a uma pergunta usando RAG.
     Retorna `resposta` e, se disponível, `fontes`.
+    Com `X-Debug-Timings: 1` (ou `?debug=1`) inclui `timings`.
     """
     pergunta = body.pergunta.strip()
     if not pergunta:
@@ -193,14 +252,98 @@ async def perguntar(
             detail="Campo 'pergunta' é obrigatório."
         )
 
-    result = responder_pergunta_com_versiculo(pergunta)
+    result = await aresponder_pergunta_com_versiculo(pergunta)
 
     # Compatível com sua função antiga (string) e a versão revisada (dict)
     if isinstance(result, dict):
         # Esperado: {"resposta": str, "fontes": [...]}
-        return result
+        return anexar_timings(result)
+
+    return anexar_timings({"resposta": str(result), "fontes": []})
+
+
+@router.post("/perguntar/lote", tags=["RAG"])
+async def perguntar_lote(
+    body: LoteRequest,
+    user=Depends(get_current_user),
+):
+    """
+    Responde a uma lista de perguntas (até EKLESIA_BATCH_MAX), sem
+    repetir as iguais (vide app.lote). `autor`/`tema`/`tipo` filtram o
+    acervo para todas.
+    - `modo=stream`: NDJSON, um evento por pergunta única à medida que
+      fica pronta (`indices` diz onde ela aparece no lote).
+    - `modo=job`: 202 com o job da fila (app.jobs); acompanhe em
+      `GET /perguntar/lote/{id}` (ou `/jobs/{id}`) e baixe o NDJSON em
+      `GET /perguntar/lote/{id}/resultado`.
+    """
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    from app.lote import ndjson, responder_lote
+
+    if body.modo not in {"stream", "job"}:
+        raise HTTPException(
+            status_code=400, detail="`modo` deve ser 'stream' ou 'job'."
+        )
+    if body.modo == "job":
+        from app.jobs import FILA
+
+        job = await em_thread(
+            FILA.submeter, "lote", _parametros_lote(body), _dono(user)
+        )
+        return JSONResponse(job, status_code=202)
+    filtros = {"autor": body.autor, "tema": body.tema, "tipo": body.tipo}
+    return StreamingResponse(
+        ndjson(responder_lote(body.perguntas, filtros)),
+        media_type="application/x-ndjson",
+    )
+
+
+def _parametros_lote(body: LoteRequest) -> dict:
+    return {
+        "perguntas": body.perguntas,
+        "filtros": {"autor": body.autor, "tema": body.tema, "tipo": body.tipo},
+    }
+
+
+def _job_lote(lote_id: str, user) -> dict:
+    from app.jobs import FILA
+
+    job = FILA.obter(lote_id, _dono(user))
+    if job is None or job["tipo"] != "lote":
+        raise HTTPException(status_code=404, detail="Lote inexistente.")
+    return job
+
 
-    return {"resposta": str(result), "fontes": []}
+@router.get("/perguntar/lote/{lote_id}", tags=["RAG"])
+async def lote_status(lote_id: str, user=Depends(get_current_user)):
+    """Estado e progresso (`prontas` de `unicas`) de um lote em modo job."""
+    job = await em_thread(_job_lote, lote_id, user)
+    job.pop("resultado", None)
+    return job
+
+
+@router.get("/perguntar/lote/{lote_id}/resultado", tags=["RAG"])
+async def lote_resultado(lote_id: str, user=Depends(get_current_user)):
+    """NDJSON do lote concluído (mesmos eventos do modo stream)."""
+    from fastapi.responses import Response
+
+    from app.lote import linha_ndjson
+
+    job = await em_thread(_job_lote, lote_id, user)
+    if job["estado"] != "concluido":
+        raise HTTPException(
+            status_code=409,
+            detail=f"Lote ainda não concluído (estado: {job['estado']}).",
+        )
+    return Response(
+        b"".join(linha_ndjson(e) for e in job["resultado"]["eventos"]),
+        media_type="application/x-ndjson",
+        headers={
+            "Content-Disposition":
+                f'attachment; filename="lote-{lote_id}.ndjson"',
+        },
+    )
 
 
 # ----------------------------
@@ -213,7 +356,7 @@ async def gerar_sermao_endpoint(
     """
     Gera um sermão com base no tipo/tema/versículos.
     """
-    resultado = gerar_sermao(
+    resultado = await agerar_sermao(
         body.tipo, body.tema, body.versiculos, body.num_topicos, body.autor
     )
     return resultado
@@ -226,7 +369,9 @@ async def gerar_estudo_endpoint(
     """
     Gera um estudo bíblico.
     """
-    resultado = gerar_estudo_biblico(body.tema, body.versiculos, body.autor)
+    resultado = await agerar_estudo_biblico(
+        body.tema, body.versiculos, body.autor
+    )
     return resultado
 
 
@@ -237,7 +382,9 @@ async def gerar_devocional_endpoint(
     """
     Gera um devocional a partir de um tema e um versículo.
     """
-    resultado = gerar_devocional(body.tema, body.versiculo, body.autor)
+    resultado = await agerar_devocional(
+        body.tema, body.versiculo, body.autor
+    )
     return resultado
 
 
@@ -275,7 +422,8 @@ async def ingestao_upload(
         await file.close()
 
     try:
-        inserted_id = processar_arquivo(dest_path)
+        # Extração + embeddings: fora do event loop
+        inserted_id = await em_thread(processar_arquivo, dest_path)
         if not inserted_id:
             raise HTTPException(
                 status_code=500,
@@ -300,21 +448,85 @@ async def indexar_conteudo(user=Depends(get_current_user)):
     Dispara a indexação de conteúdo teológico (pipeline batch).
     """
     try:
-        indexar_conteudo_teologico()
+        await em_thread(indexar_conteudo_teologico)
         return {"status": "sucesso", "mensagem": "Conteúdo indexado na IA."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/colecoes", tags=["Ingestão"])
+async def colecoes(user=Depends(get_current_user)):
+    """
+    Coleções vetoriais registradas (modelo e dimensão de cada uma), a
+    ativa e o progresso do re-embedding.
+    """
+    from app.aquecimento import AQUECIMENTO
+    from app.colecoes import REEMBED, registro
+
+    return {
+        **registro().resumo(),
+        "reembed": REEMBED.status(),
+        "aquecimento": AQUECIMENTO.status(),
+    }
+
+
+@router.post("/colecoes/reembed", status_code=202, tags=["Ingestão"])
+async def colecoes_reembed(
+    body: ReembedRequest, user=Depends(get_current_user)
+):
+    """
+    Gera em segundo plano uma coleção nova com `modelo`; a atual segue
+    atendendo até a troca. Acompanhe em GET /colecoes.
+    """
+    from app.colecoes import REEMBED
+
+    try:
+        return REEMBED.iniciar(body.modelo)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/colecoes/aquecer", status_code=202, tags=["Ingestão"])
+async def colecoes_aquecer(
+    body: AquecerRequest, user=Depends(get_current_user)
+):
+    """
+    Aquece em segundo plano os caches de respostas e de recuperação com
+    as perguntas frequentes (app.aquecimento). Acompanhe em GET /colecoes.
+    """
+    from app.aquecimento import AQUECIMENTO, WARMUP_FILE, ler_perguntas
+
+    perguntas = [p.strip() for p in body.perguntas if p.strip()]
+    if not perguntas:
+        if not WARMUP_FILE:
+            raise HTTPException(
+                status_code=400,
+                detail="Informe `perguntas` ou defina EKLESIA_WARMUP_FILE.",
+            )
+        perguntas = ler_perguntas(WARMUP_FILE)
+    try:
+        return AQUECIMENTO.iniciar(perguntas)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 # ----------------------------
 # Bíblia — Consultas e Metadados
 # ----------------------------
 @router.get("/biblia/busca-palavra", tags=["Bíblia"])
 async def biblia_busca_palavra(
-    palavra: str, limite: int = 50, user=Depends(get_current_user)
+    palavra: str,
+    limite: int = 50,
+    recursos: bool = True,
+    user=Depends(get_current_user),
 ):
-    """Busca todos os versos que contenham a palavra nos idiomas principais."""
-    return buscar_versos_por_palavra(palavra, limite=limite)
+    """
+    Busca todos os versos que contenham a palavra nos idiomas principais.
+    `recursos=false` dispensa áudio/vídeo de cada capítulo (mais rápido).
+    """
+    return await em_thread(
+        buscar_versos_por_palavra, palavra, None, limite, recursos
+    )
 
 
 @router.get("/biblia/busca-referencia", tags=["Bíblia"])
@@ -326,15 +538,16 @@ async def biblia_busca_referencia(
     user=Depends(free_or_authenticated),
 ):
     """Busca um verso específico por referência."""
-    return buscar_verso_por_referencia(
-        language_code, book_id, chapter_id, verse_number
+    return await em_thread(
+        buscar_verso_por_referencia,
+        language_code, book_id, chapter_id, verse_number,
     )
 
 
 @router.get("/biblia/versoes", tags=["Bíblia"])
 async def biblia_versoes(user=Depends(get_current_user)):
     """Lista versões disponíveis (pt, es, en, grego, hebraico)."""
-    return listar_biblias_idiomas()
+    return await em_thread(listar_biblias_idiomas)
 
 
 @router.get("/biblia/recursos-extras", tags=["Bíblia"])
@@ -345,7 +558,9 @@ async def biblia_recursos_extras(
     user=Depends(free_or_authenticated),
 ):
     """Busca recursos extras (áudio, vídeo, etc) para um capítulo."""
-    return buscar_recursos_extras(bible_id, book_id, chapter_id)
+    return await em_thread(
+        buscar_recursos_extras, bible_id, book_id, chapter_id
+    )
 
 
 @router.get("/biblia/multimidia", tags=["Bíblia"])
@@ -356,7 +571,9 @@ async def biblia_multimidia(
     user=Depends(free_or_authenticated),
 ):
     """Busca conteúdo multimídia (áudio, vídeo, texto) de um capítulo."""
-    return buscar_conteudo_multimidia(fileset_id, book, chapter)
+    return await em_thread(
+        buscar_conteudo_multimidia, fileset_id, book, chapter
+    )
 
 
 @router.get("/biblia/audio-timestamps", tags=["Bíblia"])
@@ -367,17 +584,19 @@ async def biblia_audio_timestamps(
     user=Depends(free_or_authenticated),
 ):
     """Busca timestamps de áudio para um capítulo."""
-    return buscar_audio_timestamps(fileset_id, book, chapter)
+    return await em_thread(
+        buscar_audio_timestamps, fileset_id, book, chapter
+    )
 
 
 @router.get("/biblia/idiomas", tags=["Bíblia"])
 async def biblia_idiomas(user=Depends(get_current_user)):
-    return listar_idiomas()
+    return await em_thread(listar_idiomas)
 
 
 @router.get("/biblia/paises", tags=["Bíblia"])
 async def biblia_paises(user=Depends(get_current_user)):
-    return listar_paises()
+    return await em_thread(listar_paises)
 
 
 @router.get("/versiculo", tags=["Bíblia"])
@@ -389,7 +608,9 @@ async def versiculo(
     user=Depends(free_or_authenticated),
 ):
     """Retorna um versículo específico (parâmetros explícitos)."""
-    return buscar_versiculo(
+    # API do DBT e write-through no texto local: fora do event loop
+    return await em_thread(
+        buscar_versiculo,
         language_code,
         book_id,
         chapter_id,
@@ -402,20 +623,25 @@ async def pesquisar(
     termo: str,
     page: int = 1,
     limit: int = 5,
+    cursor: Optional[str] = None,
     user=Depends(free_or_authenticated),
 ):
-    """Pesquisa por termo; suporta paginação."""
-    return pesquisar_termo(termo, page, limit)
+    """
+    Pesquisa por termo (frases entre aspas). Com texto local, pagina por
+    `cursor` (`meta.next_cursor` da resposta anterior); `page` continua
+    aceito.
+    """
+    return await em_thread(pesquisar_termo, termo, page, limit, cursor)
 
 
 @router.get("/biblias", tags=["Bíblia"])
 async def biblias(user=Depends(get_current_user)):
-    return listar_biblias()
+    return await em_thread(listar_biblias)
 
 
 @router.get("/livros", tags=["Bíblia"])
 async def livros(bible_id: str, user=Depends(get_current_user)):
-    return listar_livros(bible_id)
+    return await em_thread(listar_livros, bible_id)
 
 
 # ----------------------------
@@ -428,11 +654,199 @@ async def gerar_ebook_endpoint(
 ):
     """
     Gera um eBook a partir de um tema e (opcional) autor/qtde capítulos.
+    - `modo=job` (padrão): 202 com o job da fila (app.jobs), o mesmo que
+      `POST /jobs` com `tipo=ebook`; acompanhe em `GET /jobs/{id}` e
+      baixe com `POST /exportar` (`job_id`).
+    - `modo=direto`: gera dentro da requisição e devolve o ebook; a
+      conexão fica aberta a geração inteira.
     """
-    resultado = gerar_ebook(body.tema, body.capitulos, body.autor)
+    from fastapi.responses import JSONResponse
+
+    if body.modo not in {"direto", "job"}:
+        raise HTTPException(
+            status_code=400, detail="`modo` deve ser 'direto' ou 'job'."
+        )
+    if body.modo == "job":
+        from app.jobs import FILA
+
+        job = await em_thread(
+            FILA.submeter, "ebook", body.model_dump(exclude={"modo"}),
+            _dono(user),
+        )
+        return JSONResponse(job, status_code=202)
+    resultado = await agerar_ebook(body.tema, body.capitulos, body.autor)
     return resultado
 
 
+# ----------------------------
+# Exportar (DOCX / PDF / Markdown)
+# ----------------------------
+@router.post("/exportar", tags=["Conteúdo"])
+async def exportar_endpoint(
+    body: ExportarRequest, user=Depends(get_current_user)
+):
+    """
+    Baixa o conteúdo gerado em DOCX, PDF ou Markdown (app.exportador).
+    Mande o JSON de `/gerar-*` em `conteudo` ou o `job_id` de um job
+    concluído. O arquivo sai do cache quando o mesmo conteúdo já foi
+    exportado no mesmo formato.
+    """
+    from fastapi.responses import StreamingResponse
+
+    from app.exportador import FORMATOS, exportar, nome_arquivo
+
+    if body.formato not in FORMATOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"`formato` deve ser um de: {', '.join(FORMATOS)}.",
+        )
+    tipo = None
+    conteudo = body.conteudo
+    if body.job_id:
+        job = await em_thread(_job, body.job_id, user)
+        if job["tipo"] not in {"sermao", "estudo", "devocional", "ebook"}:
+            raise HTTPException(
+                status_code=400, detail="Job sem documento para exportar."
+            )
+        if job["estado"] != "concluido":
+            raise HTTPException(
+                status_code=409,
+                detail=f"Job ainda não concluído (estado: {job['estado']}).",
+            )
+        tipo, conteudo = job["tipo"], job["resultado"]
+    if not isinstance(conteudo, dict) or not conteudo:
+        raise HTTPException(
+            status_code=400, detail="Informe `conteudo` ou `job_id`."
+        )
+
+    caminho, do_cache = await em_thread(
+        exportar, conteudo, body.formato, tipo
+    )
+    # Aberto já: a limpeza do cache pode apagar o arquivo durante o envio
+    arquivo = open(caminho, "rb")
+    tamanho = os.fstat(arquivo.fileno()).st_size
+
+    def pedacos():
+        with arquivo:
+            while bloco := arquivo.read(64 * 1024):
+                yield bloco
+
+    nome = nome_arquivo(conteudo, body.formato, tipo)
+    return StreamingResponse(
+        pedacos(),
+        media_type=FORMATOS[body.formato][1],
+        headers={
+            "Content-Disposition": f'attachment; filename="{nome}"',
+            "Content-Length": str(tamanho),
+            "X-Export-Cache": "hit" if do_cache else "miss",
+        },
+    )
+
+
+# ----------------------------
+# Jobs de geração (fila persistente)
+# ----------------------------
+_JOB_MODELOS = {
+    "sermao": GerarSermaoRequest,
+    "estudo": GerarEstudoRequest,
+    "devocional": GerarDevocionalRequest,
+    "ebook": GerarEbookRequest,
+    "lote": LoteRequest,
+}
+
+
+@router.post("/jobs", status_code=202, tags=["Jobs"])
+async def submeter_job(body: JobRequest, user=Depends(get_current_user)):
+    """
+    Agenda uma geração na fila persistente (app.jobs) e responde na hora
+    com o job. `parametros` são os campos do endpoint síncrono do tipo
+    (`/gerar-sermao`, `/gerar-estudo`, `/gerar-devocional`,
+    `/gerar-ebook`, `/perguntar/lote`). Acompanhe em `GET /jobs/{id}`
+    ou `GET /jobs/{id}/eventos` (SSE); cancele com `DELETE /jobs/{id}`.
+    """
+    from pydantic import ValidationError
+
+    from app.jobs import FILA
+
+    modelo = _JOB_MODELOS.get(body.tipo)
+    if modelo is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"`tipo` deve ser um de: {', '.join(_JOB_MODELOS)}.",
+        )
+    try:
+        pedido = modelo(**body.parametros)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=e.errors(include_url=False)
+        )
+    if body.tipo == "lote":
+        parametros = _parametros_lote(pedido)
+    else:
+        parametros = pedido.model_dump(exclude={"modo"})
+    return await em_thread(
+        FILA.submeter, body.tipo, parametros, _dono(user)
+    )
+
+
+@router.get("/jobs", tags=["Jobs"])
+async def listar_jobs(limite: int = 50, user=Depends(get_current_user)):
+    """Jobs do usuário, mais recentes primeiro (sem o resultado)."""
+    from app.jobs import FILA
+
+    limite = max(1, min(limite, 200))
+    return await em_thread(FILA.listar, _dono(user), limite)
+
+
+def _job(job_id: str, user) -> dict:
+    from app.jobs import FILA
+
+    job = FILA.obter(job_id, _dono(user))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job inexistente.")
+    return job
+
+
+@router.get("/jobs/{job_id}", tags=["Jobs"])
+async def job_status(job_id: str, user=Depends(get_current_user)):
+    """Estado, tentativas, progresso e, ao concluir, o resultado."""
+    return await em_thread(_job, job_id, user)
+
+
+@router.get("/jobs/{job_id}/eventos", tags=["Jobs"])
+async def job_eventos(
+    job_id: str, request: Request, user=Depends(get_current_user)
+):
+    """
+    SSE com o estado do job a cada mudança (`event: job`); termina no
+    estado final, com o resultado no último evento.
+    """
+    from fastapi.responses import StreamingResponse
+
+    from app.jobs import eventos_sse
+
+    await em_thread(_job, job_id, user)
+    return StreamingResponse(
+        eventos_sse(job_id, _dono(user), request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.delete("/jobs/{job_id}", tags=["Jobs"])
+async def cancelar_job(job_id: str, user=Depends(get_current_user)):
+    """
+    Cancela o job: se ainda está na fila, na hora; se está gerando, o
+    worker interrompe no próximo batimento (`cancelamento_pedido`).
+    """
+    from app.jobs import FILA
+
+    job = await em_thread(FILA.cancelar, job_id, _dono(user))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job inexistente.")
+    return job
+
+
 # ----------------------------
 # Upload + Ingestão
 # ----------------------------
@@ -440,19 +854,15 @@ async def gerar_ebook_endpoint(
 async def upload_arquivo(
     arquivo: UploadFile = File(...),
     tipo: str = Form(...),
-    # mantidos para compat; ignorados por enquanto
     autor: str | None = Form(None),
     tema: str | None = Form(None),
     fonte: str | None = Form(None),
     user=Depends(free_or_authenticated),
 ):
     """
-    Faz upload para um arquivo temporário e processa com `processar_arquivo`
-    e remove o arquivo em seguida.
-
-    Observação: metadados (tipo, autor, tema, fonte) são ignorados na versão
-    atual do `processar_arquivo(path)`. Se quiser persistir esses metadados,
-    posso estender o schema do banco e a função de ingestão.
+    Faz upload para um arquivo temporário, processa com `processar_arquivo`
+    (tipo, autor, tema e fonte vão para o conteúdo e para os metadados
+    usados nos filtros do RAG) e remove o arquivo em seguida.
     """
     allowed_exts = {".pdf", ".docx", ".html", ".htm", ".txt", ".md"}
     _, ext = os.path.splitext(arquivo.filename or "")
@@ -478,8 +888,11 @@ async def upload_arquivo(
         await arquivo.close()
 
     try:
-        # Compatível com ingestao.py robusto
-        inserted_id = processar_arquivo(temp_path)
+        # Extração + embeddings: fora do event loop
+        inserted_id = await em_thread(
+            processar_arquivo, temp_path, tipo, autor, tema, fonte,
+            arquivo.filename,
+        )
         if not inserted_id:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -492,7 +905,7 @@ async def upload_arquivo(
             "status": "sucesso",
             "mensagem": "Arquivo salvo e indexado.",
             "id": inserted_id,
-            "path": temp_path,
+            "path": arquivo.filename,
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -551,6 +964,7 @@ async def pergunta_unificada(
     Endpoint unificado: produz resposta ou gera conteúdo
     (estudo/devocional/ebook/sermão) e agrega um excerto do acervo
     (via Chroma) como contexto/apoio.
+    Com `X-Debug-Timings: 1` (ou `?debug=1`) inclui `timings`.
     """
     pergunta = body.pergunta.strip()
     tipo_conteudo = body.tipo_conteudo.lower()
@@ -558,9 +972,12 @@ async def pergunta_unificada(
     autor = body.autor
     versiculos = body.versiculos or []
 
+    # Filtros explícitos restringem a busca no acervo (tema só se enviado)
+    filtros = {"autor": autor, "tema": body.tema, "tipo": body.tipo}
+
     # 1) Busca no acervo via util do chat (lida com MOCK_RAG internamente)
     try:
-        docs, fontes = recuperar_docs(pergunta)
+        docs, fontes = await arecuperar_docs(pergunta, filtros=filtros)
         resposta_acervo = (
             (docs[0].page_content.strip()) if docs else ""
         )
@@ -572,20 +989,22 @@ async def pergunta_unificada(
 
     # 3) Roteamento por tipo_conteudo
     if tipo_conteudo == "estudo":
-        resultado = gerar_estudo_biblico(tema, versiculos, autor)
+        resultado = await agerar_estudo_biblico(tema, versiculos, autor)
     elif tipo_conteudo == "devocional":
-        resultado = gerar_devocional(
+        resultado = await agerar_devocional(
             tema,
             versiculos[0] if versiculos else None,
             autor,
         )
     elif tipo_conteudo == "ebook":
-        resultado = gerar_ebook(tema, 5, autor)
+        resultado = await agerar_ebook(tema, 5, autor)
     elif tipo_conteudo in {"sermão", "sermao"}:
-        resultado = gerar_sermao("expositivo", tema, versiculos, 3, autor)
+        resultado = await agerar_sermao(
+            "expositivo", tema, versiculos, 3, autor
+        )
     else:
         # "resposta" padrão: delega ao seu chat (que pode usar RAG completo)
-        result = responder_pergunta_com_versiculo(pergunta)
+        result = await aresponder_pergunta_com_versiculo(pergunta, filtros)
         if isinstance(result, dict):
             resultado = result
         else:
@@ -611,22 +1030,38 @@ async def pergunta_unificada(
             "modelo_usado": modelo,
         }
 
-    return resultado
+    return anexar_timings(resultado)
 
 
 @router.post("/perguntar/stream", tags=["RAG"])
 async def perguntar_stream(
     body: PerguntaRequest,
+    request: Request,
     user=Depends(get_current_user),
 ):
     """
     Streaming da resposta via SSE (Server-Sent Events).
-    Eventos enviados:
-      - {type: "meta", fontes: [...], modelos: {...}}
+    Eventos enviados (cada um com `id: <stream_id>:<n>`):
+      - {type: "meta", stream_id: "...", fontes: [...], modelos: {...}}
       - {type: "token", content: "<texto parcial>"}
       - {type: "versiculo", ref: "João 3:16", texto: "<texto>" } (opcional)
+      - {type: "limite", motivo: "tempo"|"tokens"|"desconexao"}
+        (geração interrompida)
+      - {type: "timings", ...} (apenas em modo debug)
       - {type: "done"}
+    Reenviar a requisição com `Last-Event-ID` retoma o stream do buffer
+    (ou `GET /perguntar/stream/{stream_id}`). Sem nenhum cliente
+    conectado além da carência, a geração no LLM é cancelada (vide
+    app.streaming). A mesma pergunta já em geração é assinada, não
+    gerada de novo (app.singleflight); uma já respondida na geração
+    corrente do índice (app.cache) vem num único evento `token`.
     """
+    retomada = ler_event_id(request.headers.get("last-event-id"))
+    if retomada:
+        t = TRANSMISSOES.obter(retomada[0], _dono(user))
+        if t is not None:
+            return resposta_sse(t, retomada[1], request)
+
     pergunta = body.pergunta.strip()
     if not pergunta:
         raise HTTPException(
@@ -634,56 +1069,115 @@ async def perguntar_stream(
             detail="Campo 'pergunta' é obrigatório.",
         )
 
-    # Recupera docs + fontes uma única vez (antes do streaming)
     from app.chat import (
-        recuperar_docs,
         stream_resposta,
-        buscar_versiculo,
+        guardar_resposta,
+        resposta_em_cache,
         _SALVACAO_REGEX,
+        _versiculo_salvacao,
         LLM_MODEL,
         EMBED_MODEL,
         PERSIST_DIR,
         COLLECTION_NAME,
     )
 
-    docs, fontes = recuperar_docs(pergunta)
-
-    async def event_generator():
+    chave = chave_pergunta(pergunta)
+    em_voo = TRANSMISSOES.assinar(chave, _dono(user))
+    if em_voo is not None:
+        return resposta_sse(em_voo, 0, request)
+    transmissao = TRANSMISSOES.nova(_dono(user), chave)
+
+    async def gerar():
+        publicar = transmissao.publicar
+        # Resposta já gerada (cache/aquecimento) sai num evento só
+        guardada = resposta_em_cache(pergunta)
+        if guardada is not None:
+            docs, fontes = None, guardada["fontes"]
+        else:
+            # Recupera docs + fontes uma única vez (antes do streaming)
+            docs, fontes = await arecuperar_docs(pergunta)
         # 1) Evento inicial com metadados e fontes
-        meta = {
+        publicar({
             "type": "meta",
+            "stream_id": transmissao.id,
             "fontes": fontes,
             "modelos": {"llm": LLM_MODEL, "embeddings": EMBED_MODEL},
             "chroma": {
                 "persist_dir": PERSIST_DIR,
                 "collection": COLLECTION_NAME,
             },
-        }
-        yield f"data: {json.dumps(meta, ensure_ascii=False)}\n\n"
+        })
 
-        # 2) Stream de tokens
-        async for token in stream_resposta(pergunta, docs=docs):
-            if not token:
-                continue
-            data = {"type": "token", "content": token}
-            yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        if guardada is not None:
+            transmissao.publicar_token(guardada["resposta"])
+            versiculo = guardada["versiculo"]
+        else:
+            # 2) Stream de tokens (com limites; cancela sem leitores)
+            partes = []
+            guarda = GuardaStream(transmissao, modelo=LLM_MODEL)
+            async for token in guarda.percorrer(
+                stream_resposta(pergunta, docs=docs)
+            ):
+                if token:
+                    partes.append(token)
+                    transmissao.publicar_token(token)
+            if guarda.motivo:
+                publicar({"type": "limite", "motivo": guarda.motivo})
+            if guarda.motivo == "desconexao":
+                publicar({"type": "done"})
+                return
+
+            versiculo = None
+            if _SALVACAO_REGEX.search(pergunta):
+                versiculo = await em_thread(_versiculo_salvacao)
+            if guarda.motivo is None:
+                guardar_resposta(
+                    pergunta, None, "".join(partes).strip(), fontes,
+                    versiculo,
+                )
 
         # 3) Injeta João 3:16 quando apropriado
-        try:
-            if _SALVACAO_REGEX.search(pergunta):
-                v = buscar_versiculo("João 3:16")
-                if v:
-                    data = {
-                        "type": "versiculo",
-                        "ref": "João 3:16",
-                        "texto": v,
-                    }
-                    yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-        except Exception:
-            # falha silenciosa: não interrompe o stream
-            pass
+        if versiculo:
+            publicar({
+                "type": "versiculo",
+                "ref": "João 3:16",
+                "texto": versiculo,
+            })
+
+        # 4) Tempos por estágio (opt-in via X-Debug-Timings / ?debug=1)
+        trace = trace_atual()
+        if trace is not None and trace.debug:
+            publicar({"type": "timings", **trace.resumo()})
+
+        # 5) Fim
+        publicar({"type": "done"})
+
+    transmissao.iniciar(gerar())
+    return resposta_sse(transmissao, 0, request)
+
+
+@router.get("/perguntar/stream/{stream_id}", tags=["RAG"])
+async def retomar_stream(
+    stream_id: str,
+    request: Request,
+    desde: int = 0,
+    user=Depends(get_current_user),
+):
+    """
+    Retoma um stream de `/perguntar/stream` a partir do evento `desde`
+    (ou do header `Last-Event-ID`), enquanto ele estiver no buffer.
+    """
+    retomada = ler_event_id(request.headers.get("last-event-id"))
+    if retomada and retomada[0] == stream_id:
+        desde = retomada[1]
+    t = TRANSMISSOES.obter(stream_id, _dono(user))
+    if t is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Stream expirado ou inexistente; refaça a pergunta.",
+        )
+    return resposta_sse(t, desde, request)
 
-        # 4) Fim
-        yield f"data: {json.dumps({'type': 'done'})}\n\n"
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+def _dono(user) -> Optional[str]:
+    return getattr(user, "username", None)
@@ -1,91 +1,146 @@
-from app.chat import responder_pergunta_com_versiculo
+"""
+Geração de sermões, estudos, devocionais e ebooks sobre o RAG.
+
+Cada tipo monta um pedido (tarefa, texto, filtros, montar) e tem duas
+formas: `agerar_*` (assíncrona, usada pela API) e `gerar_*` (síncrona,
+para CLI/scripts, que só espera a assíncrona por `chat.em_loop`). O
+texto do pedido traz só as partes variáveis; as instruções de cada
+tarefa ficam no prefixo fixo do prompt (app.prompts). Montar o pedido e
+o resultado (API da Bíblia, citações) roda no pool de threads da
+recuperação e a geração vai por `astream`, sem prender o event loop.
+"""
+from app import prompts
+from app.chat import (
+    aresponder_pergunta_com_versiculo,
+    em_loop,
+    em_thread,
+)
 from app.biblia_api import buscar_versiculo
 from app.sermoes.templates import montar_esboco
 from app.sermoes.utils import buscar_autores
 
 
-def gerar_sermao(tipo, tema, versiculos, num_topicos, autor=None):
+def _filtros(tema, autor):
+    """Restringe a recuperação ao autor/tema pedidos (relaxa se vazio)."""
+    return {"tema": tema, "autor": autor}
+
+
+def _resultado(resposta, tipo, num_topicos, tema, autor, **campos):
+    texto = resposta.get("resposta", "")
+    return {
+        "tema": tema,
+        **campos,
+        "autor": autor,
+        "esboco": montar_esboco(texto, tipo, num_topicos),
+        "citacoes": buscar_autores(tema, autor),
+        "texto_gerado": texto,
+        "fontes": resposta.get("fontes", []),
+    }
+
+
+# ----------------------------
+# Pedidos: (tarefa, texto, filtros, montar)
+# ----------------------------
+def _sermao(tipo, tema, versiculos, num_topicos, autor=None):
     referencias = [buscar_versiculo(v) for v in versiculos]
     base_biblica = "\n".join([
         f"{v} — {texto}"
         for v, texto in zip(versiculos, referencias)
     ])
-    citacoes = buscar_autores(tema, autor)
-    prompt = (
-        f"Crie um sermão {tipo} sobre '{tema}' com {num_topicos} tópicos. "
-        f"Use os versículos: {base_biblica}. "
-        f"Inclua citações de {autor or 'teólogos relevantes'}."
+    texto = prompts.pedido(
+        "sermao", tipo=tipo, tema=tema, num_topicos=num_topicos,
+        base_biblica=base_biblica, autor=autor,
     )
-    resposta = responder_pergunta_com_versiculo(prompt)
-    esboco = montar_esboco(resposta, tipo, num_topicos)
-    return {
-        "tema": tema,
-        "tipo": tipo,
-        "versiculos": versiculos,
-        "autor": autor,
-        "esboco": esboco,
-        "citacoes": citacoes,
-        "texto_gerado": resposta
-    }
 
+    def montar(resposta):
+        return _resultado(
+            resposta, tipo, num_topicos, tema, autor,
+            tipo=tipo, versiculos=versiculos,
+        )
 
-def gerar_estudo_biblico(tema, versiculos, autor=None):
-    prompt = (
-        f"Crie um estudo bíblico sobre '{tema}'. "
-        f"Use os versículos: {', '.join(versiculos)}. "
-        f"Inclua citações de {autor or 'teólogos relevantes'}. "
-        "Estruture em introdução, desenvolvimento e conclusão."
+    return "sermao", texto, _filtros(tema, autor), montar
+
+
+def _estudo(tema, versiculos, autor=None):
+    texto = prompts.pedido(
+        "estudo", tema=tema, versiculos=versiculos, autor=autor
     )
-    resposta = responder_pergunta_com_versiculo(prompt)
-    esboco = montar_esboco(resposta, "estudo", 3)
-    citacoes = buscar_autores(tema, autor)
-    return {
-        "tema": tema,
-        "versiculos": versiculos,
-        "autor": autor,
-        "esboco": esboco,
-        "citacoes": citacoes,
-        "texto_gerado": resposta
-    }
 
+    def montar(resposta):
+        return _resultado(
+            resposta, "estudo", 3, tema, autor, versiculos=versiculos
+        )
 
-def gerar_devocional(tema, versiculo, autor=None):
-    prompt = (
-        f"Crie um devocional sobre '{tema}' baseado no versículo {versiculo}. "
-        "Inclua uma reflexão pessoal e uma oração final."
+    return "estudo", texto, _filtros(tema, autor), montar
+
+
+def _devocional(tema, versiculo, autor=None):
+    texto = prompts.pedido("devocional", tema=tema, versiculo=versiculo)
+
+    def montar(resposta):
+        return _resultado(
+            resposta, "devocional", 2, tema, autor, versiculo=versiculo
+        )
+
+    return "devocional", texto, _filtros(tema, autor), montar
+
+
+def _ebook(tema, capitulos, autor=None):
+    texto = prompts.pedido(
+        "ebook", tema=tema, capitulos=capitulos, autor=autor
     )
-    resposta = responder_pergunta_com_versiculo(prompt)
-    esboco = montar_esboco(resposta, "devocional", 2)
-    citacoes = buscar_autores(tema, autor)
-    return {
-        "tema": tema,
-        "versiculo": versiculo,
-        "autor": autor,
-        "esboco": esboco,
-        "citacoes": citacoes,
-        "texto_gerado": resposta
-    }
+
+    def montar(resposta):
+        return _resultado(
+            resposta, "ebook", capitulos, tema, autor, capitulos=capitulos
+        )
+
+    return "ebook", texto, _filtros(tema, autor), montar
+
+
+async def _agerar(construtor, *args):
+    tarefa, texto, filtros, montar = await em_thread(construtor, *args)
+    resposta = await aresponder_pergunta_com_versiculo(
+        texto, filtros, tarefa
+    )
+    return await em_thread(montar, resposta)
+
+
+# ----------------------------
+# Síncronas (CLI)
+# ----------------------------
+def gerar_sermao(tipo, tema, versiculos, num_topicos, autor=None):
+    return em_loop(agerar_sermao(tipo, tema, versiculos, num_topicos, autor))
+
+
+def gerar_estudo_biblico(tema, versiculos, autor=None):
+    return em_loop(agerar_estudo_biblico(tema, versiculos, autor))
+
+
+def gerar_devocional(tema, versiculo, autor=None):
+    return em_loop(agerar_devocional(tema, versiculo, autor))
 
 
 def gerar_ebook(tema, capitulos, autor=None):
-    prompt = (
-        f"Crie um ebook sobre '{tema}' dividido em {capitulos} capítulos. "
-        (
-            (
-                "Cada capítulo deve abordar um aspecto do tema "
-                "e incluir referências bíblicas "
-                f"e citações de {autor or 'teólogos relevantes'}."
-            )
-        )
+    return em_loop(agerar_ebook(tema, capitulos, autor))
+
+
+# ----------------------------
+# Assíncronas (API)
+# ----------------------------
+async def agerar_sermao(tipo, tema, versiculos, num_topicos, autor=None):
+    return await _agerar(
+        _sermao, tipo, tema, versiculos, num_topicos, autor
     )
-    resposta = responder_pergunta_com_versiculo(prompt)
-    esboco = montar_esboco(resposta, "ebook", capitulos)
-    citacoes = buscar_autores(tema, autor)
-    return {
-        "tema": tema,
-        "capitulos": capitulos,
-        "autor": autor,
-        "esboco": esboco,
-        "citacoes": citacoes,
-        "texto_gerado": resposta
-    }
+
+
+async def agerar_estudo_biblico(tema, versiculos, autor=None):
+    return await _agerar(_estudo, tema, versiculos, autor)
+
+
+async def agerar_devocional(tema, versiculo, autor=None):
+    return await _agerar(_devocional, tema, versiculo, autor)
+
+
+async def agerar_ebook(tema, capitulos, autor=None):
+    return await _agerar(_ebook, tema, capitulos, autor)
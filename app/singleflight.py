@@ -0,0 +1,115 @@
+# app/singleflight.py
+"""
+Coalescência de perguntas idênticas em voo (single-flight).
+
+Perguntas iguais depois de normalizadas (caixa, acentos, pontuação e
+espaços) e com os mesmos filtros, chegando enquanto a primeira ainda é
+respondida, esperam a mesma execução em vez de disparar outra
+recuperação e outra geração no LLM. Cada uma recebe sua própria cópia
+do resultado.
+
+No streaming a coalescência é feita pelas `Transmissao` de
+app.streaming: quem chega depois assina o stream em voo (fan-out) e
+recebe os mesmos eventos desde o início.
+
+- EKLESIA_SINGLEFLIGHT: "1" (padrão) liga; "0" desliga
+
+Métricas: `eklesia_singleflight_requests_total{kind,role}` (role=leader
+para quem executa, follower para quem pegou carona) e
+`eklesia_stream_fanout` (assinantes por stream gerado).
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.lexical import limpar_filtros, sem_acentos
+from app.metrics import SINGLEFLIGHT_REQUESTS
+from app.tracing import anotar
+
+load_dotenv()
+
+SINGLEFLIGHT = os.getenv("EKLESIA_SINGLEFLIGHT", "1").lower() in {
+    "1", "true", "yes"
+}
+
+_PALAVRA = re.compile(r"\w+(?::\w+)*")
+
+
+def normalizar_pergunta(texto: str) -> str:
+    """'Quem foi  Nicodemos?' e 'quem foi nicodemos' dão a mesma chave."""
+    return " ".join(_PALAVRA.findall(sem_acentos((texto or "").casefold())))
+
+
+def chave_pergunta(
+    pergunta: str, filtros: Optional[Dict[str, Any]] = None
+) -> str:
+    filtro = ",".join(
+        f"{c}={v}" for c, v in sorted(limpar_filtros(filtros).items())
+    )
+    return f"{normalizar_pergunta(pergunta)}|{filtro}"
+
+
+class _Voo:
+    def __init__(self, tarefa: asyncio.Task):
+        self.tarefa = tarefa
+        self.esperando = 0
+
+
+class SingleFlight:
+    def __init__(self, tipo: str):
+        self.tipo = tipo
+        self._voos: Dict[str, _Voo] = {}
+
+    def em_voo(self) -> int:
+        return len(self._voos)
+
+    async def executar(
+        self, chave: str, fabrica: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Resultado de `fabrica()`, compartilhado com chamadas concorrentes
+        de mesma chave. Se todos os interessados desistem (cancelados),
+        a execução é cancelada.
+        """
+        if not SINGLEFLIGHT:
+            return await fabrica()
+        voo = self._voos.get(chave)
+        if (
+            voo is not None
+            and voo.tarefa.get_loop() is not asyncio.get_running_loop()
+        ):
+            # Task de outro event loop (vide chat.em_loop) não pode ser
+            # esperada daqui
+            return await fabrica()
+        if voo is None:
+            voo = _Voo(asyncio.create_task(fabrica()))
+            self._voos[chave] = voo
+            voo.tarefa.add_done_callback(
+                lambda _t, c=chave, v=voo: self._encerrar(c, v)
+            )
+            papel = "leader"
+        else:
+            papel = "follower"
+        SINGLEFLIGHT_REQUESTS.inc(kind=self.tipo, role=papel)
+        anotar(singleflight=papel)
+
+        voo.esperando += 1
+        try:
+            resultado = await asyncio.shield(voo.tarefa)
+        except asyncio.CancelledError:
+            if not voo.tarefa.done() and voo.esperando == 1:
+                voo.tarefa.cancel()
+            raise
+        finally:
+            voo.esperando -= 1
+        return copy.deepcopy(resultado)
+
+    def _encerrar(self, chave: str, voo: _Voo) -> None:
+        if self._voos.get(chave) is voo:
+            del self._voos[chave]
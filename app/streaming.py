@@ -0,0 +1,464 @@
+# app/streaming.py
+"""
+Guarda dos streams SSE de geração.
+
+`GuardaStream.percorrer` consome os tokens do LLM numa task própria e
+os repassa ao cliente. Interrompe a geração (cancelando a task, o que
+fecha a conexão com o Ollama e libera o slot de OLLAMA_NUM_PARALLEL)
+quando:
+
+- o cliente desconecta (verificado a cada EKLESIA_STREAM_POLL_S
+  segundos, padrão 0.5, mesmo se o LLM ainda não mandou nada)
+- passa EKLESIA_STREAM_MAX_SECONDS segundos de geração (120)
+- chegam EKLESIA_STREAM_MAX_TOKENS chunks de tokens (1024)
+
+Cada interrupção conta em `eklesia_llm_streams_cancelled_total` e os
+tokens que deixaram de ser gerados (estimados pela média das respostas
+completas do modelo) em `eklesia_llm_tokens_saved_total`.
+
+Streams retomáveis: a geração roda desacoplada da conexão e publica os
+eventos numa `Transmissao` em memória; cada evento SSE leva o id
+`<stream_id>:<n>`. Quem reconecta com `Last-Event-ID` recebe o que
+perdeu do buffer e segue ao vivo, sem gerar de novo. A mesma pergunta
+chegando enquanto a transmissão gera vira mais um assinante dela
+(fan-out; vide app.singleflight).
+
+- EKLESIA_SSE_HEARTBEAT_S: comentário `: ping` sem eventos há N
+  segundos (15), para proxies não fecharem a conexão ociosa
+- EKLESIA_SSE_RETRY_MS: `retry:` sugerido ao cliente (3000)
+- EKLESIA_STREAM_RESUME_GRACE_S: sem nenhum leitor por N segundos
+  (15), a geração é cancelada como desconexão
+- EKLESIA_STREAM_REPLAY_TTL_S: quanto um stream fica no buffer depois
+  da última atividade (300)
+- EKLESIA_STREAM_REPLAY_MAX: streams mantidos no buffer (256)
+
+Enquadramento: tokens que chegam dentro de EKLESIA_SSE_FLUSH_MS (40;
+0 = um evento por token) viram um só evento, ou antes disso ao somar
+EKLESIA_SSE_FLUSH_BYTES (512). Os frames são montados uma vez, já em
+bytes (orjson), a partir de um prefixo fixo por
+stream; o leitor manda tudo o que estiver pendente numa escrita só.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import (
+    Any, AsyncIterator, Callable, Dict, List, Optional, Tuple,
+)
+
+import orjson
+from dotenv import load_dotenv
+
+from app.logging_utils import get_logger
+from app.metrics import (
+    LLM_STREAMS_CANCELLED,
+    LLM_TOKENS_SAVED,
+    SINGLEFLIGHT_REQUESTS,
+    STREAM_FANOUT,
+)
+from app.singleflight import SINGLEFLIGHT
+from app.tracing import anotar
+
+load_dotenv()
+
+STREAM_MAX_TOKENS = int(os.getenv("EKLESIA_STREAM_MAX_TOKENS", "1024"))
+STREAM_MAX_SECONDS = float(os.getenv("EKLESIA_STREAM_MAX_SECONDS", "120"))
+STREAM_POLL = float(os.getenv("EKLESIA_STREAM_POLL_S", "0.5"))
+SSE_HEARTBEAT = float(os.getenv("EKLESIA_SSE_HEARTBEAT_S", "15"))
+SSE_RETRY_MS = int(os.getenv("EKLESIA_SSE_RETRY_MS", "3000"))
+RESUME_GRACE = float(os.getenv("EKLESIA_STREAM_RESUME_GRACE_S", "15"))
+REPLAY_TTL = float(os.getenv("EKLESIA_STREAM_REPLAY_TTL_S", "300"))
+REPLAY_MAX = int(os.getenv("EKLESIA_STREAM_REPLAY_MAX", "256"))
+SSE_FLUSH_MS = float(os.getenv("EKLESIA_SSE_FLUSH_MS", "40"))
+SSE_FLUSH_BYTES = int(os.getenv("EKLESIA_SSE_FLUSH_BYTES", "512"))
+# Peso da última resposta completa na média de tokens por modelo
+_EWMA = 0.2
+
+log = get_logger("streaming")
+
+_FIM = object()
+_medias: Dict[str, float] = {}
+_medias_lock = threading.Lock()
+
+
+def media_tokens(modelo: str) -> float:
+    """Média móvel de chunks por resposta completa do modelo (0 = n/d)."""
+    return _medias.get(modelo, 0.0)
+
+
+def _registrar_completa(modelo: str, tokens: int) -> None:
+    with _medias_lock:
+        atual = _medias.get(modelo)
+        _medias[modelo] = (
+            float(tokens) if atual is None
+            else _EWMA * tokens + (1 - _EWMA) * atual
+        )
+
+
+# ----------------------------
+# Guarda da geração
+# ----------------------------
+class GuardaStream:
+    """
+    `request` é qualquer objeto com `async is_disconnected()`: o Request
+    do Starlette ou uma `Transmissao` (sem leitores além da carência).
+    """
+
+    def __init__(
+        self,
+        request: Any = None,
+        modelo: str = "-",
+        max_tokens: int = STREAM_MAX_TOKENS,
+        max_segundos: float = STREAM_MAX_SECONDS,
+    ):
+        self.request = request
+        self.modelo = modelo
+        self.max_tokens = max_tokens
+        self.max_segundos = max_segundos
+        # desconexao | tempo | tokens (None = terminou normalmente)
+        self.motivo: Optional[str] = None
+        self.produzidos = 0
+        self._erro: Optional[BaseException] = None
+
+    async def _produzir(self, tokens: AsyncIterator[str], fila):
+        try:
+            async for t in tokens:
+                self.produzidos += 1
+                fila.put_nowait(t)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._erro = e
+        finally:
+            fila.put_nowait(_FIM)
+
+    async def _vigiar(self, produtor: asyncio.Task) -> None:
+        prazo = time.monotonic() + self.max_segundos
+        while not produtor.done():
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                self._interromper("tempo", produtor)
+                return
+            await asyncio.sleep(min(STREAM_POLL, restante))
+            if self.request is not None and (
+                await self.request.is_disconnected()
+            ):
+                self._interromper("desconexao", produtor)
+                return
+
+    def _interromper(self, motivo: str, produtor: asyncio.Task) -> None:
+        if self.motivo is None:
+            self.motivo = motivo
+        produtor.cancel()
+
+    async def percorrer(
+        self, tokens: AsyncIterator[str]
+    ) -> AsyncIterator[str]:
+        """Repassa os tokens até o fim do LLM ou até um dos limites."""
+        fila: asyncio.Queue = asyncio.Queue()
+        produtor = asyncio.create_task(self._produzir(tokens, fila))
+        vigia = asyncio.create_task(self._vigiar(produtor))
+        entregues = 0
+        try:
+            while True:
+                token = await fila.get()
+                if token is _FIM:
+                    break
+                entregues += 1
+                yield token
+                if entregues >= self.max_tokens:
+                    self._interromper("tokens", produtor)
+                    break
+        except (asyncio.CancelledError, GeneratorExit):
+            # Starlette cancela a resposta quando o cliente some
+            if self.motivo is None:
+                self.motivo = "desconexao"
+            raise
+        finally:
+            vigia.cancel()
+            produtor.cancel()
+            self._registrar()
+        if self._erro is not None and self.motivo is None:
+            raise self._erro
+
+    def _registrar(self) -> None:
+        if self.motivo is None:
+            if self._erro is None:
+                _registrar_completa(self.modelo, self.produzidos)
+            return
+        poupados = max(
+            0, int(min(self.max_tokens, media_tokens(self.modelo)))
+            - self.produzidos
+        )
+        LLM_STREAMS_CANCELLED.inc(model=self.modelo, reason=self.motivo)
+        LLM_TOKENS_SAVED.inc(poupados, model=self.modelo, reason=self.motivo)
+        anotar(stream_interrompido=self.motivo, tokens_poupados=poupados)
+
+
+# ----------------------------
+# Streams retomáveis
+# ----------------------------
+_TOKEN = b'\ndata: {"type":"token","content":'
+
+
+def _json(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+def formatar_evento(
+    evento: Any, event_id: str = "", nome: str = ""
+) -> bytes:
+    """Frame SSE (`id:`/`event:` opcionais) com `evento` em JSON."""
+    linha_id = f"id: {event_id}\n".encode() if event_id else b""
+    if nome:
+        linha_id += f"event: {nome}\n".encode()
+    return linha_id + b"data: " + _json(evento) + b"\n\n"
+
+
+def ler_event_id(valor: Optional[str]) -> Optional[Tuple[str, int]]:
+    """`<stream_id>:<n>` -> (stream_id, n); None se inválido."""
+    if not valor or ":" not in valor:
+        return None
+    sid, _, n = valor.strip().rpartition(":")
+    if not sid or not n.isdigit():
+        return None
+    return sid, int(n)
+
+
+class Transmissao:
+    def __init__(
+        self,
+        dono: Optional[str] = None,
+        flush_ms: float = SSE_FLUSH_MS,
+        flush_bytes: int = SSE_FLUSH_BYTES,
+    ):
+        self.id = uuid.uuid4().hex
+        # Quem pode retomar: o dono e quem assinou em voo (fan-out)
+        self.donos = {dono} if dono is not None else set()
+        self.assinantes = 1
+        self.chave: Optional[str] = None
+        self.frames: List[bytes] = []
+        self.fim = False
+        self.flush_s = flush_ms / 1000
+        self.flush_bytes = flush_bytes
+        self._prefixo = f"id: {self.id}:".encode()
+        self._pendente: List[str] = []
+        self._pendente_chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.leitores = 0
+        self.atividade = time.monotonic()
+        self._sem_leitor_desde: Optional[float] = time.monotonic()
+        self._novo = asyncio.Event()
+        self._tarefa: Optional[asyncio.Task] = None
+        # Chamado uma vez quando a geração termina (vide BufferStreams)
+        self.ao_encerrar: Optional[Callable[[], None]] = None
+
+    def publicar(self, evento: Dict[str, Any]) -> None:
+        self._descarregar()
+        n = len(self.frames) + 1
+        self.frames.append(formatar_evento(evento, f"{self.id}:{n}"))
+        self.atividade = time.monotonic()
+        self._novo.set()
+
+    def publicar_token(self, texto: str) -> None:
+        """Token do LLM; agrupado com os vizinhos na janela de flush."""
+        self._pendente.append(texto)
+        self._pendente_chars += len(texto)
+        if self.flush_s <= 0 or self._pendente_chars >= self.flush_bytes:
+            self._descarregar()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.flush_s, self._descarregar
+            )
+
+    def _descarregar(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pendente:
+            return
+        texto = "".join(self._pendente)
+        self._pendente.clear()
+        self._pendente_chars = 0
+        n = len(self.frames) + 1
+        self.frames.append(
+            self._prefixo + str(n).encode() + _TOKEN + _json(texto)
+            + b"}\n\n"
+        )
+        self.atividade = time.monotonic()
+        self._novo.set()
+
+    def encerrar(self) -> None:
+        self._descarregar()
+        if not self.fim:
+            STREAM_FANOUT.observe(self.assinantes)
+            if self.ao_encerrar is not None:
+                self.ao_encerrar()
+        self.fim = True
+        self.atividade = time.monotonic()
+        self._novo.set()
+
+    def iniciar(self, geracao) -> None:
+        """Roda a corrotina `geracao` (que publica) fora da conexão."""
+
+        async def rodar():
+            try:
+                await geracao
+            except Exception as e:
+                log.error("stream_erro", stream_id=self.id, error=str(e))
+                self.publicar({"type": "erro", "detail": str(e)})
+            finally:
+                self.encerrar()
+
+        self._tarefa = asyncio.create_task(rodar())
+
+    async def is_disconnected(self) -> bool:
+        desde = self._sem_leitor_desde
+        return (
+            self.leitores == 0 and desde is not None
+            and time.monotonic() - desde > RESUME_GRACE
+        )
+
+    async def ler(
+        self, desde: int = 0, request: Any = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Frames a partir do evento `desde` + 1, seguindo ao vivo até o
+        fim (os pendentes juntos, numa escrita); comentário de heartbeat
+        quando fica ocioso.
+        """
+        self.leitores += 1
+        self._sem_leitor_desde = None
+        try:
+            if desde == 0:
+                yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+            proximo = desde
+            ocioso = time.monotonic()
+            while True:
+                if proximo < len(self.frames):
+                    frames = self.frames[proximo:]
+                    proximo += len(frames)
+                    ocioso = time.monotonic()
+                    yield b"".join(frames)
+                    continue
+                if self.fim:
+                    return
+                if time.monotonic() - ocioso >= SSE_HEARTBEAT:
+                    ocioso = time.monotonic()
+                    yield b": ping\n\n"
+                self._novo.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._novo.wait(),
+                        min(STREAM_POLL, SSE_HEARTBEAT),
+                    )
+                except asyncio.TimeoutError:
+                    if request is not None and (
+                        await request.is_disconnected()
+                    ):
+                        return
+        finally:
+            self.leitores -= 1
+            if self.leitores == 0:
+                self._sem_leitor_desde = time.monotonic()
+            self.atividade = time.monotonic()
+
+
+class BufferStreams:
+    """Transmissões recentes, por id, com TTL e limite de quantidade."""
+
+    def __init__(self, ttl: float = REPLAY_TTL, maximo: int = REPLAY_MAX):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._itens: "OrderedDict[str, Transmissao]" = OrderedDict()
+        # chave da pergunta -> id da transmissão ainda gerando
+        self._em_voo: Dict[str, str] = {}
+
+    def _liberar(self, chave: str, sid: str) -> None:
+        """Tira `chave` do voo se ainda aponta para a transmissão `sid`."""
+        if self._em_voo.get(chave) == sid:
+            del self._em_voo[chave]
+
+    def _descartar(self, sid: str) -> None:
+        t = self._itens.pop(sid)
+        if t.chave is not None:
+            self._liberar(t.chave, sid)
+
+    def _podar(self) -> None:
+        agora = time.monotonic()
+        for sid, t in list(self._itens.items()):
+            if t.leitores == 0 and agora - t.atividade > self.ttl:
+                self._descartar(sid)
+        # Acima do limite, saem primeiro as mais antigas já encerradas
+        for sid, t in list(self._itens.items()):
+            if len(self._itens) <= self.maximo:
+                break
+            if t.fim and t.leitores == 0:
+                self._descartar(sid)
+
+    def nova(
+        self, dono: Optional[str] = None, chave: Optional[str] = None
+    ) -> Transmissao:
+        self._podar()
+        t = Transmissao(dono)
+        self._itens[t.id] = t
+        if chave is not None and SINGLEFLIGHT:
+            t.chave = chave
+            t.ao_encerrar = lambda: self._liberar(chave, t.id)
+            self._em_voo[chave] = t.id
+            SINGLEFLIGHT_REQUESTS.inc(kind="stream", role="leader")
+        return t
+
+    def assinar(
+        self, chave: str, dono: Optional[str] = None
+    ) -> Optional[Transmissao]:
+        """
+        Transmissão ainda gerando para a mesma pergunta: o novo cliente
+        vira assinante dela (recebe tudo desde o início) em vez de
+        disparar outra geração.
+        """
+        if not SINGLEFLIGHT:
+            return None
+        sid = self._em_voo.get(chave)
+        t = self._itens.get(sid) if sid else None
+        if t is None or t.fim:
+            self._em_voo.pop(chave, None)
+            return None
+        if dono is not None:
+            t.donos.add(dono)
+        t.assinantes += 1
+        SINGLEFLIGHT_REQUESTS.inc(kind="stream", role="follower")
+        anotar(singleflight="follower", stream_id=t.id)
+        return t
+
+    def obter(
+        self, sid: str, dono: Optional[str] = None
+    ) -> Optional[Transmissao]:
+        t = self._itens.get(sid)
+        if t is None or (t.donos and dono not in t.donos):
+            return None
+        return t
+
+
+TRANSMISSOES = BufferStreams()
+
+
+def resposta_sse(
+    transmissao: Transmissao, desde: int = 0, request: Any = None
+):
+    from fastapi.responses import StreamingResponse
+
+    return StreamingResponse(
+        transmissao.ler(desde, request),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # nginx: não bufferiza esta resposta (vide deploy/nginx)
+            "X-Accel-Buffering": "no",
+            "X-Stream-Id": transmissao.id,
+        },
+    )
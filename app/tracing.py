@@ -0,0 +1,154 @@
+# app/tracing.py
+"""
+Tracing por requisição: tempos de cada estágio do RAG, chamadas à API da
+Bíblia e tamanho do prompt, com um request id.
+
+O middleware cria um `Trace` por requisição HTTP; os helpers de
+`app.metrics` alimentam o trace corrente. Quando o cliente pede modo debug
+(header `X-Debug-Timings: 1` ou query `?debug=1`) as rotas RAG devolvem o
+objeto `timings`; o mesmo resumo vai para o log JSON `eklesia.trace`.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+DEBUG_HEADER = "x-debug-timings"
+REQUEST_ID_HEADER = "x-request-id"
+
+TRACE_LOG = os.getenv("EKLESIA_TRACE_LOG", "1").lower() in {
+    "1", "true", "yes"
+}
+
+logger = logging.getLogger("eklesia.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar(
+    "eklesia_trace", default=None
+)
+
+
+class Trace:
+    def __init__(self, request_id: str, route: str, debug: bool = False):
+        self.request_id = request_id
+        self.route = route
+        self.debug = debug
+        self.inicio = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.bible_api: List[Dict[str, Any]] = []
+        self.info: Dict[str, Any] = {}
+
+    def stage(self, nome: str, segundos: float) -> None:
+        # Estágios podem se repetir (ex.: duas recuperações); soma os tempos
+        self.stages[nome] = self.stages.get(nome, 0.0) + segundos * 1000
+
+    def bible_call(self, operacao: str, status: str, segundos: float):
+        self.bible_api.append({
+            "operation": operacao,
+            "status": status,
+            "ms": round(segundos * 1000, 2),
+        })
+
+    def resumo(self) -> Dict[str, Any]:
+        dados: Dict[str, Any] = {
+            f"{k}_ms": round(v, 2) for k, v in self.stages.items()
+        }
+        dados["bible_api"] = self.bible_api
+        dados.update(self.info)
+        dados["total_ms"] = round(
+            (time.perf_counter() - self.inicio) * 1000, 2
+        )
+        return dados
+
+
+def trace_atual() -> Optional[Trace]:
+    return _trace.get()
+
+
+def registrar_stage(nome: str, segundos: float) -> None:
+    t = _trace.get()
+    if t is not None:
+        t.stage(nome, segundos)
+
+
+def registrar_bible_call(operacao: str, status: str, segundos: float):
+    t = _trace.get()
+    if t is not None:
+        t.bible_call(operacao, status, segundos)
+
+
+def anotar(**info: Any) -> None:
+    """Acrescenta dados ao trace (ex.: docs=3, prompt_chars=1200)."""
+    t = _trace.get()
+    if t is not None:
+        t.info.update(info)
+
+
+def anexar_timings(resultado: Any) -> Any:
+    """Inclui `timings` na resposta quando a requisição pediu debug."""
+    t = _trace.get()
+    if t is not None and t.debug and isinstance(resultado, dict):
+        resultado["timings"] = t.resumo()
+    return resultado
+
+
+def _debug_solicitado(scope) -> bool:
+    for nome, valor in scope.get("headers", []):
+        if nome == DEBUG_HEADER.encode():
+            return valor.decode().lower() in {"1", "true", "yes"}
+    query = scope.get("query_string", b"").decode()
+    return any(
+        p in {"debug=1", "debug=true"} for p in query.split("&")
+    )
+
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for nome, valor in scope.get("headers", []):
+            if nome == REQUEST_ID_HEADER.encode():
+                request_id = valor.decode()[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        trace = Trace(request_id, scope["path"], _debug_solicitado(scope))
+        token = _trace.set(trace)
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (REQUEST_ID_HEADER.encode(), request_id.encode())
+                )
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _trace.reset(token)
+            # Só registra requisições que passaram pelo pipeline RAG
+            if TRACE_LOG and (trace.stages or trace.bible_api):
+                logger.info(json.dumps({
+                    "event": "request_trace",
+                    "request_id": request_id,
+                    "route": trace.route,
+                    "timings": trace.resumo(),
+                }, ensure_ascii=False))
@@ -0,0 +1,545 @@
+# app/vetores.py
+"""
+Índice vetorial em processo: matriz NumPy mapeada em memória.
+
+Alternativa ao Chroma para acervos de dezenas de milhares de fragmentos,
+escolhida por `EKLESIA_VECTOR_BACKEND=numpy`. Cada coleção vira uma
+pasta `<CHROMA_PERSIST_DIR>/<coleção>.npvec` com:
+
+- vetores.bin: linhas normalizadas em float16 ou int8 (escala por linha
+  em escalas.bin), só com acréscimos no fim;
+- docs.jsonl: id, texto e metadados de cada linha, na mesma ordem;
+- apagados.txt: lápides (linhas removidas). Um id regravado aponta para
+  a linha mais nova; a antiga sai da busca sem reescrever o arquivo;
+- info.json: dimensão, dtype e a geração dos arquivos acima. A
+  compactação grava `vetores.<geração>.bin` etc. ao lado dos atuais e só
+  então troca info.json (os.replace); leitores nunca veem uma mistura de
+  gerações, e quem ainda tem a antiga mapeada segue com ela até notar a
+  troca.
+
+Leitores abrem vetores.bin com np.memmap somente leitura, então os
+workers do uvicorn compartilham as páginas pelo cache do SO; cada um só
+lê o que foi acrescentado desde a última consulta. Escritas são
+serializadas entre processos com flock.
+
+A busca é o produto escalar (cosseno) em blocos e top-k por
+argpartition; consultas em lote (app.lote) são pontuadas juntas, numa
+passada só pela matriz. A distância devolvida é a L2 ao quadrado entre vetores
+unitários (2 - 2·cos), a mesma escala do Chroma, para que
+`score_threshold` e demais limiares valham nos dois backends.
+
+- EKLESIA_VECTOR_BACKEND: "chroma" (padrão) ou "numpy"
+- EKLESIA_VECTOR_DTYPE: "int8" (padrão; 1 byte por dimensão) ou
+  "float16" (mais fiel, ~4x mais lento para pontuar em NumPy)
+
+    python -m app.vetores --compactar <coleção>  # descarta lápides
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    from langchain_core.documents import Document
+    from langchain_core.vectorstores import VectorStore as _Base
+except Exception:  # pragma: no cover - modo mock sem LangChain
+    from types import SimpleNamespace as Document
+
+    _Base = object
+
+load_dotenv()
+
+VECTOR_BACKEND = os.getenv("EKLESIA_VECTOR_BACKEND", "chroma").lower()
+VECTOR_DTYPE = os.getenv("EKLESIA_VECTOR_DTYPE", "int8").lower()
+_DTYPES = {"int8": np.int8, "float16": np.float16}
+# Linhas convertidas para float32 por vez na busca
+_BLOCO = 4096
+# Consultas pontuadas juntas na busca em lote (matriz linhas x consultas)
+_CONSULTAS = 64
+# Arquivos de dados de uma geração (info.json aponta para a atual)
+_ARQUIVOS = ("vetores.bin", "escalas.bin", "docs.jsonl", "apagados.txt")
+
+
+def pasta_colecao(persist_dir: str, nome: str) -> str:
+    return os.path.join(persist_dir, f"{nome}.npvec")
+
+
+def _normalizar(vetores: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return vetores / normas
+
+
+def _quantizar(vetores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """int8 simétrico com uma escala por linha."""
+    escalas = np.abs(vetores).max(axis=1) / 127.0
+    escalas[escalas == 0] = 1.0
+    q = np.round(vetores / escalas[:, None]).astype(np.int8)
+    return q, escalas.astype(np.float32)
+
+
+def _relevancia(distancia: float) -> float:
+    # Mesma função do Chroma (distância euclidiana) no LangChain
+    return 1.0 - distancia / math.sqrt(2)
+
+
+def _casa(meta: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Subconjunto do `where` do Chroma: igualdade, $eq, $in, $and, $or."""
+    for chave, cond in where.items():
+        if chave == "$and":
+            if not all(_casa(meta, c) for c in cond):
+                return False
+        elif chave == "$or":
+            if not any(_casa(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            valor = meta.get(chave)
+            if "$eq" in cond and valor != cond["$eq"]:
+                return False
+            if "$in" in cond and valor not in cond["$in"]:
+                return False
+        elif meta.get(chave) != cond:
+            return False
+    return True
+
+
+class _Trava:
+    """flock na pasta da coleção (escritores de processos diferentes)."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.caminho, "a")
+        try:
+            import fcntl
+
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        except ImportError:  # pragma: no cover - Windows
+            pass
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()  # fechar libera o flock
+
+
+class IndiceNumpy(_Base):
+    def __init__(
+        self,
+        collection_name: str,
+        persist_directory: str,
+        embedding_function: Any = None,
+        dtype: str = VECTOR_DTYPE,
+    ):
+        self.nome = collection_name
+        self.pasta = pasta_colecao(persist_directory, collection_name)
+        self._emb = embedding_function
+        self._lock = threading.RLock()
+        os.makedirs(self.pasta, exist_ok=True)
+        info = self._ler_info()
+        self.dtype = info.get("dtype", dtype)
+        if self.dtype not in _DTYPES:
+            raise ValueError(f"EKLESIA_VECTOR_DTYPE inválido: {self.dtype}")
+        self.dim: Optional[int] = info.get("dim")
+        self._geracao = ""
+        self._info: Optional[Tuple[int, int]] = None
+        self._limpar_estado()
+        self._atualizar()
+
+    # ------------------------
+    # Arquivos
+    # ------------------------
+    def _arq(self, nome: str) -> str:
+        return os.path.join(self.pasta, nome)
+
+    def _ler_info(self) -> Dict[str, Any]:
+        try:
+            with open(self._arq("info.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _id_info(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self._arq("info.json"))
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _gravar_info(self, geracao: str) -> None:
+        tmp = self._arq("info.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(
+                {"dim": self.dim, "dtype": self.dtype, "geracao": geracao}, f
+            )
+        os.replace(tmp, self._arq("info.json"))
+
+    def _arq_dados(self, nome: str, geracao: Optional[str] = None) -> str:
+        """`vetores.bin` da geração -> `vetores.<geração>.bin`."""
+        geracao = self._geracao if geracao is None else geracao
+        if not geracao:
+            return self._arq(nome)  # coleções anteriores às gerações
+        base, ext = os.path.splitext(nome)
+        return self._arq(f"{base}.{geracao}{ext}")
+
+    def _bytes_linha(self) -> int:
+        return self.dim * np.dtype(_DTYPES[self.dtype]).itemsize
+
+    def _limpar_estado(self) -> None:
+        self._ids: List[str] = []
+        self._textos: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._linha: Dict[str, int] = {}
+        self._apagadas: set = set()
+        self._off_docs = 0
+        self._off_apagados = 0
+        self._mat: Optional[np.ndarray] = None
+        self._escalas: Optional[np.ndarray] = None
+        self._vivos = np.zeros(0, dtype=bool)
+        self._filtros: Dict[Tuple[str, int], np.ndarray] = {}
+
+    def _tamanho(self, nome: str) -> int:
+        try:
+            return os.path.getsize(self._arq_dados(nome))
+        except OSError:
+            return 0
+
+    def _atualizar(self) -> None:
+        """Lê só o que outros processos acrescentaram desde a última vez."""
+        with self._lock:
+            try:
+                self._atualizar_geracao()
+            except FileNotFoundError:
+                # Compactada e apagada no meio da leitura: recomeça pela
+                # geração nova
+                self._info = None
+                self._atualizar_geracao()
+
+    def _atualizar_geracao(self) -> None:
+        info = self._id_info()
+        if info != self._info:
+            dados = self._ler_info()
+            if self.dim is None:
+                self.dim = dados.get("dim")
+            if dados.get("geracao", "") != self._geracao:
+                # Compactada por outro processo: relê tudo
+                self._limpar_estado()
+                self._geracao = dados.get("geracao", "")
+            self._info = info
+        if (
+            self._tamanho("docs.jsonl") == self._off_docs
+            and self._tamanho("apagados.txt") == self._off_apagados
+        ):
+            return
+        if self._tamanho("docs.jsonl") < self._off_docs:
+            self._limpar_estado()
+        self._ler_docs()
+        self._ler_apagados()
+        self._mapear()
+
+    def _ler_docs(self) -> None:
+        with open(self._arq_dados("docs.jsonl"), "rb") as f:
+            f.seek(self._off_docs)
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    break  # escrita em andamento
+                self._off_docs += len(linha)
+                d = json.loads(linha)
+                i = len(self._ids)
+                self._ids.append(d["id"])
+                self._textos.append(d["texto"])
+                self._metas.append(d.get("meta") or {})
+                anterior = self._linha.get(d["id"])
+                if anterior is not None:
+                    self._apagadas.add(anterior)
+                self._linha[d["id"]] = i
+
+    def _ler_apagados(self) -> None:
+        if not os.path.exists(self._arq_dados("apagados.txt")):
+            return
+        with open(self._arq_dados("apagados.txt"), "rb") as f:
+            f.seek(self._off_apagados)
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    break
+                self._off_apagados += len(linha)
+                i = int(linha)
+                self._apagadas.add(i)
+                if self._linha.get(self._ids[i]) == i:
+                    del self._linha[self._ids[i]]
+
+    def _mapear(self) -> None:
+        n = len(self._ids)
+        if not n:
+            return
+        self._mat = np.memmap(
+            self._arq_dados("vetores.bin"), dtype=_DTYPES[self.dtype],
+            mode="r", shape=(n, self.dim),
+        )
+        if self.dtype == "int8":
+            self._escalas = np.memmap(
+                self._arq_dados("escalas.bin"), dtype=np.float32,
+                mode="r", shape=(n,),
+            )
+        vivos = np.ones(n, dtype=bool)
+        if self._apagadas:
+            vivos[list(self._apagadas)] = False
+        self._vivos = vivos
+
+    # ------------------------
+    # Escrita
+    # ------------------------
+    def _gravar(
+        self, ids: List[str], textos: List[str], metas: List[Dict],
+        vetores: np.ndarray,
+    ) -> None:
+        vetores = _normalizar(np.asarray(vetores, dtype=np.float32))
+        with _Trava(self._arq(".lock")), self._lock:
+            self._atualizar()
+            if self.dim is None:
+                self.dim = int(vetores.shape[1])
+                self._gravar_info(self._geracao)
+            elif vetores.shape[1] != self.dim:
+                raise ValueError(
+                    f"Coleção '{self.nome}' tem dimensão {self.dim}; "
+                    f"recebeu vetores de {vetores.shape[1]}."
+                )
+            n = len(self._ids)
+            with open(self._arq_dados("vetores.bin"), "ab") as f:
+                # Sobra de uma escrita interrompida: volta ao fim da
+                # última linha com documento
+                f.truncate(n * self._bytes_linha())
+                if self.dtype == "int8":
+                    q, escalas = _quantizar(vetores)
+                    f.write(q.tobytes())
+                else:
+                    f.write(vetores.astype(np.float16).tobytes())
+            if self.dtype == "int8":
+                with open(self._arq_dados("escalas.bin"), "ab") as f:
+                    f.truncate(n * 4)
+                    f.write(escalas.tobytes())
+            # docs.jsonl por último: é ele que torna as linhas visíveis
+            with open(self._arq_dados("docs.jsonl"), "ab") as f:
+                for i, t, m in zip(ids, textos, metas):
+                    f.write(json.dumps(
+                        {"id": i, "texto": t, "meta": m},
+                        ensure_ascii=False,
+                    ).encode("utf-8") + b"\n")
+            self._atualizar()
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        textos = list(texts)
+        if not textos:
+            return []
+        if ids is None:
+            import uuid
+
+            ids = [str(uuid.uuid4()) for _ in textos]
+        metas = metadatas or [{} for _ in textos]
+        vetores = self._emb.embed_documents(textos)
+        self._gravar(list(ids), textos, list(metas), np.asarray(vetores))
+        return list(ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any):
+        with _Trava(self._arq(".lock")), self._lock:
+            self._atualizar()
+            linhas = [self._linha[i] for i in ids or [] if i in self._linha]
+            if linhas:
+                with open(self._arq_dados("apagados.txt"), "a") as f:
+                    f.write("".join(f"{i}\n" for i in linhas))
+                self._atualizar()
+
+    # ------------------------
+    # Leitura
+    # ------------------------
+    def get(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Dict:
+        self._atualizar()
+        with self._lock:
+            chaves = ids if ids is not None else list(self._linha)
+            linhas = [self._linha[i] for i in chaves if i in self._linha]
+            return {
+                "ids": [self._ids[i] for i in linhas],
+                "documents": [self._textos[i] for i in linhas],
+                "metadatas": [self._metas[i] for i in linhas],
+            }
+
+    def count(self) -> int:
+        self._atualizar()
+        return len(self._linha)
+
+    def _pontuar(self, q: np.ndarray, mat, escalas) -> np.ndarray:
+        """Cosseno de cada linha com cada consulta de `q`: (linhas, m)."""
+        scores = np.empty((mat.shape[0], q.shape[0]), dtype=np.float32)
+        for a in range(0, mat.shape[0], _BLOCO):
+            scores[a:a + _BLOCO] = mat[a:a + _BLOCO].astype(np.float32) @ q.T
+        if escalas is not None:
+            scores *= np.asarray(escalas)[:, None]
+        return scores
+
+    def _mascara_filtro(self, where, metas, n: int) -> np.ndarray:
+        """Linhas que casam com `where`; vale até a próxima escrita."""
+        chave = (json.dumps(where, sort_keys=True), n)
+        mascara = self._filtros.get(chave)
+        if mascara is None:
+            mascara = np.fromiter(
+                (_casa(m, where) for m in metas[:n]), dtype=bool, count=n,
+            )
+            if len(self._filtros) >= 64:
+                self._filtros.clear()
+            self._filtros[chave] = mascara
+        return mascara
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self, embedding: List[float], k: int = 4,
+        filter: Optional[Dict[str, Any]] = None, **kwargs: Any,
+    ) -> List[Tuple[Any, float]]:
+        return self.similarity_search_by_vectors_with_relevance_scores(
+            [embedding], k, filter
+        )[0]
+
+    def similarity_search_by_vectors_with_relevance_scores(
+        self, embeddings: List[List[float]], k: int = 4,
+        filter: Optional[Dict[str, Any]] = None, **kwargs: Any,
+    ) -> List[List[Tuple[Any, float]]]:
+        """
+        Várias consultas numa passada só pela matriz (lotes de
+        perguntas): cada bloco de linhas é convertido uma vez e
+        multiplicado por todas as consultas.
+        """
+        self._atualizar()
+        with self._lock:
+            mat, escalas, vivos = self._mat, self._escalas, self._vivos
+            metas = self._metas
+        if mat is None or not k or not len(embeddings):
+            return [[] for _ in embeddings]
+        q = _normalizar(np.asarray(embeddings, dtype=np.float32))
+        if q.shape[1] != mat.shape[1]:
+            raise ValueError(
+                f"Consulta com dimensão {q.shape[1]}; coleção "
+                f"'{self.nome}' tem {mat.shape[1]}."
+            )
+        mascara = vivos
+        if filter:
+            mascara = vivos & self._mascara_filtro(filter, metas, len(vivos))
+        k = min(k, int(mascara.sum()))
+        if k <= 0:
+            return [[] for _ in embeddings]
+        resultados = []
+        for c in range(0, q.shape[0], _CONSULTAS):
+            scores = self._pontuar(q[c:c + _CONSULTAS], mat, escalas)
+            scores[~mascara] = -np.inf
+            for coluna in scores.T:
+                top = np.argpartition(-coluna, k - 1)[:k]
+                top = top[np.argsort(-coluna[top])]
+                resultados.append([
+                    (
+                        Document(
+                            page_content=self._textos[i],
+                            metadata=dict(metas[i]),
+                        ),
+                        float(2.0 - 2.0 * coluna[i]),
+                    )
+                    for i in top
+                ])
+        return resultados
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Any, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self._emb.embed_query(query), k, **kwargs
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Any]:
+        return [d for d, _ in self.similarity_search_with_score(
+            query, k, **kwargs
+        )]
+
+    def _select_relevance_score_fn(self):
+        return _relevancia
+
+    @property
+    def embeddings(self):
+        return self._emb
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        indice = cls(
+            kwargs.pop("collection_name"), kwargs.pop("persist_directory"),
+            embedding,
+        )
+        indice.add_texts(texts, metadatas, **kwargs)
+        return indice
+
+    # ------------------------
+    # Manutenção
+    # ------------------------
+    def compactar(self) -> int:
+        """Reescreve só as linhas vivas; devolve quantas foram descartadas."""
+        with _Trava(self._arq(".lock")), self._lock:
+            self._atualizar()
+            linhas = sorted(self._linha.values())
+            descartadas = len(self._ids) - len(linhas)
+            if not descartadas:
+                return 0
+            import uuid
+
+            nova = uuid.uuid4().hex[:12]
+            mat = np.asarray(self._mat[linhas])
+            for nome, dados in (
+                ("vetores.bin", mat.tobytes()),
+                ("escalas.bin", np.asarray(self._escalas[linhas]).tobytes()
+                 if self._escalas is not None else None),
+                ("docs.jsonl", b"".join(
+                    json.dumps({
+                        "id": self._ids[i], "texto": self._textos[i],
+                        "meta": self._metas[i],
+                    }, ensure_ascii=False).encode("utf-8") + b"\n"
+                    for i in linhas
+                )),
+            ):
+                if dados is not None:
+                    with open(self._arq_dados(nome, nova), "wb") as f:
+                        f.write(dados)
+            # A troca de info.json publica a geração nova de uma vez
+            self._gravar_info(nova)
+            manter = {
+                os.path.basename(self._arq_dados(n, nova)) for n in _ARQUIVOS
+            }
+            for nome in os.listdir(self.pasta):
+                # Geração antiga (e sobras de compactações interrompidas);
+                # quem ainda a tem mapeada segue com o arquivo desvinculado
+                if nome not in manter and nome not in ("info.json", ".lock"):
+                    os.remove(self._arq(nome))
+            self._atualizar()
+            return descartadas
+
+
+def apagar_colecao(persist_dir: str, nome: str) -> None:
+    shutil.rmtree(pasta_colecao(persist_dir, nome), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if "--compactar" in sys.argv:
+        from app.chat import PERSIST_DIR
+
+        nome = sys.argv[sys.argv.index("--compactar") + 1]
+        print(f"Linhas descartadas: "
+              f"{IndiceNumpy(nome, PERSIST_DIR).compactar()}")
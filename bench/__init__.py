@@ -0,0 +1,9 @@
+"""
+Suíte de benchmark offline da API EKLESIA IA.
+
+- `bench.fake_ollama`: servidor Ollama falso com taxa de tokens ajustável.
+- `bench.fake_dbt`: API DBT falsa, rotas e fixtures derivadas de
+  `biblie.json` (spec OpenAPI) + `bench/fixtures/capitulos.json`.
+- `bench.run`: sobe os stand-ins e a API, dispara carga concorrente e
+  compara com baselines salvos em `bench/baselines/`.
+"""
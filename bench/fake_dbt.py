@@ -0,0 +1,196 @@
+# bench/fake_dbt.py
+"""
+API DBT (Digital Bible Platform v4) falsa para benchmarks offline.
+
+Todas as rotas de `biblie.json` são registradas; as usadas pela app
+(`/bibles`, `/bibles/{id}`, `/bibles/{id}/book`,
+`/bibles/filesets/{fileset_id}/{book}/{chapter}` e `/search`) respondem
+com fixtures montadas a partir dos exemplos dos schemas da spec e dos
+textos de `bench/fixtures/capitulos.json`. As demais
+devolvem `{"data": []}`. Rotas fora da spec (ex.: versículo no path)
+retornam 404, exatamente como o upstream, exercitando o fallback da app.
+
+- FAKE_DBT_LATENCY_MS: latência adicional por chamada (padrão 30)
+
+Uso: python -m bench.fake_dbt --port 8081
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+RAIZ = Path(__file__).resolve().parent.parent
+SPEC_PATH = Path(os.getenv("FAKE_DBT_SPEC", RAIZ / "biblie.json"))
+FIXTURES_PATH = RAIZ / "bench" / "fixtures" / "capitulos.json"
+LATENCY_MS = float(os.getenv("FAKE_DBT_LATENCY_MS", "30"))
+
+BIBLE_ID = "PORARC"
+FILESET_ID = "PORARCN_ET"
+
+SPEC: Dict[str, Any] = json.loads(SPEC_PATH.read_text(encoding="utf-8"))
+CAPITULOS: Dict[str, list] = json.loads(
+    FIXTURES_PATH.read_text(encoding="utf-8")
+)
+
+
+def exemplo_de_schema(nome: str) -> Dict[str, Any]:
+    """Monta um objeto a partir dos `example` das propriedades do schema."""
+    schema = SPEC["components"]["schemas"].get(nome, {})
+    return {
+        k: v.get("example")
+        for k, v in schema.get("properties", {}).items()
+        if isinstance(v, dict)
+    }
+
+
+_BIBLE_FILE = exemplo_de_schema("BibleFile")
+
+
+def _verso(livro: str, capitulo: int, numero: int, texto: str) -> dict:
+    return {
+        **_BIBLE_FILE,
+        "book_id": livro,
+        "book_name": livro,
+        "chapter": capitulo,
+        "chapter_start": str(capitulo),
+        "verse_start": str(numero),
+        "verse_end": str(numero),
+        "verse_sequence": numero,
+        "verse_text": texto,
+    }
+
+
+def _sem_acentos(texto: str) -> str:
+    nfkd = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in nfkd if not unicodedata.combining(c))
+
+
+async def _latencia():
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+
+
+# ----------------------------
+# Handlers
+# ----------------------------
+async def bibles(request: Request):
+    await _latencia()
+    return JSONResponse({"data": [{
+        "abbr": BIBLE_ID,
+        "name": "Almeida Revista e Corrigida",
+        "language": "Portuguese",
+        "iso": "por",
+    }]})
+
+
+async def bible(request: Request):
+    await _latencia()
+    return JSONResponse({"data": {
+        "abbr": request.path_params["id"],
+        "filesets": {"dbp-prod": [
+            {"id": FILESET_ID, "type": "text_plain",
+             "set_type_code": "text_plain", "size": "C"},
+        ]},
+    }})
+
+
+async def capitulo(request: Request):
+    await _latencia()
+    p = request.path_params
+    chave = f"{p['book']}/{p['chapter']}"
+    if chave not in CAPITULOS:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    versos = [
+        _verso(p["book"], int(p["chapter"]), i, t)
+        for i, t in enumerate(CAPITULOS[chave], start=1)
+    ]
+    return JSONResponse({"data": versos})
+
+
+async def livros(request: Request):
+    await _latencia()
+    capitulos: Dict[str, list] = {}
+    for chave in CAPITULOS:
+        livro, cap = chave.split("/")
+        capitulos.setdefault(livro, []).append(int(cap))
+    return JSONResponse({"data": [
+        {"book_id": livro, "name": livro, "chapters": sorted(caps)}
+        for livro, caps in capitulos.items()
+    ]})
+
+
+async def search(request: Request):
+    await _latencia()
+    termo = _sem_acentos(request.query_params.get("query", ""))
+    limit = int(request.query_params.get("limit", 15))
+    page = int(request.query_params.get("page", 1))
+    achados = []
+    for chave, textos in CAPITULOS.items():
+        livro, cap = chave.split("/")
+        for i, t in enumerate(textos, start=1):
+            if termo and termo in _sem_acentos(t):
+                achados.append(_verso(livro, int(cap), i, t))
+    inicio = (page - 1) * limit
+    return JSONResponse({"verses": {
+        "data": achados[inicio:inicio + limit],
+        "meta": {"pagination": {"total": len(achados), "per_page": limit,
+                                "current_page": page}},
+    }})
+
+
+async def generico(request: Request):
+    await _latencia()
+    return JSONResponse({"data": []})
+
+
+_ESPECIFICOS = {
+    "/bibles": bibles,
+    "/bibles/{id}": bible,
+    "/bibles/{id}/book": livros,
+    "/bibles/filesets/{fileset_id}/{book}/{chapter}": capitulo,
+    "/search": search,
+}
+
+
+def _rotas():
+    rotas = []
+    for path in SPEC.get("paths", {}):
+        handler = _ESPECIFICOS.get(path, generico)
+        # `{verse_number?}` (estilo Laravel) vira duas rotas
+        if "?}" in path:
+            base = re.sub(r"/\{[^}]+\?\}", "", path)
+            rotas.append(Route(base, handler, methods=["GET"]))
+            path = path.replace("?}", "}")
+        rotas.append(Route(path, handler, methods=["GET"]))
+    # Rotas específicas primeiro (ex.: /bibles/filesets/media/types)
+    rotas.sort(key=lambda r: r.path.count("{"))
+    return [Route(f"/api{r.path}", r.endpoint, methods=["GET"])
+            for r in rotas]
+
+
+app = Starlette(routes=_rotas())
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+# bench/fake_ollama.py
+"""
+Servidor Ollama falso para benchmarks offline.
+
+Implementa /api/tags, /api/generate, /api/chat, /api/embed e
+/api/embeddings com latências sintéticas configuráveis por ambiente:
+
+- FAKE_OLLAMA_TPS: tokens/s da geração (padrão 50)
+- FAKE_OLLAMA_TOKENS: tokens por resposta (padrão 120)
+- FAKE_OLLAMA_PROMPT_TPS: tokens/s de avaliação do prompt (padrão 2000)
+- FAKE_OLLAMA_EMBED_MS: latência por texto embeddado (padrão 5)
+- FAKE_OLLAMA_EMBED_DIM: dimensão dos vetores (padrão 384)
+- FAKE_OLLAMA_PARALLEL: slots de geração simultâneos, como
+  OLLAMA_NUM_PARALLEL (padrão 1)
+- FAKE_OLLAMA_MODELS: modelos anunciados em /api/tags
+- FAKE_OLLAMA_PREFIX_CACHE: "1" (padrão) simula o cache de prompt do
+  Ollama: cada slot guarda o último prompt e só o trecho depois do
+  prefixo em comum é avaliado; `keep_alive` 0 ou `num_ctx` diferente do
+  carregado descartam o cache
+
+GET /bench/stats devolve tokens gerados, gerações completas ou
+abandonadas pelo cliente (para medir cancelamento) e tokens de prompt
+avaliados e reaproveitados do cache.
+
+Uso: python -m bench.fake_ollama --port 11435
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+TPS = float(os.getenv("FAKE_OLLAMA_TPS", "50"))
+TOKENS = int(os.getenv("FAKE_OLLAMA_TOKENS", "120"))
+PROMPT_TPS = float(os.getenv("FAKE_OLLAMA_PROMPT_TPS", "2000"))
+EMBED_MS = float(os.getenv("FAKE_OLLAMA_EMBED_MS", "5"))
+EMBED_DIM = int(os.getenv("FAKE_OLLAMA_EMBED_DIM", "384"))
+PARALLEL = int(os.getenv("FAKE_OLLAMA_PARALLEL", "1"))
+MODELS = os.getenv("FAKE_OLLAMA_MODELS", "mistral,bge-m3").split(",")
+PREFIX_CACHE = os.getenv("FAKE_OLLAMA_PREFIX_CACHE", "1") == "1"
+
+_PALAVRAS = (
+    "A graça de Deus é o favor imerecido concedido ao pecador por meio "
+    "de Cristo conforme as Escrituras ensinam em Efésios e Romanos"
+).split()
+
+_slots: asyncio.Semaphore | None = None
+_stats = {
+    "tokens": 0, "completas": 0, "abandonadas": 0, "em_curso": 0,
+    "prompt_tokens": 0, "prompt_tokens_cache": 0,
+}
+# Último prompt de cada slot livre (cache de KV simulado)
+_cache_slots: list[str] = []
+_num_ctx = {"carregado": None}
+
+
+def _semaforo() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(PARALLEL)
+    return _slots
+
+
+def _agora() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _tokens_prompt(texto: str) -> int:
+    return max(1, len(texto) // 4)
+
+
+def vetor_deterministico(texto: str, dim: int = EMBED_DIM) -> list[float]:
+    """Vetor unitário pseudo-aleatório estável para o mesmo texto."""
+    valores = []
+    semente = hashlib.sha256(texto.encode("utf-8")).digest()
+    bloco = semente
+    while len(valores) < dim:
+        bloco = hashlib.sha256(bloco).digest()
+        valores.extend((b - 127.5) / 127.5 for b in bloco)
+    valores = valores[:dim]
+    norma = math.sqrt(sum(v * v for v in valores)) or 1.0
+    return [v / norma for v in valores]
+
+
+def _prefixo_comum(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _ocupar_slot(prompt: str, num_ctx) -> int:
+    """Tira da lista o slot com maior prefixo em comum; devolve o
+    número de caracteres do prompt já em cache."""
+    if not PREFIX_CACHE:
+        return 0
+    if num_ctx != _num_ctx["carregado"]:
+        # Outro num_ctx: o Ollama recarrega o modelo
+        _num_ctx["carregado"] = num_ctx
+        _cache_slots.clear()
+    if not _cache_slots:
+        return 0
+    comuns = [_prefixo_comum(prompt, p) for p in _cache_slots]
+    melhor = max(range(len(comuns)), key=comuns.__getitem__)
+    _cache_slots.pop(melhor)
+    # Um prompt idêntico ainda avalia o último token
+    return min(comuns[melhor], len(prompt) - 1)
+
+
+def _liberar_slot(prompt: str, keep_alive) -> None:
+    if not PREFIX_CACHE:
+        return
+    if str(keep_alive) in {"0", "0s", "0m"}:
+        _cache_slots.clear()
+        return
+    _cache_slots.append(prompt)
+    del _cache_slots[:-PARALLEL]
+
+
+async def _gerar(
+    modelo: str, prompt: str, opcoes: dict, chat: bool, keep_alive=None
+):
+    num_predict = int(opcoes.get("num_predict") or TOKENS)
+    if num_predict < 0:
+        num_predict = TOKENS
+    async with _semaforo():
+        em_cache = _ocupar_slot(prompt, opcoes.get("num_ctx"))
+        prompt_tokens = _tokens_prompt(prompt[em_cache:])
+        _stats["prompt_tokens"] += prompt_tokens
+        _stats["prompt_tokens_cache"] += em_cache // 4
+        _stats["em_curso"] += 1
+        try:
+            async for ev in _gerar_no_slot(
+                modelo, prompt_tokens, num_predict, chat
+            ):
+                yield ev
+            _stats["completas"] += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            _stats["abandonadas"] += 1
+            raise
+        finally:
+            _stats["em_curso"] -= 1
+            _liberar_slot(prompt, keep_alive)
+
+
+async def _gerar_no_slot(
+    modelo: str, prompt_tokens: int, num_predict: int, chat: bool
+):
+    inicio = time.perf_counter()
+    await asyncio.sleep(prompt_tokens / PROMPT_TPS)
+    prompt_ns = int((time.perf_counter() - inicio) * 1e9)
+    gen_inicio = time.perf_counter()
+    for i in range(num_predict):
+        await asyncio.sleep(1.0 / TPS)
+        _stats["tokens"] += 1
+        palavra = _PALAVRAS[i % len(_PALAVRAS)] + " "
+        if chat:
+            corpo = {"message": {"role": "assistant", "content": palavra}}
+        else:
+            corpo = {"response": palavra}
+        yield {"model": modelo, "created_at": _agora(), "done": False,
+               **corpo}
+    eval_ns = int((time.perf_counter() - gen_inicio) * 1e9)
+    final = {"message": {"role": "assistant", "content": ""}} if chat \
+        else {"response": ""}
+    yield {
+        "model": modelo,
+        "created_at": _agora(),
+        "done": True,
+        "done_reason": "stop",
+        "total_duration": prompt_ns + eval_ns,
+        "load_duration": 0,
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": prompt_ns,
+        "eval_count": num_predict,
+        "eval_duration": eval_ns,
+        **final,
+    }
+
+
+async def _responder_geracao(request: Request, chat: bool):
+    corpo = await request.json()
+    modelo = corpo.get("model", MODELS[0])
+    if chat:
+        prompt = "\n".join(
+            m.get("content", "") for m in corpo.get("messages", [])
+        )
+    else:
+        prompt = f"{corpo.get('system', '')}\n{corpo.get('prompt', '')}"
+    opcoes = corpo.get("options") or {}
+    eventos = _gerar(modelo, prompt, opcoes, chat, corpo.get("keep_alive"))
+
+    if corpo.get("stream", True):
+        async def ndjson():
+            async for ev in eventos:
+                yield json.dumps(ev) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    partes, final = [], {}
+    async for ev in eventos:
+        if ev["done"]:
+            final = ev
+        else:
+            partes.append(
+                ev["message"]["content"] if chat else ev["response"]
+            )
+    if chat:
+        final["message"]["content"] = "".join(partes)
+    else:
+        final["response"] = "".join(partes)
+    return JSONResponse(final)
+
+
+async def generate(request: Request):
+    return await _responder_geracao(request, chat=False)
+
+
+async def chat(request: Request):
+    return await _responder_geracao(request, chat=True)
+
+
+async def embed(request: Request):
+    corpo = await request.json()
+    entrada = corpo.get("input", "")
+    textos = [entrada] if isinstance(entrada, str) else list(entrada)
+    await asyncio.sleep(EMBED_MS * len(textos) / 1000)
+    return JSONResponse({
+        "model": corpo.get("model", MODELS[-1]),
+        "embeddings": [vetor_deterministico(t) for t in textos],
+    })
+
+
+async def embeddings_legado(request: Request):
+    corpo = await request.json()
+    await asyncio.sleep(EMBED_MS / 1000)
+    return JSONResponse(
+        {"embedding": vetor_deterministico(corpo.get("prompt", ""))}
+    )
+
+
+async def stats(request: Request):
+    return JSONResponse(_stats)
+
+
+async def tags(request: Request):
+    return JSONResponse({
+        "models": [
+            {"name": m if ":" in m else f"{m}:latest", "model": m}
+            for m in MODELS
+        ]
+    })
+
+
+app = Starlette(routes=[
+    Route("/api/tags", tags, methods=["GET"]),
+    Route("/api/generate", generate, methods=["POST"]),
+    Route("/api/chat", chat, methods=["POST"]),
+    Route("/api/embed", embed, methods=["POST"]),
+    Route("/api/embeddings", embeddings_legado, methods=["POST"]),
+    Route("/bench/stats", stats, methods=["GET"]),
+])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
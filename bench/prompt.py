@@ -0,0 +1,256 @@
+# bench/prompt.py
+"""
+Tempo de avaliação do prompt por versão do layout (app.prompts).
+
+Manda ao Ollama (o falso, com cache de prefixo simulado, ou um real via
+`--ollama-url`) uma sequência de gerações misturando as tarefas
+(resposta, sermão, estudo, devocional, ebook), com os prompts
+renderizados por cada versão, e soma `prompt_eval_count` e
+`prompt_eval_duration` das respostas. Só a avaliação do prompt
+interessa: cada geração pede `--num-predict` tokens (padrão 1).
+
+A carga imita o uso real (vide `carga`): cada pergunta traz o seu
+CONTEXTO; gerações são refeitas com variações (autor, versículos,
+tópicos) sobre o mesmo tema e o mesmo CONTEXTO; `--users` sessões se
+intercalam. Sequência e contextos são determinísticos (`--seed`), iguais
+para todas as versões.
+
+Exemplos:
+  python -m bench.prompt --requests 120 --users 2
+  python -m bench.prompt --versions 1,2 --parallel 4 --output prompt.json
+  python -m bench.prompt --ollama-url http://localhost:11434 --model mistral
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.run import RAIZ, _aguardar, _porta_livre, _subir
+
+TEMAS = [
+    "graça", "justificação pela fé", "santificação", "oração",
+    "perdão", "esperança", "batismo", "Espírito Santo", "aliança",
+    "ressurreição",
+]
+AUTORES = [None, "Calvino", "Spurgeon", "Lutero", "Agostinho", "Wesley"]
+VERSICULOS = [
+    "Efésios 2:8", "Romanos 5:1", "João 3:16", "Salmos 23:1",
+    "Hebreus 11:1", "Mateus 6:9", "1 João 1:9", "Gálatas 5:22",
+]
+# Peso de cada tarefa na mistura
+MISTURA = {
+    "resposta": 0.5, "sermao": 0.15, "estudo": 0.15, "devocional": 0.1,
+    "ebook": 0.1,
+}
+_FRASES = (
+    "A {t} aparece nas Escrituras como obra de Deus em favor do seu povo.",
+    "Os reformadores insistiram que a {t} não depende de mérito humano.",
+    "No Novo Testamento, a {t} é apresentada à luz da obra de Cristo.",
+    "A tradição da igreja discutiu a {t} em concílios e confissões.",
+    "Pregadores aplicaram a {t} à vida devocional e à comunidade.",
+    "Comentaristas relacionam a {t} com as promessas do Antigo Testamento.",
+)
+
+
+def contexto(chave: str, tokens: int) -> str:
+    """CONTEXTO sintético estável por chave (~4 caracteres por token)."""
+    tema = chave.split("|", 1)[0]
+    rnd = random.Random(chave)
+    partes, tamanho, n = [], 0, 0
+    while tamanho < tokens * 4:
+        frase = rnd.choice(_FRASES).format(t=tema)
+        trecho = f"[fonte: {tema}-{n}.pdf, p. {rnd.randint(1, 300)}] {frase}"
+        partes.append(trecho)
+        tamanho += len(trecho) + 2
+        n += 1
+    return "\n\n".join(partes)
+
+
+def _campos(rnd: random.Random, tema: str, i: int) -> Dict[str, Any]:
+    versos = rnd.sample(VERSICULOS, rnd.randint(1, 3))
+    return {
+        "pergunta": f"O que a Bíblia ensina sobre {tema}? ({i})",
+        "tipo": rnd.choice(["expositivo", "temático", "textual"]),
+        "tema": tema,
+        "num_topicos": rnd.randint(2, 5),
+        "base_biblica": "\n".join(f"{v} — …" for v in versos),
+        "versiculos": versos,
+        "versiculo": versos[0],
+        "capitulos": rnd.randint(3, 8),
+        "autor": rnd.choice(AUTORES),
+    }
+
+
+def carga(n: int, seed: int, usuarios: int = 2) -> List[Dict[str, Any]]:
+    """
+    Sessões de `usuarios` pessoas intercaladas. Cada sessão fica num tema
+    e numa tarefa: perguntas seguidas (cada uma com o seu CONTEXTO) ou
+    uma geração com 1 a 4 variações (autor, tópicos, versículos), que
+    recuperam o mesmo CONTEXTO do tema.
+    """
+    rnd = random.Random(seed)
+    tarefas, pesos = zip(*MISTURA.items())
+    sessoes: List[List[Dict[str, Any]]] = [[] for _ in range(usuarios)]
+    pedidos = []
+    for i in range(n):
+        u = rnd.randrange(usuarios)
+        if not sessoes[u]:
+            tarefa = rnd.choices(tarefas, pesos)[0]
+            tema = rnd.choice(TEMAS)
+            sessoes[u] = [
+                {"tarefa": tarefa, "tema": tema}
+                for _ in range(rnd.randint(1, 4))
+            ]
+        p = sessoes[u].pop()
+        campos = _campos(rnd, p["tema"], i)
+        chave = p["tema"]
+        if p["tarefa"] == "resposta":
+            chave = f"{p['tema']}|{campos['pergunta']}"
+        pedidos.append({**p, "contexto": chave, "campos": campos})
+    return pedidos
+
+
+def medir(
+    base_url: str, args, versao: str, pedidos: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    from app import prompts
+
+    opcoes = prompts.opcoes_ollama(args.model)
+    por_tarefa: Dict[str, Dict[str, float]] = {}
+    total = {"n": 0, "tokens": 0, "ms": 0.0, "chars": 0}
+    with httpx.Client(base_url=base_url, timeout=600) as client:
+        for p in pedidos:
+            texto = prompts.pedido(p["tarefa"], versao, **p["campos"])
+            ctx = contexto(p["contexto"], args.context_tokens)
+            prompt = prompts.renderizar(p["tarefa"], texto, ctx, versao)
+            r = client.post("/api/generate", json={
+                "model": args.model,
+                "prompt": prompt,
+                "stream": False,
+                "keep_alive": opcoes.get("keep_alive"),
+                "options": {
+                    "num_ctx": opcoes.get("num_ctx"),
+                    "num_predict": args.num_predict,
+                },
+            })
+            r.raise_for_status()
+            corpo = r.json()
+            tokens = corpo.get("prompt_eval_count") or 0
+            ms = (corpo.get("prompt_eval_duration") or 0) / 1e6
+            for acc in (por_tarefa.setdefault(
+                p["tarefa"], {"n": 0, "tokens": 0, "ms": 0.0, "chars": 0}
+            ), total):
+                acc["n"] += 1
+                acc["tokens"] += tokens
+                acc["ms"] += ms
+                acc["chars"] += len(prompt)
+
+    def resumo(acc):
+        return {
+            "requisicoes": acc["n"],
+            "prompt_chars_medio": round(acc["chars"] / acc["n"]),
+            "tokens_avaliados_medio": round(acc["tokens"] / acc["n"], 1),
+            "prompt_eval_ms_medio": round(acc["ms"] / acc["n"], 2),
+        }
+
+    return {
+        "versao": versao,
+        "total": resumo(total),
+        "por_tarefa": {t: resumo(a) for t, a in sorted(por_tarefa.items())},
+    }
+
+
+def _com_fake_ollama(args, fn):
+    with tempfile.TemporaryDirectory(prefix="eklesia-prompt-"):
+        porta = _porta_livre()
+        env = dict(os.environ)
+        env.update({
+            "PYTHONPATH": str(RAIZ),
+            "FAKE_OLLAMA_PARALLEL": str(args.parallel),
+            "FAKE_OLLAMA_PROMPT_TPS": str(args.prompt_tps),
+            "FAKE_OLLAMA_TPS": "1000",
+            "FAKE_OLLAMA_MODELS": args.model,
+        })
+        proc = _subir("bench.fake_ollama:app", porta, env)
+        try:
+            base_url = f"http://127.0.0.1:{porta}"
+            _aguardar(f"{base_url}/api/tags")
+            return fn(base_url)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    p.add_argument("--versions", default="1,2",
+                   help="versões do prompt a comparar")
+    p.add_argument("--requests", type=int, default=120)
+    p.add_argument("--context-tokens", type=int, default=1500)
+    p.add_argument("--num-predict", type=int, default=1)
+    p.add_argument("--parallel", type=int, default=4,
+                   help="slots do fake Ollama (OLLAMA_NUM_PARALLEL)")
+    p.add_argument("--prompt-tps", type=float, default=2000,
+                   help="tokens/s de avaliação de prompt do fake Ollama")
+    p.add_argument("--model", default="mistral")
+    p.add_argument("--ollama-url",
+                   help="Ollama real em vez do fake (ex.: localhost:11434)")
+    p.add_argument("--users", type=int, default=2,
+                   help="sessões intercaladas (pessoas usando ao mesmo tempo)")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--output", help="salva o JSON do resultado neste path")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    pedidos = carga(args.requests, args.seed, args.users)
+    resultados = []
+    for versao in [v.strip() for v in args.versions.split(",") if v]:
+        if args.ollama_url:
+            resultados.append(medir(args.ollama_url, args, versao, pedidos))
+        else:
+            # Processo novo por versão: cache de prefixo zerado
+            resultados.append(_com_fake_ollama(
+                args, lambda url: medir(url, args, versao, pedidos)
+            ))
+
+    cab = f"{'versão':>7}{'tarefa':>12}{'n':>6}{'chars':>8}" \
+          f"{'tok aval.':>11}{'ms prompt':>11}"
+    print(cab)
+    print("-" * len(cab))
+    for r in resultados:
+        linhas = [*r["por_tarefa"].items(), ("TOTAL", r["total"])]
+        for tarefa, m in linhas:
+            print(
+                f"{r['versao']:>7}{tarefa:>12}{m['requisicoes']:>6}"
+                f"{m['prompt_chars_medio']:>8}"
+                f"{m['tokens_avaliados_medio']:>11}"
+                f"{m['prompt_eval_ms_medio']:>11}"
+            )
+    if len(resultados) > 1:
+        base, ultimo = resultados[0]["total"], resultados[-1]["total"]
+        if base["prompt_eval_ms_medio"]:
+            ganho = 1 - ultimo["prompt_eval_ms_medio"] \
+                / base["prompt_eval_ms_medio"]
+            print(f"\nprompt eval v{resultados[-1]['versao']} vs "
+                  f"v{resultados[0]['versao']}: {ganho:+.0%} de economia")
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(resultados, indent=2, ensure_ascii=False),
+            encoding="utf-8",
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,433 @@
+# bench/run.py
+"""
+Benchmark end-to-end da API com stand-ins locais (sem rede externa).
+
+Sobe `bench.fake_ollama`, `bench.fake_dbt` e a API (`main:app`) em
+processos separados, registra um usuário, dispara os cenários com a
+concorrência pedida e imprime vazão e p50/p95/p99. Os resultados podem
+ser salvos como baseline e comparados em execuções futuras.
+
+Exemplos:
+  python -m bench.run --concurrency 16 --requests 200
+  python -m bench.run --scenarios perguntar,stream --save-baseline mock
+  python -m bench.run --compare mock --tolerance 0.2
+  python -m bench.run --no-mock --tokens-per-sec 30   # LLM via fake Ollama
+  python -m bench.run --no-mock --scenarios perguntar --sweep 1,4,16 \
+      --ollama-parallel 16      # vazão de um worker por concorrência
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+RAIZ = Path(__file__).resolve().parent.parent
+BASELINES_DIR = RAIZ / "bench" / "baselines"
+
+PERGUNTAS = [
+    "O que é graça?",
+    "O que a Bíblia diz sobre salvação?",
+    "Explique propiciação em Romanos 3",
+    "Quem foi Nicodemos?",
+    "O que significa nascer de novo?",
+]
+
+
+# ----------------------------
+# Cenários
+# ----------------------------
+@dataclass
+class Cenario:
+    nome: str
+    metodo: str
+    path: str
+    montar: Callable[[int], Dict[str, Any]]
+    stream: bool = False
+
+
+def _json(body: Callable[[int], dict]) -> Callable[[int], Dict[str, Any]]:
+    return lambda i: {"json": body(i)}
+
+
+CENARIOS: Dict[str, Cenario] = {
+    "perguntar": Cenario(
+        "perguntar", "POST", "/perguntar",
+        _json(lambda i: {"pergunta": PERGUNTAS[i % len(PERGUNTAS)]}),
+    ),
+    "stream": Cenario(
+        "stream", "POST", "/perguntar/stream",
+        _json(lambda i: {"pergunta": PERGUNTAS[i % len(PERGUNTAS)]}),
+        stream=True,
+    ),
+    "unificada": Cenario(
+        "unificada", "POST", "/pergunta-unificada",
+        _json(lambda i: {
+            "pergunta": PERGUNTAS[i % len(PERGUNTAS)],
+            "tipo_conteudo": "resposta",
+        }),
+    ),
+    "versiculo": Cenario(
+        "versiculo", "GET", "/versiculo",
+        lambda i: {"params": {
+            "language_code": "por", "book_id": "JHN",
+            "chapter_id": 3, "verse_number": 16,
+        }},
+    ),
+    "upload": Cenario(
+        "upload", "POST", "/upload-arquivo",
+        lambda i: {
+            "files": {"arquivo": (
+                f"bench_{uuid.uuid4().hex[:8]}.txt",
+                f"Sermão de teste {i}\nA graça de Deus.".encode(),
+                "text/plain",
+            )},
+            "data": {"tipo": "txt"},
+        },
+    ),
+}
+
+
+@dataclass
+class Resultado:
+    cenario: str
+    latencias: List[float] = field(default_factory=list)
+    ttfb: List[float] = field(default_factory=list)
+    erros: int = 0
+    duracao: float = 0.0
+
+    def resumo(self) -> Dict[str, Any]:
+        ok = len(self.latencias)
+        dados = {
+            "requests": ok + self.erros,
+            "errors": self.erros,
+            "throughput_rps": round(ok / self.duracao, 2)
+            if self.duracao else 0.0,
+            **{f"{k}_ms": v for k, v in _percentis(self.latencias).items()},
+        }
+        if self.ttfb:
+            dados.update({
+                f"ttfb_{k}_ms": v for k, v in _percentis(self.ttfb).items()
+            })
+        return dados
+
+
+def _percentis(valores: List[float]) -> Dict[str, float]:
+    if not valores:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordenados = sorted(valores)
+
+    def p(q: float) -> float:
+        idx = min(len(ordenados) - 1, max(0, int(q * len(ordenados)) - 1))
+        return round(ordenados[idx] * 1000, 2)
+
+    return {"p50": p(0.50), "p95": p(0.95), "p99": p(0.99)}
+
+
+# ----------------------------
+# Execução de carga
+# ----------------------------
+async def _uma_requisicao(
+    client: httpx.AsyncClient, cenario: Cenario, i: int, res: Resultado
+):
+    kwargs = cenario.montar(i)
+    inicio = time.perf_counter()
+    try:
+        if cenario.stream:
+            async with client.stream(
+                cenario.metodo, cenario.path, **kwargs
+            ) as resp:
+                if resp.status_code != 200:
+                    res.erros += 1
+                    return
+                primeiro = None
+                async for linha in resp.aiter_lines():
+                    if primeiro is None and '"token"' in linha:
+                        primeiro = time.perf_counter() - inicio
+                if primeiro is not None:
+                    res.ttfb.append(primeiro)
+        else:
+            resp = await client.request(
+                cenario.metodo, cenario.path, **kwargs
+            )
+            if resp.status_code != 200:
+                res.erros += 1
+                return
+    except httpx.HTTPError:
+        res.erros += 1
+        return
+    res.latencias.append(time.perf_counter() - inicio)
+
+
+async def executar_cenario(
+    base_url: str, token: str, cenario: Cenario,
+    concorrencia: int, total: int, timeout: float = 300.0,
+) -> Resultado:
+    res = Resultado(cenario.nome)
+    fila: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(total):
+        fila.put_nowait(i)
+
+    limites = httpx.Limits(max_connections=concorrencia)
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=timeout,
+        limits=limites,
+    ) as client:
+        async def worker():
+            while True:
+                try:
+                    i = fila.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await _uma_requisicao(client, cenario, i, res)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concorrencia)))
+        res.duracao = time.perf_counter() - inicio
+    return res
+
+
+# ----------------------------
+# Processos (stand-ins + API)
+# ----------------------------
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _subir(modulo: str, porta: int, env: Dict[str, str],
+           workers: int = 1) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "uvicorn", modulo,
+        "--host", "127.0.0.1", "--port", str(porta),
+        "--log-level", "warning", "--workers", str(workers),
+    ]
+    return subprocess.Popen(cmd, cwd=RAIZ, env=env)
+
+
+def _aguardar(url: str, timeout: float = 60.0) -> None:
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timeout aguardando {url}")
+
+
+def _token(base_url: str) -> str:
+    usuario = f"bench_{uuid.uuid4().hex[:8]}"
+    senha = "bench-senha"
+    httpx.post(f"{base_url}/register", json={
+        "username": usuario, "email": f"{usuario}@bench.local",
+        "full_name": "Bench", "password": senha,
+    }, timeout=30).raise_for_status()
+    r = httpx.post(f"{base_url}/login", data={
+        "username": usuario, "password": senha,
+    }, timeout=30)
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+def montar_ambiente(args, tmp: Path, ollama_port: int, dbt_port: int):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": str(RAIZ),
+        "DATABASE_URL": f"sqlite:///{tmp / 'bench.db'}",
+        "UPLOAD_DIR": str(tmp / "uploads"),
+        "CHROMA_PERSIST_DIR": str(tmp / "chroma"),
+        "EKLESIA_MOCK_RAG": "1" if args.mock else "0",
+        "EKLESIA_TRACE_LOG": "0",
+        "OLLAMA_HOST": f"http://127.0.0.1:{ollama_port}",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{ollama_port}",
+        "BIBLE_API_URL": f"http://127.0.0.1:{dbt_port}/api",
+        "BIBLE_API_KEY": "bench",
+        "FAKE_OLLAMA_TPS": str(args.tokens_per_sec),
+        "FAKE_OLLAMA_TOKENS": str(args.tokens),
+        "FAKE_OLLAMA_PARALLEL": str(args.ollama_parallel),
+        "FAKE_DBT_LATENCY_MS": str(args.dbt_latency_ms),
+    })
+    return env
+
+
+# ----------------------------
+# Baselines
+# ----------------------------
+def salvar_baseline(nome: str, dados: Dict[str, Any]) -> Path:
+    BASELINES_DIR.mkdir(parents=True, exist_ok=True)
+    destino = BASELINES_DIR / f"{nome}.json"
+    destino.write_text(
+        json.dumps(dados, indent=2, ensure_ascii=False), encoding="utf-8"
+    )
+    return destino
+
+
+def comparar(
+    atual: Dict[str, Any], baseline: Dict[str, Any], tolerancia: float
+) -> List[str]:
+    """Lista regressões: p95 acima ou vazão abaixo da tolerância."""
+    regressoes = []
+    for nome, dados in atual["cenarios"].items():
+        base = baseline.get("cenarios", {}).get(nome)
+        if not base:
+            continue
+        if base["p95_ms"] and dados["p95_ms"] > base["p95_ms"] * (
+            1 + tolerancia
+        ):
+            regressoes.append(
+                f"{nome}: p95 {dados['p95_ms']}ms > "
+                f"baseline {base['p95_ms']}ms"
+            )
+        if base["throughput_rps"] and dados["throughput_rps"] < base[
+            "throughput_rps"
+        ] * (1 - tolerancia):
+            regressoes.append(
+                f"{nome}: vazão {dados['throughput_rps']} rps < "
+                f"baseline {base['throughput_rps']} rps"
+            )
+        if dados["errors"] > base.get("errors", 0):
+            regressoes.append(
+                f"{nome}: {dados['errors']} erros "
+                f"(baseline {base.get('errors', 0)})"
+            )
+    return regressoes
+
+
+def imprimir(dados: Dict[str, Any]) -> None:
+    cab = f"{'cenário':<16}{'req':>6}{'erros':>7}{'rps':>9}" \
+          f"{'p50':>10}{'p95':>10}{'p99':>10}{'ttfb p50':>10}"
+    print(cab)
+    print("-" * len(cab))
+    for nome, r in dados["cenarios"].items():
+        print(
+            f"{nome:<16}{r['requests']:>6}{r['errors']:>7}"
+            f"{r['throughput_rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+            f"{r['p99_ms']:>10}{r.get('ttfb_p50_ms', '-'):>10}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    p.add_argument("--scenarios", default=",".join(CENARIOS))
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--sweep", metavar="C1,C2,...",
+                   help="roda cada cenário em cada concorrência "
+                        "(resultados como cenário@cN)")
+    p.add_argument("--requests", type=int, default=100,
+                   help="requisições por cenário")
+    p.add_argument("--workers", type=int, default=1,
+                   help="workers do uvicorn da API")
+    p.add_argument("--mock", dest="mock", action="store_true", default=True,
+                   help="EKLESIA_MOCK_RAG=1 (padrão)")
+    p.add_argument("--no-mock", dest="mock", action="store_false",
+                   help="usa LangChain contra o fake Ollama")
+    p.add_argument("--tokens-per-sec", type=float, default=50)
+    p.add_argument("--tokens", type=int, default=120)
+    p.add_argument("--ollama-parallel", type=int, default=1)
+    p.add_argument("--dbt-latency-ms", type=float, default=30)
+    p.add_argument("--save-baseline", metavar="NOME")
+    p.add_argument("--compare", metavar="NOME")
+    p.add_argument("--tolerance", type=float, default=0.2)
+    p.add_argument("--output", help="salva o JSON do resultado neste path")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    nomes = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    desconhecidos = set(nomes) - set(CENARIOS)
+    if desconhecidos:
+        print(f"Cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+        return 2
+
+    processos: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory(prefix="eklesia-bench-") as d:
+        tmp = Path(d)
+        (tmp / "uploads").mkdir()
+        ollama_port, dbt_port, api_port = (
+            _porta_livre(), _porta_livre(), _porta_livre()
+        )
+        env = montar_ambiente(args, tmp, ollama_port, dbt_port)
+        try:
+            processos.append(
+                _subir("bench.fake_ollama:app", ollama_port, env)
+            )
+            processos.append(_subir("bench.fake_dbt:app", dbt_port, env))
+            processos.append(
+                _subir("main:app", api_port, env, workers=args.workers)
+            )
+            base_url = f"http://127.0.0.1:{api_port}"
+            _aguardar(f"http://127.0.0.1:{ollama_port}/api/tags")
+            _aguardar(f"http://127.0.0.1:{dbt_port}/api/bibles")
+            _aguardar(f"{base_url}/health/live")
+            token = _token(base_url)
+
+            resultado: Dict[str, Any] = {
+                "config": {
+                    k: v for k, v in vars(args).items()
+                    if k not in {"save_baseline", "compare", "output"}
+                },
+                "cenarios": {},
+            }
+            niveis = (
+                [int(c) for c in args.sweep.split(",") if c.strip()]
+                if args.sweep else [args.concurrency]
+            )
+            for nome in nomes:
+                for c in niveis:
+                    res = asyncio.run(executar_cenario(
+                        base_url, token, CENARIOS[nome], c, args.requests,
+                    ))
+                    chave = f"{nome}@c{c}" if args.sweep else nome
+                    resultado["cenarios"][chave] = res.resumo()
+        finally:
+            for proc in processos:
+                proc.terminate()
+            for proc in processos:
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    imprimir(resultado)
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(resultado, indent=2, ensure_ascii=False),
+            encoding="utf-8",
+        )
+    if args.save_baseline:
+        destino = salvar_baseline(args.save_baseline, resultado)
+        print(f"Baseline salvo em {destino}")
+    if args.compare:
+        base_path = BASELINES_DIR / f"{args.compare}.json"
+        baseline = json.loads(base_path.read_text(encoding="utf-8"))
+        regressoes = comparar(resultado, baseline, args.tolerance)
+        if regressoes:
+            print("\nRegressões detectadas:")
+            for r in regressoes:
+                print(f"  - {r}")
+            return 1
+        print(f"\nSem regressões frente ao baseline '{args.compare}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# bench/sse.py
+"""
+Custo de CPU por token no streaming SSE.
+
+Sobe o fake Ollama e a API (um worker, LLM via fake Ollama), abre N
+streams simultâneos em /perguntar/stream e mede o tempo de CPU do
+processo da API (via /proc) dividido pelos tokens entregues. Com várias
+configurações de coalescência (`--flush-ms`), reinicia a API para cada
+uma e imprime a comparação.
+
+Exemplos:
+  python -m bench.sse --streams 500
+  python -m bench.sse --streams 500 --flush-ms 0,40 --output sse.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.run import _aguardar, _porta_livre, _subir, _token, \
+    montar_ambiente
+
+
+def cpu_processo(pid: int) -> float:
+    """Segundos de CPU (user + sys) do processo e dos filhos (Linux)."""
+    campos = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    # utime, stime, cutime, cstime: campos 14-17 (base 1) do stat
+    ticks = sum(int(v) for v in campos[11:15])
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+async def _um_stream(client, i: int, totais: Dict[str, int]) -> None:
+    corpo = {"pergunta": f"O que é graça? ({i % 7})"}
+    try:
+        async with client.stream(
+            "POST", "/perguntar/stream", json=corpo
+        ) as resp:
+            if resp.status_code != 200:
+                totais["erros"] += 1
+                return
+            async for linha in resp.aiter_lines():
+                if not linha.startswith("data:"):
+                    continue
+                evento = json.loads(linha[5:])
+                if evento.get("type") == "token":
+                    totais["frames"] += 1
+                    totais["bytes"] += len(evento["content"])
+    except httpx.HTTPError:
+        totais["erros"] += 1
+
+
+async def disparar(base_url: str, token: str, streams: int):
+    totais = {"frames": 0, "bytes": 0, "erros": 0}
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=600,
+        limits=httpx.Limits(max_connections=streams),
+    ) as client:
+        await asyncio.gather(*(
+            _um_stream(client, i, totais) for i in range(streams)
+        ))
+    return totais
+
+
+def medir(args, flush_ms: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="eklesia-sse-") as d:
+        tmp = Path(d)
+        (tmp / "uploads").mkdir()
+        ollama_port, api_port = _porta_livre(), _porta_livre()
+        env = montar_ambiente(args, tmp, ollama_port, _porta_livre())
+        env.update({
+            "EKLESIA_SSE_FLUSH_MS": str(flush_ms),
+            "EKLESIA_STREAM_MAX_SECONDS": "600",
+        })
+        processos = [
+            _subir("bench.fake_ollama:app", ollama_port, env),
+            _subir("main:app", api_port, env),
+        ]
+        try:
+            base_url = f"http://127.0.0.1:{api_port}"
+            _aguardar(f"http://127.0.0.1:{ollama_port}/api/tags")
+            _aguardar(f"{base_url}/health/live")
+            token = _token(base_url)
+            # Aquece (imports preguiçosos, coleção, conexões)
+            asyncio.run(disparar(base_url, token, 2))
+
+            pid = processos[1].pid
+            cpu0, t0 = cpu_processo(pid), time.perf_counter()
+            totais = asyncio.run(disparar(base_url, token, args.streams))
+            cpu, duracao = cpu_processo(pid) - cpu0, time.perf_counter() - t0
+        finally:
+            for proc in processos:
+                proc.terminate()
+            for proc in processos:
+                proc.wait(timeout=10)
+
+    tokens = args.streams * args.tokens
+    return {
+        "flush_ms": flush_ms,
+        "streams": args.streams,
+        "erros": totais["erros"],
+        "tokens": tokens,
+        "frames": totais["frames"],
+        "frames_por_token": round(totais["frames"] / tokens, 3),
+        "cpu_s": round(cpu, 2),
+        "cpu_us_por_token": round(cpu / tokens * 1e6, 1),
+        "duracao_s": round(duracao, 2),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    p.add_argument("--streams", type=int, default=500)
+    p.add_argument("--flush-ms", default="0,40",
+                   help="EKLESIA_SSE_FLUSH_MS a comparar (0 = sem "
+                        "coalescência)")
+    p.add_argument("--tokens", type=int, default=100,
+                   help="tokens por resposta no fake Ollama")
+    p.add_argument("--tokens-per-sec", type=float, default=20)
+    p.add_argument("--output", help="salva o JSON do resultado neste path")
+    args = p.parse_args(argv)
+    # Campos esperados por montar_ambiente
+    args.mock = False
+    args.ollama_parallel = args.streams
+    args.dbt_latency_ms = 0
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    resultados = [
+        medir(args, int(f)) for f in args.flush_ms.split(",") if f.strip()
+    ]
+    cab = f"{'flush_ms':>9}{'erros':>7}{'frames/tok':>12}" \
+          f"{'cpu s':>9}{'µs/token':>10}{'duração s':>11}"
+    print(cab)
+    print("-" * len(cab))
+    for r in resultados:
+        print(
+            f"{r['flush_ms']:>9}{r['erros']:>7}{r['frames_por_token']:>12}"
+            f"{r['cpu_s']:>9}{r['cpu_us_por_token']:>10}"
+            f"{r['duracao_s']:>11}"
+        )
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps(resultados, indent=2), encoding="utf-8"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,12 +6,16 @@ e erros de import, apenas reexportamos as funções utilizadas.
 
 from app.chat import (  # noqa: F401
     responder_pergunta_com_versiculo,
+    aresponder_pergunta_com_versiculo,
     recuperar_docs,
+    arecuperar_docs,
     stream_resposta,
 )
 
 __all__ = [
     "responder_pergunta_com_versiculo",
+    "aresponder_pergunta_com_versiculo",
     "recuperar_docs",
+    "arecuperar_docs",
     "stream_resposta",
 ]
@@ -1,9 +1,14 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 from app.routes import router
+from app.health import router as health_router
+from app.metrics import MetricsMiddleware, router as metrics_router
+from app.tracing import TracingMiddleware
 from sqlalchemy import text
 from app.ingestor import engine
 from fastapi import HTTPException
@@ -11,6 +16,26 @@ from fastapi import HTTPException
 # Carrega variáveis de ambiente
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app):
+    # Vigia do índice: reaquece os caches do RAG (app.aquecimento)
+    from app.aquecimento import AQUECIMENTO
+    # Worker da fila de jobs no próprio processo (EKLESIA_JOBS_INLINE)
+    from app.jobs import iniciar_worker_inline, parar_worker_inline
+
+    # Versões síncronas (aquecimento, scripts) esperam no loop da API
+    from app.chat import registrar_loop
+
+    registrar_loop(asyncio.get_running_loop())
+    AQUECIMENTO.iniciar_vigia()
+    iniciar_worker_inline()
+    yield
+    await parar_worker_inline()
+    AQUECIMENTO.parar_vigia()
+    registrar_loop(None)
+
+
 app = FastAPI(
     title="EKLESIA IA",
     description=(
@@ -18,6 +43,7 @@ app = FastAPI(
         "(LangChain + Ollama + Chroma)"
     ),
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -29,15 +55,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Métricas por rota (exportadas em /metrics) e tracing por requisição
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # Rotas
 app.include_router(router)
+app.include_router(health_router)
+app.include_router(metrics_router)
 
 # Healthcheck
 
 
 @app.get("/health", tags=["Health"])
 def health_check():
+    """Compatibilidade: equivale a /health/live."""
     return {"status": "ok", "message": "API EKLESIA IA está rodando"}
 
 
@@ -0,0 +1,89 @@
+# scripts/migrar_ingestao.py
+"""
+Migra para o motor único de ingestão (app.ingestor):
+
+1. adiciona a conteudo_teologico as colunas novas (source_path,
+   mime_type, content_hash, created_at) e preenche o hash das linhas
+   antigas;
+2. copia textos_biblicos (banco de origem, padrão DATABASE_URL) para
+   conteudo_teologico, sem duplicar textos já existentes;
+3. indexa no Chroma da app (EMBED_MODEL, COLLECTION_NAME/PERSIST_DIR)
+   o que ainda não tem vetor e reconstrói o índice BM25.
+
+Uso:
+    python -m scripts.migrar_ingestao [--origem URL] [--sem-indexar]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+
+
+def migrar_colunas() -> int:
+    from app.ingestor import (
+        ConteudoTeologico,
+        garantir_schema,
+        hash_conteudo,
+        session,
+    )
+
+    criadas = garantir_schema()
+    if criadas:
+        print(f"Colunas adicionadas: {', '.join(criadas)}")
+    antigas = session.query(ConteudoTeologico).filter(
+        ConteudoTeologico.content_hash.is_(None)
+    ).all()
+    for c in antigas:
+        c.content_hash = hash_conteudo(c.texto)
+    session.commit()
+    return len(antigas)
+
+
+def copiar_textos_biblicos(origem: str) -> int:
+    from app.ingestao import TextoBiblico, salvar_texto
+
+    engine = create_engine(origem, pool_pre_ping=True)
+    if not inspect(engine).has_table(TextoBiblico.__tablename__):
+        print("Sem tabela textos_biblicos na origem; nada a copiar.")
+        return 0
+    total = 0
+    with Session(engine) as s:
+        for t in s.query(TextoBiblico).yield_per(100):
+            # indexação em lote no fim (um embedding por fragmento)
+            if salvar_texto(
+                t.titulo, t.conteudo, t.source_path, t.mime_type,
+                indexar=False,
+            ):
+                total += 1
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--origem",
+        default=os.getenv("LEGACY_DATABASE_URL") or os.getenv("DATABASE_URL"),
+        help="URL do banco com textos_biblicos (padrão: DATABASE_URL)",
+    )
+    parser.add_argument("--sem-indexar", action="store_true")
+    args = parser.parse_args()
+
+    print(f"Hashes preenchidos: {migrar_colunas()}")
+    if args.origem:
+        migrados = copiar_textos_biblicos(args.origem)
+        print(f"textos_biblicos migrados: {migrados}")
+    if args.sem_indexar:
+        return
+
+    from app.ingestor import indexar_conteudo_teologico
+    from app.lexical import reconstruir_do_banco
+
+    indexar_conteudo_teologico()
+    print(f"Índice léxico: {reconstruir_do_banco()} fragmentos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import os
+import shutil
+import tempfile
+
+# Banco SQLite, índice BM25, marcador de geração do cache e coleções dos
+# testes fora da árvore do repositório e novos a cada execução (app.db,
+# app.lexical, app.cache e app.chat leem estes caminhos ao importar,
+# antes de qualquer fixture)
+_PERSIST_DIR = tempfile.mkdtemp(prefix="eklesia-testes-")
+os.environ["DATABASE_URL"] = (
+    f"sqlite:///{os.path.join(_PERSIST_DIR, 'test_app.db')}"
+)
+os.environ["CHROMA_PERSIST_DIR"] = _PERSIST_DIR
+os.environ["LEXICAL_INDEX_PATH"] = os.path.join(
+    _PERSIST_DIR, "lexical_index.json"
+)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_PERSIST_DIR, ignore_errors=True)
@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+import pytest  # noqa: E402
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+
+import app.aquecimento as aquecimento  # noqa: E402
+import app.cache as cache  # noqa: E402
+import app.chat as chat  # noqa: E402
+from app.metrics import CACHE_WARM_HITS  # noqa: E402
+
+GERACOES = []
+
+
+def _recuperar(pergunta, k=8, score_threshold=0.25, filtros=None):
+    return [], [{"source": "a.txt", "page": 1, "score": 0.9}]
+
+
+def _llm(prompt):
+    GERACOES.append(prompt)
+    return "Graça é favor imerecido."
+
+
+async def _allm(prompt):
+    return _llm(prompt)
+
+
+@pytest.fixture
+def rag_falso(monkeypatch, tmp_path):
+    monkeypatch.setattr(chat, "MOCK_RAG", False)
+    monkeypatch.setattr(chat, "recuperar_docs", _recuperar)
+    monkeypatch.setattr(chat, "llm", RunnableLambda(_llm, afunc=_allm))
+    monkeypatch.setattr(
+        cache, "_geracao", cache._Geracao(str(tmp_path / "indice.geracao"))
+    )
+    monkeypatch.setattr(
+        cache.RESPOSTAS_QUENTES, "path", str(tmp_path / "quentes.json")
+    )
+    monkeypatch.setattr(aquecimento, "LOCK_PATH", str(tmp_path / "lock"))
+    cache.CACHE_RESPOSTAS.limpar()
+    GERACOES.clear()
+    yield
+    cache.CACHE_RESPOSTAS.limpar()
+
+
+def test_aquecimento_atende_trafego_e_cai_com_o_indice(rag_falso, tmp_path):
+    arquivo = tmp_path / "perguntas.txt"
+    arquivo.write_text(
+        "# mais frequentes\nO que é graça?\no que e GRACA\nQuem foi Paulo?\n",
+        encoding="utf-8",
+    )
+    resumo = aquecimento.AQUECIMENTO.executar(
+        aquecimento.ler_perguntas(str(arquivo))
+    )
+    assert resumo["geradas"] == 2 and resumo["erros"] == 0
+    assert resumo["snapshot"]["entradas"] == 2
+    assert len(GERACOES) == 2
+
+    # Outro worker: memória vazia, responde pelo snapshot do aquecimento
+    cache.CACHE_RESPOSTAS.limpar()
+    antes = CACHE_WARM_HITS.valor(cache="respostas")
+    r = asyncio.run(chat.aresponder_pergunta_com_versiculo("O que é graça"))
+    assert r["resposta"] == "Graça é favor imerecido."
+    assert len(GERACOES) == 2
+    assert CACHE_WARM_HITS.valor(cache="respostas") == antes + 1
+
+    # Reaquecer sem mudança no índice reaproveita tudo
+    resumo = aquecimento.AQUECIMENTO.executar(
+        aquecimento.ler_perguntas(str(arquivo))
+    )
+    assert resumo["reaproveitadas"] == 2 and len(GERACOES) == 2
+
+    # Índice mudou: o que estava em cache deixa de valer
+    cache.marcar_indice_alterado()
+    assert aquecimento.AQUECIMENTO.motivo_pendente() is None  # debounce
+    chat.responder_pergunta_com_versiculo("O que é graça?")
+    assert len(GERACOES) == 3
+
+
+def test_janela_de_baixo_movimento():
+    assert aquecimento.na_janela(3, "2-5")
+    assert not aquecimento.na_janela(5, "2-5")
+    assert aquecimento.na_janela(1, "22-3")
+    assert not aquecimento.na_janela(12, "")
@@ -0,0 +1,115 @@
+import os
+
+from fastapi.testclient import TestClient
+
+# Configura ambiente (tests usam SQLite e RAG simulado)
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_app.db")
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+from app import biblia_local  # noqa: E402
+from app.biblia_local import IndiceVersos, normalizar  # noqa: E402
+
+
+def _capitulo(livro, cap, textos):
+    return [
+        {"book_id": livro, "chapter": cap, "verse_start": str(i),
+         "verse_text": t}
+        for i, t in enumerate(textos, start=1)
+    ]
+
+
+def _popular(monkeypatch, tmp_path):
+    idx = IndiceVersos("por", str(tmp_path))
+    monkeypatch.setitem(biblia_local._indices, "por", idx)
+    # Fora de ordem de propósito: a paginação segue a ordem canônica
+    biblia_local.armazenar_capitulo("por", "PORARC", "PORARCN_ET", _capitulo(
+        "JHN", 3, [
+            "Havia entre os fariseus um homem chamado Nicodemos.",
+            "Aquele que não nascer de novo não pode ver o Reino de Deus.",
+        ]
+    ))
+    biblia_local.armazenar_capitulo("por", "PORARC", "PORARCN_ET", _capitulo(
+        "GEN", 1, [
+            "No princípio criou Deus os céus e a terra.",
+            "E o Espírito de Deus se movia sobre a face das águas.",
+        ]
+    ))
+    return idx
+
+
+def test_normalizacao_multilingue():
+    assert normalizar("Espíritu CORAÇÃO") == "espiritu coracao"
+    assert normalizar("λόγος") == "λογοσ"
+    assert normalizar("בְּרֵאשִׁית אֱלֹהִים") == "בראשית אלהימ"
+
+
+def test_frase_e_cursor(monkeypatch, tmp_path):
+    _popular(monkeypatch, tmp_path)
+
+    r = biblia_local.pesquisar("deus", limite=2)
+    assert r["meta"]["total"] == 3
+    assert [v["reference"] for v in r["data"]] == ["GEN 1:1", "GEN 1:2"]
+    r = biblia_local.pesquisar(
+        "deus", limite=2, cursor=r["meta"]["next_cursor"]
+    )
+    assert [v["reference"] for v in r["data"]] == ["JHN 3:2"]
+    assert r["meta"]["next_cursor"] is None
+
+    assert biblia_local.pesquisar('"nascer de novo"')["meta"]["total"] == 1
+    assert biblia_local.pesquisar('"de novo nascer"')["meta"]["total"] == 0
+    assert biblia_local.pesquisar("espirito aguas")["meta"]["total"] == 1
+
+    # Persistido em JSONL: uma nova instância relê o texto
+    outro = IndiceVersos("por", str(tmp_path))
+    outro.carregar()
+    assert len(outro) == 4
+
+
+def test_capitulo_repetido_nao_regrava(monkeypatch, tmp_path):
+    idx = _popular(monkeypatch, tmp_path)
+    idx.buscar("deus")
+    tamanho = os.path.getsize(idx.path)
+    registros = [
+        {"book_id": "GEN", "chapter": 1, "verse": 1,
+         "text": "No princípio criou Deus os céus e a terra."},
+    ]
+    assert idx.adicionar(registros) == 0
+    assert os.path.getsize(idx.path) == tamanho and not idx._sujo
+
+    registros[0]["text"] = "No princípio era o Verbo."
+    assert idx.adicionar(registros) == 1
+    assert biblia_local.pesquisar("verbo")["meta"]["total"] == 1
+
+
+def test_rota_usa_indice_local(monkeypatch, tmp_path):
+    _popular(monkeypatch, tmp_path)
+    from main import app
+
+    client = TestClient(app)
+    resp = client.get("/pesquisar-termo", params={"termo": "Nicodemos"})
+    assert resp.status_code == 200
+    corpo = resp.json()
+    assert corpo["meta"]["source"] == "local"
+    assert corpo["data"][0]["reference"] == "JHN 3:1"
+
+
+def test_busca_por_palavra_recursos_por_capitulo(monkeypatch, tmp_path):
+    from app import biblia_api
+
+    _popular(monkeypatch, tmp_path)
+    chamadas = []
+
+    def extras(bible_id, book_id, chapter, timeout=None):
+        chamadas.append((book_id, chapter))
+        raise TimeoutError("DBT lento")
+
+    monkeypatch.setattr(biblia_api, "buscar_recursos_extras", extras)
+    achados = biblia_api.buscar_versos_por_palavra("deus", idiomas=["por"])
+    assert len(achados) == 3 and all(a["recursos"] == {} for a in achados)
+    assert sorted(chamadas) == [("GEN", 1), ("JHN", 3)]
+
+    chamadas.clear()
+    biblia_api.buscar_versos_por_palavra(
+        "deus", idiomas=["por"], recursos=False
+    )
+    assert chamadas == []
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+import pytest  # noqa: E402
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+
+import app.chat as chat  # noqa: E402
+
+
+def _recuperar(pergunta, k=8, score_threshold=0.25, filtros=None):
+    time.sleep(0.05)
+    return [], [{"source": "a.txt", "page": 1, "score": 0.9}]
+
+
+async def _llm_lento(prompt):
+    await asyncio.sleep(0.3)
+    return "Graça é favor imerecido."
+
+
+def _llm_sincrono(prompt):
+    time.sleep(0.3)
+    return "Graça é favor imerecido."
+
+
+@pytest.fixture
+def rag_falso(monkeypatch):
+    monkeypatch.setattr(chat, "MOCK_RAG", False)
+    monkeypatch.setattr(chat, "recuperar_docs", _recuperar)
+    monkeypatch.setattr(
+        chat, "llm", RunnableLambda(_llm_sincrono, afunc=_llm_lento)
+    )
+
+
+def test_respostas_concorrentes_nao_bloqueiam_o_loop(rag_falso):
+    async def rodar():
+        inicio = time.perf_counter()
+        respostas = await asyncio.gather(*(
+            chat.aresponder_pergunta_com_versiculo(f"O que é graça? {i}")
+            for i in range(10)
+        ))
+        return respostas, time.perf_counter() - inicio
+
+    respostas, duracao = asyncio.run(rodar())
+    assert all(r["resposta"] == "Graça é favor imerecido." for r in respostas)
+    # Em série seriam ~3.5s
+    assert duracao < 1.5
+
+
+def test_versao_sincrona_equivale(rag_falso):
+    sincrona = chat.responder_pergunta_com_versiculo("O que é graça?")
+    assincrona = asyncio.run(
+        chat.aresponder_pergunta_com_versiculo("O que é graça?")
+    )
+    assert sincrona == assincrona
+
+
+def test_versao_sincrona_usa_o_single_flight(rag_falso, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    chamadas = []
+
+    async def contar(prompt):
+        chamadas.append(prompt)
+        return await _llm_lento(prompt)
+
+    monkeypatch.setattr(
+        chat, "llm", RunnableLambda(_llm_sincrono, afunc=contar)
+    )
+    with ThreadPoolExecutor(4) as pool:
+        respostas = list(pool.map(
+            chat.responder_pergunta_com_versiculo, ["Quem é Deus?"] * 4
+        ))
+    assert len(chamadas) == 1
+    assert all(r == respostas[0] for r in respostas)
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_app.db")
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+
+def test_registro_troca_ativa_e_persiste(tmp_path):
+    from app.colecoes import Registro
+
+    path = str(tmp_path / "colecoes.json")
+    reg = Registro(path, alias="eklesia")
+    assert reg.garantir_ativa("bge-m3")["nome"] == "eklesia"
+    reg.conferir_dimensao("eklesia", 1024)
+    with pytest.raises(RuntimeError):
+        reg.conferir_dimensao("eklesia", 768)
+
+    reg.registrar("eklesia__nomic__1", "nomic-embed-text", 768)
+    reg.ativar("eklesia__nomic__1")
+    with pytest.raises(ValueError):
+        reg.remover("eklesia__nomic__1")
+
+    # Outro processo lê o mesmo arquivo
+    outro = Registro(path, alias="eklesia")
+    outro.carregar()
+    ativa = outro.ativa()
+    assert ativa["modelo"] == "nomic-embed-text"
+    assert ativa["dimensao"] == 768
+    assert outro.dados["colecoes"]["eklesia"]["estado"] == "inativa"
+    # garantir_ativa não sobrescreve o que já está registrado
+    assert outro.garantir_ativa("bge-m3")["nome"] == "eklesia__nomic__1"
+
+
+def test_reembed_recusado_em_modo_mock():
+    from app.colecoes import REEMBED
+
+    with pytest.raises(RuntimeError):
+        REEMBED.iniciar("nomic-embed-text")
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from app.contexto import SEPARADOR, contar_tokens, montar_contexto
+
+
+def _doc(texto):
+    return SimpleNamespace(page_content=texto, metadata={})
+
+
+def test_docs_curtos_passam_inteiros():
+    docs = [_doc("A graça é favor imerecido."), _doc("A fé vem pelo ouvir.")]
+    contexto, rel = montar_contexto(docs, "graça", limite=1000)
+    assert contexto == SEPARADOR.join(d.page_content for d in docs)
+    assert rel["descartados"] == 0
+
+
+def test_orcamento_mantem_frases_relevantes_e_remove_duplicadas():
+    longo = " ".join(
+        f"Frase de enchimento número {i} sobre outro assunto."
+        for i in range(50)
+    )
+    docs = [
+        _doc(longo + " A propiciação é obra de Cristo na cruz."),
+        # Chunk sobreposto: repete a frase final do anterior
+        _doc(
+            "A propiciação é obra de Cristo na cruz. "
+            "Ela satisfaz a justiça."
+        ),
+    ]
+    contexto, rel = montar_contexto(docs, "o que é propiciação", limite=60)
+    assert "A propiciação é obra de Cristo na cruz." in contexto
+    assert contexto.count("propiciação é obra") == 1
+    assert rel["duplicados"] == 1
+    assert rel["usados"] <= 60
+    assert rel["descartados"] == rel["tokens"] - rel["usados"]
+    assert contar_tokens(contexto) <= 60 + 10  # separadores e elipses
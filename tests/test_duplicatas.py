@@ -0,0 +1,52 @@
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_app.db")
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+SERMAO = " ".join(
+    f"No parágrafo {i} o pregador expõe a justificação pela fé somente, "
+    f"a imputação da justiça de Cristo e a paz com Deus."
+    for i in range(40)
+)
+
+
+def test_minhash_estima_jaccard():
+    from app.duplicatas import assinar, similaridade
+
+    original = assinar(SERMAO)
+    rodape = assinar(SERMAO + " Igreja Local — todos os direitos reservados.")
+    outro = assinar("A doutrina da criação e o descanso do sétimo dia. " * 20)
+    assert similaridade(original, rodape) > 0.9
+    assert similaridade(original, outro) < 0.2
+
+
+def test_quase_duplicata_vinculada_e_nao_indexada(tmp_path):
+    from app.ingestor import ConteudoTeologico, salvar_conteudo, session
+    from app.lexical import indice_lexico
+
+    texto = f"{SERMAO} ({tmp_path.name})"
+    original = salvar_conteudo("Sermão", texto, "pdf")
+    copia = salvar_conteudo("Sermão (docx)", texto + " Rodapé novo.", "docx")
+    assert copia != original
+    # Em banco reaproveitado, o "original" pode já ser cópia de outro
+    canonico = session.get(ConteudoTeologico, original).duplicata_de
+    assert session.get(ConteudoTeologico, copia).duplicata_de == (
+        canonico or original
+    )
+    assert f"ct:{copia}:0" not in indice_lexico().docs
+
+
+def test_colapsar_mantem_o_primeiro_de_cada_grupo():
+    from app.duplicatas import colapsar
+
+    def doc(texto):
+        return SimpleNamespace(page_content=texto, metadata={})
+
+    pares = [
+        (doc(SERMAO[:1500]), 0.9),
+        (doc(SERMAO[:1500] + " Amém."), 0.8),
+        (doc("Outro assunto: a eleição incondicional em Romanos 9."), 0.7),
+    ]
+    mantidos = colapsar(pares)
+    assert [s for _, s in mantidos] == [0.9, 0.7]
@@ -0,0 +1,53 @@
+import pytest
+
+from app.embedding import ExecutorEmbeddings, planejar_lotes
+
+
+class _Base:
+    model = "fake"
+
+    def __init__(self, falhar_acima=None):
+        self.falhar_acima = falhar_acima
+        self.chamadas = []
+
+    def embed_documents(self, textos):
+        self.chamadas.append(len(textos))
+        if self.falhar_acima is not None and len(textos) > self.falhar_acima:
+            raise RuntimeError("payload grande demais")
+        return [[float(len(t))] for t in textos]
+
+    def embed_query(self, texto):
+        return [float(len(texto))]
+
+
+def test_planejar_lotes_por_quantidade_e_caracteres():
+    textos = ["a" * 10] * 5 + ["b" * 100] + ["c"]
+    assert planejar_lotes(textos, lote=3, max_chars=50) == [
+        [0, 1, 2], [3, 4], [5], [6]
+    ]
+
+
+def test_executor_preserva_ordem_e_divide_lote_que_falha(monkeypatch):
+    monkeypatch.setattr("app.embedding.time.sleep", lambda s: None)
+    base = _Base(falhar_acima=4)
+    emb = ExecutorEmbeddings(base, job="teste", lote=8, concorrencia=3,
+                             retentativas=1)
+    textos = ["x" * i for i in range(1, 41)]
+    assert emb.embed_documents(textos) == [[float(i)] for i in range(1, 41)]
+    # Lotes de 8 falharam, foram divididos e o lote caiu para 4
+    assert max(n for n in base.chamadas) == 8
+    assert emb.lote == 4
+    assert emb.estado()["vetores"] == 40
+
+
+def test_executor_cresce_lote_com_latencia_folgada():
+    emb = ExecutorEmbeddings(_Base(), job="teste", lote=8, concorrencia=1)
+    emb.embed_documents(["t"] * 100)
+    assert emb.lote > 8
+
+
+def test_executor_desiste_de_texto_unico():
+    emb = ExecutorEmbeddings(_Base(falhar_acima=0), job="teste",
+                             retentativas=0)
+    with pytest.raises(RuntimeError):
+        emb.embed_documents(["sozinho"])
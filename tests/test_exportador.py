@@ -0,0 +1,86 @@
+import io
+import os
+
+import pytest
+
+import app.exportador as exportador
+
+pymupdf = pytest.importorskip("pymupdf")
+
+
+def _ebook(capitulos=3):
+    texto = "Introdução.\n\n" + "\n".join(
+        f"## Capítulo {c}: A graça\n"
+        + "\n".join(f"Parágrafo {i} & <graça>." for i in range(5))
+        + "\n- item"
+        for c in range(1, capitulos + 1)
+    )
+    return {
+        "tema": "A graça de Deus",
+        "capitulos": capitulos,
+        "autor": "Calvino",
+        "esboco": [],
+        "citacoes": ["Calvino sobre graça: 'A verdade é eterna.'"],
+        "texto_gerado": texto,
+        "fontes": [
+            {"source": "/docs/institutas.pdf", "page": 3},
+            {"source": "/docs/institutas.pdf", "page": 3},
+        ],
+    }
+
+
+def test_markdown_com_capitulos_e_fontes():
+    saida = io.BytesIO()
+    exportador.escrever(_ebook(), "md", saida)
+    md = saida.getvalue().decode("utf-8")
+    assert md.startswith("# A graça de Deus\n")
+    assert "## Capítulo 2: A graça" in md
+    assert "- item" in md and "> Calvino sobre graça" in md
+    assert md.count("institutas.pdf, p. 3") == 1
+
+
+def test_pdf_comeca_cada_capitulo_em_pagina_nova():
+    saida = io.BytesIO()
+    exportador.escrever(_ebook(), "pdf", saida)
+    doc = pymupdf.open(stream=saida.getvalue(), filetype="pdf")
+    inicios = [p.get_text().lstrip().split("\n")[0] for p in doc]
+    assert inicios[:4] == [
+        "A graça de Deus",
+        "Capítulo 1: A graça",
+        "Capítulo 2: A graça",
+        "Capítulo 3: A graça",
+    ]
+    assert "Parágrafo 4 & <graça>." in doc[1].get_text()
+
+
+def test_docx_em_memoria():
+    docx = pytest.importorskip("docx")
+    sermao = {
+        "tema": "Fé", "tipo": "expositivo", "versiculos": ["Hebreus 11:1"],
+        "esboco": ["Definição", "Exemplos"], "texto_gerado": "Definição",
+    }
+    doc = docx.Document(io.BytesIO(exportador.gerar_docx(sermao)))
+    textos = [p.text for p in doc.paragraphs]
+    assert textos[:2] == ["Fé", "Sermão expositivo"]
+    assert "Exemplos" in textos
+
+
+def test_cache_por_conteudo_e_limpeza(tmp_path, monkeypatch):
+    conteudo = _ebook()
+    caminho, do_cache = exportador.exportar(conteudo, "md", pasta=tmp_path)
+    assert not do_cache and os.path.exists(caminho)
+    assert exportador.exportar(conteudo, "md", pasta=tmp_path) == (
+        caminho, True
+    )
+    outro, do_cache = exportador.exportar(
+        {**conteudo, "tema": "Outro"}, "md", pasta=tmp_path
+    )
+    assert outro != caminho and not do_cache
+    assert exportador.nome_arquivo(conteudo, "pdf") == (
+        "ebook-a-graca-de-deus.pdf"
+    )
+
+    os.utime(caminho, (0, 0))
+    monkeypatch.setattr(exportador, "EXPORT_CACHE_MB", 0.0001)
+    assert exportador.limpar(tmp_path, manter=outro) == 1
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(outro)]
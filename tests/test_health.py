@@ -0,0 +1,28 @@
+import os
+from fastapi.testclient import TestClient
+
+# Configura ambiente (tests usam SQLite e RAG simulado)
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_app.db")
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+
+def test_health_live_and_ready():
+    from main import app
+    client = TestClient(app)
+
+    r = client.get("/health/live")
+    assert r.status_code == 200, r.text
+    assert r.json()["status"] == "ok"
+
+    r = client.get("/health/ready")
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert set(data["checks"]) == {
+        "database", "chroma", "ollama", "biblia_api", "cache_rag"
+    }
+    for check in data["checks"].values():
+        assert "latency_ms" in check
+
+    # Segunda chamada dentro do TTL reaproveita o resultado em cache
+    r2 = client.get("/health/ready")
+    assert r2.json()["checked_at"] == data["checked_at"]
@@ -0,0 +1,38 @@
+import os
+
+# Configura ambiente (tests usam SQLite e RAG simulado)
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_app.db")
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+
+def test_fragmentar_com_sobreposicao():
+    from app.ingestor import CHUNK_CHARS, fragmentar
+
+    texto = "Frase sobre a graça de Deus. " * 200
+    partes = fragmentar(texto)
+    assert len(partes) > 1
+    assert all(len(p) <= CHUNK_CHARS for p in partes)
+    # Fragmentos vizinhos compartilham o trecho de sobreposição
+    assert partes[0][-100:] in partes[1]
+    assert fragmentar("curto") == ["curto"]
+
+
+def test_salvar_conteudo_deduplica_e_indexa():
+    import uuid
+
+    from app.ingestao import salvar_texto
+    from app.ingestor import ConteudoTeologico, salvar_conteudo, session
+    from app.lexical import indice_lexico
+
+    texto = f"Conteúdo único {uuid.uuid4().hex} sobre santificação."
+    cid = salvar_conteudo("Teste", texto, "txt", autor="Owen")
+    # Mesmo texto pelo caminho da ingestão em lote: mesmo registro
+    assert salvar_texto("Outro título", texto, "/tmp/x.txt") == cid
+    assert session.query(ConteudoTeologico).filter(
+        ConteudoTeologico.content_hash
+        == session.get(ConteudoTeologico, cid).content_hash
+    ).count() == 1
+
+    idx = indice_lexico()
+    assert f"ct:{cid}:0" in idx.docs
+    assert idx.filtrar({"autor": "owen"}) >= {f"ct:{cid}:0"}
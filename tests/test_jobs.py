@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_app.db")
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import app.jobs as jobs  # noqa: E402
+
+
+@pytest.fixture
+def fila(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    jobs.JobGeracao.__table__.create(engine)
+    monkeypatch.setattr(jobs, "JOB_POLL", 0.02)
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT", 0.02)
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE", 0)
+    chamadas = []
+
+    async def eco(p, progresso):
+        chamadas.append(p)
+        if p.get("falhas", 0) >= len(chamadas):
+            raise RuntimeError("Ollama fora do ar")
+        progresso["chunks"] = 3
+        await asyncio.sleep(p.get("dormir", 0))
+        return {"texto": p["texto"]}
+
+    monkeypatch.setitem(jobs._EXECUTORES, "eco", eco)
+    yield jobs.FilaJobs(sessionmaker(bind=engine))
+    engine.dispose()
+
+
+def _executar(fila, job_id, durante=None):
+    """Roda um worker até o job chegar a um estado final."""
+
+    async def rodar():
+        worker = jobs.Worker(nome="w1", fila=fila)
+        tarefa = asyncio.create_task(worker.rodar())
+        try:
+            while True:
+                job = fila.obter(job_id, "ana")
+                if job["estado"] in jobs.TERMINAIS:
+                    return job
+                if durante and job["estado"] == "executando":
+                    durante()
+                await asyncio.sleep(0.02)
+        finally:
+            worker.parar()
+            await tarefa
+
+    return asyncio.run(asyncio.wait_for(rodar(), 10))
+
+
+def test_job_concluido_com_resultado_e_progresso(fila):
+    job = fila.submeter("eco", {"texto": "graça"}, dono="ana")
+    assert job["estado"] == "pendente"
+    assert fila.obter(job["id"], "bia") is None
+
+    job = _executar(fila, job["id"])
+    assert job["estado"] == "concluido"
+    assert job["resultado"] == {"texto": "graça"}
+    assert job["progresso"] == {"chunks": 3}
+    assert job["tentativas"] == 1
+    assert [j["id"] for j in fila.listar("ana")] == [job["id"]]
+
+
+def test_falha_volta_para_a_fila_ate_esgotar_tentativas(fila):
+    job = fila.submeter("eco", {"texto": "fé", "falhas": 1}, dono="ana")
+    job = _executar(fila, job["id"])
+    assert job["estado"] == "concluido" and job["tentativas"] == 2
+
+    job = fila.submeter(
+        "eco", {"texto": "fé", "falhas": 9}, dono="ana", max_tentativas=2
+    )
+    job = _executar(fila, job["id"])
+    assert job["estado"] == "erro" and job["tentativas"] == 2
+    assert "Ollama fora do ar" in job["erro"]
+
+
+def test_cancelar_pendente_e_em_execucao(fila):
+    job = fila.submeter("eco", {"texto": "x"}, dono="ana")
+    assert fila.cancelar(job["id"], "ana")["estado"] == "cancelado"
+    assert fila.reivindicar("w1") is None
+
+    job = fila.submeter("eco", {"texto": "x", "dormir": 30}, dono="ana")
+    job = _executar(
+        fila, job["id"], durante=lambda: fila.cancelar(job["id"], "ana")
+    )
+    assert job["estado"] == "cancelado" and job["resultado"] is None
+
+
+def test_job_de_worker_morto_volta_para_a_fila(fila, monkeypatch):
+    job = fila.submeter("eco", {"texto": "x"}, dono="ana")
+    assert fila.reivindicar("morto")["id"] == job["id"]
+    assert fila.recuperar_abandonados() == 0
+
+    monkeypatch.setattr(jobs, "JOB_LEASE", -1)
+    assert fila.recuperar_abandonados() == 1
+    assert fila.bater(job["id"], "morto", {}) is None
+    monkeypatch.setattr(jobs, "JOB_LEASE", 60)
+    job = _executar(fila, job["id"])
+    assert job["estado"] == "concluido" and job["tentativas"] == 2
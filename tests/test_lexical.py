@@ -0,0 +1,91 @@
+import os
+
+from app.lexical import IndiceBM25, tokenizar
+
+
+def _indice(tmp_path):
+    idx = IndiceBM25(str(tmp_path / "lexical.json"))
+    idx.adicionar(
+        "Cristo foi proposto para propiciação pela fé no seu sangue.",
+        {"id": 1},
+    )
+    idx.adicionar(
+        "Pela graça sois salvos, por meio da fé (Efésios 2:8).", {"id": 2}
+    )
+    idx.adicionar("A fé vem pelo ouvir a palavra de Deus.", {"id": 3})
+    return idx
+
+
+def test_tokenizar_sem_acentos_e_referencias():
+    assert tokenizar("Propiciação em Efésios 2:8") == [
+        "propiciacao", "efesios", "2:8"
+    ]
+
+
+def test_bm25_termo_exato_e_persistencia(tmp_path):
+    idx = _indice(tmp_path)
+    assert idx.buscar("propiciacao")[0][0] == "ct:1"
+    assert idx.buscar("Efésios 2:8")[0][0] == "ct:2"
+    assert idx.cobertura("Efésios 2:8", "ct:2") == 1.0
+
+    idx.salvar()
+    outro = IndiceBM25(idx.path)
+    outro.carregar()
+    assert len(outro) == 3
+    assert outro.buscar("propiciação")[0][0] == "ct:1"
+
+
+def test_atualizacao_incremental(tmp_path):
+    idx = _indice(tmp_path)
+    idx.adicionar("Texto novo sobre santificação.", {"id": 1})
+    assert idx.buscar("propiciação") == []
+    assert idx.buscar("santificação")[0][0] == "ct:1"
+    idx.remover("ct:1")
+    assert len(idx) == 2 and "santificacao" not in idx.postings
+
+
+def test_filtros_por_metadados(tmp_path):
+    idx = IndiceBM25(str(tmp_path / "lexical.json"))
+    idx.adicionar("A graça soberana de Deus.", {"id": 1, "autor": "Calvino"})
+    idx.adicionar("A graça e o livre-arbítrio.", {"id": 2, "autor": "Armínio"})
+    assert len(idx.buscar("graça")) == 2
+    assert [c for c, _ in idx.buscar("graça", filtros={"autor": "calvino"})] \
+        == ["ct:1"]
+    assert idx.buscar("graça", filtros={"autor": "ARMINIO"})[0][0] == "ct:2"
+    assert idx.buscar("graça", filtros={"autor": "Lutero"}) == []
+
+    idx.salvar()
+    outro = IndiceBM25(idx.path)
+    outro.carregar()
+    assert outro.filtrar({"autor": "Armínio"}) == {"ct:2"}
+
+
+def test_workers_nao_sobrescrevem_um_ao_outro(tmp_path, monkeypatch):
+    import app.lexical as lexical
+
+    path = str(tmp_path / "lexical.json")
+    a, b = IndiceBM25(path), IndiceBM25(path)
+    a.carregar()
+    b.carregar()
+    a.adicionar("Cristo, propiciação pelos nossos pecados.", {"id": 1})
+    a.salvar()
+    b.adicionar("Pela graça sois salvos.", {"id": 2})
+    b.salvar()
+    assert len(b) == 2
+
+    novo = IndiceBM25(path)
+    novo.carregar()
+    assert len(novo) == 2
+    assert novo.buscar("propiciação")[0][0] == "ct:1"
+
+    # Diário maior que o snapshot: vira snapshot novo; `a` acompanha
+    monkeypatch.setattr(lexical, "COMPACT_MIN_BYTES", 0)
+    b.remover("ct:1")
+    b.salvar()
+    monkeypatch.setattr(lexical, "RELOAD_INTERVAL", 0)
+    a.recarregar_se_mudou()
+    assert len(a) == 1 and a.buscar("propiciação") == []
+    # O diário da geração anterior é apagado
+    assert sorted(os.listdir(tmp_path)) == [
+        "lexical.json", "lexical.json.lock"
+    ]
@@ -0,0 +1,41 @@
+import logging
+
+from app.logging_utils import (
+    get_logger,
+    redigir_params,
+    redigir_url,
+    truncar,
+)
+
+
+def test_redacao_e_truncamento():
+    url = "https://4.dbt.io/api/bibles?language_code=por&v=4&key=SEGREDO"
+    assert "SEGREDO" not in redigir_url(url)
+    assert redigir_url(url).endswith("key=***")
+    assert redigir_params({"key": "x", "query": "amor"}) == {
+        "key": "***", "query": "amor"
+    }
+    assert truncar("a" * 10, limite=4) == "aaaa...(+6 chars)"
+
+
+def test_debug_desligado_nao_avalia_payload(caplog):
+    log = get_logger("teste_sampling", sample_rate=1.0)
+    nome = "eklesia.teste_sampling"
+    # set_level restaura o nível ao fim do teste
+    caplog.set_level(logging.INFO, logger=nome)
+
+    def caro():
+        raise AssertionError("payload não deveria ser avaliado")
+
+    log.debug("evento", payload=caro)
+
+    caplog.set_level(logging.DEBUG, logger=nome)
+    # "eklesia" não propaga para a raiz: o handler do caplog vai direto
+    logger = logging.getLogger(nome)
+    logger.addHandler(caplog.handler)
+    try:
+        log.debug("evento", url="http://x/?key=abc", payload=lambda: "ok")
+    finally:
+        logger.removeHandler(caplog.handler)
+    assert '"url": "http://x/?key=***"' in caplog.text
+    assert '"payload": "ok"' in caplog.text
@@ -0,0 +1,115 @@
+import asyncio
+import os
+
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+
+import app.cache as cache  # noqa: E402
+import app.chat as chat  # noqa: E402
+from app.lote import agrupar, responder_lote  # noqa: E402
+from app.vetores import IndiceNumpy  # noqa: E402
+
+
+class _Emb:
+    model = "emb-teste"
+
+    def __init__(self):
+        self.lotes = []
+        self.consultas = 0
+
+    def _vetor(self, texto):
+        rng = np.random.default_rng(sum(texto.encode()) * 7919)
+        return rng.standard_normal(16).tolist()
+
+    def embed_documents(self, textos):
+        self.lotes.append(len(textos))
+        return [self._vetor(t) for t in textos]
+
+    def embed_query(self, texto):
+        self.consultas += 1
+        return self._vetor(texto)
+
+
+async def _allm(prompt):
+    return "Resposta do lote."
+
+
+@pytest.fixture
+def indice(monkeypatch, tmp_path):
+    emb = _Emb()
+    idx = IndiceNumpy("lote", str(tmp_path), emb)
+    idx.add_texts(
+        [f"Pergunta {i}?" for i in range(40)],
+        metadatas=[{"source": "catecismo.txt", "page": i} for i in range(40)],
+    )
+    emb.lotes.clear()
+    monkeypatch.setattr(chat, "MOCK_RAG", False)
+    monkeypatch.setattr(chat, "RETRIEVAL_MODE", "vector")
+    monkeypatch.setattr(chat, "_par_vetorial", lambda: (emb, idx, None))
+    monkeypatch.setattr(
+        chat, "llm", RunnableLambda(lambda p: "x", afunc=_allm)
+    )
+    monkeypatch.setattr(
+        cache, "_geracao", cache._Geracao(str(tmp_path / "indice.geracao"))
+    )
+    monkeypatch.setattr(
+        cache.RESPOSTAS_QUENTES, "path", str(tmp_path / "quentes.json")
+    )
+    cache.CACHE_RESPOSTAS.limpar()
+    cache.CACHE_RECUPERACAO.limpar()
+    yield emb, idx
+    cache.CACHE_RESPOSTAS.limpar()
+    cache.CACHE_RECUPERACAO.limpar()
+
+
+def _rodar(perguntas):
+    async def coletar():
+        return [e async for e in responder_lote(perguntas, concorrencia=2)]
+
+    return asyncio.run(coletar())
+
+
+def test_agrupar_junta_repetidas():
+    grupos = agrupar(["Quem é Deus?", "", "quem e deus", "O que é fé?"])
+    assert grupos == [
+        {"pergunta": "Quem é Deus?", "indices": [0, 2]},
+        {"pergunta": "O que é fé?", "indices": [3]},
+    ]
+
+
+def test_lote_embeda_uma_vez_e_reaproveita_o_cache(indice):
+    emb, _ = indice
+    perguntas = [f"Pergunta {i}?" for i in range(10)] + ["pergunta 3"]
+    eventos = _rodar(perguntas)
+    assert eventos[0] == {"tipo": "inicio", "total": 11, "unicas": 10}
+    respostas = [e for e in eventos if e["tipo"] == "resposta"]
+    assert len(respostas) == 10
+    assert {tuple(e["indices"]) for e in respostas} >= {(3, 10)}
+    assert all(e["fontes"] for e in respostas)
+    assert emb.lotes == [10] and emb.consultas == 0
+    assert eventos[-1]["respondidas"] == 10 and eventos[-1]["erros"] == 0
+
+    eventos = _rodar(perguntas)
+    assert eventos[-1]["em_cache"] == 10
+    assert emb.lotes == [10]
+
+
+def test_busca_em_lote_igual_a_individual(indice):
+    emb, idx = indice
+    vetores = [emb._vetor(f"Pergunta {i}?") for i in range(5)]
+    em_lote = idx.similarity_search_by_vectors_with_relevance_scores(
+        vetores, k=3
+    )
+    for v, pares in zip(vetores, em_lote):
+        sozinho = idx.similarity_search_by_vector_with_relevance_scores(
+            v, k=3
+        )
+        assert [d.page_content for d, _ in pares] == [
+            d.page_content for d, _ in sozinho
+        ]
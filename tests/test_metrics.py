@@ -0,0 +1,40 @@
+import os
+from fastapi.testclient import TestClient
+
+# Configura ambiente (tests usam SQLite e RAG simulado)
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_app.db")
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+
+def test_histogram_render_cumulativo():
+    from app.metrics import Histogram
+
+    h = Histogram("x_seconds", "teste", ("stage",), buckets=(0.1, 1.0))
+    h.observe(0.05, stage="embed")
+    h.observe(0.5, stage="embed")
+    h.observe(5.0, stage="embed")
+    texto = "\n".join(h.render())
+    assert 'x_seconds_bucket{stage="embed",le="0.1"} 1.0' in texto
+    assert 'x_seconds_bucket{stage="embed",le="1.0"} 2.0' in texto
+    assert 'x_seconds_bucket{stage="embed",le="+Inf"} 3.0' in texto
+    assert 'x_seconds_count{stage="embed"} 3.0' in texto
+
+
+def test_metrics_endpoint_rotula_por_rota():
+    from main import app
+    client = TestClient(app)
+
+    r = client.post(
+        "/pergunta-unificada",
+        json={"pergunta": "O que é graça?", "tipo_conteudo": "resposta"},
+    )
+    assert r.status_code == 200, r.text
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert (
+        'eklesia_http_requests_total{route="/pergunta-unificada",'
+        'method="POST",status="200"}'
+    ) in r.text
+    assert "# TYPE eklesia_rag_stage_seconds histogram" in r.text
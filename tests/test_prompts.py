@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from app import prompts  # noqa: E402
+
+
+def _prefixo(a, b):
+    i = 0
+    while i < min(len(a), len(b)) and a[i] == b[i]:
+        i += 1
+    return a[:i]
+
+
+def test_v2_mantem_instrucoes_e_contexto_antes_do_pedido():
+    contexto = "[fonte: graca.pdf, p. 3] A graça é favor imerecido."
+    a = prompts.renderizar("sermao", prompts.pedido(
+        "sermao", "2", tipo="expositivo", tema="graça", num_topicos=3,
+        base_biblica="Efésios 2:8 — …", autor="Calvino",
+    ), contexto, "2")
+    b = prompts.renderizar("sermao", prompts.pedido(
+        "sermao", "2", tipo="textual", tema="graça", num_topicos=5,
+        base_biblica="Romanos 5:1 — …",
+    ), contexto, "2")
+    comum = _prefixo(a, b)
+    assert "Tarefa: escrever o sermão" in comum
+    assert contexto in comum
+    assert "Calvino" not in comum
+
+
+def test_v1_reproduz_os_pedidos_antigos():
+    assert prompts.pedido(
+        "devocional", "1", tema="fé", versiculo="Hebreus 11:1"
+    ) == (
+        "Crie um devocional sobre 'fé' baseado no versículo Hebreus 11:1. "
+        "Inclua uma reflexão pessoal e uma oração final."
+    )
+    with pytest.raises(ValueError):
+        prompts.template("resposta", "9")
+
+
+def test_opcoes_ollama(monkeypatch):
+    monkeypatch.setattr(prompts, "NUM_CTX", -1)
+    opcoes = prompts.opcoes_ollama("mistral")
+    assert opcoes["keep_alive"] == prompts.KEEP_ALIVE
+    assert opcoes["num_ctx"] % 2048 == 0 and opcoes["num_ctx"] > 2048
+    monkeypatch.setattr(prompts, "NUM_CTX", 0)
+    assert "num_ctx" not in prompts.opcoes_ollama("mistral")
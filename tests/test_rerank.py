@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from app import rerank
+
+
+def _doc(texto):
+    return SimpleNamespace(page_content=texto, metadata={})
+
+
+def test_lexical_reordena_e_respeita_orcamento():
+    pares = [
+        (_doc("Texto sobre outro assunto qualquer."), 0.9),
+        (_doc("A justificação pela fé somente. " * 40), 0.6),
+        (_doc("Justificação pela fé em Romanos 5."), 0.5),
+    ]
+    mantidos = rerank.reordenar(
+        "justificação pela fé", pares, top_k=3, orcamento=50
+    )
+    # O primeiro sempre entra; o seguinte já estouraria o orçamento
+    assert [d for d, _ in mantidos] == [pares[1][0]]
+
+    mantidos = rerank.reordenar(
+        "justificação pela fé", pares, top_k=2, orcamento=10_000
+    )
+    assert pares[0][0] not in [d for d, _ in mantidos]
+
+
+def test_timeout_mantem_ordem_da_recuperacao():
+    pares = [(_doc("nada"), 0.9), (_doc("graça e fé"), 0.5)]
+    mantidos = rerank.reordenar("graça fé", pares, top_k=2, timeout_ms=-1)
+    assert mantidos == pares
+
+
+def test_cross_encoder_carrega_em_segundo_plano(monkeypatch):
+    tentativas = []
+
+    def falhar():
+        tentativas.append(1)
+        raise OSError("modelo não encontrado")
+
+    monkeypatch.setattr(rerank, "RERANK", "cross-encoder")
+    monkeypatch.setattr(rerank, "_cross_encoder", None)
+    monkeypatch.setattr(rerank, "_indisponivel_ate", 0.0)
+    monkeypatch.setattr(rerank, "_carregar_cross_encoder", falhar)
+    # Enquanto carrega (ou depois de falhar), vale o léxico
+    assert rerank._scorer()[0] == "lexical"
+    rerank._carregador.join()
+    assert rerank._scorer()[0] == "lexical"
+    assert len(tentativas) == 1
+
+    monkeypatch.setattr(rerank, "_indisponivel_ate", 0.0)
+    monkeypatch.setattr(
+        rerank, "_carregar_cross_encoder",
+        lambda: setattr(rerank, "_cross_encoder", object()),
+    )
+    rerank._scorer()
+    rerank._carregador.join()
+    assert rerank._scorer()[0] == "cross-encoder"
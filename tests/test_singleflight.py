@@ -0,0 +1,78 @@
+import asyncio
+
+from app.singleflight import SingleFlight, chave_pergunta
+from app.streaming import BufferStreams
+
+
+def test_chave_ignora_caixa_acentos_e_pontuacao():
+    assert chave_pergunta("O que é  GRAÇA?") == chave_pergunta("o que e graca")
+    assert chave_pergunta("Graça", {"autor": "Calvino"}) != chave_pergunta(
+        "Graça"
+    )
+
+
+def test_perguntas_identicas_compartilham_uma_execucao():
+    voos = SingleFlight("teste")
+    chamadas = []
+
+    async def gerar():
+        chamadas.append(1)
+        await asyncio.sleep(0.05)
+        return {"resposta": "favor imerecido", "fontes": []}
+
+    async def rodar():
+        return await asyncio.gather(*(
+            voos.executar("graca|", gerar) for _ in range(20)
+        ))
+
+    respostas = asyncio.run(rodar())
+    assert len(chamadas) == 1
+    assert all(r == respostas[0] for r in respostas)
+    # Cada um recebe sua cópia (rotas anexam campos ao resultado)
+    respostas[0]["fontes"].append("x")
+    assert respostas[1]["fontes"] == []
+    assert voos.em_voo() == 0
+
+
+def test_execucao_cancelada_quando_todos_desistem():
+    voos = SingleFlight("teste")
+    terminou = []
+
+    async def gerar():
+        await asyncio.sleep(0.5)
+        terminou.append(1)
+
+    async def rodar():
+        tarefas = [
+            asyncio.create_task(voos.executar("k", gerar)) for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        for t in tarefas:
+            t.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        await asyncio.sleep(0.6)
+
+    asyncio.run(rodar())
+    assert terminou == []
+
+
+def test_stream_em_voo_ganha_assinantes():
+    async def rodar():
+        buffer = BufferStreams()
+        t = buffer.nova("ana", "graca|")
+        assert buffer.assinar("graca|", "bia") is t
+        assert buffer.obter(t.id, "bia") is t
+        t.encerrar()
+        assert buffer._em_voo == {}
+        # Encerrada, a próxima pergunta igual gera de novo
+        assert buffer.assinar("graca|", "caio") is None
+
+        # Podada pelo TTL ainda gerando: a chave sai junto
+        buffer.ttl = -1
+        buffer.nova("ana", "fe|")
+        buffer.nova("ana")
+        assert buffer._em_voo == {}
+        return t
+
+    t = asyncio.run(rodar())
+    assert t.assinantes == 2
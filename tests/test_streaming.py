@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+from app.metrics import LLM_TOKENS_SAVED
+from app.streaming import (
+    BufferStreams,
+    GuardaStream,
+    Transmissao,
+    ler_event_id,
+)
+
+
+class _Fonte:
+    def __init__(self, n=50, intervalo=0.01):
+        self.n = n
+        self.intervalo = intervalo
+        self.gerados = 0
+        self.fechada = False
+
+    async def tokens(self):
+        try:
+            for i in range(self.n):
+                await asyncio.sleep(self.intervalo)
+                self.gerados += 1
+                yield f"t{i} "
+        finally:
+            self.fechada = True
+
+
+class _Request:
+    def __init__(self, apos):
+        self.apos = apos
+        self.chamadas = 0
+
+    async def is_disconnected(self):
+        self.chamadas += 1
+        return self.chamadas > self.apos
+
+
+def _consumir(guarda, fonte):
+    async def rodar():
+        recebidos = [t async for t in guarda.percorrer(fonte.tokens())]
+        await asyncio.sleep(0.05)
+        return recebidos
+
+    return asyncio.run(rodar())
+
+
+def test_completa_sem_interrupcao():
+    fonte = _Fonte(n=5)
+    guarda = GuardaStream(modelo="m-completa")
+    assert len(_consumir(guarda, fonte)) == 5
+    assert guarda.motivo is None
+
+
+def test_limite_de_tokens_cancela_a_geracao():
+    fonte = _Fonte(n=50)
+    guarda = GuardaStream(modelo="m-tokens", max_tokens=5)
+    assert len(_consumir(guarda, fonte)) == 5
+    assert guarda.motivo == "tokens"
+    assert fonte.fechada and fonte.gerados < 50
+
+
+def test_limite_de_tempo():
+    fonte = _Fonte(n=50, intervalo=0.05)
+    guarda = GuardaStream(modelo="m-tempo", max_segundos=0.3)
+    recebidos = _consumir(guarda, fonte)
+    assert guarda.motivo == "tempo"
+    assert 0 < len(recebidos) < 50 and fonte.fechada
+
+
+def test_desconexao_cancela_e_conta_tokens_poupados(monkeypatch):
+    monkeypatch.setattr("app.streaming.STREAM_POLL", 0.02)
+    # Uma resposta completa de 20 chunks define a média do modelo
+    _consumir(GuardaStream(modelo="m-desc"), _Fonte(n=20, intervalo=0))
+
+    fonte = _Fonte(n=20, intervalo=0.02)
+    guarda = GuardaStream(_Request(apos=3), modelo="m-desc")
+    _consumir(guarda, fonte)
+    assert guarda.motivo == "desconexao"
+    assert fonte.fechada and fonte.gerados < 20
+    poupados = LLM_TOKENS_SAVED.valor(model="m-desc", reason="desconexao")
+    assert poupados == 20 - guarda.produzidos
+
+
+def test_transmissao_retoma_do_ultimo_evento(monkeypatch):
+    monkeypatch.setattr("app.streaming.STREAM_POLL", 0.02)
+    monkeypatch.setattr("app.streaming.SSE_HEARTBEAT", 0.05)
+
+    async def rodar():
+        buffer = BufferStreams()
+        t = buffer.nova("ana")
+
+        async def gerar():
+            for i in range(4):
+                t.publicar({"type": "token", "content": str(i)})
+                await asyncio.sleep(0.08)
+            t.publicar({"type": "done"})
+
+        t.iniciar(gerar())
+        primeiro = []
+        async for chunk in t.ler(0):
+            primeiro.extend(_frames(chunk))
+            if primeiro[-1].startswith("id:"):
+                break
+        ultimo_id = primeiro[-1].split("\n")[0][4:]
+        sid, n = ler_event_id(ultimo_id)
+        assert buffer.obter(sid, "outro") is None
+        resto = [
+            f async for chunk in buffer.obter(sid, "ana").ler(n)
+            for f in _frames(chunk)
+        ]
+        return primeiro, resto
+
+    primeiro, resto = asyncio.run(rodar())
+    assert primeiro[0].startswith("retry:")
+    eventos = [f for f in resto if f.startswith("id:")]
+    assert [e.split("\n")[0].rsplit(":", 1)[1] for e in eventos] == [
+        "2", "3", "4", "5"
+    ]
+    assert '"done"' in eventos[-1]
+    assert any(f.startswith(": ping") for f in resto)
+
+
+def _frames(chunk):
+    return [f for f in chunk.decode().split("\n\n") if f]
+
+
+def test_tokens_sao_agrupados_na_janela_de_flush():
+    async def rodar():
+        t = Transmissao(flush_ms=30, flush_bytes=8)
+        for parte in ["a", "b", "c"]:
+            t.publicar_token(parte)
+        await asyncio.sleep(0.06)
+        t.publicar_token("0123456789")
+        t.publicar_token("fim")
+        t.encerrar()
+        return [f async for chunk in t.ler(1) for f in _frames(chunk)]
+
+    frames = asyncio.run(rodar())
+    conteudos = [json.loads(f.split("data: ", 1)[1])["content"]
+                 for f in frames]
+    assert conteudos == ["0123456789", "fim"]
+    assert frames[0].split("\n")[0].endswith(":2")
@@ -0,0 +1,35 @@
+import os
+from fastapi.testclient import TestClient
+
+# Configura ambiente (tests usam SQLite e RAG simulado)
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test_app.db")
+os.environ.setdefault("EKLESIA_MOCK_RAG", "1")
+
+
+def test_timings_opt_in_e_request_id():
+    from main import app
+    client = TestClient(app)
+    body = {"pergunta": "O que é graça?", "tipo_conteudo": "resposta"}
+
+    # Sem debug: resposta sem timings, mas com request id no header
+    r = client.post("/pergunta-unificada", json=body)
+    assert r.status_code == 200, r.text
+    assert "timings" not in r.json()
+    assert r.headers.get("x-request-id")
+
+    # Com debug via header e request id propagado
+    r = client.post(
+        "/pergunta-unificada",
+        json=body,
+        headers={"X-Debug-Timings": "1", "X-Request-ID": "abc123"},
+    )
+    assert r.status_code == 200, r.text
+    assert r.headers["x-request-id"] == "abc123"
+    timings = r.json()["timings"]
+    assert timings["docs"] == 1
+    assert "total_ms" in timings
+    assert isinstance(timings["bible_api"], list)
+
+    # Com debug via query string
+    r = client.post("/pergunta-unificada?debug=1", json=body)
+    assert "timings" in r.json()
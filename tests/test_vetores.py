@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.vetores import IndiceNumpy
+
+
+class _Emb:
+    """Vetor determinístico por texto (dimensão 16)."""
+
+    def _vetor(self, texto):
+        rng = np.random.default_rng(abs(hash(texto)) % 2**32)
+        return rng.standard_normal(16).tolist()
+
+    def embed_documents(self, textos):
+        return [self._vetor(t) for t in textos]
+
+    def embed_query(self, texto):
+        return self._vetor(texto)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_busca_upsert_e_lapides(tmp_path, dtype):
+    emb = _Emb()
+    idx = IndiceNumpy("teste", str(tmp_path), emb, dtype=dtype)
+    textos = [f"trecho {i}" for i in range(50)]
+    idx.add_texts(
+        textos,
+        metadatas=[{"autor_norm": "owen" if i % 2 else "calvino"}
+                   for i in range(50)],
+        ids=[f"ct:{i}:0" for i in range(50)],
+    )
+    doc, dist = idx.similarity_search_by_vector_with_relevance_scores(
+        emb.embed_query("trecho 7"), k=1
+    )[0]
+    assert doc.page_content == "trecho 7"
+    assert dist == pytest.approx(0.0, abs=0.01)
+
+    filtrados = idx.similarity_search_by_vector_with_relevance_scores(
+        emb.embed_query("trecho 7"), k=5, filter={"autor_norm": "calvino"}
+    )
+    assert all(d.metadata["autor_norm"] == "calvino" for d, _ in filtrados)
+
+    # Regravar um id troca o texto; apagar tira da busca
+    idx.add_texts(["novo texto"], ids=["ct:7:0"])
+    idx.delete(ids=["ct:8:0"])
+    assert idx.count() == 49
+    assert idx.get(ids=["ct:7:0"])["documents"] == ["novo texto"]
+
+    # Outro processo (nova instância) vê o mesmo estado pelo disco
+    outro = IndiceNumpy("teste", str(tmp_path), emb)
+    assert outro.dtype == dtype
+    achados = [
+        d.page_content
+        for d, _ in outro.similarity_search_by_vector_with_relevance_scores(
+            emb.embed_query("trecho 8"), k=50
+        )
+    ]
+    assert "trecho 8" not in achados and "trecho 7" not in achados
+
+    # `idx` ainda tem a geração antiga mapeada quando `outro` compacta
+    antes = idx.similarity_search_by_vector_with_relevance_scores
+    assert outro.compactar() == 2
+    arquivos = sorted(os.listdir(tmp_path / "teste.npvec"))
+    assert "docs.jsonl" not in arquivos and "info.json" in arquivos
+    assert idx.count() == 49
+    assert idx.get(ids=["ct:9:0"])["documents"] == ["trecho 9"]
+    doc, _ = antes(emb.embed_query("trecho 9"), k=1)[0]
+    assert doc.page_content == "trecho 9"
+
+
+def test_leitor_no_meio_da_compactacao_recomeca(tmp_path):
+    emb = _Emb()
+    idx = IndiceNumpy("teste", str(tmp_path), emb)
+    idx.add_texts([f"trecho {i}" for i in range(10)],
+                  ids=[str(i) for i in range(10)])
+    idx.delete(ids=["3"])
+    leitor = IndiceNumpy("teste", str(tmp_path), emb)
+    idx.add_texts(["mais um"], ids=["10"])
+    idx.compactar()
+    # Leitor que conferiu info.json logo antes da troca: os arquivos da
+    # geração dele somem no meio da leitura e ele recomeça pela nova
+    leitor._info = leitor._id_info()
+    assert leitor.count() == 10
+    assert leitor._mat.shape[0] == 10